@@ -0,0 +1,182 @@
+"""
+Incremental change feed for point-of-sale and marketplace sync.
+
+Clients keep an opaque cursor and ask for everything that changed after it.
+Each feed is read in ``(updated_at, id)`` keyset order, backed by an index on
+those columns, so a sync costs O(changes) instead of O(catalog). Deletes are
+reported from the Tombstone table in ``(deleted_at, id)`` order.
+
+Rows are emitted as NDJSON lines::
+
+    {"feed": "items", "op": "upsert", "id": 7, "updated_at": "...", "data": {...}}
+    {"feed": "items", "op": "delete", "id": 9, "deleted_at": "..."}
+    {"op": "checkpoint", "cursor": "<token>", "has_more": false}
+
+The final checkpoint carries the cursor to send on the next sync.
+"""
+import base64
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from crm.models import Customer
+from inventory.models import JewelryItem
+from sales.models import Invoice, InvoiceLine
+
+from .models import Tombstone
+
+FEEDS = {
+    'items': {
+        'model': JewelryItem,
+        'fields': (
+            'id', 'sku', 'name', 'category_id', 'supplier_id', 'description', 'metal', 'purity',
+            'weight_grams', 'stone_details', 'cost_price', 'sale_price', 'quantity_on_hand',
+            'image', 'is_active', 'created_at', 'updated_at',
+        ),
+    },
+    'customers': {
+        'model': Customer,
+        'fields': ('id', 'name', 'email', 'phone', 'address', 'notes', 'created_at', 'updated_at'),
+    },
+    'invoices': {
+        'model': Invoice,
+        'fields': (
+            'id', 'invoice_number', 'customer_id', 'status', 'currency', 'subtotal', 'tax',
+            'discount', 'total', 'notes', 'created_at', 'updated_at',
+        ),
+    },
+}
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+LINE_FIELDS = ('id', 'item_id', 'description', 'quantity', 'unit_price', 'line_total')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def model_label(model):
+    return model._meta.label_lower
+
+
+def encode_cursor(positions):
+    raw = json.dumps(positions, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return ``{stream: [timestamp, id]}`` from a cursor token."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        positions = json.loads(raw)
+        for stamp, pk in positions.values():
+            if parse_datetime(stamp) is None or not isinstance(pk, int):
+                raise ValueError
+    except (ValueError, TypeError, AttributeError):
+        raise InvalidCursor('Malformed cursor')
+    return positions
+
+
+def initial_positions(feeds, since=None):
+    """Cursor positions for a first sync, optionally starting at ``since``."""
+    stamp = (since or EPOCH).isoformat()
+    positions = {}
+    for feed in feeds:
+        positions[feed] = [stamp, 0]
+        positions[f'{feed}:deleted'] = [stamp, 0]
+    return positions
+
+
+def _after(stamp_field, stamp, pk):
+    return Q(**{f'{stamp_field}__gt': stamp}) | Q(**{stamp_field: stamp, 'pk__gt': pk})
+
+
+def _dump(obj):
+    return json.dumps(obj, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n'
+
+
+def _upserts(feed, position, until, chunk_size, limit):
+    config = FEEDS[feed]
+    stamp, pk = parse_datetime(position[0]), position[1]
+    queryset = (
+        config['model'].objects.filter(updated_at__lte=until)
+        .order_by('updated_at', 'pk')
+        .values(*config['fields'])
+    )
+    emitted = 0
+    while limit is None or emitted < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - emitted)
+        rows = list(queryset.filter(_after('updated_at', stamp, pk))[:size])
+        if not rows:
+            return False
+        if feed == 'invoices':
+            attach_invoice_lines(rows)
+        for row in rows:
+            yield {'feed': feed, 'op': 'upsert', 'id': row['id'], 'updated_at': row['updated_at'], 'data': row}
+        stamp, pk = rows[-1]['updated_at'], rows[-1]['id']
+        position[:] = [stamp.isoformat(), pk]
+        emitted += len(rows)
+        if len(rows) < size:
+            return False
+    return queryset.filter(_after('updated_at', stamp, pk)).exists()
+
+
+def attach_invoice_lines(rows):
+    lines = {}
+    for line in InvoiceLine.objects.filter(invoice_id__in=[row['id'] for row in rows]).order_by('pk').values('invoice_id', *LINE_FIELDS):
+        lines.setdefault(line.pop('invoice_id'), []).append(line)
+    for row in rows:
+        row['lines'] = lines.get(row['id'], [])
+
+
+def _deletes(feed, position, until, chunk_size, limit):
+    label = model_label(FEEDS[feed]['model'])
+    stamp, pk = parse_datetime(position[0]), position[1]
+    queryset = (
+        Tombstone.objects.filter(model=label, deleted_at__lte=until)
+        .order_by('deleted_at', 'pk')
+        .values('id', 'object_id', 'deleted_at')
+    )
+    emitted = 0
+    while limit is None or emitted < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - emitted)
+        rows = list(queryset.filter(_after('deleted_at', stamp, pk))[:size])
+        if not rows:
+            return False
+        for row in rows:
+            yield {'feed': feed, 'op': 'delete', 'id': row['object_id'], 'deleted_at': row['deleted_at']}
+        stamp, pk = rows[-1]['deleted_at'], rows[-1]['id']
+        position[:] = [stamp.isoformat(), pk]
+        emitted += len(rows)
+        if len(rows) < size:
+            return False
+    return queryset.filter(_after('deleted_at', stamp, pk)).exists()
+
+
+def stream_changes(feeds, positions, chunk_size=None, limit=None):
+    """
+    Yield NDJSON lines for every change after ``positions``.
+
+    Rows newer than now minus CHANGEFEED_SAFETY_LAG_SECONDS are held back so a
+    transaction that commits late with an older ``updated_at`` isn't skipped.
+    ``limit`` caps the rows per stream; ``has_more`` in the checkpoint tells
+    the client to call again.
+    """
+    chunk_size = chunk_size or settings.CHANGEFEED_CHUNK_SIZE
+    until = timezone.now() - timedelta(seconds=settings.CHANGEFEED_SAFETY_LAG_SECONDS)
+    positions = {**initial_positions(feeds), **positions}
+    has_more = False
+    for feed in feeds:
+        for stream, reader in ((feed, _upserts), (f'{feed}:deleted', _deletes)):
+            generator = reader(feed, positions[stream], until, chunk_size, limit)
+            while True:
+                try:
+                    yield _dump(next(generator))
+                except StopIteration as stop:
+                    has_more = has_more or bool(stop.value)
+                    break
+    yield _dump({'op': 'checkpoint', 'cursor': encode_cursor(positions), 'has_more': has_more})
@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from api.changefeed import FEEDS, InvalidCursor, decode_cursor, initial_positions, stream_changes
+
+
+class Command(BaseCommand):
+    help = 'Write items, customers and invoices changed since a watermark as NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='ISO timestamp with offset for a first sync.')
+        parser.add_argument('--cursor', help='Cursor from the checkpoint line of a previous export.')
+        parser.add_argument('--feeds', default=','.join(FEEDS), help='Comma separated feeds (default: all).')
+        parser.add_argument('--limit', type=int, help='Maximum rows per feed.')
+        parser.add_argument('--output', help='File to write (default: stdout).')
+
+    def handle(self, *args, **options):
+        feeds = [f.strip() for f in options['feeds'].split(',') if f.strip()]
+        unknown = [f for f in feeds if f not in FEEDS]
+        if unknown:
+            raise CommandError(f"Unknown feed(s): {', '.join(unknown)}")
+
+        if options['cursor']:
+            try:
+                positions = decode_cursor(options['cursor'])
+            except InvalidCursor as exc:
+                raise CommandError(str(exc))
+        elif options['since']:
+            since = parse_datetime(options['since'])
+            if since is None or since.tzinfo is None:
+                raise CommandError('--since must be an ISO timestamp with a UTC offset')
+            positions = initial_positions(feeds, since)
+        else:
+            positions = {}
+
+        lines = stream_changes(feeds, positions, limit=options['limit'])
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.writelines(lines)
+            self.stderr.write(f"Wrote changes to {options['output']}")
+        else:
+            sys.stdout.writelines(lines)
@@ -0,0 +1,18 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Tombstone(models.Model):
+    """Record of a deleted row, so the change feed can tell clients to drop it."""
+    model = models.CharField(max_length=100, help_text='Model label, e.g. inventory.jewelryitem')
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['deleted_at', 'id']
+        indexes = [
+            models.Index(fields=['model', 'deleted_at', 'id'], name='tombstone_model_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model}#{self.object_id}'
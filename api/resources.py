@@ -0,0 +1,84 @@
+"""
+Resources exposed by the read-only v1 API.
+
+Each resource maps public field names to ORM paths. Rows are always read
+with ``.values()`` so responses never build model instances. ``version`` is
+the column the ETag is computed from.
+"""
+from crm.models import Customer, Supplier
+from documents.models import Certificate
+from inventory.models import JewelryItem, SerializedPiece
+from sales.models import Invoice
+
+from .changefeed import attach_invoice_lines
+
+RESOURCES = {
+    'items': {
+        'model': JewelryItem,
+        'fields': {
+            'id': 'id', 'sku': 'sku', 'name': 'name', 'description': 'description',
+            'category_id': 'category_id', 'category_name': 'category__name',
+            'supplier_id': 'supplier_id', 'supplier_name': 'supplier__name',
+            'metal': 'metal', 'purity': 'purity', 'weight_grams': 'weight_grams',
+            'stone_details': 'stone_details', 'cost_price': 'cost_price', 'sale_price': 'sale_price',
+            'quantity_on_hand': 'quantity_on_hand', 'image': 'image', 'is_active': 'is_active',
+            'created_at': 'created_at', 'updated_at': 'updated_at',
+        },
+        'default_fields': ('id', 'sku', 'name', 'metal', 'purity', 'weight_grams', 'sale_price',
+                           'quantity_on_hand', 'is_active', 'updated_at'),
+        'version': 'updated_at',
+    },
+    'pieces': {
+        'model': SerializedPiece,
+        'fields': {
+            'id': 'id', 'serial': 'serial', 'item_id': 'item_id', 'item_sku': 'item__sku', 'status': 'status',
+            'invoice_line_id': 'invoice_line_id', 'received_at': 'received_at', 'updated_at': 'updated_at',
+        },
+        'default_fields': ('id', 'serial', 'item_id', 'status', 'updated_at'),
+        'version': 'updated_at',
+    },
+    'customers': {
+        'model': Customer,
+        'fields': {
+            'id': 'id', 'name': 'name', 'email': 'email', 'phone': 'phone', 'address': 'address',
+            'notes': 'notes', 'created_at': 'created_at', 'updated_at': 'updated_at',
+        },
+        'default_fields': ('id', 'name', 'email', 'phone', 'updated_at'),
+        'version': 'updated_at',
+    },
+    'suppliers': {
+        'model': Supplier,
+        'fields': {
+            'id': 'id', 'name': 'name', 'email': 'email', 'phone': 'phone', 'vat_number': 'vat_number',
+            'address': 'address', 'notes': 'notes', 'created_at': 'created_at', 'updated_at': 'updated_at',
+        },
+        'default_fields': ('id', 'name', 'email', 'phone', 'vat_number', 'updated_at'),
+        'version': 'updated_at',
+    },
+    'invoices': {
+        'model': Invoice,
+        'fields': {
+            'id': 'id', 'invoice_number': 'invoice_number', 'customer_id': 'customer_id',
+            'customer_name': 'customer__name', 'status': 'status', 'currency': 'currency',
+            'subtotal': 'subtotal', 'tax': 'tax', 'discount': 'discount', 'total': 'total',
+            'notes': 'notes', 'created_at': 'created_at', 'updated_at': 'updated_at',
+        },
+        'default_fields': ('id', 'invoice_number', 'customer_id', 'status', 'total', 'created_at', 'updated_at'),
+        'version': 'updated_at',
+        # Extra fields that are not columns: name -> function(rows) filling them in.
+        'expand': {'lines': attach_invoice_lines},
+    },
+    'certificates': {
+        'model': Certificate,
+        'fields': {
+            'id': 'id', 'certificate_number': 'certificate_number', 'item_id': 'item_id',
+            'item_sku': 'item__sku', 'piece_id': 'piece_id', 'piece_serial': 'piece__serial',
+            'invoice_id': 'invoice_id', 'customer_id': 'customer_id',
+            'pdf_file': 'pdf_file', 'issued_at': 'issued_at', 'created_at': 'created_at',
+            'updated_at': 'updated_at',
+        },
+        'default_fields': ('id', 'certificate_number', 'item_id', 'invoice_id', 'customer_id', 'issued_at',
+                           'updated_at'),
+        'version': 'updated_at',
+    },
+}
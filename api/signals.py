@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from crm.models import Customer
+from inventory.models import JewelryItem
+from sales.models import Invoice
+
+from .models import Tombstone
+
+
+@receiver(post_delete, sender=JewelryItem)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Invoice)
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(model=sender._meta.label_lower, object_id=instance.pk)
@@ -0,0 +1,155 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from crm.models import Customer
+from inventory.models import Category, JewelryItem
+from inventory.tests import make_item
+from sales.models import Invoice, InvoiceLine
+
+from .changefeed import InvalidCursor, decode_cursor, encode_cursor, stream_changes
+from .models import Tombstone
+
+
+class ResourceListTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='pw'))
+        self.category = Category.objects.create(name='Rings')
+        self.items = [make_item(f'RG-{n}', category=self.category) for n in range(1, 6)]
+
+    def get(self, resource='items', etag=None, **params):
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get(reverse('api:resource_list', args=[resource]), params, headers=headers)
+
+    def test_ids_fetch_only_those_rows(self):
+        wanted = [self.items[3].pk, self.items[0].pk]
+        data = self.get(ids=','.join(map(str, wanted)), fields='sku').json()
+        self.assertEqual(data, {'results': [{'sku': 'RG-1'}, {'sku': 'RG-4'}], 'next_after': None})
+        self.assertEqual(self.get(ids='1,x').status_code, 400)
+
+    def test_after_and_limit_page_by_id(self):
+        first = self.get(limit=2, fields='id').json()
+        self.assertEqual([row['id'] for row in first['results']], [item.pk for item in self.items[:2]])
+        self.assertEqual(first['next_after'], self.items[1].pk)
+        rest = self.get(limit=3, after=first['next_after'], fields='id').json()
+        self.assertEqual([row['id'] for row in rest['results']], [item.pk for item in self.items[2:]])
+        self.assertIsNone(rest['next_after'])
+        self.assertEqual(self.get(limit=0).status_code, 400)
+
+    def test_fields_select_columns_and_reject_unknown(self):
+        row = self.get(fields='sku,category_name', limit=1).json()['results'][0]
+        self.assertEqual(row, {'sku': 'RG-1', 'category_name': 'Rings'})
+        self.assertEqual(self.get(fields='sku,cost').status_code, 400)
+
+    def test_etag_is_stable_until_a_row_changes(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(etag=etag).status_code, 304)
+        self.items[0].save()
+        self.assertEqual(self.get(etag=etag).status_code, 200)
+
+    def test_renaming_a_joined_row_changes_etag(self):
+        etag = self.get(fields='sku,category_name')['ETag']
+        self.assertEqual(self.get(etag=etag, fields='sku,category_name').status_code, 304)
+        Category.objects.filter(pk=self.category.pk).update(name='Bands')
+        response = self.get(etag=etag, fields='sku,category_name')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['category_name'], 'Bands')
+
+    def test_customer_rename_and_line_change_change_invoice_etag(self):
+        customer = Customer.objects.create(name='Ada Lovelace')
+        invoice = Invoice.objects.create(customer=customer)
+        line = InvoiceLine.objects.create(invoice=invoice, description='Ring', quantity=1, unit_price=Decimal('10.00'))
+        url = reverse('api:resource_detail', args=['invoices', invoice.pk])
+        params = {'fields': 'id,customer_name,lines'}
+
+        etag = self.client.get(url, params)['ETag']
+        self.assertEqual(self.client.get(url, params, headers={'If-None-Match': etag}).status_code, 304)
+
+        Customer.objects.filter(pk=customer.pk).update(name='Ada King')
+        response = self.client.get(url, params, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        InvoiceLine.objects.filter(pk=line.pk).update(quantity=2)
+        response = self.client.get(url, params, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['lines'][0]['quantity'], 2)
+
+
+@override_settings(CHANGEFEED_SAFETY_LAG_SECONDS=0)
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        self.stamp = timezone.now() - timedelta(minutes=5)
+        self.items = [make_item(f'RG-{n}') for n in range(1, 6)]
+        # Every row shares one timestamp, so only the id orders them.
+        JewelryItem.objects.update(updated_at=self.stamp)
+
+    def sync(self, positions=None, **kwargs):
+        lines = [json.loads(line) for line in stream_changes(['items'], positions or {}, **kwargs)]
+        checkpoint = lines.pop()
+        self.assertEqual(checkpoint['op'], 'checkpoint')
+        return lines, checkpoint
+
+    def ids(self, lines, op='upsert'):
+        return [line['id'] for line in lines if line['op'] == op]
+
+    def test_cursor_round_trip_and_tampering(self):
+        positions = {'items': [self.stamp.isoformat(), 7], 'items:deleted': [self.stamp.isoformat(), 0]}
+        self.assertEqual(decode_cursor(encode_cursor(positions)), positions)
+        for token in ['not-base64!', encode_cursor({'items': ['yesterday', 1]}), encode_cursor({'items': [self.stamp.isoformat(), '1']})]:
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(token)
+
+        self.client.force_login(User.objects.create_user('clerk', password='pw'))
+        response = self.client.get(reverse('api:changes'), {'cursor': encode_cursor(positions)[:-3] + 'xyz'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_equal_timestamps_split_across_chunks(self):
+        lines, checkpoint = self.sync(chunk_size=2)
+        self.assertEqual(self.ids(lines), [item.pk for item in self.items])
+        self.assertFalse(checkpoint['has_more'])
+
+    def test_limit_sets_has_more_and_cursor_resumes(self):
+        seen = []
+        positions = {}
+        while True:
+            lines, checkpoint = self.sync(positions, chunk_size=2, limit=2)
+            seen += self.ids(lines)
+            positions = decode_cursor(checkpoint['cursor'])
+            if not checkpoint['has_more']:
+                break
+        self.assertEqual(seen, [item.pk for item in self.items])
+
+        lines, checkpoint = self.sync(positions)
+        self.assertEqual(lines, [])
+        # A row saved later with the same timestamp but a higher id is still picked up.
+        later = make_item('RG-9')
+        JewelryItem.objects.filter(pk=later.pk).update(updated_at=self.stamp)
+        lines, _ = self.sync(decode_cursor(checkpoint['cursor']))
+        self.assertEqual(self.ids(lines), [later.pk])
+
+    def test_safety_lag_holds_back_recent_rows(self):
+        _, checkpoint = self.sync()
+        self.items[0].save()
+        with override_settings(CHANGEFEED_SAFETY_LAG_SECONDS=60):
+            lines, held = self.sync(decode_cursor(checkpoint['cursor']))
+        self.assertEqual(lines, [])
+        lines, _ = self.sync(decode_cursor(held['cursor']))
+        self.assertEqual(self.ids(lines), [self.items[0].pk])
+
+    def test_deletes_are_reported_from_tombstones(self):
+        _, checkpoint = self.sync()
+        pk = self.items[2].pk
+        self.items[2].delete()
+        tombstone = Tombstone.objects.get()
+        self.assertEqual((tombstone.model, tombstone.object_id), ('inventory.jewelryitem', pk))
+        Tombstone.objects.update(deleted_at=timezone.now() - timedelta(seconds=1))
+
+        lines, _ = self.sync(decode_cursor(checkpoint['cursor']))
+        self.assertEqual(self.ids(lines, 'delete'), [pk])
+        self.assertEqual(self.ids(lines), [])
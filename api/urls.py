@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('v1/changes/', views.changes, name='changes'),
+    path('v1/<str:resource_name>/', views.resource_list, name='resource_list'),
+    path('v1/<str:resource_name>/<int:pk>/', views.resource_detail, name='resource_detail'),
+]
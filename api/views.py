@@ -0,0 +1,192 @@
+import hashlib
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import Http404, HttpResponseBadRequest, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.http import require_GET
+
+from .changefeed import FEEDS, InvalidCursor, decode_cursor, initial_positions, stream_changes
+from .resources import RESOURCES
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+MAX_IDS = 500
+
+
+@login_required
+def changes(request):
+    """
+    Stream changes since ``cursor`` (or ``since`` on a first sync) as NDJSON.
+
+    Query params: ``feeds`` (comma separated, default all), ``cursor``,
+    ``since`` (ISO timestamp) and ``limit`` (rows per feed).
+    """
+    feeds = [f.strip() for f in request.GET.get('feeds', ','.join(FEEDS)).split(',') if f.strip()]
+    unknown = [f for f in feeds if f not in FEEDS]
+    if unknown:
+        return HttpResponseBadRequest(f"Unknown feed(s): {', '.join(unknown)}")
+
+    cursor = request.GET.get('cursor')
+    since = request.GET.get('since')
+    if cursor:
+        try:
+            positions = decode_cursor(cursor)
+        except InvalidCursor as exc:
+            return HttpResponseBadRequest(str(exc))
+    elif since:
+        since_at = parse_datetime(since)
+        if since_at is None or since_at.tzinfo is None:
+            return HttpResponseBadRequest('since must be an ISO timestamp with a UTC offset')
+        positions = initial_positions(feeds, since_at)
+    else:
+        positions = {}
+
+    limit = request.GET.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or int(limit) < 1:
+            return HttpResponseBadRequest('limit must be a positive integer')
+        limit = int(limit)
+
+    response = StreamingHttpResponse(stream_changes(feeds, positions, limit=limit), content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def _get_resource(name):
+    try:
+        return RESOURCES[name]
+    except KeyError:
+        raise Http404(f'Unknown resource: {name}')
+
+
+def _parse_ids(raw, name):
+    values = [v.strip() for v in raw.split(',') if v.strip()]
+    if not all(v.isdigit() for v in values):
+        raise ValueError(f'{name} must be a comma separated list of integers')
+    return [int(v) for v in values]
+
+
+def _selected_fields(resource, raw):
+    """Split ``fields=`` into (columns, expansions); unknown names are an error."""
+    names = [f.strip() for f in raw.split(',') if f.strip()] if raw else list(resource['default_fields'])
+    expand = resource.get('expand', {})
+    unknown = [n for n in names if n not in resource['fields'] and n not in expand]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    columns = [n for n in names if n in resource['fields']]
+    return columns, [n for n in names if n in expand]
+
+
+def _fetch_rows(resource, queryset, columns):
+    """
+    Read rows as dicts with .values().
+
+    ``id`` and the version column are always fetched, for paging and the
+    ETag; _finish_rows drops them again if the client didn't ask for them.
+    """
+    mapping = resource['fields']
+    wanted = list(dict.fromkeys(['id', resource['version'], *columns]))
+    plain = [n for n in wanted if mapping[n] == n]
+    aliased = {n: F(mapping[n]) for n in wanted if mapping[n] != n}
+    return list(queryset.values(*plain, **aliased))
+
+
+def _finish_rows(resource, rows, columns, expansions):
+    """
+    Fill in expansions, compute the ETag for ``rows`` and drop unrequested keys.
+
+    A row's version only covers its own table, so values joined from other
+    rows (``category_name``, ``customer_name``, ...) and expansions are
+    hashed as sent: renaming a category or editing an invoice line changes
+    the ETag without touching the row's ``updated_at``.
+    """
+    version = resource['version']
+    joined = [n for n in columns if '__' in resource['fields'][n]]
+    for name in expansions:
+        resource['expand'][name](rows)
+
+    etag = hashlib.md5(','.join(columns + expansions).encode())
+    for row in rows:
+        etag.update(f"{row['id']}:{row[version].isoformat()};".encode())
+        if joined or expansions:
+            related = [row[n] for n in joined + expansions]
+            etag.update(json.dumps(related, cls=DjangoJSONEncoder, separators=(',', ':')).encode())
+    hidden = [n for n in ('id', version) if n not in columns]
+    if hidden:
+        for row in rows:
+            for name in hidden:
+                del row[name]
+    return quote_etag(etag.hexdigest())
+
+
+def _not_modified(request, etag):
+    return etag in parse_etags(request.headers.get('If-None-Match', ''))
+
+
+@require_GET
+@login_required
+def resource_list(request, resource_name):
+    """
+    List a resource with keyset pagination.
+
+    Query params: ``fields`` (sparse fieldset), ``ids`` (batch fetch by id),
+    ``after`` (last id of the previous page) and ``limit``. Responses carry
+    an ETag; a matching ``If-None-Match`` returns 304.
+    """
+    resource = _get_resource(resource_name)
+    try:
+        columns, expansions = _selected_fields(resource, request.GET.get('fields'))
+        ids = _parse_ids(request.GET['ids'], 'ids') if 'ids' in request.GET else None
+        after = _parse_ids(request.GET.get('after', '0'), 'after')
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    if len(after) > 1 or not 1 <= limit <= MAX_LIMIT:
+        return HttpResponseBadRequest(f'after must be one id and limit between 1 and {MAX_LIMIT}')
+
+    queryset = resource['model'].objects.order_by('pk')
+    if ids is not None:
+        if len(ids) > MAX_IDS:
+            return HttpResponseBadRequest(f'At most {MAX_IDS} ids per request')
+        rows = _fetch_rows(resource, queryset.filter(pk__in=ids), columns)
+        next_after = None
+    else:
+        # One extra row tells whether there is a next page.
+        rows = _fetch_rows(resource, queryset.filter(pk__gt=after[0] if after else 0)[:limit + 1], columns)
+        next_after = rows[limit - 1]['id'] if len(rows) > limit else None
+        rows = rows[:limit]
+    etag = _finish_rows(resource, rows, columns, expansions)
+
+    if _not_modified(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({'results': rows, 'next_after': next_after})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@require_GET
+@login_required
+def resource_detail(request, resource_name, pk):
+    resource = _get_resource(resource_name)
+    try:
+        columns, expansions = _selected_fields(resource, request.GET.get('fields'))
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    rows = _fetch_rows(resource, resource['model'].objects.filter(pk=pk), columns)
+    if not rows:
+        raise Http404(f'No {resource_name} with id {pk}')
+    etag = _finish_rows(resource, rows, columns, expansions)
+
+    if _not_modified(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(rows[0])
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
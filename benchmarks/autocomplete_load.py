@@ -0,0 +1,145 @@
+"""
+Concurrent autocomplete load test: sync (WSGI) vs async (ASGI) deployment.
+
+Start the two servers against the same database, e.g.
+
+    gunicorn config.wsgi:application --bind 127.0.0.1:8000 --workers 3
+    gunicorn config.asgi:application -c scripts/gunicorn_asgi.conf.py --bind 127.0.0.1:8001
+
+then run
+
+    python -m benchmarks.autocomplete_load \\
+        --target sync=http://127.0.0.1:8000 --target async=http://127.0.0.1:8001 \\
+        --username admin --password secret --concurrency 50 --duration 20
+
+Each client thread replays a mix of item_search, customer_search,
+invoice_search and item_json requests. Throughput and p50/p95/p99 latency are
+printed per target and per endpoint, and optionally written as JSON.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from .client import Session, summarize
+
+SEARCH_TERMS = ['ri', 'go', 'ne', 'br', 'ea', 'pe', 'di', 'si', 'an', 'ma', 'INV', 'CERT', '1', '2']
+
+
+def _discover_item_ids(session):
+    status, body, _ = session.get('/inventory/search/?q=')
+    if status != 200:
+        raise RuntimeError(f'item_search returned {status} at {session.base_url}')
+    return [row['id'] for row in json.loads(body)['results']] or [1]
+
+
+def _request_mix(item_ids, rng):
+    term = rng.choice(SEARCH_TERMS)
+    roll = rng.random()
+    if roll < 0.35:
+        return 'item_search', f'/inventory/search/?q={term}'
+    if roll < 0.6:
+        return 'customer_search', f'/customers/customers/search/?q={term}'
+    if roll < 0.8:
+        return 'invoice_search', f'/sales/search/?q={term}'
+    return 'item_json', f'/inventory/{rng.choice(item_ids)}/json/'
+
+
+def run_target(base_url, username, password, concurrency, duration, seed):
+    session = Session(base_url)
+    session.login(username, password)
+    item_ids = _discover_item_ids(session)
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(worker_id):
+        rng = random.Random(seed + worker_id)
+        local_latencies = defaultdict(list)
+        local_errors = defaultdict(int)
+        while time.perf_counter() < deadline:
+            endpoint, path = _request_mix(item_ids, rng)
+            try:
+                status, _, elapsed = session.get(path)
+            except OSError:
+                local_errors[endpoint] += 1
+                continue
+            if status == 200:
+                local_latencies[endpoint].append(elapsed)
+            else:
+                local_errors[endpoint] += 1
+        with lock:
+            for endpoint, values in local_latencies.items():
+                latencies[endpoint].extend(values)
+            for endpoint, count in local_errors.items():
+                errors[endpoint] += count
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    endpoints = sorted(set(latencies) | set(errors))
+    return {
+        'base_url': base_url,
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 2),
+        'overall': summarize(
+            [value for values in latencies.values() for value in values],
+            sum(errors.values()),
+            elapsed,
+        ),
+        'endpoints': {
+            endpoint: summarize(latencies[endpoint], errors[endpoint], elapsed)
+            for endpoint in endpoints
+        },
+    }
+
+
+def _print_report(results):
+    header = f"{'target':<10} {'endpoint':<16} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    print(header)
+    print('-' * len(header))
+    for label, result in results.items():
+        rows = [('ALL', result['overall'])] + list(result['endpoints'].items())
+        for endpoint, stats in rows:
+            print(
+                f"{label:<10} {endpoint:<16} {stats['throughput_rps']:>9} {stats['p50_ms']:>9} "
+                f"{stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['errors']:>7}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', required=True, metavar='LABEL=URL',
+                        help='Server to test, e.g. sync=http://127.0.0.1:8000 (repeatable).')
+    parser.add_argument('--username', default=os.getenv('BENCH_USERNAME', 'admin'))
+    parser.add_argument('--password', default=os.getenv('BENCH_PASSWORD', ''))
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds per target.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write the results as JSON to this path.')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for target in args.target:
+        label, _, url = target.partition('=')
+        if not url:
+            parser.error(f'--target must look like LABEL=URL, got {target!r}')
+        results[label] = run_target(url, args.username, args.password, args.concurrency, args.duration, args.seed)
+
+    _print_report(results)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+"""
+Minimal HTTP client for the load-test scripts.
+
+Standard library only, so the scripts can run from any machine that can reach
+the server. One keep-alive connection per thread, shared session cookies.
+"""
+import http.client
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+
+class Session:
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.base_url = base_url.rstrip('/')
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.timeout = timeout
+        self.cookies = {}
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            conn = conn_class(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _reset_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request and return ``(status, body_bytes, elapsed_seconds)``."""
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        if isinstance(body, str):
+            body = body.encode()
+
+        for attempt in range(2):
+            conn = self._connection()
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Server closed an idle keep-alive connection; retry once on a fresh one.
+                self._reset_connection()
+                if attempt:
+                    raise
+                continue
+            elapsed = time.perf_counter() - start
+            break
+
+        for header in response.msg.get_all('Set-Cookie') or []:
+            cookie = SimpleCookie()
+            cookie.load(header)
+            for key, morsel in cookie.items():
+                self.cookies[key] = morsel.value
+        if response.getheader('Connection', '').lower() == 'close':
+            self._reset_connection()
+        return response.status, data, elapsed
+
+    def get(self, path, headers=None):
+        return self.request('GET', path, headers=headers)
+
+    def post_form(self, path, data, headers=None):
+        """POST urlencoded form data with the session's CSRF token."""
+        headers = {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Referer': self.base_url + path,
+            **(headers or {}),
+        }
+        data = {'csrfmiddlewaretoken': self.cookies.get('csrftoken', ''), **data}
+        return self.request('POST', path, body=urlencode(data, doseq=True), headers=headers)
+
+    def login(self, username, password):
+        self.get('/login/')
+        self.post_form('/login/', {'username': username, 'password': password})
+        if 'sessionid' not in self.cookies:
+            raise RuntimeError(f'Login failed for {username!r} at {self.base_url}')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    """Latency percentiles (ms) and throughput for one endpoint or target."""
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'throughput_rps': round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 2),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 2),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2) if ordered else 0.0,
+    }
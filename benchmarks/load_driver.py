@@ -0,0 +1,277 @@
+"""
+Scripted load driver replaying a realistic request mix against a running server.
+
+Generate the dataset first, then start the server and run the driver:
+
+    python manage.py generate_benchmark_data --scale 1
+    python -m benchmarks.load_driver run --base-url http://127.0.0.1:8000 \\
+        --username admin --password secret --webhook-secret whsec_... --duration 60
+
+The mix covers browsing (item_list with filters, detail pages, dashboard),
+autocomplete, invoice_create and signed stripe_webhook deliveries. Per-endpoint
+p50/p95/p99 latency and throughput are printed and saved as JSON under
+benchmarks/results/, tagged with the current git commit. Compare two runs with
+
+    python -m benchmarks.load_driver compare before.json after.json
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .client import Session, summarize
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+# (endpoint, weight). Weights roughly follow shop traffic: mostly browsing.
+REQUEST_MIX = [
+    ('item_list', 22),
+    ('item_detail', 10),
+    ('item_search', 14),
+    ('customer_list', 6),
+    ('customer_search', 6),
+    ('invoice_list', 8),
+    ('invoice_detail', 10),
+    ('dashboard', 6),
+    ('invoice_create', 10),
+    ('stripe_webhook', 8),
+]
+SEARCH_TERMS = ['ring', 'gold', 'neck', 'BENCH-00', 'vintage', 'royal', 'pear', 'Maria', 'Kar']
+METALS = ['', 'gold', 'silver', 'platinum']
+
+
+class Driver:
+    def __init__(self, session, manifest, webhook_secret):
+        self.session = session
+        self.manifest = manifest
+        self.webhook_secret = webhook_secret
+        self.endpoints = [name for name, _ in REQUEST_MIX]
+        self.weights = [weight for _, weight in REQUEST_MIX]
+        if not webhook_secret:
+            index = self.endpoints.index('stripe_webhook')
+            del self.endpoints[index], self.weights[index]
+
+    def pick(self, rng):
+        return rng.choices(self.endpoints, weights=self.weights)[0]
+
+    def call(self, endpoint, rng):
+        """Issue one request; return ``(ok, elapsed_seconds)``."""
+        status, _, elapsed = getattr(self, f'_{endpoint}')(rng)
+        expected = (200, 302) if endpoint == 'invoice_create' else (200,)
+        return status in expected, elapsed
+
+    def _item_list(self, rng):
+        params = f'?page={rng.randint(1, 20)}'
+        if rng.random() < 0.5:
+            params += f'&metal={rng.choice(METALS)}'
+        if rng.random() < 0.3:
+            params += f'&search={rng.choice(SEARCH_TERMS)}'
+        return self.session.get(f'/inventory/{params}')
+
+    def _item_detail(self, rng):
+        return self.session.get(f"/inventory/{rng.choice(self.manifest['item_ids'])}/")
+
+    def _item_search(self, rng):
+        return self.session.get(f'/inventory/search/?q={rng.choice(SEARCH_TERMS)}')
+
+    def _customer_list(self, rng):
+        return self.session.get(f'/customers/?page={rng.randint(1, 20)}')
+
+    def _customer_search(self, rng):
+        return self.session.get(f'/customers/customers/search/?q={rng.choice(SEARCH_TERMS)}')
+
+    def _invoice_list(self, rng):
+        status = rng.choice(['', 'paid', 'sent', 'draft'])
+        return self.session.get(f'/sales/?status={status}&page={rng.randint(1, 10)}')
+
+    def _invoice_detail(self, rng):
+        return self.session.get(f"/sales/{rng.choice(self.manifest['invoice_ids'])}/")
+
+    def _dashboard(self, rng):
+        return self.session.get('/')
+
+    def _invoice_create(self, rng):
+        lines = rng.randint(1, 3)
+        data = {
+            'customer': rng.choice(self.manifest['customer_ids']),
+            'tax': '0.00',
+            'discount': '0.00',
+            'notes': 'load test',
+            'lines-TOTAL_FORMS': lines,
+            'lines-INITIAL_FORMS': 0,
+            'lines-MIN_NUM_FORMS': 1,
+            'lines-MAX_NUM_FORMS': 1000,
+        }
+        for i in range(lines):
+            data.update({
+                f'lines-{i}-item': rng.choice(self.manifest['item_ids']),
+                f'lines-{i}-description': 'Load test line',
+                f'lines-{i}-quantity': 1,
+                f'lines-{i}-unit_price': '100.00',
+            })
+        return self.session.post_form('/sales/create/', data)
+
+    def _stripe_webhook(self, rng):
+        invoice_id = rng.choice(self.manifest['sent_invoice_ids'] or self.manifest['invoice_ids'])
+        payload = json.dumps({
+            'id': f'evt_bench_{rng.getrandbits(48):x}',
+            'object': 'event',
+            'type': 'checkout.session.completed',
+            'data': {'object': {
+                'id': f'cs_bench_{invoice_id}',
+                'object': 'checkout.session',
+                'payment_intent': f'pi_bench_{invoice_id}',
+                'metadata': {'invoice_id': str(invoice_id)},
+            }},
+        })
+        timestamp = int(time.time())
+        signature = hmac.new(
+            self.webhook_secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256
+        ).hexdigest()
+        return self.session.request('POST', '/sales/webhook/stripe/', body=payload, headers={
+            'Content-Type': 'application/json',
+            'Stripe-Signature': f't={timestamp},v1={signature}',
+        })
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(args):
+    with open(args.manifest) as fh:
+        manifest = json.load(fh)
+    session = Session(args.base_url)
+    session.login(args.username, args.password)
+    driver = Driver(session, manifest, args.webhook_secret)
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def client(worker_id):
+        rng = random.Random(args.seed * 1000 + worker_id)
+        local_latencies = defaultdict(list)
+        local_errors = defaultdict(int)
+        while time.perf_counter() < deadline:
+            endpoint = driver.pick(rng)
+            try:
+                ok, elapsed = driver.call(endpoint, rng)
+            except OSError:
+                ok, elapsed = False, 0.0
+            if ok:
+                local_latencies[endpoint].append(elapsed)
+            else:
+                local_errors[endpoint] += 1
+        with lock:
+            for endpoint, values in local_latencies.items():
+                latencies[endpoint].extend(values)
+            for endpoint, count in local_errors.items():
+                errors[endpoint] += count
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(client, range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    result = {
+        'commit': _git_commit(),
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'base_url': args.base_url,
+        'concurrency': args.concurrency,
+        'duration_s': round(elapsed, 2),
+        'seed': args.seed,
+        'dataset': manifest.get('counts', {}),
+        'overall': summarize(
+            [value for values in latencies.values() for value in values], sum(errors.values()), elapsed
+        ),
+        'endpoints': {
+            endpoint: summarize(latencies[endpoint], errors[endpoint], elapsed)
+            for endpoint in sorted(set(latencies) | set(errors))
+        },
+    }
+    _print_result(result)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{result['commit']}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f'\nSaved results to {output}')
+    return 0
+
+
+def _print_result(result):
+    header = f"{'endpoint':<16} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    print(f"commit {result['commit']}  concurrency {result['concurrency']}  {result['duration_s']}s")
+    print(header)
+    print('-' * len(header))
+    for endpoint, stats in [('ALL', result['overall'])] + list(result['endpoints'].items()):
+        print(
+            f"{endpoint:<16} {stats['throughput_rps']:>9} {stats['p50_ms']:>9} "
+            f"{stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['errors']:>7}"
+        )
+
+
+def compare(args):
+    before = json.loads(Path(args.before).read_text())
+    after = json.loads(Path(args.after).read_text())
+    print(f"{before['commit']} -> {after['commit']}")
+    header = f"{'endpoint':<16} {'p50 ms':>18} {'p95 ms':>18} {'p99 ms':>18} {'req/s':>18}"
+    print(header)
+    print('-' * len(header))
+    rows = [('ALL', before['overall'], after['overall'])]
+    for endpoint in sorted(set(before['endpoints']) & set(after['endpoints'])):
+        rows.append((endpoint, before['endpoints'][endpoint], after['endpoints'][endpoint]))
+    for endpoint, old, new in rows:
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'):
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            cells.append(f'{new[key]:>9} ({change:+6.1f}%)')
+        print(f"{endpoint:<16} " + ' '.join(cells))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Replay the request mix against a server.')
+    run_parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    run_parser.add_argument('--username', default=os.getenv('BENCH_USERNAME', 'admin'))
+    run_parser.add_argument('--password', default=os.getenv('BENCH_PASSWORD', ''))
+    run_parser.add_argument('--webhook-secret', default=os.getenv('STRIPE_WEBHOOK_SECRET', ''),
+                            help='Server webhook secret; stripe_webhook is skipped without it.')
+    run_parser.add_argument('--manifest', default=str(RESULTS_DIR / 'dataset.json'))
+    run_parser.add_argument('--concurrency', type=int, default=10)
+    run_parser.add_argument('--duration', type=float, default=60.0)
+    run_parser.add_argument('--seed', type=int, default=1)
+    run_parser.add_argument('--output', help='Result path (default benchmarks/results/<time>-<commit>.json).')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two saved results.')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
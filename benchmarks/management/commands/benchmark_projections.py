@@ -0,0 +1,160 @@
+import gc
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from crm.models import Customer, Supplier
+from crm.projections import CUSTOMER_LIST_FIELDS, CUSTOMER_SEARCH_FIELDS, SUPPLIER_LIST_FIELDS
+from inventory.models import JewelryItem
+from inventory.projections import ITEM_LIST_FIELDS, ITEM_SEARCH_FIELDS, SUPPLIER_OPTION_FIELDS
+from sales.models import Invoice
+from sales.projections import INVOICE_LIST_FIELDS
+
+
+def _item_row(item):
+    return (item.sku, item.name, item.get_metal_display(), item.purity, item.weight_grams,
+            item.sale_price, item.is_active,
+            item.category.name if item.category else None,
+            item.supplier.name if item.supplier else None)
+
+
+def _item_search_row(obj):
+    if isinstance(obj, dict):
+        return {**obj, 'sale_price': str(obj['sale_price'])}
+    return {'id': obj.pk, 'sku': obj.sku, 'name': obj.name, 'sale_price': str(obj.sale_price)}
+
+
+def _customer_search_row(obj):
+    if isinstance(obj, dict):
+        return obj
+    return {'id': obj.pk, 'name': obj.name, 'email': obj.email, 'phone': obj.phone}
+
+
+def _contact_row(obj):
+    return (obj.pk, obj.name, obj.email, obj.phone, obj.created_at)
+
+
+def _option_row(obj):
+    return (obj.pk, obj.name)
+
+
+def _invoice_row(invoice):
+    return (invoice.invoice_number, invoice.get_status_display(), invoice.subtotal, invoice.tax,
+            invoice.discount, invoice.total, invoice.created_at,
+            invoice.customer.name if invoice.customer else None)
+
+
+# name -> (queryset before projection, projected queryset, how the view reads a row).
+SCENARIOS = {
+    'item_list': (
+        lambda: JewelryItem.objects.select_related('category', 'supplier'),
+        lambda: JewelryItem.objects.select_related('category', 'supplier').only(*ITEM_LIST_FIELDS),
+        _item_row,
+    ),
+    'item_search': (
+        lambda: JewelryItem.objects.filter(is_active=True),
+        lambda: JewelryItem.objects.filter(is_active=True).values(*ITEM_SEARCH_FIELDS),
+        _item_search_row,
+    ),
+    'supplier_dropdown': (
+        lambda: Supplier.objects.all(),
+        lambda: Supplier.objects.only(*SUPPLIER_OPTION_FIELDS),
+        _option_row,
+    ),
+    'customer_list': (
+        lambda: Customer.objects.all(),
+        lambda: Customer.objects.select_related('stats').only(*CUSTOMER_LIST_FIELDS),
+        _contact_row,
+    ),
+    'customer_search': (
+        lambda: Customer.objects.all(),
+        lambda: Customer.objects.values(*CUSTOMER_SEARCH_FIELDS),
+        _customer_search_row,
+    ),
+    'supplier_list': (
+        lambda: Supplier.objects.all(),
+        lambda: Supplier.objects.only(*SUPPLIER_LIST_FIELDS),
+        _contact_row,
+    ),
+    'invoice_list': (
+        lambda: Invoice.objects.select_related('customer'),
+        lambda: Invoice.objects.select_related('customer').only(*INVOICE_LIST_FIELDS),
+        _invoice_row,
+    ),
+}
+
+
+def _measure(queryset_factory, read_row, limit, repeat):
+    # Latency: untraced end-to-end runs (fetch + read every column the view uses).
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        rows = [read_row(obj) for obj in queryset_factory()[:limit]]
+        timings.append(time.perf_counter() - start)
+        count = len(rows)
+        del rows
+
+    # Memory: what the ORM materializes and the page/JSON payload holds on to.
+    gc.collect()
+    tracemalloc.start()
+    objects = list(queryset_factory()[:limit])
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = snapshot.statistics('filename')
+    blocks = sum(stat.count for stat in stats)
+    retained = sum(stat.size for stat in stats)
+    del objects, snapshot, stats
+
+    return {
+        'rows': count,
+        'ms': round(min(timings) * 1000, 2),
+        'allocated_objects': blocks,
+        'retained_kib': round(retained / 1024, 1),
+        'peak_kib': round(peak / 1024, 1),
+        'bytes_per_row': round(retained / count, 1) if count else 0.0,
+    }
+
+
+def _saving(before, after):
+    return (1 - after / before) * 100 if before else 0.0
+
+
+class Command(BaseCommand):
+    help = 'Compare memory and latency of full-row vs projected list/JSON querysets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000,
+                            help='Rows materialized per scenario (generate at least this many first).')
+        parser.add_argument('--repeat', type=int, default=3, help='Untraced timing runs; the fastest is reported.')
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                            help='Limit to these scenarios (repeatable).')
+        parser.add_argument('--output', help='Write the results as JSON to this path.')
+
+    def handle(self, *args, **options):
+        results = {}
+        header = f"{'scenario':<18} {'mode':<10} {'rows':>7} {'ms':>9} {'objects':>9} {'KiB':>10} {'B/row':>8}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name in options['scenario'] or SCENARIOS:
+            full_qs, projected_qs, read_row = SCENARIOS[name]
+            full = _measure(full_qs, read_row, options['rows'], options['repeat'])
+            projected = _measure(projected_qs, read_row, options['rows'], options['repeat'])
+            results[name] = {'full': full, 'projected': projected}
+            for mode, stats in results[name].items():
+                self.stdout.write(
+                    f"{name:<18} {mode:<10} {stats['rows']:>7} {stats['ms']:>9} {stats['allocated_objects']:>9} "
+                    f"{stats['retained_kib']:>10} {stats['bytes_per_row']:>8}"
+                )
+            self.stdout.write(
+                f"{'':<18} {'saved':<10} {'':>7} {_saving(full['ms'], projected['ms']):>8.1f}% "
+                f"{_saving(full['allocated_objects'], projected['allocated_objects']):>8.1f}% "
+                f"{_saving(full['retained_kib'], projected['retained_kib']):>9.1f}%"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump({'rows': options['rows'], 'scenarios': results}, fh, indent=2)
@@ -0,0 +1,278 @@
+import json
+import random
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from crm.models import Customer, Supplier
+from crm.normalization import backfill
+from crm.stats import rebuild as rebuild_customer_stats
+from documents.models import Certificate
+from inventory.models import Category, JewelryItem
+from sales.models import Invoice, InvoiceLine
+
+PREFIX = 'BENCH'
+EMAIL_DOMAIN = 'bench.example'
+
+# Row counts at --scale 1.
+BASE_COUNTS = {
+    'suppliers': 40,
+    'customers': 2000,
+    'items': 5000,
+    'invoices': 10000,
+    'certificates': 2000,
+}
+
+CATEGORY_NAMES = [
+    'Rings', 'Necklaces', 'Bracelets', 'Earrings', 'Pendants', 'Brooches',
+    'Anklets', 'Cufflinks', 'Chains', 'Charms', 'Watches', 'Wedding Bands',
+]
+FIRST_NAMES = ['Maria', 'Eleni', 'Giorgos', 'Nikos', 'Anna', 'Dimitris', 'Sofia', 'Kostas', 'Katerina', 'Yannis']
+LAST_NAMES = ['Papadopoulos', 'Georgiou', 'Nikolaou', 'Ioannou', 'Vlachou', 'Karras', 'Antoniou', 'Makris']
+ADJECTIVES = ['Classic', 'Vintage', 'Royal', 'Twisted', 'Minimal', 'Byzantine', 'Art Deco', 'Solitaire']
+STONES = ['', '', 'Diamond 0.25ct VS1', 'Sapphire 1.1ct', 'Emerald 0.8ct', 'Ruby 0.5ct', 'Pearl 8mm']
+# Purity values that make sense for each metal.
+METAL_PURITIES = {
+    'gold': ['14K', '18K', '22K'],
+    'silver': ['925K'],
+    'platinum': ['N/A'],
+    'other': ['N/A'],
+}
+INVOICE_STATUSES = ['paid'] * 12 + ['sent'] * 4 + ['draft'] * 3 + ['void']
+
+
+def _batched(iterable, size):
+    batch = []
+    for obj in iterable:
+        batch.append(obj)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _money(rng, low, high):
+    return Decimal(rng.randint(low * 100, high * 100)) / 100
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic synthetic jewelry-store dataset for benchmarking.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0, help='Multiplier for the default row counts.')
+        for name, count in BASE_COUNTS.items():
+            parser.add_argument(f'--{name}', type=int, help=f'Number of {name} (default {count} x scale).')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--flush', action='store_true', help='Delete previously generated benchmark rows first.')
+        parser.add_argument('--manifest', default='benchmarks/results/dataset.json',
+                            help='Where to write sample ids for the load driver.')
+
+    def handle(self, *args, **options):
+        counts = {
+            name: options[name] if options[name] is not None else int(count * options['scale'])
+            for name, count in BASE_COUNTS.items()
+        }
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # Dates are spread over the year before this anchor.
+        self.now = timezone.now().replace(microsecond=0)
+
+        if options['flush']:
+            self.flush()
+        elif JewelryItem.objects.filter(sku__startswith=f'{PREFIX}-').exists():
+            self.stderr.write('Benchmark data already exists; rerun with --flush to regenerate it.')
+            return
+
+        categories = self.create_categories()
+        supplier_ids = self.create_suppliers(counts['suppliers'])
+        customer_ids = self.create_customers(counts['customers'])
+        items = self.create_items(counts['items'], categories, supplier_ids)
+        invoice_ids = self.create_invoices(counts['invoices'], customer_ids, items)
+        # Bulk inserts skip the signals that keep CustomerStats current.
+        rebuild_customer_stats()
+        self.create_certificates(counts['certificates'], invoice_ids, items)
+
+        self.write_manifest(options['manifest'], counts, options['seed'], items, customer_ids, supplier_ids)
+        self.stdout.write(self.style.SUCCESS(
+            'Generated ' + ', '.join(f'{count} {name}' for name, count in counts.items())
+        ))
+
+    def flush(self):
+        Certificate.objects.filter(certificate_number__startswith=f'{PREFIX}-').delete()
+        Invoice.objects.filter(invoice_number__startswith=f'{PREFIX}-').delete()
+        JewelryItem.objects.filter(sku__startswith=f'{PREFIX}-').delete()
+        Customer.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
+        Supplier.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').delete()
+
+    def create_categories(self):
+        return [Category.objects.get_or_create(name=name)[0] for name in CATEGORY_NAMES]
+
+    def create_suppliers(self, count):
+        rng = self.rng
+
+        def rows():
+            for i in range(count):
+                yield Supplier(
+                    name=f'{rng.choice(LAST_NAMES)} Gold Works {i:04d}',
+                    email=f'supplier{i:05d}@{EMAIL_DOMAIN}',
+                    phone=f'+30 21{rng.randint(0, 99999999):08d}',
+                    vat_number=f'EL{rng.randint(0, 999999999):09d}',
+                    address=f'{rng.randint(1, 200)} Ermou Street, Athens',
+                )
+
+        self._bulk_create(Supplier, rows())
+        backfill(Supplier)
+        return list(Supplier.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').order_by('email').values_list('pk', flat=True))
+
+    def create_customers(self, count):
+        rng = self.rng
+
+        def rows():
+            for i in range(count):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                yield Customer(
+                    name=f'{first} {last}',
+                    email=f'customer{i:06d}@{EMAIL_DOMAIN}',
+                    phone=f'+30 69{rng.randint(0, 99999999):08d}',
+                    address=f'{rng.randint(1, 300)} Stadiou Street, Athens',
+                    notes=rng.choice(['', '', 'Prefers yellow gold', 'Ring size 52', 'VIP']),
+                )
+
+        self._bulk_create(Customer, rows())
+        backfill(Customer)
+        return list(Customer.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').order_by('email').values_list('pk', flat=True))
+
+    def create_items(self, count, categories, supplier_ids):
+        rng = self.rng
+
+        def rows():
+            for i in range(count):
+                category = rng.choice(categories)
+                metal = rng.choices(['gold', 'silver', 'platinum', 'other'], weights=[6, 3, 1, 1])[0]
+                cost = _money(rng, 20, 4000)
+                yield JewelryItem(
+                    sku=f'{PREFIX}-{i:07d}',
+                    name=f'{rng.choice(ADJECTIVES)} {metal.title()} {category.name.rstrip("s")}',
+                    category=category,
+                    supplier_id=rng.choice(supplier_ids) if supplier_ids else None,
+                    description=f'Handcrafted {metal} piece. ' * rng.randint(1, 6),
+                    metal=metal,
+                    purity=rng.choice(METAL_PURITIES[metal]),
+                    weight_grams=_money(rng, 1, 60),
+                    stone_details=rng.choice(STONES),
+                    cost_price=cost,
+                    sale_price=(cost * Decimal(rng.choice(['1.4', '1.8', '2.2', '2.5']))).quantize(Decimal('0.01')),
+                    quantity_on_hand=rng.choice([0, 1, 1, 2, 3, 5, 8, 12, 20]),
+                    is_active=rng.random() > 0.05,
+                )
+
+        self._bulk_create(JewelryItem, rows())
+        return list(
+            JewelryItem.objects.filter(sku__startswith=f'{PREFIX}-')
+            .order_by('sku')
+            .values_list('pk', 'sku', 'sale_price')
+        )
+
+    def create_invoices(self, count, customer_ids, items):
+        rng = self.rng
+        invoice_ids = []
+        for batch_start in range(0, count, self.batch_size):
+            batch_numbers = range(batch_start, min(count, batch_start + self.batch_size))
+            invoices, lines_by_number, created = [], {}, {}
+            for i in batch_numbers:
+                number = f'{PREFIX}-INV-{i:07d}'
+                lines = []
+                for _ in range(rng.choices([1, 2, 3, 4], weights=[5, 3, 1, 1])[0]):
+                    item_id, sku, price = rng.choice(items)
+                    quantity = rng.choice([1, 1, 1, 2])
+                    lines.append(InvoiceLine(
+                        item_id=item_id,
+                        description=sku,
+                        quantity=quantity,
+                        unit_price=price,
+                        line_total=price * quantity,
+                    ))
+                subtotal = sum(line.line_total for line in lines)
+                tax = (subtotal * Decimal('0.24')).quantize(Decimal('0.01'))
+                discount = Decimal('0.00') if rng.random() > 0.1 else Decimal('10.00')
+                invoices.append(Invoice(
+                    invoice_number=number,
+                    customer_id=rng.choice(customer_ids) if customer_ids and rng.random() > 0.1 else None,
+                    status=rng.choice(INVOICE_STATUSES),
+                    subtotal=subtotal,
+                    tax=tax,
+                    discount=discount,
+                    total=max(Decimal('0.00'), subtotal + tax - discount),
+                ))
+                lines_by_number[number] = lines
+                created[number] = self.now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+
+            with transaction.atomic():
+                Invoice.objects.bulk_create(invoices)
+                saved = list(Invoice.objects.filter(invoice_number__in=lines_by_number).only('pk', 'invoice_number'))
+                all_lines = []
+                for invoice in saved:
+                    invoice.created_at = created[invoice.invoice_number]
+                    for line in lines_by_number[invoice.invoice_number]:
+                        line.invoice_id = invoice.pk
+                        all_lines.append(line)
+                # bulk_create stamps created_at with now(); backdate to spread sales over the year.
+                Invoice.objects.bulk_update(saved, ['created_at'])
+                InvoiceLine.objects.bulk_create(all_lines, batch_size=self.batch_size)
+            invoice_ids.extend(invoice.pk for invoice in saved)
+        return sorted(invoice_ids)
+
+    def create_certificates(self, count, invoice_ids, items):
+        rng = self.rng
+        paid = list(
+            Invoice.objects.filter(pk__in=invoice_ids, status='paid')
+            .order_by('pk')
+            .values_list('pk', 'customer_id')
+        )
+
+        def rows():
+            for i in range(count):
+                if paid and rng.random() < 0.7:
+                    invoice_id, _ = rng.choice(paid)
+                    customer_id = None
+                else:
+                    invoice_id, customer_id = None, rng.choice(paid)[1] if paid else None
+                yield Certificate(
+                    item_id=rng.choice(items)[0],
+                    invoice_id=invoice_id,
+                    customer_id=customer_id,
+                    certificate_number=f'{PREFIX}-CERT-{i:07d}',
+                    issued_at=self.now - timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+                )
+
+        self._bulk_create(Certificate, rows())
+
+    def _bulk_create(self, model, rows):
+        for batch in _batched(rows, self.batch_size):
+            model.objects.bulk_create(batch)
+
+    def write_manifest(self, path, counts, seed, items, customer_ids, supplier_ids):
+        """Record sample ids so the load driver can replay requests without discovery."""
+        sample = random.Random(seed)
+        invoices = Invoice.objects.filter(invoice_number__startswith=f'{PREFIX}-').order_by('pk')
+        invoice_ids = list(invoices.values_list('pk', flat=True))
+        manifest = {
+            'seed': seed,
+            'counts': counts,
+            'generated_at': self.now.isoformat(),
+            'item_ids': sample.sample([pk for pk, _, _ in items], min(500, len(items))),
+            'customer_ids': sample.sample(customer_ids, min(500, len(customer_ids))),
+            'supplier_ids': supplier_ids[:100],
+            'invoice_ids': sample.sample(invoice_ids, min(500, len(invoice_ids))),
+            'sent_invoice_ids': list(invoices.filter(status='sent').values_list('pk', flat=True)[:500]),
+        }
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as fh:
+            json.dump(manifest, fh, indent=2)
+        self.stdout.write(f'Wrote manifest to {path}')
@@ -0,0 +1,53 @@
+"""
+Small in-process caches.
+
+TTLCache is a thread-safe LRU whose entries also expire: it answers repeat
+lookups (barcode scans, certificate verification) without touching the
+database. Each worker process has its own copy, so callers clear it when
+they change the underlying rows in this process and rely on the expiry to
+bound how stale another process can be. Size and lifetime are read from
+settings on every write, so override_settings applies to a cache created at
+import time.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+# Returned by TTLCache.get() for keys that are not cached; None is a valid cached value.
+MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, size_setting, seconds_setting):
+        self.size_setting = size_setting
+        self.seconds_setting = seconds_setting
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The cached value for ``key``, or MISSING."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Cache ``value`` under ``key``, evicting the least recently used entries; returns ``value``."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + getattr(settings, self.seconds_setting), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > getattr(settings, self.size_setting):
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,163 @@
+"""
+Primary/replica database routing.
+
+When a ``replica`` alias is configured in ``DATABASES``, reads made while
+serving a request (list pages, autocomplete endpoints, dashboard counts) go to
+the replica and every write goes to ``default``. A request is pinned to the
+primary as soon as it writes or uses an unsafe HTTP method, and a short-lived
+cookie keeps the same browser on the primary for the next few seconds so the
+redirect after ``invoice_create`` and friends reads its own writes.
+
+Code running outside a request (management commands, background jobs) always
+uses the primary.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class _RequestState:
+    __slots__ = ('pinned', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_request_state = ContextVar('db_request_state', default=None)
+
+
+def replica_alias():
+    """Return the replica alias, or None when no replica is configured."""
+    alias = getattr(settings, 'DB_REPLICA_ALIAS', 'replica')
+    if alias and alias != DEFAULT_DB_ALIAS and alias in settings.DATABASES:
+        return alias
+    return None
+
+
+def _reads_use_primary():
+    state = _request_state.get()
+    if state is None or state.pinned:
+        return True
+    # Reads inside a transaction on the primary must see that transaction.
+    return connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+def pin_to_primary():
+    """Send the remaining reads of the current request to the primary."""
+    state = _request_state.get()
+    if state is not None:
+        state.pinned = True
+
+
+@contextmanager
+def use_primary():
+    """Force reads inside the block to the primary database."""
+    state = _request_state.get()
+    if state is None:
+        yield
+        return
+    previous = state.pinned
+    state.pinned = True
+    try:
+        yield
+    finally:
+        state.pinned = previous
+
+
+def primary_db(view_func):
+    """View decorator for pages that must never read from the replica."""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            pin_to_primary()
+            return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        pin_to_primary()
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if alias is None or _reads_use_primary():
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primary and replica hold the same data.
+        allowed = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in allowed and obj2._state.db in allowed:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica_alias():
+            return False
+        return None
+
+
+class PrimaryPinningMiddleware:
+    """Track writes per request and keep recent writers on the primary."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self._request_state(request)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self._pin_client(request, response, state)
+
+    async def __acall__(self, request):
+        state = self._request_state(request)
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self._pin_client(request, response, state)
+
+    def _request_state(self, request):
+        cookie_name = settings.DB_PRIMARY_PIN_COOKIE
+        pinned = request.method not in SAFE_METHODS or cookie_name in request.COOKIES
+        return _RequestState(pinned=pinned)
+
+    def _pin_client(self, request, response, state):
+        if state.wrote and replica_alias() is not None:
+            response.set_cookie(
+                settings.DB_PRIMARY_PIN_COOKIE,
+                '1',
+                max_age=settings.DB_REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+                secure=request.is_secure(),
+            )
+        return response
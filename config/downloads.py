@@ -0,0 +1,177 @@
+"""
+File downloads and media serving.
+
+serve_file() answers a download once the view has checked permissions. With
+SENDFILE_BACKEND 'nginx' or 'xsendfile' Django only sends headers and the
+front server transfers the file (X-Accel-Redirect / X-Sendfile), so no
+worker is tied up for the length of the download. The default 'python'
+backend streams the file itself but still honours conditional requests
+(ETag / Last-Modified, answered with 304) and single byte ranges (206), so
+resumed downloads and PDF viewers fetching pages don't re-send whole files.
+
+media() replaces django.views.static.serve for MEDIA_URL when SERVE_MEDIA is
+on: paths under PUBLIC_MEDIA_PREFIXES (product photos) are public and cached
+for MEDIA_CACHE_SECONDS; anything else (certificates, invoices, catalogs)
+requires a login and is never stored by shared caches.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+BACKENDS = ('python', 'nginx', 'xsendfile')
+
+
+def _range_reader(fh, start, length):
+    try:
+        fh.seek(start)
+        while length > 0:
+            data = fh.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        fh.close()
+
+
+def _byte_range(request, size, etag, last_modified):
+    """
+    ``(start, end)`` of the single range requested, None to send the whole
+    file, or False if the range can't be satisfied.
+    """
+    header = request.headers.get('Range', '')
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or request.method not in ('GET', 'HEAD'):
+        # No range, or several ranges: a full 200 is always an allowed answer.
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def serve_file(request, file, filename=None, as_attachment=True, content_type=None, public=False, max_age=0):
+    """
+    Respond with ``file`` (a FieldFile or a storage name) after the caller's
+    permission check.
+
+    ``public`` responses may be kept by shared caches for ``max_age``
+    seconds; the rest are private and revalidated on every use.
+    """
+    name = getattr(file, 'name', file)
+    storage = getattr(file, 'storage', default_storage)
+    if not name:
+        raise Http404('File not found')
+    filename = filename or os.path.basename(name)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        path = None
+    except SuspiciousFileOperation:
+        raise Http404('File not found')
+
+    if path is None:
+        # Storage without local files: stream it through Django.
+        try:
+            response = FileResponse(storage.open(name, 'rb'), as_attachment=as_attachment, filename=filename)
+        except OSError:
+            raise Http404('File not found')
+        return _cache_headers(response, public, max_age)
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        raise Http404('File not found')
+    # Directories (and sockets, devices) are never served, whichever backend sends the body.
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404('File not found')
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    last_modified = int(st.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return _cache_headers(response, public, max_age)
+
+    backend = settings.SENDFILE_BACKEND
+    if backend not in BACKENDS:
+        raise ImproperlyConfigured(f'SENDFILE_BACKEND must be one of {", ".join(BACKENDS)}.')
+
+    if backend == 'python':
+        byte_range = _byte_range(request, st.st_size, etag, last_modified)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{st.st_size}'
+            return response
+        if byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+            response['Content-Length'] = st.st_size
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _range_reader(open(path, 'rb'), start, end - start + 1), status=206, content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{st.st_size}'
+            response['Content-Length'] = end - start + 1
+        response['Accept-Ranges'] = 'bytes'
+    else:
+        # The front server sends the body and answers ranges itself; it
+        # keeps the headers set here.
+        response = HttpResponse(content_type=content_type)
+        if backend == 'nginx':
+            response['X-Accel-Redirect'] = settings.SENDFILE_URL_PREFIX.rstrip('/') + '/' + quote(name.replace(os.sep, '/'))
+        else:
+            response['X-Sendfile'] = path
+
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return _cache_headers(response, public, max_age)
+
+
+def _cache_headers(response, public, max_age):
+    if public:
+        patch_cache_control(response, public=True, max_age=max_age)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def media(request, path):
+    """MEDIA_URL view: public product photos, everything else behind a login."""
+    path = posixpath.normpath(path).lstrip('/')
+    if path.startswith('..'):
+        raise Http404('File not found')
+    public = any(path.startswith(prefix) for prefix in settings.PUBLIC_MEDIA_PREFIXES)
+    if not public and not request.user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    return serve_file(
+        request, path, as_attachment=False, public=public,
+        max_age=settings.MEDIA_CACHE_SECONDS if public else 0,
+    )
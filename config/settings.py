@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -57,11 +58,15 @@ INSTALLED_APPS = [
     'sales',
     'documents',
     'notifications',
+    'benchmarks',
+    'api',
+    'purchasing',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'config.db_router.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -88,6 +93,12 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Serve the autocomplete JSON endpoints and the Stripe/SMTP-calling views with
+# their async variants. Enable together with the ASGI launch profile
+# (scripts/gunicorn_asgi.conf.py); under WSGI the sync views are faster.
+ASYNC_VIEWS = _env_bool('ASYNC_VIEWS', 'False')
 
 
 # Database
@@ -113,6 +124,17 @@ if DB_ENGINE == 'mssql':
             'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
         }
     }
+    if os.getenv('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.getenv('DB_REPLICA_HOST'),
+            'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'OPTIONS': {
+                **DATABASES['default']['OPTIONS'],
+                'extra_params': f'Encrypt={_encrypt};TrustServerCertificate={_trust};ApplicationIntent=ReadOnly;',
+            },
+            'TEST': {'MIRROR': 'default'},
+        }
 else:
     DATABASES = {
         'default': {
@@ -120,6 +142,106 @@ else:
             'NAME': BASE_DIR / os.getenv('SQLITE_NAME', 'db.sqlite3'),
         }
     }
+    # Local replica for testing the router: a copy of the primary file,
+    # refreshed with scripts/copy_sqlite_replica.py.
+    if os.getenv('SQLITE_REPLICA_NAME'):
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / os.getenv('SQLITE_REPLICA_NAME'),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+# The test runner gets a 'replica' mirroring the test database. Routing to it
+# is off unless a test turns it on (the router's tests in sales/tests.py).
+TESTING = sys.argv[1:2] == ['test']
+if TESTING and 'replica' not in DATABASES:
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+# Read replica routing (see config/db_router.py). Without a 'replica' entry in
+# DATABASES every query goes to 'default'.
+DATABASE_ROUTERS = ['config.db_router.PrimaryReplicaRouter']
+DB_REPLICA_ALIAS = None if TESTING else 'replica'
+# After a write, keep the client on the primary for this many seconds.
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', '5'))
+DB_PRIMARY_PIN_COOKIE = 'db_pin_primary'
+
+# Change feed (api/changefeed.py). Rows younger than the safety lag are held
+# back so a transaction committing late with an older updated_at isn't skipped.
+CHANGEFEED_CHUNK_SIZE = int(os.getenv('CHANGEFEED_CHUNK_SIZE', '500'))
+CHANGEFEED_SAFETY_LAG_SECONDS = int(os.getenv('CHANGEFEED_SAFETY_LAG_SECONDS', '5'))
+
+# Django's cache holds facet counts, supplier figures and verification rate
+# limits. Without CACHE_REDIS_URL each process has its own memory cache, so an
+# invalidation in one worker isn't seen by the others until entries expire.
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', '')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+
+# How long item_list facet counts are cached (inventory/facets.py); short by
+# default when the cache is per process.
+FACET_CACHE_SECONDS = int(os.getenv('FACET_CACHE_SECONDS') or (300 if CACHE_REDIS_URL else 15))
+
+# How long the supplier list's performance figures are cached (crm/analytics.py).
+SUPPLIER_STATS_CACHE_SECONDS = int(os.getenv('SUPPLIER_STATS_CACHE_SECONDS', '300'))
+
+# Barcode scan lookups (inventory/scanning.py): per-process LRU size and entry lifetime.
+SCAN_CACHE_SIZE = int(os.getenv('SCAN_CACHE_SIZE', '2048'))
+SCAN_CACHE_SECONDS = int(os.getenv('SCAN_CACHE_SECONDS', '10'))
+
+# Country code assumed for phone numbers entered without one (crm/normalization.py).
+CRM_DEFAULT_PHONE_PREFIX = os.getenv('CRM_DEFAULT_PHONE_PREFIX', '')
+
+# Low-stock scan and reorder suggestions (purchasing/reorder.py). Items at or
+# below the threshold, or with fewer days of cover than the lead time, are low;
+# suggestions top stock up to lead time plus cover days of sales.
+LOW_STOCK_THRESHOLD = int(os.getenv('LOW_STOCK_THRESHOLD', '5'))
+REORDER_LOOKBACK_DAYS = int(os.getenv('REORDER_LOOKBACK_DAYS', '90'))
+REORDER_LEAD_TIME_DAYS = int(os.getenv('REORDER_LEAD_TIME_DAYS', '14'))
+REORDER_COVER_DAYS = int(os.getenv('REORDER_COVER_DAYS', '30'))
+# Recipients of the low-stock digest email (comma-separated).
+LOW_STOCK_ALERT_EMAILS = [e.strip() for e in os.getenv('LOW_STOCK_ALERT_EMAILS', '').split(',') if e.strip()]
+
+# Background threads building catalog PDFs (documents/catalog.py). With 0,
+# exports wait for the build_catalogs command (e.g. from cron).
+CATALOG_EXPORT_WORKERS = int(os.getenv('CATALOG_EXPORT_WORKERS', '1'))
+
+# Invoice PDFs (documents/invoices.py): background threads re-rendering PDFs
+# after invoices are saved (0 renders them on first download instead), and
+# worker processes rendering a month's ZIP bundle (1 renders in-process).
+INVOICE_PDF_WORKERS = int(os.getenv('INVOICE_PDF_WORKERS', '1'))
+INVOICE_PDF_PROCESSES = int(os.getenv('INVOICE_PDF_PROCESSES') or min(4, os.cpu_count() or 1))
+
+# Certificate PDFs (documents/certificates.py): background threads rendering
+# new certificates (0 leaves them to render_certificates or the first
+# download), and how often a failed render is tried, starting
+# CERTIFICATE_RENDER_RETRY_DELAY seconds apart and doubling.
+CERTIFICATE_PDF_WORKERS = int(os.getenv('CERTIFICATE_PDF_WORKERS', '1'))
+CERTIFICATE_RENDER_ATTEMPTS = int(os.getenv('CERTIFICATE_RENDER_ATTEMPTS', '3'))
+CERTIFICATE_RENDER_RETRY_DELAY = int(os.getenv('CERTIFICATE_RENDER_RETRY_DELAY', '30'))
+
+# Public certificate verification (documents/verification.py). With a
+# CERTIFICATE_VERIFY_URL (e.g. https://shop.example.com/verify/) certificate
+# PDFs carry a QR code linking to the certificate's page. Lookups are cached
+# per process; uncached lookups are limited per client IP and minute (0 = no limit).
+CERTIFICATE_VERIFY_URL = os.getenv('CERTIFICATE_VERIFY_URL', '')
+CERTIFICATE_VERIFY_CACHE_SIZE = int(os.getenv('CERTIFICATE_VERIFY_CACHE_SIZE', '4096'))
+CERTIFICATE_VERIFY_CACHE_SECONDS = int(os.getenv('CERTIFICATE_VERIFY_CACHE_SECONDS', '60'))
+CERTIFICATE_VERIFY_RATE_LIMIT = int(os.getenv('CERTIFICATE_VERIFY_RATE_LIMIT', '60'))
+
+# Label sheets (documents/labels.py): worker processes rendering large runs
+# of labels (1 renders in-process).
+LABEL_PROCESSES = int(os.getenv('LABEL_PROCESSES') or min(4, os.cpu_count() or 1))
+
+# TrueType fonts for label sheets and catalogs (documents/pdf_common.py).
+# Empty uses ReportLab's bundled Vera; point these at e.g. DejaVuSans.ttf and
+# DejaVuSans-Bold.ttf to print Greek or Cyrillic names.
+PDF_FONT = os.getenv('PDF_FONT', '')
+PDF_FONT_BOLD = os.getenv('PDF_FONT_BOLD', '')
 
 
 # Password validation
@@ -169,6 +291,27 @@ STORAGES = {
     }
 }
 
+# Media storage: files under MEDIA_ROOT, or an S3-compatible bucket (AWS S3,
+# MinIO, ...) through django-storages. Set S3_ENDPOINT_URL for anything but AWS.
+MEDIA_STORAGE = os.getenv('MEDIA_STORAGE', 'local').lower()  # local|s3
+
+if MEDIA_STORAGE == 's3':
+    STORAGES['default'] = {
+        'BACKEND': 'storages.backends.s3.S3Storage',
+        'OPTIONS': {
+            'bucket_name': os.getenv('S3_BUCKET_NAME', ''),
+            'endpoint_url': os.getenv('S3_ENDPOINT_URL') or None,
+            'region_name': os.getenv('S3_REGION_NAME') or None,
+            'access_key': os.getenv('S3_ACCESS_KEY_ID', ''),
+            'secret_key': os.getenv('S3_SECRET_ACCESS_KEY', ''),
+            'addressing_style': 'path' if os.getenv('S3_ENDPOINT_URL') else None,
+            # Private bucket: links are signed and expire.
+            'default_acl': None,
+            'querystring_auth': True,
+            'file_overwrite': False,
+        },
+    }
+
 # Media files (uploads, generated PDFs)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -177,8 +320,20 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # In most production setups you should serve media via a separate web server or object storage.
 SERVE_MEDIA = _env_bool('SERVE_MEDIA', 'False')
 
+# Downloads and media (config/downloads.py). 'python' streams files from Django
+# with Range and conditional GET support; 'nginx' hands them to nginx with
+# X-Accel-Redirect under SENDFILE_URL_PREFIX (an `internal` location aliased to
+# MEDIA_ROOT); 'xsendfile' sends the file path in X-Sendfile (Apache, lighttpd).
+SENDFILE_BACKEND = os.getenv('SENDFILE_BACKEND', 'python')
+SENDFILE_URL_PREFIX = os.getenv('SENDFILE_URL_PREFIX', '/protected-media/')
+# Media under these prefixes is public and cacheable; the rest needs a login.
+PUBLIC_MEDIA_PREFIXES = [p.strip() for p in os.getenv('PUBLIC_MEDIA_PREFIXES', 'jewelry_images/').split(',') if p.strip()]
+MEDIA_CACHE_SECONDS = int(os.getenv('MEDIA_CACHE_SECONDS', '2592000'))
+
 # If you are behind a reverse proxy/load balancer that sets X-Forwarded-Proto
 USE_X_FORWARDED_PROTO = _env_bool('USE_X_FORWARDED_PROTO', 'True')
+# Take client IPs (for rate limits) from the proxy's X-Forwarded-For header.
+USE_X_FORWARDED_FOR = _env_bool('USE_X_FORWARDED_FOR', 'False')
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -195,7 +350,7 @@ STRIPE_SUCCESS_URL = os.getenv('STRIPE_SUCCESS_URL','')
 STRIPE_CANCEL_URL = os.getenv('STRIPE_CANCEL_URL', '')
 
 # Email settings (Gmail SMTP)
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True').lower() in ('true', '1', 'yes')
@@ -0,0 +1,42 @@
+"""
+Sharded media layout.
+
+Files are stored as ``<prefix>/<yyyy>/<mm>/<bucket>/<filename>``: by month,
+then in one of 256 buckets named by a two-hex-digit hash prefix, so no
+directory (or S3 listing prefix) grows past a few hundred entries however
+many files there are. New uploads hash a random token; the shard_media
+command hashes a file's old name, so re-running it finds files it already
+copied.
+"""
+import hashlib
+import posixpath
+import re
+import secrets
+
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ShardedUploadTo:
+    """``upload_to`` callable for the sharded layout; ``date_field`` dates existing files when they are moved."""
+
+    def __init__(self, prefix, date_field=None):
+        self.prefix = prefix.strip('/')
+        self.date_field = date_field
+        self.pattern = re.compile(rf'^{re.escape(self.prefix)}/\d{{4}}/\d{{2}}/[0-9a-f]{{2}}/[^/]+$')
+
+    def __call__(self, instance, filename):
+        return self.path(filename, timezone.now(), secrets.token_hex(8))
+
+    def path(self, filename, when, key):
+        if timezone.is_aware(when):
+            when = timezone.localtime(when)
+        bucket = hashlib.sha1(key.encode()).hexdigest()[:2]
+        return posixpath.join(self.prefix, f'{when:%Y}', f'{when:%m}', bucket, posixpath.basename(filename))
+
+    def is_sharded(self, name):
+        return bool(self.pattern.match(name))
+
+    def __eq__(self, other):
+        return isinstance(other, ShardedUploadTo) and (self.prefix, self.date_field) == (other.prefix, other.date_field)
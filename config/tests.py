@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import views as auth_views
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import path, re_path
+
+from . import downloads
+from .cache import MISSING, TTLCache
+
+# Media is only routed with DEBUG or SERVE_MEDIA; the tests route it themselves.
+urlpatterns = [
+    path('login/', auth_views.LoginView.as_view(), name='login'),
+    re_path(r'^media/(?P<path>.*)$', downloads.media, name='media'),
+]
+
+
+@override_settings(TEST_CACHE_SIZE=2, TEST_CACHE_SECONDS=10)
+class TTLCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = TTLCache('TEST_CACHE_SIZE', 'TEST_CACHE_SECONDS')
+
+    def test_none_is_cached_and_unknown_keys_are_missing(self):
+        self.assertIsNone(self.cache.set('a', None))
+        self.assertIsNone(self.cache.get('a'))
+        self.assertIs(self.cache.get('b'), MISSING)
+
+    def test_evicts_least_recently_used(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual([self.cache.get(key) for key in 'abc'], [1, MISSING, 3])
+
+    def test_entries_expire(self):
+        with mock.patch('config.cache.time.monotonic', return_value=100):
+            self.cache.set('a', 1)
+        with mock.patch('config.cache.time.monotonic', return_value=110):
+            self.assertEqual(self.cache.get('a'), 1)
+        with mock.patch('config.cache.time.monotonic', return_value=110.1):
+            self.assertIs(self.cache.get('a'), MISSING)
+
+    def test_clear(self):
+        self.cache.set('a', 1)
+        self.cache.clear()
+        self.assertIs(self.cache.get('a'), MISSING)
+
+
+@override_settings(ROOT_URLCONF=__name__, SENDFILE_BACKEND='python', PUBLIC_MEDIA_PREFIXES=['jewelry_images/'])
+class MediaServingTests(TestCase):
+    body = bytes(range(256)) * 4
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        for name in ('jewelry_images/2026/10/ab/ring.jpg', 'certificates/2026/10/cd/CERT-1.pdf'):
+            os.makedirs(os.path.join(self.root, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(self.root, name), 'wb') as fh:
+                fh.write(self.body)
+        settings = override_settings(MEDIA_ROOT=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def get(self, path, **headers):
+        return self.client.get(f'/media/{path}', headers=headers)
+
+    def test_full_file(self):
+        response = self.get('jewelry_images/2026/10/ab/ring.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.body)
+        self.assertEqual(response['Content-Length'], str(len(self.body)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_byte_ranges(self):
+        response = self.get('jewelry_images/2026/10/ab/ring.jpg', range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.body)}')
+        self.assertEqual(b''.join(response.streaming_content), self.body[10:20])
+
+        response = self.get('jewelry_images/2026/10/ab/ring.jpg', range='bytes=-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.body[-5:])
+
+        response = self.get('jewelry_images/2026/10/ab/ring.jpg', range=f'bytes={len(self.body)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.body)}')
+
+    def test_range_ignored_when_if_range_is_stale(self):
+        response = self.get('jewelry_images/2026/10/ab/ring.jpg', range='bytes=0-9', if_range='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified(self):
+        etag = self.get('jewelry_images/2026/10/ab/ring.jpg')['ETag']
+        response = self.get('jewelry_images/2026/10/ab/ring.jpg', if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_directories_and_traversal_are_not_found(self):
+        for backend in ('python', 'nginx', 'xsendfile'):
+            with self.subTest(backend=backend), override_settings(SENDFILE_BACKEND=backend):
+                self.assertEqual(self.get('jewelry_images/2026/').status_code, 404)
+                self.assertEqual(self.get('jewelry_images/../../etc/passwd').status_code, 404)
+                self.assertEqual(self.get('jewelry_images/2026/10/ab/missing.jpg').status_code, 404)
+
+    def test_private_files_need_login(self):
+        path = 'certificates/2026/10/cd/CERT-1.pdf'
+        response = self.get(path)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/login/', response['Location'])
+
+        self.client.force_login(User.objects.create_user('clerk', password='pw'))
+        response = self.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_sendfile_backends_only_send_headers(self):
+        with override_settings(SENDFILE_BACKEND='nginx', SENDFILE_URL_PREFIX='/protected-media/'):
+            response = self.get('jewelry_images/2026/10/ab/ring.jpg')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/jewelry_images/2026/10/ab/ring.jpg')
+        self.assertEqual(response.content, b'')
+        with override_settings(SENDFILE_BACKEND='xsendfile'):
+            response = self.get('jewelry_images/2026/10/ab/ring.jpg')
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.root, 'jewelry_images/2026/10/ab/ring.jpg'))
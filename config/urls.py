@@ -1,13 +1,14 @@
 """
 URL configuration for config project.
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
 
-from . import views
+from . import downloads, views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -18,9 +19,16 @@ urlpatterns = [
     path('sales/', include('sales.urls')),
     path('customers/', include(('crm.urls', 'crm'), namespace='crm')),
     path('suppliers/', include(('crm.urls_suppliers', 'crm'), namespace='crm_suppliers')),
+    path('purchasing/', include('purchasing.urls')),
     path('certificates/', include('documents.urls')),
+    path('catalogs/', include(('documents.urls_catalogs', 'documents'), namespace='catalogs')),
+    path('verify/', include(('documents.urls_verify', 'documents'), namespace='verify')),
+    path('labels/', include(('documents.urls_labels', 'documents'), namespace='labels')),
+    path('api/', include('api.urls')),
 ]
 
 if settings.DEBUG or getattr(settings, 'SERVE_MEDIA', False):
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), downloads.media, name='media'),
+    ]
 
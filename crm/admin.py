@@ -1,14 +1,40 @@
-from django.contrib import admin
-from .models import Customer, Supplier
+from django.contrib import admin, messages
+
+from .dedup import merge
+from .models import Customer, CustomerStats, Supplier
+
+
+@admin.action(description='Merge selected into the oldest record')
+def merge_selected(modeladmin, request, queryset):
+    records = list(queryset.order_by('pk'))
+    if len(records) < 2:
+        modeladmin.message_user(request, 'Select at least two records to merge.', messages.WARNING)
+        return
+    survivor, duplicates = records[0], records[1:]
+    moved = merge(survivor, duplicates)
+    summary = ', '.join(f'{count} {label}' for label, count in moved.items() if count) or 'no related rows'
+    modeladmin.message_user(
+        request, f'Merged {len(duplicates)} records into "{survivor}" (#{survivor.pk}); moved {summary}.',
+        messages.SUCCESS,
+    )
 
 
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ['name', 'email', 'phone', 'created_at']
     search_fields = ['name', 'email', 'phone']
+    actions = [merge_selected]
 
 
 @admin.register(Supplier)
 class SupplierAdmin(admin.ModelAdmin):
     list_display = ['name', 'email', 'phone', 'created_at']
     search_fields = ['name', 'email', 'phone']
+    actions = [merge_selected]
+
+
+@admin.register(CustomerStats)
+class CustomerStatsAdmin(admin.ModelAdmin):
+    list_display = ['customer', 'lifetime_spend', 'order_count', 'last_purchase_at', 'updated_at']
+    search_fields = ['customer__name', 'customer__email']
+    readonly_fields = ['customer', 'lifetime_spend', 'order_count', 'last_purchase_at', 'updated_at']
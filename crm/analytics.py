@@ -0,0 +1,158 @@
+"""
+Supplier performance aggregates.
+
+with_performance() annotates a Supplier queryset with correlated subqueries,
+so each metric is computed inside the same SELECT without the row fan-out a
+join across items and invoice lines would cause. performance_table() computes
+the same metrics for every supplier with four grouped queries and caches the
+result for the supplier list.
+
+Delivery metrics come from purchasing: the on-time rate is the share of
+goods receipts booked in on or before their order's expected date (orders
+without one are left out), and the fill rate the share of ordered units
+received on orders that are due, i.e. fully received or past their expected
+date. Both are percentages, or None when there is nothing to measure.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+
+from inventory.models import JewelryItem
+from purchasing.models import GoodsReceipt, PurchaseOrder, PurchaseOrderLine
+from sales.models import InvoiceLine
+
+CACHE_KEY = 'crm:supplier_performance'
+ZERO = Decimal('0.00')
+
+# name -> (label, zero value), in display order. Rates have no zero: None
+# means nothing to measure.
+SUPPLIER_METRICS = {
+    'item_count': ('Items', 0),
+    'units_on_hand': ('Units on Hand', 0),
+    'stock_cost': ('Stock at Cost', ZERO),
+    'stock_value': ('Stock at Sale', ZERO),
+    'units_sold': ('Units Sold', 0),
+    'revenue': ('Revenue', ZERO),
+    'deliveries': ('Deliveries', 0),
+    'on_time_rate': ('On-Time %', None),
+    'fill_rate': ('Fill Rate %', None),
+}
+
+
+def _field(zero):
+    if zero is None:
+        return FloatField()
+    return IntegerField() if isinstance(zero, int) else DecimalField(max_digits=16, decimal_places=2)
+
+
+def _percent(part, whole):
+    """``100 * part / whole`` as a float, NULL when ``whole`` is 0."""
+    return Cast(part, FloatField()) * 100 / NullIf(Cast(whole, FloatField()), 0.0)
+
+
+def _item_aggregates():
+    return {
+        'item_count': Count('pk'),
+        'units_on_hand': Sum('quantity_on_hand'),
+        'stock_cost': Sum(F('cost_price') * F('quantity_on_hand')),
+        'stock_value': Sum(F('sale_price') * F('quantity_on_hand')),
+    }
+
+
+def _sales_aggregates():
+    return {
+        'units_sold': Sum('quantity'),
+        'revenue': Sum('line_total'),
+    }
+
+
+def _dated_receipts():
+    return GoodsReceipt.objects.filter(order__expected_date__isnull=False)
+
+
+def _delivery_aggregates():
+    return {
+        'deliveries': Count('pk'),
+        'on_time_rate': _percent(Count('pk', filter=Q(received_at__date__lte=F('order__expected_date'))), Count('pk')),
+    }
+
+
+def _due_lines():
+    return PurchaseOrderLine.objects.filter(
+        Q(order__status='received')
+        | Q(order__status__in=PurchaseOrder.RECEIVABLE, order__expected_date__lt=timezone.localdate())
+    )
+
+
+def _fill_aggregates():
+    return {'fill_rate': _percent(Sum('quantity_received'), Sum('quantity_ordered'))}
+
+
+def with_performance(queryset):
+    """Annotate suppliers with every SUPPLIER_METRICS value in a single query."""
+    items = JewelryItem.objects.filter(supplier=OuterRef('pk')).order_by().values('supplier')
+    sold = (
+        InvoiceLine.objects.filter(item__supplier=OuterRef('pk'), invoice__status='paid')
+        .order_by().values('item__supplier')
+    )
+    receipts = _dated_receipts().filter(order__supplier=OuterRef('pk')).order_by().values('order__supplier')
+    due = _due_lines().filter(order__supplier=OuterRef('pk')).order_by().values('order__supplier')
+    annotations = {}
+    for source, aggregates in (
+        (items, _item_aggregates()), (sold, _sales_aggregates()),
+        (receipts, _delivery_aggregates()), (due, _fill_aggregates()),
+    ):
+        for name, aggregate in aggregates.items():
+            zero = SUPPLIER_METRICS[name][1]
+            field = _field(zero)
+            annotations[name] = Subquery(source.annotate(value=aggregate).values('value')[:1], output_field=field)
+            if zero is not None:
+                annotations[name] = Coalesce(annotations[name], Value(zero), output_field=field)
+    return queryset.annotate(**annotations)
+
+
+def performance_table():
+    """Return ``{supplier_id: {metric: value}}`` for all suppliers, cached."""
+    table = cache.get(CACHE_KEY)
+    if table is not None:
+        return table
+
+    table = {}
+
+    def row_for(supplier_id):
+        if supplier_id not in table:
+            table[supplier_id] = {name: zero for name, (_, zero) in SUPPLIER_METRICS.items()}
+        return table[supplier_id]
+
+    items = (
+        JewelryItem.objects.filter(supplier__isnull=False)
+        .values('supplier_id').annotate(**_item_aggregates()).order_by()
+    )
+    for row in items:
+        stats = row_for(row.pop('supplier_id'))
+        stats.update({name: value for name, value in row.items() if value is not None})
+
+    sold = (
+        InvoiceLine.objects.filter(invoice__status='paid', item__supplier__isnull=False)
+        .values('item__supplier_id').annotate(**_sales_aggregates()).order_by()
+    )
+    for row in sold:
+        stats = row_for(row.pop('item__supplier_id'))
+        stats.update({name: value for name, value in row.items() if value is not None})
+
+    receipts = _dated_receipts().filter(order__supplier__isnull=False).values('order__supplier_id').annotate(
+        **_delivery_aggregates()
+    ).order_by()
+    due = _due_lines().filter(order__supplier__isnull=False).values('order__supplier_id').annotate(
+        **_fill_aggregates()
+    ).order_by()
+    for row in [*receipts, *due]:
+        stats = row_for(row.pop('order__supplier_id'))
+        stats.update({name: value for name, value in row.items() if value is not None})
+
+    cache.set(CACHE_KEY, table, settings.SUPPLIER_STATS_CACHE_SECONDS)
+    return table
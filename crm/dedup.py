@@ -0,0 +1,198 @@
+"""
+Duplicate detection and merging for customers and suppliers.
+
+Comparing every record with every other is O(n^2). Instead each record is put
+into a few blocks keyed by its normalized email, normalized phone and name
+(sorted tokens, and first initial + last token), and only records sharing a
+block are scored. Blocks larger than ``max_block`` (shared mailboxes, very
+common names) are skipped, so the work stays close to linear in the number
+of records.
+
+merge() folds duplicates into a surviving record: every foreign key pointing
+at them is re-pointed with one UPDATE per relation, then they are deleted.
+"""
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import ForeignKey
+from django.utils import timezone
+
+from inventory.facets import invalidate_facets
+
+from .analytics import CACHE_KEY as SUPPLIER_PERFORMANCE_CACHE_KEY
+from .models import Customer, Supplier
+from .normalization import normalize_name
+from .stats import rebuild
+
+# Relative weight of each field in a pair's score. Fields blank on either
+# side are left out of the average.
+FIELD_WEIGHTS = {'name': 0.4, 'email': 0.35, 'phone': 0.25}
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_MAX_BLOCK = 50
+
+
+def _records(model):
+    records = {}
+    rows = model.objects.order_by().values_list('pk', 'name', 'email_normalized', 'phone_normalized')
+    for pk, name, email, phone in rows.iterator(chunk_size=2000):
+        tokens = normalize_name(name)
+        records[pk] = {'name': ' '.join(sorted(tokens)), 'tokens': tokens, 'email': email, 'phone': phone}
+    return records
+
+
+def _blocking_keys(record):
+    if record['email']:
+        yield 'email', record['email']
+    if record['phone']:
+        yield 'phone', record['phone']
+    if record['name']:
+        yield 'name', record['name']
+    tokens = record['tokens']
+    if len(tokens) > 1:
+        yield 'initial', f'{tokens[0][0]} {tokens[-1]}'
+
+
+def _similarity(a, b):
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def score_pair(a, b):
+    """Return ``(score, reasons)`` for two records from _records()."""
+    parts = []
+    reasons = []
+    if a['name'] and b['name']:
+        similarity = _similarity(a['name'], b['name'])
+        parts.append((FIELD_WEIGHTS['name'], similarity))
+        if similarity == 1:
+            reasons.append('same name')
+        elif similarity >= DEFAULT_THRESHOLD:
+            reasons.append('similar name')
+    if a['email'] and b['email']:
+        if a['email'] == b['email']:
+            similarity = 1
+            reasons.append('same email')
+        else:
+            similarity = _similarity(a['email'].split('@')[0], b['email'].split('@')[0])
+        parts.append((FIELD_WEIGHTS['email'], similarity))
+    if a['phone'] and b['phone']:
+        same = a['phone'] == b['phone']
+        if same:
+            reasons.append('same phone')
+        parts.append((FIELD_WEIGHTS['phone'], 1 if same else 0))
+    if not parts:
+        return 0.0, reasons
+    return sum(w * s for w, s in parts) / sum(w for w, _ in parts), reasons
+
+
+def find_duplicates(model, threshold=DEFAULT_THRESHOLD, max_block=DEFAULT_MAX_BLOCK):
+    """
+    Return ``(pairs, skipped_blocks)``.
+
+    ``pairs`` is a list of ``(score, pk_a, pk_b, reasons)`` with
+    ``pk_a < pk_b``, best first; ``skipped_blocks`` counts blocks larger
+    than ``max_block`` that were not scored.
+    """
+    records = _records(model)
+    blocks = defaultdict(list)
+    for pk, record in records.items():
+        for key in _blocking_keys(record):
+            blocks[key].append(pk)
+
+    seen = set()
+    pairs = []
+    skipped = 0
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        if len(members) > max_block:
+            skipped += 1
+            continue
+        members.sort()
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                if (a, b) in seen:
+                    continue
+                seen.add((a, b))
+                score, reasons = score_pair(records[a], records[b])
+                if score >= threshold:
+                    pairs.append((round(score, 3), a, b, reasons))
+    pairs.sort(key=lambda pair: (-pair[0], pair[1], pair[2]))
+    return pairs, skipped
+
+
+def group_pairs(pairs):
+    """Cluster matched pairs into groups of pks (union-find), largest first."""
+    parent = {}
+
+    def root(pk):
+        parent.setdefault(pk, pk)
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    for _, a, b, _ in pairs:
+        ra, rb = root(a), root(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    groups = defaultdict(list)
+    for pk in parent:
+        groups[root(pk)].append(pk)
+    return sorted((sorted(group) for group in groups.values()), key=lambda group: (-len(group), group[0]))
+
+
+# Contact fields copied from a duplicate when the survivor has them blank.
+MERGE_FILL_FIELDS = ('email', 'phone', 'address', 'vat_number')
+
+
+def merge(survivor, duplicates):
+    """
+    Fold ``duplicates`` into ``survivor`` and delete them.
+
+    Every ForeignKey to the model (invoices, certificates, jewelry items, ...)
+    is re-pointed with a single UPDATE per relation; rows with an
+    ``updated_at`` column get it stamped so delta syncs pick them up. Blank
+    contact fields on the survivor are filled from the duplicates and their
+    notes are appended. Returns ``{relation label: rows moved}``.
+    """
+    model = type(survivor)
+    duplicates = [dup for dup in duplicates if dup.pk != survivor.pk]
+    if not duplicates:
+        return {}
+    duplicate_ids = [dup.pk for dup in duplicates]
+    now = timezone.now()
+    moved = {}
+
+    with transaction.atomic():
+        for relation in model._meta.related_objects:
+            if not isinstance(relation.field, ForeignKey) or relation.field.one_to_one:
+                continue
+            related = relation.related_model
+            changes = {relation.field.name: survivor}
+            if any(field.name == 'updated_at' for field in related._meta.concrete_fields):
+                changes['updated_at'] = now
+            moved[related._meta.verbose_name_plural] = (
+                related._base_manager.filter(**{f'{relation.field.name}__in': duplicate_ids}).update(**changes)
+            )
+
+        for dup in duplicates:
+            for name in MERGE_FILL_FIELDS:
+                if hasattr(survivor, name) and not getattr(survivor, name) and getattr(dup, name):
+                    setattr(survivor, name, getattr(dup, name))
+            if dup.notes:
+                survivor.notes = '\n'.join(filter(None, [survivor.notes, f'[Merged from #{dup.pk}] {dup.notes}']))
+        survivor.save()
+        model.objects.filter(pk__in=duplicate_ids).delete()
+        transaction.on_commit(lambda: _after_merge(model, survivor))
+    return moved
+
+
+def _after_merge(model, survivor):
+    # Re-pointing with update() skips the signals that maintain these.
+    if model is Customer:
+        rebuild([survivor.pk])
+    elif model is Supplier:
+        invalidate_facets()
+        cache.delete(SUPPLIER_PERFORMANCE_CACHE_KEY)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from crm.models import Customer, Supplier
+from crm.normalization import backfill
+
+
+class Command(BaseCommand):
+    help = 'Recompute the normalized email/phone lookup columns of customers and suppliers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        for model in (Customer, Supplier):
+            updated = backfill(model, chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(f'Updated {updated} {model._meta.verbose_name_plural}.'))
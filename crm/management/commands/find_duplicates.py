@@ -0,0 +1,48 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand
+
+from crm.dedup import DEFAULT_MAX_BLOCK, DEFAULT_THRESHOLD, find_duplicates, group_pairs
+from crm.models import Customer, Supplier
+
+MODELS = {'customers': Customer, 'suppliers': Supplier}
+
+
+class Command(BaseCommand):
+    help = 'Report likely duplicate customers or suppliers (merge them from the admin).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(MODELS))
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Minimum pair score between 0 and 1.')
+        parser.add_argument('--max-block', type=int, default=DEFAULT_MAX_BLOCK,
+                            help='Skip blocking keys shared by more records than this.')
+        parser.add_argument('--show', type=int, default=20, help='Groups to print.')
+        parser.add_argument('--report', help='Write every matched pair to this CSV file.')
+
+    def handle(self, *args, **options):
+        model = MODELS[options['model']]
+        start = time.perf_counter()
+        pairs, skipped = find_duplicates(model, threshold=options['threshold'], max_block=options['max_block'])
+        elapsed = time.perf_counter() - start
+        groups = group_pairs(pairs)
+
+        shown = groups[:options['show']]
+        names = dict(model.objects.filter(pk__in=[pk for group in shown for pk in group]).values_list('pk', 'name'))
+        for group in shown:
+            self.stdout.write(', '.join(f'#{pk} {names.get(pk, "?")}' for pk in group))
+
+        if options['report']:
+            with open(options['report'], 'w', newline='') as fh:
+                writer = csv.writer(fh)
+                writer.writerow(['score', 'id_a', 'id_b', 'reasons'])
+                for score, a, b, reasons in pairs:
+                    writer.writerow([score, a, b, '; '.join(reasons)])
+            self.stdout.write(f"Wrote {len(pairs)} pairs to {options['report']}")
+
+        if skipped:
+            self.stdout.write(f'Skipped {skipped} blocks larger than {options["max_block"]} records.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Found {len(pairs)} candidate pairs in {len(groups)} groups in {elapsed:.2f}s.'
+        ))
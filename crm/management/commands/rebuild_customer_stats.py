@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from crm.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute lifetime spend, order count and last purchase for every customer from paid invoices.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--customer', type=int, action='append', help='Only these customer ids (repeatable).')
+
+    def handle(self, *args, **options):
+        total = rebuild(options['customer'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {total} customers.'))
@@ -0,0 +1,41 @@
+from django.db import migrations
+from django.db.models import Count, Max, Sum
+
+
+def populate(apps, schema_editor):
+    Customer = apps.get_model('crm', 'Customer')
+    CustomerStats = apps.get_model('crm', 'CustomerStats')
+    Invoice = apps.get_model('sales', 'Invoice')
+
+    paid = (
+        Invoice.objects.filter(status='paid', customer__isnull=False)
+        .values('customer_id')
+        .annotate(spend=Sum('total'), orders=Count('id'), last=Max('created_at'))
+        .order_by()
+    )
+    by_customer = {row['customer_id']: row for row in paid}
+    batch = []
+    for pk in Customer.objects.values_list('pk', flat=True).iterator(chunk_size=2000):
+        row = by_customer.get(pk)
+        batch.append(CustomerStats(
+            customer_id=pk,
+            lifetime_spend=row['spend'] if row else 0,
+            order_count=row['orders'] if row else 0,
+            last_purchase_at=row['last'] if row else None,
+        ))
+        if len(batch) >= 2000:
+            CustomerStats.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    CustomerStats.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_customerstats'),
+        ('sales', '0004_invoice_invoice_updated_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
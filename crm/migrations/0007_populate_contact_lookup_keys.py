@@ -0,0 +1,19 @@
+from django.db import migrations
+
+from crm.normalization import backfill
+
+
+def populate(apps, schema_editor):
+    for name in ('Customer', 'Supplier'):
+        backfill(apps.get_model('crm', name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_contact_lookup_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
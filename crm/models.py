@@ -1,10 +1,28 @@
 from django.db import models
+from decimal import Decimal
 
+from .normalization import normalize_email, normalize_phone
 
-class Customer(models.Model):
+
+class ContactKeysMixin:
+    """Keeps the indexed email_normalized/phone_normalized lookup columns in step on save()."""
+
+    def save(self, *args, **kwargs):
+        self.email_normalized = normalize_email(self.email)
+        self.phone_normalized = normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'email', 'phone'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'email_normalized', 'phone_normalized'}
+        super().save(*args, **kwargs)
+
+
+class Customer(ContactKeysMixin, models.Model):
     name = models.CharField(max_length=200)
     email = models.EmailField(blank=True)
     phone = models.CharField(max_length=50, blank=True)
+    # Lookup keys for search and duplicate detection (crm/normalization.py).
+    email_normalized = models.CharField(max_length=254, blank=True, editable=False, db_index=True)
+    phone_normalized = models.CharField(max_length=50, blank=True, editable=False, db_index=True)
     address = models.TextField(blank=True)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -12,15 +30,21 @@ class Customer(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='customer_updated_at_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Supplier(models.Model):
+class Supplier(ContactKeysMixin, models.Model):
     name = models.CharField(max_length=200)
     email = models.EmailField(blank=True)
     phone = models.CharField(max_length=50, blank=True)
+    # Lookup keys for search and duplicate detection (crm/normalization.py).
+    email_normalized = models.CharField(max_length=254, blank=True, editable=False, db_index=True)
+    phone_normalized = models.CharField(max_length=50, blank=True, editable=False, db_index=True)
     vat_number = models.CharField(max_length=50, blank=True, verbose_name='VAT Registration Number')
     address = models.TextField(blank=True)
     notes = models.TextField(blank=True)
@@ -32,3 +56,29 @@ class Supplier(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class CustomerStats(models.Model):
+    """
+    Precomputed purchase aggregates for a customer (paid invoices only).
+
+    Kept up to date by sales/signals.py as invoices change status; run
+    ``manage.py rebuild_customer_stats`` after bulk imports.
+    """
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    lifetime_spend = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), db_index=True)
+    order_count = models.PositiveIntegerField(default=0)
+    last_purchase_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Customer stats'
+
+    def __str__(self):
+        return f'{self.customer} ({self.lifetime_spend})'
+
+    @property
+    def average_order_value(self):
+        if self.order_count:
+            return (self.lifetime_spend / self.order_count).quantize(Decimal('0.01'))
+        return Decimal('0.00')
@@ -0,0 +1,144 @@
+"""
+Canonical forms of customer and supplier contact details.
+
+Phones are stored as typed in the forms ("<prefix> <number>", see
+PHONE_PREFIX_CHOICES in crm/forms.py) or as free text from imports;
+normalize_phone() turns them into E.164 ("+306912345678") so the same number
+compares equal however it was entered.
+
+Customer and Supplier keep both forms in indexed shadow columns
+(email_normalized, phone_normalized) written on save(); backfill() rewrites
+them for rows created with bulk_create() or after CRM_DEFAULT_PHONE_PREFIX
+changes.
+"""
+import re
+import unicodedata
+from functools import cache
+
+from django.conf import settings
+from django.db import connection, transaction
+
+# Countries whose national trunk prefix 0 is part of the E.164 number.
+KEEP_TRUNK_ZERO = {'+39'}
+
+# Words that don't help tell two names apart ("Acme Ltd" == "ACME").
+NAME_STOPWORDS = {
+    'the', 'and', 'of', 'co', 'company', 'ltd', 'limited', 'inc', 'llc', 'plc',
+    'gmbh', 'ag', 'sa', 'ae', 'oe', 'ee', 'ike', 'srl', 'spa', 'bv',
+}
+
+
+@cache
+def _dialling_codes():
+    # Imported lazily: crm.forms imports crm.models.
+    from .forms import PHONE_PREFIX_CHOICES
+    # Longest first so +358 wins over a shorter code it starts with.
+    return sorted((prefix for prefix, _ in PHONE_PREFIX_CHOICES if prefix), key=len, reverse=True)
+
+
+def normalize_email(email):
+    """Lower-cased address with any +tag removed from the local part."""
+    email = (email or '').strip().lower()
+    local, at, domain = email.rpartition('@')
+    if not at or not local:
+        return email
+    return f"{local.split('+', 1)[0]}@{domain}"
+
+
+def normalize_phone(phone, default_prefix=None, min_digits=6):
+    """
+    Return ``phone`` in E.164 form, or '' if it has fewer than ``min_digits`` digits.
+
+    Numbers without a country code get ``default_prefix`` (the
+    CRM_DEFAULT_PHONE_PREFIX setting by default); without one they are
+    returned as bare digits. A partly typed number normalizes to a prefix of
+    the full number's form, which is what searches rely on.
+    """
+    phone = (phone or '').strip()
+    digits = re.sub(r'\D', '', phone)
+    if not digits or len(digits) < min_digits:
+        return ''
+    if phone.startswith('+'):
+        international = True
+    elif digits.startswith('00'):
+        international, digits = True, digits[2:]
+    else:
+        international = False
+
+    if international:
+        number = '+' + digits
+        for prefix in _dialling_codes():
+            if number.startswith(prefix):
+                national = number[len(prefix):]
+                if prefix not in KEEP_TRUNK_ZERO:
+                    national = national.lstrip('0')
+                return prefix + national
+        return number
+
+    if default_prefix is None:
+        default_prefix = getattr(settings, 'CRM_DEFAULT_PHONE_PREFIX', '')
+    if not default_prefix:
+        return digits
+    if default_prefix not in KEEP_TRUNK_ZERO:
+        digits = digits.lstrip('0')
+    return default_prefix + digits
+
+
+def phone_search_prefixes(text, min_digits=3):
+    """
+    Prefixes of phone_normalized that a typed (partial) number can match.
+
+    A number typed with its country code has one normalized form. One typed
+    without it may be stored under any country code, or as bare digits for
+    rows saved before CRM_DEFAULT_PHONE_PREFIX was set, so all of those are
+    returned. Returns [] below ``min_digits`` digits.
+    """
+    phone = normalize_phone(text, min_digits=min_digits)
+    if not phone:
+        return []
+    if phone.startswith('+') and (text.strip().startswith('+') or re.sub(r'\D', '', text).startswith('00')):
+        return [phone]
+    digits = re.sub(r'\D', '', text)
+    prefixes = {digits, phone}
+    for prefix in _dialling_codes():
+        prefixes.add(prefix + (digits if prefix in KEEP_TRUNK_ZERO else digits.lstrip('0')))
+    return sorted(prefixes)
+
+
+def normalize_name(name):
+    """Case-folded, accent-free name tokens without punctuation or NAME_STOPWORDS."""
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(ch for ch in name if not unicodedata.combining(ch)).casefold()
+    return [token for token in re.split(r'[\W_]+', name) if token and token not in NAME_STOPWORDS]
+
+
+def backfill(model, chunk_size=2000):
+    """
+    Recompute email_normalized/phone_normalized for every row of ``model``.
+
+    Only rows whose values change are written, with one executemany UPDATE
+    per chunk. updated_at is left alone: the shadow columns aren't part of
+    any API payload, so there is nothing for delta syncs to pick up.
+    Returns the number of rows updated.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    email_column = connection.ops.quote_name(model._meta.get_field('email_normalized').column)
+    phone_column = connection.ops.quote_name(model._meta.get_field('phone_normalized').column)
+    sql = f'UPDATE {table} SET {email_column} = %s, {phone_column} = %s WHERE id = %s'
+    rows = model._base_manager.order_by('pk').values_list('pk', 'email', 'phone', 'email_normalized', 'phone_normalized')
+    last_pk = 0
+    updated = 0
+    while True:
+        chunk = list(rows.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return updated
+        params = []
+        for pk, email, phone, old_email, old_phone in chunk:
+            email, phone = normalize_email(email), normalize_phone(phone)
+            if (email, phone) != (old_email, old_phone):
+                params.append((email, phone, pk))
+        if params:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, params)
+        updated += len(params)
+        last_pk = chunk[-1][0]
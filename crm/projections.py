@@ -0,0 +1,18 @@
+"""
+Column projections for customer/supplier list pages and JSON endpoints.
+
+List templates only show name, email, phone and created_at, so the address and
+notes TextFields are never loaded there.
+"""
+
+CUSTOMER_LIST_FIELDS = (
+    'name', 'email', 'phone', 'created_at', 'stats__lifetime_spend', 'stats__order_count',
+)
+SUPPLIER_LIST_FIELDS = ('name', 'email', 'phone', 'created_at')
+
+# customer_search JSON (.values() rows).
+CUSTOMER_SEARCH_FIELDS = ('id', 'name', 'email', 'phone')
+
+# customer_detail history panel.
+CUSTOMER_INVOICE_FIELDS = ('invoice_number', 'status', 'total', 'created_at')
+CUSTOMER_CERTIFICATE_FIELDS = ('certificate_number', 'issued_at', 'item__sku', 'item__name', 'invoice__invoice_number')
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Customer, CustomerStats
+
+
+@receiver(post_save, sender=Customer)
+def create_customer_stats(sender, instance, created, raw=False, **kwargs):
+    # Every customer saved through the ORM gets a stats row; bulk-created
+    # ones get theirs from rebuild_customer_stats.
+    if created and not raw:
+        CustomerStats.objects.get_or_create(customer=instance)
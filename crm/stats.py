@@ -0,0 +1,74 @@
+"""
+Incremental maintenance of CustomerStats.
+
+Invoice changes are applied as deltas with F() expressions so concurrent
+updates to the same customer don't overwrite each other. Removing a purchase
+recomputes last_purchase_at from the customer's remaining paid invoices,
+because a running maximum can't be decremented.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Customer, CustomerStats
+
+PAID = Q(invoices__status='paid')
+
+
+def add_purchase(customer_id, amount, purchased_at):
+    CustomerStats.objects.get_or_create(customer_id=customer_id)
+    CustomerStats.objects.filter(customer_id=customer_id).update(
+        lifetime_spend=F('lifetime_spend') + amount,
+        order_count=F('order_count') + 1,
+        updated_at=timezone.now(),
+    )
+    CustomerStats.objects.filter(customer_id=customer_id).filter(
+        Q(last_purchase_at__isnull=True) | Q(last_purchase_at__lt=purchased_at)
+    ).update(last_purchase_at=purchased_at)
+
+
+def remove_purchase(customer_id, amount):
+    CustomerStats.objects.filter(customer_id=customer_id, order_count__gt=0).update(
+        lifetime_spend=F('lifetime_spend') - amount,
+        order_count=F('order_count') - 1,
+        updated_at=timezone.now(),
+    )
+    last = Customer.objects.filter(pk=customer_id).aggregate(last=Max('invoices__created_at', filter=PAID))['last']
+    CustomerStats.objects.filter(customer_id=customer_id).update(last_purchase_at=last)
+
+
+def rebuild(customer_ids=None, chunk_size=1000):
+    """Recompute stats from paid invoices; returns the number of customers processed."""
+    customers = Customer.objects.order_by('pk')
+    if customer_ids is not None:
+        customers = customers.filter(pk__in=customer_ids)
+    now = timezone.now()
+    last_pk = 0
+    total = 0
+    while True:
+        # Keyset over customers; each chunk is one grouped query over their invoices.
+        rows = list(
+            customers.filter(pk__gt=last_pk)
+            .annotate(
+                spend=Coalesce(Sum('invoices__total', filter=PAID), Value(Decimal('0.00'))),
+                orders=Count('invoices', filter=PAID),
+                last=Max('invoices__created_at', filter=PAID),
+            )
+            .values_list('pk', 'spend', 'orders', 'last')[:chunk_size]
+        )
+        if not rows:
+            return total
+        stats = [
+            CustomerStats(customer_id=pk, lifetime_spend=spend, order_count=orders, last_purchase_at=last, updated_at=now)
+            for pk, spend, orders, last in rows
+        ]
+        CustomerStats.objects.bulk_create(
+            stats,
+            update_conflicts=True,
+            unique_fields=['customer'],
+            update_fields=['lifetime_spend', 'order_count', 'last_purchase_at', 'updated_at'],
+        )
+        last_pk = rows[-1][0]
+        total += len(rows)
@@ -1,3 +1,305 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from documents.models import Certificate
+from purchasing.models import GoodsReceipt, PurchaseOrder, PurchaseOrderLine
+from purchasing.receiving import receive
+from inventory.tests import assert_constant_queries, call_views, json_payloads, make_item, view_request
+from sales.models import Invoice, InvoiceLine
+
+from . import views
+from .analytics import CACHE_KEY, performance_table, with_performance
+from .dedup import merge
+from .models import Customer, CustomerStats, Supplier
+
+
+class CustomerStatsTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Eleni Papadopoulou')
+
+    def stats(self):
+        return CustomerStats.objects.values_list('lifetime_spend', 'order_count').get(customer=self.customer)
+
+    def paid_invoice(self, total):
+        return Invoice.objects.create(customer=self.customer, status='paid', total=Decimal(total))
+
+    def test_paid_invoices_add_to_stats(self):
+        self.paid_invoice('100.00')
+        self.paid_invoice('50.50')
+        Invoice.objects.create(customer=self.customer, status='sent', total=Decimal('999.00'))
+        self.assertEqual(self.stats(), (Decimal('150.50'), 2))
+
+    def test_voiding_paid_invoice_removes_it(self):
+        keep = self.paid_invoice('100.00')
+        invoice = self.paid_invoice('40.00')
+        invoice.status = 'void'
+        invoice.save()
+        self.assertEqual(self.stats(), (Decimal('100.00'), 1))
+        self.assertEqual(CustomerStats.objects.get(customer=self.customer).last_purchase_at, keep.created_at)
+
+    def test_deleting_paid_invoice_removes_it(self):
+        invoice = self.paid_invoice('75.00')
+        invoice.delete()
+        stats = CustomerStats.objects.get(customer=self.customer)
+        self.assertEqual((stats.lifetime_spend, stats.order_count, stats.last_purchase_at), (Decimal('0.00'), 0, None))
+
+    def test_changing_paid_total_applies_the_difference(self):
+        invoice = self.paid_invoice('75.00')
+        invoice.total = Decimal('60.00')
+        invoice.save()
+        self.assertEqual(self.stats(), (Decimal('60.00'), 1))
+
+
+class CustomerListTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='pw'))
+
+    def test_lifetime_sort_keeps_customers_without_stats(self):
+        big = Customer.objects.create(name='Big Spender')
+        Invoice.objects.create(customer=big, status='paid', total=Decimal('500.00'))
+        Customer.objects.bulk_create([Customer(name='Imported A'), Customer(name='Imported B')])
+        self.assertEqual(CustomerStats.objects.count(), 1)
+
+        response = self.client.get(reverse('crm:customer_list'), {'sort': 'lifetime'})
+        names = [customer.name for customer in response.context['customers']]
+        self.assertEqual(names, ['Big Spender', 'Imported B', 'Imported A'])
+
+
+class ContactSearchTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='pw'))
+        self.greek = Customer.objects.create(name='Nikos', email='Nikos.K+shop@Gmail.com', phone='+30 6914366125')
+        self.italian = Customer.objects.create(name='Giulia', email='giulia@bench.example', phone='+39 0612345678')
+        self.bare = Customer.objects.create(name='Walk-in', phone='2101234567')
+
+    def search(self, text):
+        response = self.client.get(reverse('crm:customer_list'), {'search': text})
+        return {customer.name for customer in response.context['customers']}
+
+    def test_number_with_country_code(self):
+        self.assertEqual(self.search('+30 691436'), {'Nikos'})
+        self.assertEqual(self.search('0030 691 436'), {'Nikos'})
+
+    def test_national_number_without_country_code(self):
+        self.assertEqual(self.search('691436'), {'Nikos'})
+        self.assertEqual(self.search('06123'), {'Giulia'})
+        self.assertEqual(self.search('210 123'), {'Walk-in'})
+
+    def test_email_fragments(self):
+        self.assertEqual(self.search('gmail'), {'Nikos'})
+        self.assertEqual(self.search('bench.example'), {'Giulia'})
+        self.assertEqual(self.search('nikos.k@gmail.com'), {'Nikos'})
+        self.assertEqual(self.search('@bench.example'), {'Giulia'})
+
+    def test_name(self):
+        self.assertEqual(self.search('giu'), {'Giulia'})
+
+
+class AsyncCustomerSearchTests(TestCase):
+    def test_matches_sync_view(self):
+        user = User.objects.create_user('clerk', password='pw')
+        Customer.objects.create(name='Nikos', email='nikos@example.com', phone='+30 6914366125')
+        Customer.objects.create(name='Giulia', email='giulia@example.com')
+        for query in ('', 'nik', '691436', 'example.com', 'nobody'):
+            with self.subTest(query=query):
+                status, payload = json_payloads(self, call_views(
+                    user, views.customer_search, views.customer_search_async, f'/crm/customers/search/?q={query}',
+                ))
+                self.assertEqual(status, 200)
+        self.assertEqual(payload, {'results': []})
+
+
+@override_settings(CERTIFICATE_PDF_WORKERS=0)
+class ProjectionTests(TestCase):
+    """List pages and JSON endpoints read only their projected columns."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('clerk', password='pw')
+        self.client.force_login(self.user)
+
+    def add_contacts(self, model, *names):
+        for name in names:
+            model.objects.create(name=name, email=f'{name.lower()}@example.com', address='Long street ' * 20, notes='Notes ' * 50)
+
+    def test_customer_list(self):
+        self.add_contacts(Customer, 'Anna')
+        queries, response = assert_constant_queries(
+            self, reverse('crm:customer_list'), lambda: self.add_contacts(Customer, 'Bea', 'Cleo', 'Dina'),
+        )
+        self.assertContains(response, 'dina@example.com')
+        self.assertFalse([query for query in queries if '"notes"' in query['sql']])
+
+    def test_supplier_list(self):
+        self.add_contacts(Supplier, 'Argento')
+        queries, response = assert_constant_queries(
+            self, reverse('crm_suppliers:supplier_list'), lambda: self.add_contacts(Supplier, 'Bronzo', 'Oro'),
+        )
+        self.assertContains(response, 'oro@example.com')
+        self.assertFalse([query for query in queries if '"notes"' in query['sql']])
+
+    def test_customer_detail_history(self):
+        customer = Customer.objects.create(name='Anna')
+
+        def add_history():
+            for sku in ('RG-1', 'RG-2'):
+                invoice = Invoice.objects.create(customer=customer, status='paid', total=Decimal('10.00'))
+                Certificate.objects.create(item=make_item(sku), invoice=invoice)
+
+        queries, response = assert_constant_queries(self, reverse('crm:customer_detail', args=[customer.pk]), add_history)
+        self.assertContains(response, 'RG-2')
+
+    def test_customer_search_reads_one_query(self):
+        self.add_contacts(Customer, 'Anna', 'Bea')
+        with self.assertNumQueries(1):
+            views.customer_search(view_request(self.user, '/?q=a'))
+
+
+class SupplierPerformanceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supplier = Supplier.objects.create(name='Goldsmith & Co')
+        self.idle = Supplier.objects.create(name='Idle Metals')
+        self.today = timezone.localdate()
+        ring = make_item('RG-1', supplier=self.supplier, quantity_on_hand=2)
+        chain = make_item('CH-1', supplier=self.supplier, quantity_on_hand=1, sale_price=Decimal('80.00'))
+        paid = Invoice.objects.create(status='paid')
+        InvoiceLine.objects.create(invoice=paid, item=ring, description='Ring', quantity=2, unit_price=Decimal('150.00'))
+        InvoiceLine.objects.create(invoice=Invoice.objects.create(), item=chain, description='Chain', unit_price=Decimal('80.00'))
+
+        # Past due, delivered in two parts, on time then late: 6 of 10 units.
+        late = self.order(ring, 10, expected=self.today - timedelta(days=10))
+        self.deliver(late, 4, self.today - timedelta(days=12))
+        self.deliver(late, 2, self.today - timedelta(days=5))
+        # Delivered in full ahead of its date.
+        self.deliver(self.order(chain, 5, expected=self.today + timedelta(days=10)), 5, self.today)
+        # No expected date: counts towards the fill rate only.
+        self.deliver(self.order(chain, 3), 3, self.today)
+        # Not due yet: counts towards neither.
+        self.order(ring, 7, expected=self.today + timedelta(days=3))
+
+    def order(self, item, quantity, expected=None):
+        order = PurchaseOrder.objects.create(supplier=self.supplier, status='ordered', expected_date=expected)
+        PurchaseOrderLine.objects.create(order=order, item=item, quantity_ordered=quantity, unit_cost=Decimal('100.00'))
+        return order
+
+    def deliver(self, order, quantity, day):
+        receipt = receive(order, {order.lines.get().pk: quantity})
+        received_at = timezone.make_aware(timezone.datetime.combine(day, timezone.datetime.min.time().replace(hour=12)))
+        GoodsReceipt.objects.filter(pk=receipt.pk).update(received_at=received_at)
+
+    def assert_metrics(self, metrics, idle):
+        self.assertEqual(
+            {name: metrics[name] for name in ('item_count', 'units_on_hand', 'units_sold', 'revenue', 'deliveries')},
+            {'item_count': 2, 'units_on_hand': 2 + 6 + 1 + 5 + 3, 'units_sold': 2, 'revenue': Decimal('300.00'), 'deliveries': 3},
+        )
+        self.assertAlmostEqual(metrics['on_time_rate'], 200 / 3)
+        self.assertAlmostEqual(metrics['fill_rate'], 100 * 14 / 18)
+        self.assertEqual((idle['deliveries'], idle['on_time_rate'], idle['fill_rate']), (0, None, None))
+
+    def test_annotated_query(self):
+        with self.assertNumQueries(1):
+            suppliers = {supplier.pk: vars(supplier) for supplier in with_performance(Supplier.objects.all())}
+        self.assert_metrics(suppliers[self.supplier.pk], suppliers[self.idle.pk])
+
+    def test_cached_table(self):
+        with self.assertNumQueries(4):
+            table = performance_table()
+        self.assertNotIn(self.idle.pk, table)
+        idle = {'deliveries': 0, 'on_time_rate': None, 'fill_rate': None}
+        self.assert_metrics(table[self.supplier.pk], idle)
+        with self.assertNumQueries(0):
+            self.assertEqual(performance_table(), table)
+
+    def test_pages(self):
+        self.client.force_login(User.objects.create_user('clerk', password='pw'))
+        response = self.client.get(reverse('crm_suppliers:supplier_detail', args=[self.supplier.pk]))
+        self.assertContains(response, '67%')
+        self.assertContains(response, '78%')
+
+        for sort in ('on_time_rate', 'fill_rate'):
+            response = self.client.get(reverse('crm_suppliers:supplier_list'), {'sort': sort})
+            self.assertEqual([supplier.pk for supplier in response.context['suppliers']], [self.supplier.pk, self.idle.pk])
+
+
+class MergeTests(TestCase):
+    def remaining(self, model, ids):
+        """Rows in any ForeignKey relation that still point at ``ids``."""
+        counts = {}
+        for relation in model._meta.related_objects:
+            if relation.one_to_many:
+                counts[relation.related_model.__name__] = relation.related_model._base_manager.filter(
+                    **{f'{relation.field.name}__in': ids}
+                ).count()
+        return counts
+
+    def test_customer_relations_move_to_survivor(self):
+        survivor = Customer.objects.create(name='Anna Nowak', notes='Prefers white gold')
+        duplicate = Customer.objects.create(
+            name='Anna  Nowak', email='anna@example.com', phone='600 100 200', notes='Ring size 14',
+        )
+        Invoice.objects.create(customer=survivor, status='paid', total=Decimal('100.00'))
+        moved_invoices = [
+            Invoice.objects.create(customer=duplicate, status='paid', total=Decimal('40.00')),
+            Invoice.objects.create(customer=duplicate, status='draft'),
+        ]
+        certificate = Certificate.objects.create(item=make_item('RG-1'), customer=duplicate)
+        stamped = Invoice.objects.get(pk=moved_invoices[0].pk).updated_at
+
+        with self.captureOnCommitCallbacks(execute=True):
+            moved = merge(survivor, [duplicate])
+
+        self.assertEqual(moved, {'invoices': 2, 'certificates': 1})
+        self.assertEqual(self.remaining(Customer, [duplicate.pk]), {'Invoice': 0, 'Certificate': 0})
+        self.assertFalse(Customer.objects.filter(pk=duplicate.pk).exists())
+        self.assertEqual(survivor.invoices.count(), 3)
+        self.assertEqual(Certificate.objects.get(pk=certificate.pk).customer_id, survivor.pk)
+        self.assertGreater(Invoice.objects.get(pk=moved_invoices[0].pk).updated_at, stamped)
+
+        survivor.refresh_from_db()
+        self.assertEqual((survivor.email, survivor.phone), ('anna@example.com', '600 100 200'))
+        self.assertEqual(survivor.notes, f'Prefers white gold\n[Merged from #{duplicate.pk}] Ring size 14')
+        stats = CustomerStats.objects.get(customer=survivor)
+        self.assertEqual((stats.lifetime_spend, stats.order_count), (Decimal('140.00'), 2))
+
+    def test_supplier_relations_move_to_survivor(self):
+        survivor = Supplier.objects.create(name='Goldsmith & Co')
+        duplicates = [Supplier.objects.create(name='Goldsmith and Co'), Supplier.objects.create(name='Goldsmith Co.')]
+        items = [make_item('RG-1', supplier=duplicates[0]), make_item('RG-2', supplier=duplicates[1])]
+        order = PurchaseOrder.objects.create(supplier=duplicates[1])
+        cache.set(CACHE_KEY, {'stale': True})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            moved = merge(survivor, duplicates)
+
+        self.assertEqual(moved, {'jewelry items': 2, 'purchase orders': 1})
+        ids = [supplier.pk for supplier in duplicates]
+        self.assertEqual(set(self.remaining(Supplier, ids).values()), {0})
+        self.assertFalse(Supplier.objects.filter(pk__in=ids).exists())
+        self.assertEqual(set(survivor.jewelry_items.all()), set(items))
+        self.assertEqual(list(survivor.purchase_orders.all()), [order])
+        self.assertIsNone(cache.get(CACHE_KEY))
+
+    def test_admin_action_merges_into_oldest(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        oldest, newer = Customer.objects.create(name='Jan Kowalski'), Customer.objects.create(name='Jan Kowalsky')
+        invoice = Invoice.objects.create(customer=newer)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('admin:crm_customer_changelist'),
+                {'action': 'merge_selected', '_selected_action': [newer.pk, oldest.pk]},
+            )
+
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            [f'Merged 1 records into "Jan Kowalski" (#{oldest.pk}); moved 1 invoices.'],
+        )
+        self.assertEqual(list(Customer.objects.all()), [oldest])
+        self.assertEqual(Invoice.objects.get(pk=invoice.pk).customer, oldest)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -9,5 +10,5 @@ urlpatterns = [
     path('<int:pk>/', views.customer_detail, name='customer_detail'),
     path('<int:pk>/edit/', views.customer_edit, name='customer_edit'),
     path('<int:pk>/delete/', views.customer_delete, name='customer_delete'),
-    path('customers/search/', views.customer_search, name='customer_search'),
+    path('customers/search/', views.customer_search_async if settings.ASYNC_VIEWS else views.customer_search, name='customer_search'),
 ]
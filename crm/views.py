@@ -1,35 +1,116 @@
+import re
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
 from django.core.paginator import Paginator
 from django.http import JsonResponse
 
-from .models import Customer, Supplier
+from .analytics import SUPPLIER_METRICS, performance_table, with_performance
+from .models import Customer, CustomerStats, Supplier
+from .normalization import normalize_email, phone_search_prefixes
 from .forms import CustomerForm, SupplierForm
+from .projections import (
+    CUSTOMER_LIST_FIELDS, SUPPLIER_LIST_FIELDS, CUSTOMER_SEARCH_FIELDS,
+    CUSTOMER_INVOICE_FIELDS, CUSTOMER_CERTIFICATE_FIELDS,
+)
+from documents.models import Certificate
+from sales.models import Invoice
 
 ITEMS_PER_PAGE = 10
+HISTORY_PER_PAGE = 10
+
+# Search input that is only digits and phone punctuation is treated as a number.
+PHONE_QUERY = re.compile(r'[\d\s()+./-]+')
+
+
+def _prefix_q(field, prefix):
+    """``field`` starts with ``prefix``, written as a range so every backend can use the index."""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper})
+
+
+def _contact_q(search):
+    """
+    Search filter for customers and suppliers.
+
+    Phone numbers are matched as prefixes of the indexed normalized column,
+    so "0030 69..." finds "+30 69..." and "69..." finds it under any country
+    code. Email addresses match the start of the normalized address or any
+    part of the address; other text matches names and email addresses.
+    """
+    if PHONE_QUERY.fullmatch(search):
+        prefixes = phone_search_prefixes(search)
+        if prefixes:
+            return reduce(or_, (_prefix_q('phone_normalized', prefix) for prefix in prefixes))
+    if '@' in search:
+        return _prefix_q('email_normalized', normalize_email(search)) | Q(email__icontains=search)
+    return Q(name__icontains=search) | Q(email__icontains=search)
 
 
 # Customer Views
 @login_required
 def customer_list(request):
-    customers = Customer.objects.all()
+    customers = Customer.objects.select_related('stats').only(*CUSTOMER_LIST_FIELDS)
     search = request.GET.get('search', '')
     if search:
-        customers = customers.filter(Q(name__icontains=search) | Q(email__icontains=search) | Q(phone__icontains=search))
+        customers = customers.filter(_contact_q(search))
+    
+    # Lifetime value comes from the CustomerStats row, not from invoices.
+    # Customers without one yet (bulk imports) are kept and sort as 0.
+    sort = request.GET.get('sort', '')
+    if sort == 'lifetime':
+        customers = customers.order_by(Coalesce('stats__lifetime_spend', Value(Decimal('0.00'))).desc(), '-pk')
     
     paginator = Paginator(customers, ITEMS_PER_PAGE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    return render(request, 'crm/customer_list.html', {'customers': page_obj, 'page_obj': page_obj, 'search': search})
+    return render(request, 'crm/customer_list.html', {'customers': page_obj, 'page_obj': page_obj, 'search': search, 'sort': sort})
+
+
+def _keyset_page(queryset, before):
+    """Newest-first page of ``queryset`` with ids below ``before``; returns (rows, next_before)."""
+    if before and before.isdigit():
+        queryset = queryset.filter(pk__lt=int(before))
+    rows = list(queryset.order_by('-pk')[:HISTORY_PER_PAGE + 1])
+    next_before = rows[HISTORY_PER_PAGE - 1].pk if len(rows) > HISTORY_PER_PAGE else None
+    return rows[:HISTORY_PER_PAGE], next_before
 
 
 @login_required
 def customer_detail(request, pk):
-    customer = get_object_or_404(Customer, pk=pk)
-    return render(request, 'crm/customer_detail.html', {'customer': customer})
+    customer = get_object_or_404(Customer.objects.select_related('stats'), pk=pk)
+    try:
+        stats = customer.stats
+    except CustomerStats.DoesNotExist:
+        stats = CustomerStats(customer=customer)
+    
+    invoices, invoices_before = _keyset_page(
+        Invoice.objects.filter(customer=customer).only(*CUSTOMER_INVOICE_FIELDS),
+        request.GET.get('invoices_before'),
+    )
+    certificates, certificates_before = _keyset_page(
+        Certificate.objects.filter(Q(customer=customer) | Q(invoice__customer=customer))
+        .select_related('item', 'invoice').only(*CUSTOMER_CERTIFICATE_FIELDS),
+        request.GET.get('certificates_before'),
+    )
+    
+    return render(request, 'crm/customer_detail.html', {
+        'customer': customer,
+        'stats': stats,
+        'invoices': invoices,
+        'invoices_before': invoices_before,
+        'certificates': certificates,
+        'certificates_before': certificates_before,
+        'paging_invoices': bool(request.GET.get('invoices_before')),
+        'paging_certificates': bool(request.GET.get('certificates_before')),
+    })
 
 
 @login_required
@@ -70,50 +151,80 @@ def customer_delete(request, pk):
     return render(request, 'crm/customer_confirm_delete.html', {'customer': customer})
 
 
+def _customer_search_queryset(query):
+    customers = Customer.objects.all()
+    if query:
+        customers = customers.filter(_contact_q(query))
+    return customers.values(*CUSTOMER_SEARCH_FIELDS)[:20]  # Limit results
+
+
+def _customer_search_result(row):
+    return {
+        'id': row['id'],
+        'text': row['name'],
+        'name': row['name'],
+        'email': row['email'],
+        'phone': row['phone'],
+    }
+
+
 @login_required
 def customer_search(request):
     """JSON endpoint for searching customers (for Tom Select dropdowns)."""
     query = request.GET.get('q', '').strip()
-    customers = Customer.objects.all()
-    
-    if query:
-        customers = customers.filter(
-            Q(name__icontains=query) | 
-            Q(email__icontains=query) | 
-            Q(phone__icontains=query)
-        )
-    
-    customers = customers[:20]  # Limit results
-    
-    results = [{
-        'id': customer.id,
-        'text': customer.name,
-        'name': customer.name,
-        'email': customer.email,
-        'phone': customer.phone,
-    } for customer in customers]
-    
+    results = [_customer_search_result(row) for row in _customer_search_queryset(query)]
+    return JsonResponse({'results': results})
+
+
+@login_required
+async def customer_search_async(request):
+    """Async variant of customer_search for the ASGI deployment mode."""
+    query = request.GET.get('q', '').strip()
+    results = [_customer_search_result(row) async for row in _customer_search_queryset(query)]
     return JsonResponse({'results': results})
 
 
 # Supplier Views
 @login_required
 def supplier_list(request):
-    suppliers = Supplier.objects.all()
+    suppliers = Supplier.objects.only(*SUPPLIER_LIST_FIELDS)
     search = request.GET.get('search', '')
     if search:
-        suppliers = suppliers.filter(Q(name__icontains=search) | Q(email__icontains=search) | Q(phone__icontains=search))
+        suppliers = suppliers.filter(_contact_q(search))
+    
+    # Performance figures come from one cached table for all suppliers; ranking
+    # by a metric sorts the (few hundred) suppliers in Python.
+    table = performance_table()
+    sort = request.GET.get('sort', '')
+    if sort in SUPPLIER_METRICS:
+        zero = SUPPLIER_METRICS[sort][1]
+
+        def rank(supplier):
+            value = table.get(supplier.pk, {}).get(sort, zero)
+            # Rates that can't be measured (None) rank below every value.
+            return value is not None, value or 0, -supplier.pk
+
+        suppliers = sorted(suppliers, key=rank, reverse=True)
     
     paginator = Paginator(suppliers, ITEMS_PER_PAGE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    empty = {name: zero for name, (_, zero) in SUPPLIER_METRICS.items()}
+    for supplier in page_obj:
+        supplier.performance = table.get(supplier.pk, empty)
     
-    return render(request, 'crm/supplier_list.html', {'suppliers': page_obj, 'page_obj': page_obj, 'search': search})
+    return render(request, 'crm/supplier_list.html', {
+        'suppliers': page_obj,
+        'page_obj': page_obj,
+        'search': search,
+        'sort': sort,
+        'sort_choices': [(name, label) for name, (label, _) in SUPPLIER_METRICS.items()],
+    })
 
 
 @login_required
 def supplier_detail(request, pk):
-    supplier = get_object_or_404(Supplier, pk=pk)
+    supplier = get_object_or_404(with_performance(Supplier.objects.all()), pk=pk)
     return render(request, 'crm/supplier_detail.html', {'supplier': supplier})
 
 
@@ -1,10 +1,17 @@
 from django.contrib import admin
-from .models import Certificate
+from .models import Certificate, CatalogExport
 
 
 @admin.register(Certificate)
 class CertificateAdmin(admin.ModelAdmin):
-    list_display = ['certificate_number', 'item', 'invoice', 'issued_at']
-    list_filter = ['issued_at']
+    list_display = ['certificate_number', 'item', 'invoice', 'issued_at', 'render_status']
+    list_filter = ['render_status', 'issued_at']
     search_fields = ['certificate_number', 'item__sku', 'item__name']
-    readonly_fields = ['certificate_number']
+    readonly_fields = ['certificate_number', 'render_status', 'render_attempts', 'render_error', 'rendered_at']
+
+
+@admin.register(CatalogExport)
+class CatalogExportAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'category', 'status', 'rendered_items', 'total_items', 'pages', 'requested_by']
+    list_filter = ['status', 'created_at']
+    readonly_fields = ['status', 'total_items', 'rendered_items', 'pages', 'pdf_file', 'error', 'created_at', 'finished_at']
@@ -0,0 +1,153 @@
+"""
+Small in-process thread pools for document rendering, and spawned process
+pools for CPU-bound batches (invoice month bundles, label sheets).
+
+Each kind of job (catalog exports, invoice PDFs, certificate PDFs) gets its
+own pool, created on first use and sized by a setting; with 0 workers
+nothing is run here and the job is left to its management command. Jobs are
+submitted after the current transaction commits, so they never see
+uncommitted rows.
+
+Every pool counts its queued, running and finished jobs and keeps the wait
+and run times of the last LATENCY_SAMPLES jobs; pool_stats() reports them.
+The numbers are per process.
+"""
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from django.db import transaction
+
+LATENCY_SAMPLES = 500
+
+_pools = {}
+_process_pools = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+class _Stats:
+    def __init__(self, workers):
+        self.workers = workers
+        self.queued = self.running = self.scheduled = self.finished = self.errors = 0
+        self.waits = deque(maxlen=LATENCY_SAMPLES)
+        self.runs = deque(maxlen=LATENCY_SAMPLES)
+
+
+def _pool(name, workers):
+    with _lock:
+        if name not in _pools:
+            _pools[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+            _stats[name] = _Stats(workers)
+        return _pools[name]
+
+
+def _run(name, fn, args, queued_at):
+    stats = _stats[name]
+    started = time.monotonic()
+    with _lock:
+        stats.queued -= 1
+        stats.running += 1
+        stats.waits.append(started - queued_at)
+    failed = False
+    try:
+        return fn(*args)
+    except Exception:
+        failed = True
+        raise
+    finally:
+        with _lock:
+            stats.running -= 1
+            stats.finished += 1
+            stats.errors += failed
+            stats.runs.append(time.monotonic() - started)
+
+
+def submit(name, workers, fn, *args):
+    """Run ``fn(*args)`` in the ``name`` pool now; False if there are no workers."""
+    if workers <= 0:
+        return False
+    pool = _pool(name, workers)
+    with _lock:
+        _stats[name].queued += 1
+    pool.submit(_run, name, fn, args, time.monotonic())
+    return True
+
+
+def submit_on_commit(name, workers, fn, *args):
+    """Run ``fn(*args)`` in the ``name`` pool once the transaction commits; False if there are no workers."""
+    if workers <= 0:
+        return False
+    transaction.on_commit(partial(submit, name, workers, fn, *args))
+    return True
+
+
+def submit_later(name, workers, delay, fn, *args):
+    """Run ``fn(*args)`` in the ``name`` pool after ``delay`` seconds; False if there are no workers."""
+    if workers <= 0:
+        return False
+    _pool(name, workers)
+
+    def fire():
+        with _lock:
+            _stats[name].scheduled -= 1
+        submit(name, workers, fn, *args)
+
+    timer = threading.Timer(delay, fire)
+    timer.daemon = True
+    with _lock:
+        _stats[name].scheduled += 1
+    timer.start()
+    return True
+
+
+def _percentiles(samples):
+    if not samples:
+        return {'p50_ms': None, 'p95_ms': None, 'max_ms': None}
+    values = sorted(samples)
+
+    def ms(q):
+        return round(1000 * values[min(len(values) - 1, int(q * len(values)))], 1)
+
+    return {'p50_ms': ms(0.5), 'p95_ms': ms(0.95), 'max_ms': ms(1)}
+
+
+def pool_stats():
+    """Queue depth and latency of every pool started in this process."""
+    with _lock:
+        return {
+            name: {
+                'workers': stats.workers,
+                'queued': stats.queued,
+                'running': stats.running,
+                'scheduled': stats.scheduled,
+                'finished': stats.finished,
+                'errors': stats.errors,
+                'wait': _percentiles(stats.waits),
+                'run': _percentiles(stats.runs),
+            }
+            for name, stats in _stats.items()
+        }
+
+
+def process_pool(name, processes):
+    """The ``name`` process pool, created on first use."""
+    with _lock:
+        if name not in _process_pools:
+            # Spawned, not forked: the web process has threads and open
+            # connections, and the renderers need neither Django nor the ORM.
+            _process_pools[name] = ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _process_pools[name]
+
+
+def discard_process_pool(name):
+    """Drop a broken process pool; the next process_pool() call starts a new one."""
+    with _lock:
+        pool = _process_pools.pop(name, None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
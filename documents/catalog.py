@@ -0,0 +1,273 @@
+"""
+Catalog / price-list PDF export.
+
+Items are read with ``.iterator()`` and drawn on a ReportLab canvas, each
+thumbnail downscaled with Pillow to a small JPEG first. A canvas keeps its
+pages (and their images) in memory until save(), so a 20k-item catalog is
+drawn in parts of PART_PAGES pages: each part is saved to a temporary file
+when it is full, and the parts are merged at the end (documents/pdf_common.py,
+which also supplies the fonts). Text is in the certificate's brand colours.
+
+Exports run in a small background thread pool after the request commits
+(CATALOG_EXPORT_WORKERS); with no workers, or after a restart, the
+build_catalogs command picks up pending exports.
+"""
+import logging
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, ImageOps
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+
+from inventory.models import JewelryItem
+
+from .background import submit_on_commit
+from .models import CatalogExport
+from .pdf_common import fit_text, font_paths, merge_parts, part_canvas, register_fonts
+
+logger = logging.getLogger(__name__)
+
+ITEM_CHUNK_SIZE = 500
+PROGRESS_EVERY = 500
+# Pages drawn on one canvas before it is saved to a temporary part file.
+PART_PAGES = 50
+# Thumbnail size in pixels; the 96pt box then prints at about 150 dpi.
+THUMBNAIL_PX = 200
+THUMBNAIL_QUALITY = 75
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 36
+BAND_HEIGHT = 48
+COLUMNS, ROWS = 3, 4
+GAP = 6
+THUMB = 96
+CARD_WIDTH = (PAGE_WIDTH - 2 * MARGIN - (COLUMNS - 1) * GAP) / COLUMNS
+GRID_TOP = PAGE_HEIGHT - MARGIN - BAND_HEIGHT - 30
+GRID_BOTTOM = MARGIN + 10
+ROW_HEIGHT = (GRID_TOP - GRID_BOTTOM) / ROWS
+
+# Brand colours of the certificate (documents/pdf_generator.py), as RGB fractions.
+BRAND_BG = (0.071, 0.043, 0.0)
+BRAND_TEXT = (1.0, 0.882, 0.0)
+BLACK = (0, 0, 0)
+GREY = (0.45, 0.45, 0.45)
+LIGHT = (0.88, 0.88, 0.88)
+
+ITEM_FIELDS = ('sku', 'name', 'metal', 'purity', 'weight_grams', 'sale_price', 'image', 'category__name')
+METAL_LABELS = dict(JewelryItem.METAL_CHOICES)
+
+
+def thumbnail(name):
+    """Downscaled JPEG of a stored image as ``(data, width, height)``, or None."""
+    if not name:
+        return None
+    try:
+        with default_storage.open(name, 'rb') as fh:
+            image = Image.open(fh)
+            # Let the JPEG decoder scale down while decoding instead of
+            # expanding the full-size photo in memory first.
+            image.draft('RGB', (THUMBNAIL_PX, THUMBNAIL_PX))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((THUMBNAIL_PX, THUMBNAIL_PX))
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+            out = BytesIO()
+            image.save(out, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+            return out.getvalue(), image.width, image.height
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+class CatalogPdf:
+    """Lays out item cards, three by four per page, a new page per category."""
+
+    def __init__(self, fh, title, include_prices=True):
+        self.fh = fh
+        self.title = ' '.join(title.split())
+        self.include_prices = include_prices
+        self.regular, self.bold = register_fonts(font_paths())
+        self.parts = []
+        self.canvas = None
+        self.part_pages = 0
+        self.pages = 0
+        self.slot = 0
+        self.category = None
+
+    # Drawing primitives on the current page.
+
+    def _text(self, x, y, text, bold=False, size=8, color=BLACK, align='left'):
+        c = self.canvas
+        c.setFillColorRGB(*color)
+        c.setFont(self.bold if bold else self.regular, size)
+        text = ' '.join(str(text).split())
+        if align == 'right':
+            c.drawRightString(x, y, text)
+        else:
+            c.drawString(x, y, text)
+
+    def _fit(self, text, bold, size, width):
+        return fit_text(text, self.bold if bold else self.regular, size, width)
+
+    def _rect(self, x, y, width, height, fill=None, stroke=None):
+        c = self.canvas
+        if fill:
+            c.setFillColorRGB(*fill)
+            c.rect(x, y, width, height, stroke=0, fill=1)
+        if stroke:
+            c.setStrokeColorRGB(*stroke)
+            c.setLineWidth(0.5)
+            c.rect(x, y, width, height, stroke=1, fill=0)
+
+    def _image(self, thumb, x, y, box):
+        data, width, height = thumb
+        scale = min(box / width, box / height)
+        w, h = width * scale, height * scale
+        self.canvas.drawImage(ImageReader(BytesIO(data)), x + (box - w) / 2, y + (box - h) / 2, w, h)
+
+    # Pages and parts.
+
+    def _finish_part(self):
+        self.canvas.save()
+        self.parts[-1].seek(0)
+        self.canvas, self.part_pages = None, 0
+
+    def _start_page(self, continued=False):
+        if self.canvas is not None:
+            self.canvas.showPage()
+            if self.part_pages == PART_PAGES:
+                self._finish_part()
+        if self.canvas is None:
+            self.parts.append(tempfile.TemporaryFile())
+            self.canvas = part_canvas(self.parts[-1], A4)
+        self.pages += 1
+        self.part_pages += 1
+        self.slot = 0
+        top = PAGE_HEIGHT - MARGIN
+        self._rect(MARGIN, top - BAND_HEIGHT, PAGE_WIDTH - 2 * MARGIN, BAND_HEIGHT, fill=BRAND_BG)
+        self._text(MARGIN + 14, top - 30, 'Michaello', True, 20, BRAND_TEXT)
+        self._text(MARGIN + 120, top - 29, 'JEWELLERY', False, 11, BRAND_TEXT)
+        self._text(PAGE_WIDTH - MARGIN - 14, top - 29, self.title, False, 10, BRAND_TEXT, align='right')
+        heading = self.category + (' (continued)' if continued else '')
+        self._text(MARGIN, top - BAND_HEIGHT - 20, heading, True, 13)
+        self._text(PAGE_WIDTH - MARGIN, MARGIN - 16, f'Page {self.pages}', False, 8, GREY, align='right')
+        if self.include_prices:
+            self._text(MARGIN, MARGIN - 16, 'Prices in EUR incl. VAT, subject to change.', False, 8, GREY)
+
+    def add_item(self, row, thumb):
+        category = row['category__name'] or 'Uncategorised'
+        if category != self.category:
+            self.category = category
+            self._start_page()
+        elif self.slot == COLUMNS * ROWS:
+            self._start_page(continued=True)
+
+        column, line = self.slot % COLUMNS, self.slot // COLUMNS
+        self.slot += 1
+        x = MARGIN + column * (CARD_WIDTH + GAP)
+        top = GRID_TOP - line * ROW_HEIGHT
+        self._rect(x, top - ROW_HEIGHT + GAP, CARD_WIDTH, ROW_HEIGHT - GAP, stroke=LIGHT)
+
+        box_x, box_y = x + (CARD_WIDTH - THUMB) / 2, top - 6 - THUMB
+        if thumb:
+            self._image(thumb, box_x, box_y, THUMB)
+        else:
+            self._rect(box_x, box_y, THUMB, THUMB, fill=(0.96, 0.96, 0.96))
+            self._text(box_x + THUMB / 2 - 16, box_y + THUMB / 2 - 3, 'No image', False, 7, GREY)
+
+        width = CARD_WIDTH - 12
+        y = box_y - 13
+        self._text(x + 6, y, self._fit(row['sku'], True, 9, width), True, 9)
+        self._text(x + 6, y - 11, self._fit(row['name'], False, 8, width), False, 8)
+        details = [METAL_LABELS.get(row['metal'], row['metal'])]
+        if row['purity'] and row['purity'] != 'N/A':
+            details.append(row['purity'])
+        if row['weight_grams']:
+            details.append(f"{row['weight_grams']} g")
+        self._text(x + 6, y - 21, self._fit(' · '.join(details), False, 7.5, width), False, 7.5, GREY)
+        if self.include_prices:
+            self._text(x + 6, y - 34, f"€{row['sale_price']:,.2f}", True, 10)
+
+    def close(self):
+        """Finish the last page and merge the parts into the output file; returns the page count."""
+        if self.canvas is None:
+            self.category = 'No items'
+            self._start_page()
+        self.canvas.showPage()
+        self._finish_part()
+        try:
+            merge_parts(self.parts, self.fh, self.title)
+        finally:
+            for part in self.parts:
+                part.close()
+        return self.pages
+
+
+def catalog_items(export):
+    items = JewelryItem.objects.all()
+    if not export.include_inactive:
+        items = items.filter(is_active=True)
+    if export.category_id:
+        items = items.filter(category_id=export.category_id)
+    return items.order_by(F('category__name').asc(nulls_last=True), 'sku')
+
+
+def build_catalog(export):
+    """Render ``export`` into its pdf_file and mark it done."""
+    items = catalog_items(export)
+    total = items.count()
+    CatalogExport.objects.filter(pk=export.pk).update(total_items=total)
+    title = f"{export.category.name if export.category_id else 'Catalogue'} {timezone.localdate():%B %Y}"
+
+    with tempfile.TemporaryFile() as fh:
+        document = CatalogPdf(fh, title, include_prices=export.include_prices)
+        rendered = 0
+        for row in items.values(*ITEM_FIELDS).iterator(chunk_size=ITEM_CHUNK_SIZE):
+            document.add_item(row, thumbnail(row['image']))
+            rendered += 1
+            if rendered % PROGRESS_EVERY == 0:
+                CatalogExport.objects.filter(pk=export.pk).update(rendered_items=rendered)
+        pages = document.close()
+        fh.seek(0)
+        export.pdf_file.save(f'catalog-{timezone.now():%Y%m%d-%H%M%S}-{export.pk}.pdf', File(fh), save=False)
+
+    export.status = 'done'
+    export.total_items = total
+    export.rendered_items = rendered
+    export.pages = pages
+    export.finished_at = timezone.now()
+    export.save(update_fields=['pdf_file', 'status', 'total_items', 'rendered_items', 'pages', 'finished_at'])
+    return export
+
+
+def run_export(pk):
+    """Build a pending export; safe to call from any thread or process."""
+    try:
+        # Claim it, so the pool and build_catalogs never build the same export.
+        if not CatalogExport.objects.filter(pk=pk, status='pending').update(status='running'):
+            return
+        build_catalog(CatalogExport.objects.select_related('category').get(pk=pk))
+    except Exception as exc:
+        logger.exception('Catalog export %s failed', pk)
+        CatalogExport.objects.filter(pk=pk).update(status='failed', error=str(exc)[:1000], finished_at=timezone.now())
+    finally:
+        # Pool threads each hold their own connection; don't leave it open
+        # between jobs.
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def request_export(export):
+    """Queue ``export`` for building once the current transaction commits."""
+    submit_on_commit('catalog-export', settings.CATALOG_EXPORT_WORKERS, run_export, export.pk)
@@ -0,0 +1,201 @@
+"""
+Certificate PDFs.
+
+Creating a certificate only saves the row; its PDF is rendered afterwards in
+a background thread pool (CERTIFICATE_PDF_WORKERS) and the certificate's
+render_status goes from pending to ready. A render that raises is retried
+after CERTIFICATE_RENDER_RETRY_DELAY seconds, doubling each time, until
+CERTIFICATE_RENDER_ATTEMPTS attempts have failed; the certificate is then
+marked failed with the error. Emails are sent from a pool of their own,
+rendering the PDF first if it is not ready yet.
+
+Certificates left pending by a restart (or with no workers) are rendered by
+the render_certificates command, or on demand when the PDF is downloaded.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from crm.models import Customer
+from notifications.email_service import send_certificate_email
+
+from .background import LATENCY_SAMPLES, pool_stats, submit, submit_later, submit_on_commit
+from .models import Certificate
+from .pdf_generator import generate_certificate_pdf
+from .verification import clear_verify_cache
+
+logger = logging.getLogger(__name__)
+
+POOL = 'certificate-pdf'
+EMAIL_POOL = 'certificate-email'
+
+
+def _load(certificate_id):
+    return (
+        Certificate.objects.select_related('item__category', 'piece', 'customer', 'invoice__customer')
+        .filter(pk=certificate_id).first()
+    )
+
+
+def _render_state(certificate_id):
+    return (
+        Certificate.objects.filter(pk=certificate_id)
+        .values('pdf_file', 'render_status', 'rendered_at', 'updated_at').first()
+    )
+
+
+def render_certificate(certificate):
+    """
+    Render and store the PDF of ``certificate`` and mark it ready.
+
+    A download, an email and the background job can render the same
+    certificate at once. The new PDF is only stored if the row still holds
+    the file and rendered_at this render started from; a render that lost
+    deletes the file it wrote and returns the stored PDF instead.
+    """
+    seen = _render_state(certificate.pk)
+    generate_certificate_pdf(certificate, save=False)
+    pdf = certificate.pdf_file
+    while seen is not None:
+        now = timezone.now()
+        # update() sends no post_save, so the verification cache is cleared here.
+        stored = Certificate.objects.filter(
+            pk=certificate.pk, pdf_file=seen['pdf_file'], rendered_at=seen['rendered_at'],
+        ).update(pdf_file=pdf.name, render_status='ready', render_error='', rendered_at=now, updated_at=now)
+        if stored:
+            certificate.render_status = 'ready'
+            certificate.render_error = ''
+            certificate.rendered_at = certificate.updated_at = now
+            clear_verify_cache()
+            if seen['pdf_file'] and seen['pdf_file'] != pdf.name:
+                pdf.storage.delete(seen['pdf_file'])
+            return pdf
+        seen = _render_state(certificate.pk)
+        if seen and seen['render_status'] == 'ready' and seen['pdf_file'] and pdf.storage.exists(seen['pdf_file']):
+            break
+
+    # Another render stored its PDF first (or the certificate was deleted).
+    pdf.storage.delete(pdf.name)
+    if seen is not None:
+        certificate.pdf_file = seen['pdf_file']
+        certificate.render_status = 'ready'
+        certificate.render_error = ''
+        certificate.rendered_at = seen['rendered_at']
+        certificate.updated_at = seen['updated_at']
+    return certificate.pdf_file
+
+
+def ensure_certificate_pdf(certificate):
+    """The PDF of ``certificate``, rendered first if it is not ready or its file has gone missing."""
+    pdf = certificate.pdf_file
+    if certificate.render_status != 'ready' or not pdf or not pdf.storage.exists(pdf.name):
+        render_certificate(certificate)
+    return certificate.pdf_file
+
+
+def _render_job(certificate_id):
+    try:
+        certificate = _load(certificate_id)
+        # Already rendered by a download or an email while this job waited.
+        if certificate is None or certificate.render_status == 'ready':
+            return
+        started = time.monotonic()
+        try:
+            render_certificate(certificate)
+        except Exception as e:
+            record_render_failure(certificate, e)
+        else:
+            logger.info('Rendered certificate %s in %.0f ms', certificate.certificate_number,
+                        1000 * (time.monotonic() - started))
+    except Exception:
+        logger.exception('Rendering the PDF of certificate %s failed', certificate_id)
+    finally:
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def record_render_failure(certificate, error, retry_later=True):
+    """Count a failed render; until the attempts run out it stays pending and (``retry_later``) is retried."""
+    attempts = certificate.render_attempts + 1
+    retry = attempts < settings.CERTIFICATE_RENDER_ATTEMPTS
+    Certificate.objects.filter(pk=certificate.pk).update(
+        render_attempts=attempts, render_status='pending' if retry else 'failed',
+        render_error=f'{type(error).__name__}: {error}', updated_at=timezone.now(),
+    )
+    if not retry or not retry_later:
+        logger.error('Rendering certificate %s failed (attempt %d)', certificate.certificate_number,
+                     attempts, exc_info=error)
+        return
+    delay = settings.CERTIFICATE_RENDER_RETRY_DELAY * 2 ** (attempts - 1)
+    logger.warning('Rendering certificate %s failed (attempt %d), retrying in %ss: %s',
+                   certificate.certificate_number, attempts, delay, error)
+    submit_later(POOL, settings.CERTIFICATE_PDF_WORKERS, delay, _render_job, certificate.pk)
+
+
+def queue_certificate_pdf(certificate_id):
+    """Render a certificate's PDF in the background once the current transaction commits."""
+    return submit_on_commit(POOL, settings.CERTIFICATE_PDF_WORKERS, _render_job, certificate_id)
+
+
+def retry_certificate_pdf(certificate_id):
+    """Reset a failed certificate to pending and queue it again."""
+    Certificate.objects.filter(pk=certificate_id).update(
+        render_status='pending', render_attempts=0, render_error='', updated_at=timezone.now(),
+    )
+    return submit(POOL, settings.CERTIFICATE_PDF_WORKERS, _render_job, certificate_id)
+
+
+def _email_job(certificate_id, customer_id):
+    try:
+        certificate = _load(certificate_id)
+        customer = Customer.objects.filter(pk=customer_id).first()
+        if certificate is None or customer is None:
+            return
+        ensure_certificate_pdf(certificate)
+        if not send_certificate_email(certificate, customer):
+            logger.error('Emailing certificate %s to %s failed', certificate.certificate_number, customer.email)
+    except Exception:
+        logger.exception('Emailing certificate %s failed', certificate_id)
+    finally:
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def queue_certificate_email(certificate, customer):
+    """Email ``certificate`` to ``customer`` from the background pool; False if there are no workers."""
+    return submit(EMAIL_POOL, settings.CERTIFICATE_PDF_WORKERS, _email_job, certificate.pk, customer.pk)
+
+
+def render_stats():
+    """
+    Certificates waiting or failed, how long new certificates took to become
+    ready over the last hour (all processes), and this process's pools.
+    """
+    counts = dict(
+        Certificate.objects.exclude(render_status='ready').values_list('render_status')
+        .annotate(n=Count('pk')).order_by()
+    )
+    oldest = (
+        Certificate.objects.filter(render_status='pending').order_by('created_at')
+        .values_list('created_at', flat=True).first()
+    )
+    since = timezone.now() - timedelta(hours=1)
+    ready = sorted(
+        (rendered - created).total_seconds()
+        for created, rendered in Certificate.objects.filter(created_at__gte=since, render_status='ready')
+        .order_by('-created_at').values_list('created_at', 'rendered_at')[:LATENCY_SAMPLES]
+    )
+    return {
+        'pending': counts.get('pending', 0),
+        'failed': counts.get('failed', 0),
+        'oldest_pending_seconds': round((timezone.now() - oldest).total_seconds()) if oldest else None,
+        'ready_last_hour': len(ready),
+        'time_to_ready_p50_seconds': round(ready[len(ready) // 2], 2) if ready else None,
+        'time_to_ready_p95_seconds': round(ready[min(len(ready) - 1, int(0.95 * len(ready)))], 2) if ready else None,
+        'pools': {name: stats for name, stats in pool_stats().items() if name in (POOL, EMAIL_POOL)},
+    }
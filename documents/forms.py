@@ -1,6 +1,7 @@
 from django import forms
-from .models import Certificate
-from inventory.models import JewelryItem
+from .models import Certificate, CatalogExport
+from .label_pdf import LAYOUTS, SYMBOLOGIES
+from inventory.models import Category, JewelryItem, SerializedPiece
 from sales.models import Invoice
 from crm.models import Customer
 
@@ -8,9 +9,10 @@ from crm.models import Customer
 class CertificateForm(forms.ModelForm):
     class Meta:
         model = Certificate
-        fields = ['item', 'invoice', 'customer']
+        fields = ['item', 'piece', 'invoice', 'customer']
         widgets = {
             'item': forms.Select(attrs={'class': 'form-select'}),
+            'piece': forms.Select(attrs={'class': 'form-select'}),
             'invoice': forms.Select(attrs={'class': 'form-select'}),
             'customer': forms.Select(attrs={'class': 'form-select'}),
         }
@@ -18,6 +20,8 @@ class CertificateForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['item'].queryset = JewelryItem.objects.filter(is_active=True)
+        self.fields['piece'].queryset = SerializedPiece.objects.filter(certificates__isnull=True).select_related('item')
+        self.fields['piece'].required = False
         self.fields['invoice'].queryset = Invoice.objects.filter(status='paid')
         self.fields['invoice'].required = False
         self.fields['customer'].queryset = Customer.objects.all()
@@ -32,4 +36,60 @@ class CertificateForm(forms.ModelForm):
         if invoice and customer:
             raise forms.ValidationError('Please select either an invoice or a customer, not both.')
         
+        item = cleaned_data.get('item')
+        piece = cleaned_data.get('piece')
+        if piece and item and piece.item_id != item.pk:
+            raise forms.ValidationError('The selected piece belongs to a different item.')
+        
+        return cleaned_data
+
+
+class CatalogExportForm(forms.ModelForm):
+    class Meta:
+        model = CatalogExport
+        fields = ['category', 'include_prices', 'include_inactive']
+        widgets = {
+            'category': forms.Select(attrs={'class': 'form-select'}),
+            'include_prices': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'include_inactive': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['category'].queryset = Category.objects.all()
+        self.fields['category'].empty_label = 'All categories'
+
+
+class LabelSheetForm(forms.Form):
+    COPIES_CHOICES = [
+        ('item', 'One label per item'),
+        ('stock', 'One label per unit in stock'),
+    ]
+
+    layout = forms.ChoiceField(
+        choices=[(name, layout.label) for name, layout in LAYOUTS.items()],
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    symbology = forms.ChoiceField(
+        label='Barcode', choices=SYMBOLOGIES, widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    copies = forms.ChoiceField(
+        choices=COPIES_CHOICES, initial='item', required=False, widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    include_prices = forms.BooleanField(
+        initial=True, required=False, widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+    skip = forms.IntegerField(
+        label='Skip labels', initial=0, min_value=0, required=False,
+        help_text='Positions already used on the first sheet.',
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        layout = cleaned_data.get('layout')
+        skip = cleaned_data.get('skip') or 0
+        if layout and skip >= LAYOUTS[layout].per_page:
+            self.add_error('skip', f'A sheet has only {LAYOUTS[layout].per_page} labels.')
+        cleaned_data['skip'] = skip
         return cleaned_data
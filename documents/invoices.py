@@ -0,0 +1,224 @@
+"""
+Invoice PDFs.
+
+An invoice's PDF is rendered by pdf_generator.render_invoice_pdf from a plain
+dict of its data and stored in InvoicePdf, keyed on the updated_at of the
+invoice and of its customer: any save of either makes the stored PDF stale.
+Invoice saves queue a re-render in a background thread once they commit
+(INVOICE_PDF_WORKERS), so downloads and emails are normally served straight
+from storage; a stale or missing PDF, e.g. after the customer's address
+changed, is rendered on demand.
+
+A month's invoices are bundled as a streamed ZIP. Invoices are read in
+batches, stale PDFs in a batch are rendered in a process pool
+(INVOICE_PDF_PROCESSES) and stored, and every PDF is compressed into the
+archive and sent on before the next batch is read, so at most one batch of
+PDFs is held in memory, never the archive.
+"""
+import csv
+import io
+import logging
+import zipfile
+from collections import defaultdict
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.utils import timezone
+
+from sales.models import Invoice, InvoiceLine
+from sales.snapshots import serialize_lines
+
+from .background import discard_process_pool, process_pool, submit_on_commit
+from .models import InvoicePdf
+from .pdf_generator import render_invoice_pdf
+
+logger = logging.getLogger(__name__)
+
+MONTH_BATCH_SIZE = 100
+
+
+def invoice_pdf_data(invoice, lines):
+    """Everything render_invoice_pdf needs, as picklable plain values."""
+    customer = invoice.customer
+    return {
+        'number': invoice.invoice_number,
+        'date': f'{timezone.localtime(invoice.created_at):%b %d, %Y}',
+        'status': invoice.get_status_display(),
+        'customer': {
+            'name': customer.name,
+            'email': customer.email,
+            'address': customer.address,
+        } if customer else None,
+        'lines': serialize_lines(lines),
+        'subtotal': str(invoice.subtotal),
+        'tax': str(invoice.tax),
+        'discount': str(invoice.discount),
+        'total': str(invoice.total),
+        'notes': invoice.notes,
+    }
+
+
+def _current(invoice):
+    """The stored PDF of ``invoice`` if it is up to date (``pdf`` may be preloaded)."""
+    record = getattr(invoice, 'pdf', None)
+    return record if record is not None and record.is_current(invoice) else None
+
+
+def _read(record):
+    try:
+        with record.pdf_file.open('rb') as fh:
+            return fh.read()
+    except OSError:
+        return None
+
+
+def store_invoice_pdf(invoice, pdf):
+    """Save rendered ``pdf`` bytes as the current PDF of ``invoice``, replacing the previous file."""
+    previous = InvoicePdf.objects.filter(pk=invoice.pk).values_list('pdf_file', flat=True).first()
+    stored = InvoicePdf(invoice=invoice).pdf_file
+    stored.save(f'{invoice.invoice_number}-{invoice.updated_at:%Y%m%d%H%M%S%f}.pdf', ContentFile(pdf), save=False)
+    # A download and the background job may store the same invoice at once.
+    customer = invoice.customer
+    record, _ = InvoicePdf.objects.update_or_create(
+        invoice=invoice, defaults={
+            'pdf_file': stored.name, 'invoice_updated_at': invoice.updated_at,
+            'customer_updated_at': customer.updated_at if customer else None,
+        },
+    )
+    if previous and previous != stored.name:
+        stored.storage.delete(previous)
+    invoice.pdf = record
+    return record
+
+
+def render_invoice(invoice):
+    """Render and store the PDF of ``invoice``; returns the PDF bytes."""
+    pdf = render_invoice_pdf(invoice_pdf_data(invoice, invoice.lines.select_related('item').order_by('pk')))
+    store_invoice_pdf(invoice, pdf)
+    return pdf
+
+
+def current_invoice_pdf(invoice):
+    """The up-to-date InvoicePdf of ``invoice``, rendered first if it is stale or missing."""
+    record = _current(invoice)
+    if record is None or not record.pdf_file.storage.exists(record.pdf_file.name):
+        render_invoice(invoice)
+        record = invoice.pdf
+    return record
+
+
+def get_invoice_pdf(invoice):
+    """PDF bytes of ``invoice``, from storage while they are current."""
+    record = _current(invoice)
+    pdf = _read(record) if record else None
+    return pdf if pdf is not None else render_invoice(invoice)
+
+
+def _render_job(invoice_id):
+    try:
+        invoice = Invoice.objects.select_related('customer', 'pdf').filter(pk=invoice_id).first()
+        # Several saves in one request queue several jobs; the first renders
+        # the latest version and the rest find it current.
+        if invoice is not None and _current(invoice) is None:
+            render_invoice(invoice)
+    except Exception:
+        logger.exception('Rendering the PDF of invoice %s failed', invoice_id)
+    finally:
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def queue_invoice_pdf(invoice_id):
+    """Re-render an invoice's PDF in the background once the current transaction commits."""
+    submit_on_commit('invoice-pdf', settings.INVOICE_PDF_WORKERS, _render_job, invoice_id)
+
+
+def _render_many(invoices):
+    """Render and store the PDFs of ``invoices``; returns ``{invoice_id: pdf}``."""
+    if not invoices:
+        return {}
+    lines = defaultdict(list)
+    for line in InvoiceLine.objects.filter(invoice__in=invoices).select_related('item').order_by('pk'):
+        lines[line.invoice_id].append(line)
+    data = [invoice_pdf_data(invoice, lines[invoice.pk]) for invoice in invoices]
+
+    pdfs = None
+    if settings.INVOICE_PDF_PROCESSES > 1 and len(data) > 1:
+        try:
+            pool = process_pool('invoice-pdf', settings.INVOICE_PDF_PROCESSES)
+            pdfs = list(pool.map(render_invoice_pdf, data, chunksize=max(1, len(data) // (4 * settings.INVOICE_PDF_PROCESSES))))
+        except BrokenProcessPool:
+            logger.exception('Invoice PDF process pool broke; rendering in-process')
+            discard_process_pool('invoice-pdf')
+    if pdfs is None:
+        pdfs = [render_invoice_pdf(item) for item in data]
+
+    for invoice, pdf in zip(invoices, pdfs):
+        store_invoice_pdf(invoice, pdf)
+    return {invoice.pk: pdf for invoice, pdf in zip(invoices, pdfs)}
+
+
+def month_invoices(year, month):
+    """Issued (non-draft) invoices created in ``year``-``month``, local time."""
+    start = timezone.make_aware(datetime(year, month, 1))
+    end = timezone.make_aware(datetime(year + month // 12, month % 12 + 1, 1))
+    return Invoice.objects.filter(created_at__gte=start, created_at__lt=end).exclude(status='draft')
+
+
+class _ZipSink:
+    """Write-only file for ZipFile; take() hands out what was written since the last call."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_month_zip(year, month):
+    """
+    Yield a ZIP of every issued invoice of the month as PDF, plus an
+    ``invoices-YYYY-MM.csv`` summary, in chunks of about one PDF.
+    """
+    sink = _ZipSink()
+    summary = io.StringIO()
+    writer = csv.writer(summary)
+    writer.writerow(['invoice_number', 'date', 'status', 'customer', 'subtotal', 'tax', 'discount', 'total'])
+
+    ids = list(month_invoices(year, month).order_by('created_at', 'pk').values_list('pk', flat=True))
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for start in range(0, len(ids), MONTH_BATCH_SIZE):
+            batch = list(
+                Invoice.objects.filter(pk__in=ids[start:start + MONTH_BATCH_SIZE])
+                .select_related('customer', 'pdf').order_by('created_at', 'pk')
+            )
+            rendered = _render_many([invoice for invoice in batch if _current(invoice) is None])
+            for invoice in batch:
+                pdf = rendered.get(invoice.pk) or _read(invoice.pdf)
+                if pdf is None:
+                    # Listed as current but the file has gone missing.
+                    pdf = render_invoice(invoice)
+                created = timezone.localtime(invoice.created_at)
+                entry = zipfile.ZipInfo(f'{invoice.invoice_number}.pdf', date_time=created.timetuple()[:6])
+                entry.compress_type = zipfile.ZIP_DEFLATED
+                archive.writestr(entry, pdf)
+                writer.writerow([
+                    invoice.invoice_number, f'{created:%Y-%m-%d}', invoice.status,
+                    invoice.customer.name if invoice.customer else '',
+                    invoice.subtotal, invoice.tax, invoice.discount, invoice.total,
+                ])
+                yield sink.take()
+        archive.writestr(f'invoices-{year}-{month:02d}.csv', summary.getvalue())
+    yield sink.take()
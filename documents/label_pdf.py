@@ -0,0 +1,161 @@
+"""
+Price tag / label sheets.
+
+Labels are laid out on standard sheet layouts (LAYOUTS) with a Code128 or QR
+barcode of the piece serial or SKU, the name, metal and purity and the
+price. Pages are drawn on a ReportLab canvas, the barcodes with
+reportlab.graphics (createBarcodeDrawing, rendered by renderPDF) into canvas
+forms: each distinct code in a run of pages is drawn once and every label
+with that code reuses the form, so a run of tags for one SKU costs one
+barcode, not one per tag. Text is set in the fonts of documents/pdf_common.py.
+
+render_chunk() turns a run of pages into a complete PDF; it needs neither
+Django nor the database, so large runs are split into chunks rendered in
+worker processes and merged in order by documents/labels.py.
+"""
+from io import BytesIO
+from typing import NamedTuple
+
+from reportlab.graphics import renderPDF
+from reportlab.graphics.barcode import createBarcodeDrawing
+from reportlab.lib.pagesizes import A4, letter
+from reportlab.lib.units import inch, mm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from .pdf_common import fit_text, part_canvas, register_fonts
+
+SYMBOLOGIES = (('code128', 'Code 128'), ('qr', 'QR code'))
+QR_BORDER = 2
+
+
+class Layout(NamedTuple):
+    label: str
+    page_width: float
+    page_height: float
+    columns: int
+    rows: int
+    width: float
+    height: float
+    left: float
+    top: float
+    h_pitch: float
+    v_pitch: float
+
+    @property
+    def per_page(self):
+        return self.columns * self.rows
+
+    def origin(self, slot):
+        """Bottom-left corner of label ``slot`` (0 is top left, row by row)."""
+        column, row = slot % self.columns, slot // self.columns
+        return self.left + column * self.h_pitch, self.page_height - self.top - row * self.v_pitch - self.height
+
+
+LAYOUTS = {
+    'l7651': Layout('Avery L7651: 65 per A4 sheet, 38.1 × 21.2 mm', *A4, 5, 13,
+                    38.1 * mm, 21.2 * mm, 4.7 * mm, 10.7 * mm, 40.6 * mm, 21.2 * mm),
+    'l7160': Layout('Avery L7160: 21 per A4 sheet, 63.5 × 38.1 mm', *A4, 3, 7,
+                    63.5 * mm, 38.1 * mm, 7.2 * mm, 15.1 * mm, 66.0 * mm, 38.1 * mm),
+    '5160': Layout('Avery 5160: 30 per Letter sheet, 2⅝ × 1 in', *letter, 3, 10,
+                   2.625 * inch, 1 * inch, 0.1875 * inch, 0.5 * inch, 2.75 * inch, 1 * inch),
+    '5167': Layout('Avery 5167: 80 per Letter sheet, 1¾ × ½ in', *letter, 4, 20,
+                   1.75 * inch, 0.5 * inch, 0.3 * inch, 0.5 * inch, 2.05 * inch, 0.5 * inch),
+}
+
+
+class Label(NamedTuple):
+    code: str       # barcode value: piece serial or SKU
+    name: str
+    details: str    # metal · purity
+    price: str
+
+
+def _metrics(layout):
+    """Padding, font size and leading for labels of ``layout``."""
+    pad = max(2.0, min(layout.width, layout.height) * 0.06)
+    size = max(5.0, min(9.0, layout.height / 7))
+    return pad, size, size * 1.2
+
+
+def _code128_lines(layout):
+    return 1 if layout.height < 54 else 2
+
+
+def barcode_box(layout, symbology):
+    """``(x, y, width, height)`` of the barcode relative to the label's bottom-left corner."""
+    pad, size, lead = _metrics(layout)
+    if symbology == 'qr':
+        side = layout.height - 2 * pad
+        return pad, pad, side, side
+    # Code 128: the code and text lines on top, the barcode filling the rest.
+    bar_top = layout.height - pad - size - _code128_lines(layout) * lead - size * 0.4
+    return pad, pad, layout.width - 2 * pad, bar_top - pad
+
+
+def barcode_drawing(code, symbology, width, height):
+    """A ``width`` × ``height`` Drawing of ``code``, quiet zones included."""
+    if symbology == 'qr':
+        return createBarcodeDrawing('QR', value=code, width=width, height=height, barBorder=QR_BORDER)
+    return createBarcodeDrawing('Code128', value=code, width=width, height=height, humanReadable=False)
+
+
+def draw_label(c, layout, symbology, include_prices, fonts, label, x, y):
+    """The text of one label with its bottom-left corner at ``(x, y)``; the barcode is placed by the caller."""
+    regular, bold = fonts
+    pad, size, lead = _metrics(layout)
+    top = y + layout.height - pad - size
+    if symbology == 'qr':
+        text_x = x + 2 * pad + layout.height - 2 * pad
+        text_width = x + layout.width - pad - text_x
+        lines = [(label.code, bold), (label.name, regular), (label.details, regular)]
+        if include_prices:
+            lines.insert(1, (label.price, bold))
+        for i, (text, font) in enumerate(lines[:max(1, int((layout.height - 2 * pad) // lead))]):
+            c.setFont(font, size)
+            c.drawString(text_x, top - i * lead, fit_text(text, font, size, text_width))
+        return
+
+    text_width = layout.width - 2 * pad
+    price_width = stringWidth(label.price, bold, size) + pad if include_prices else 0
+    c.setFont(bold, size)
+    c.drawString(x + pad, top, fit_text(label.code, bold, size, text_width - price_width))
+    if include_prices:
+        c.drawRightString(x + layout.width - pad, top, label.price)
+    lines = [label.details] if _code128_lines(layout) == 1 else [label.name, label.details]
+    c.setFont(regular, size)
+    for i, text in enumerate(lines, 1):
+        c.drawString(x + pad, top - i * lead, fit_text(text, regular, size, text_width))
+
+
+def render_chunk(task):
+    """
+    Render one run of pages to PDF bytes. ``task`` is ``(layout, symbology,
+    include_prices, font_paths, slots)``: ``slots`` holds a Label or None
+    (left blank) per label position.
+    """
+    layout_name, symbology, include_prices, font_paths, slots = task
+    layout = LAYOUTS[layout_name]
+    fonts = register_fonts(font_paths)
+    box_x, box_y, box_width, box_height = barcode_box(layout, symbology)
+    out = BytesIO()
+    c = part_canvas(out, (layout.page_width, layout.page_height))
+    forms = {}
+    for start in range(0, len(slots), layout.per_page):
+        for slot, label in enumerate(slots[start:start + layout.per_page]):
+            if label is None:
+                continue
+            form = forms.get(label.code)
+            if form is None:
+                form = forms[label.code] = f'B{len(forms)}'
+                c.beginForm(form, 0, 0, box_width, box_height)
+                renderPDF.draw(barcode_drawing(label.code, symbology, box_width, box_height), c, 0, 0)
+                c.endForm()
+            x, y = layout.origin(slot)
+            draw_label(c, layout, symbology, include_prices, fonts, label, x, y)
+            c.saveState()
+            c.translate(x + box_x, y + box_y)
+            c.doForm(form)
+            c.restoreState()
+        c.showPage()
+    c.save()
+    return out.getvalue()
@@ -0,0 +1,123 @@
+"""
+Label sheets for the item list's selection or a goods receipt.
+
+The labels are collected here (one query for the items, one for their
+pieces), split into runs of CHUNK_PAGES pages and rendered by
+label_pdf.render_chunk, in LABEL_PROCESSES worker processes when there is
+more than one run. Each run is a complete PDF drawing each of its distinct
+barcodes once; the runs are merged, in order, into a temporary file.
+"""
+import logging
+import tempfile
+from collections import defaultdict
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from django.conf import settings
+
+from inventory.models import JewelryItem, SerializedPiece
+
+from .background import discard_process_pool, process_pool
+from .label_pdf import LAYOUTS, Label, render_chunk
+from .pdf_common import font_paths, merge_parts
+
+logger = logging.getLogger(__name__)
+
+CHUNK_PAGES = 25
+MAX_LABELS = 50000
+ITEM_FIELDS = ('pk', 'sku', 'name', 'metal', 'purity', 'sale_price', 'quantity_on_hand')
+METAL_LABELS = dict(JewelryItem.METAL_CHOICES)
+
+
+class TooManyLabels(Exception):
+    pass
+
+
+def _text(row):
+    details = METAL_LABELS.get(row['metal'], row['metal'])
+    if row['purity'] and row['purity'] != 'N/A':
+        details += f" · {row['purity']}"
+    return row['name'], details, f"€{row['sale_price']:,.2f}"
+
+
+def _pieces(item_ids, **filters):
+    serials = defaultdict(list)
+    rows = (
+        SerializedPiece.objects.filter(item_id__in=item_ids, **filters)
+        .order_by('item_id', 'sequence').values_list('item_id', 'serial')
+    )
+    for item_id, serial in rows.iterator(chunk_size=2000):
+        serials[item_id].append(serial)
+    return serials
+
+
+def item_labels(items, per_unit=False):
+    """
+    ``[(code, name, details, price)]`` for ``items``: one SKU label each, or
+    with ``per_unit`` one per unit on hand, using the serials of pieces in
+    stock first.
+    """
+    rows = list(items.values(*ITEM_FIELDS)[:MAX_LABELS + 1])
+    if len(rows) > MAX_LABELS:
+        raise TooManyLabels
+    if not per_unit:
+        return [(row['sku'], *_text(row)) for row in rows]
+
+    serials = _pieces(items.values('pk'), status='in_stock')
+    labels = []
+    for row in rows:
+        text = _text(row)
+        codes = serials.get(row['pk'], [])
+        codes = codes + [row['sku']] * max(0, row['quantity_on_hand'] - len(codes))
+        labels.extend((code, *text) for code in codes)
+        if len(labels) > MAX_LABELS:
+            raise TooManyLabels
+    return labels
+
+
+def receipt_labels(receipt):
+    """One label per unit of a goods receipt, with the serials of the pieces created for it."""
+    quantities = defaultdict(int)
+    for item_id, quantity in receipt.lines.exclude(item=None).values_list('item_id', 'quantity'):
+        quantities[item_id] += quantity
+    serials = _pieces(list(quantities), received_at=receipt.received_at)
+    labels = []
+    for row in JewelryItem.objects.filter(pk__in=list(quantities)).order_by('sku').values(*ITEM_FIELDS):
+        text = _text(row)
+        codes = serials.get(row['pk'], [])[:quantities[row['pk']]]
+        codes = codes + [row['sku']] * (quantities[row['pk']] - len(codes))
+        labels.extend((code, *text) for code in codes)
+    if len(labels) > MAX_LABELS:
+        raise TooManyLabels
+    return labels
+
+
+def _tasks(labels, layout_name, symbology, include_prices, skip):
+    per_chunk = LAYOUTS[layout_name].per_page * CHUNK_PAGES
+    fonts = font_paths()
+    slots = [None] * skip + [Label(*label) for label in labels]
+    for start in range(0, len(slots), per_chunk):
+        yield layout_name, symbology, include_prices, fonts, slots[start:start + per_chunk]
+
+
+def build_label_sheet(labels, layout, symbology='code128', include_prices=True, skip=0, title='Labels'):
+    """
+    Render ``labels`` (from item_labels or receipt_labels) onto sheets of
+    ``layout``, leaving the first ``skip`` positions of the first sheet
+    blank. Returns ``(file, pages)``: an open temporary file positioned at
+    the start of the PDF, and the page count.
+    """
+    tasks = list(_tasks(labels, layout, symbology, include_prices, skip))
+    chunks = None
+    if settings.LABEL_PROCESSES > 1 and len(tasks) > 1:
+        try:
+            chunks = list(process_pool('label-sheet', settings.LABEL_PROCESSES).map(render_chunk, tasks))
+        except BrokenProcessPool:
+            logger.exception('Label process pool broke; rendering in-process')
+            discard_process_pool('label-sheet')
+    if chunks is None:
+        chunks = map(render_chunk, tasks)
+    fh = tempfile.TemporaryFile()
+    pages = merge_parts((BytesIO(chunk) for chunk in chunks), fh, title)
+    fh.seek(0)
+    return fh, pages
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.catalog import run_export
+from documents.models import CatalogExport
+from inventory.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Build pending catalog PDF exports (for CATALOG_EXPORT_WORKERS=0, or exports left over from a restart).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--new', action='store_true', help='Queue a new export first.')
+        parser.add_argument('--category', help='Category name for --new (default: whole catalog).')
+        parser.add_argument('--no-prices', action='store_true', help='Leave prices out of the --new export.')
+        parser.add_argument('--include-inactive', action='store_true', help='Include inactive items in the --new export.')
+        parser.add_argument('--requeue-running', action='store_true',
+                            help='Also rebuild exports stuck as running (only when no web process is building).')
+
+    def handle(self, *args, **options):
+        if options['new']:
+            category = None
+            if options['category']:
+                category = Category.objects.filter(name=options['category']).first()
+                if category is None:
+                    raise CommandError(f"Category {options['category']} not found.")
+            CatalogExport.objects.create(
+                category=category,
+                include_prices=not options['no_prices'],
+                include_inactive=options['include_inactive'],
+            )
+        if options['requeue_running']:
+            CatalogExport.objects.filter(status='running').update(status='pending', rendered_items=0)
+
+        for pk in CatalogExport.objects.filter(status='pending').order_by('created_at').values_list('pk', flat=True):
+            run_export(pk)
+            export = CatalogExport.objects.get(pk=pk)
+            if export.status == 'done':
+                self.stdout.write(self.style.SUCCESS(
+                    f'{export}: {export.rendered_items} items on {export.pages} pages, {export.pdf_file.name}'
+                ))
+            elif export.status == 'failed':
+                self.stderr.write(f'{export}: failed: {export.error}')
@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from documents.certificates import record_render_failure, render_certificate, render_stats
+from documents.models import Certificate
+
+
+class Command(BaseCommand):
+    help = ('Render pending certificate PDFs (for CERTIFICATE_PDF_WORKERS=0, or certificates left pending by a '
+            'restart).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--failed', action='store_true', help='Also try failed certificates again.')
+        parser.add_argument('--limit', type=int, help='Render at most this many.')
+        parser.add_argument('--stats', action='store_true', help='Only print the render stats as JSON.')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(render_stats(), cls=DjangoJSONEncoder, indent=2))
+            return
+
+        statuses = ['pending', 'failed'] if options['failed'] else ['pending']
+        ids = (
+            Certificate.objects.filter(render_status__in=statuses).order_by('created_at', 'pk')
+            .values_list('pk', flat=True)
+        )
+        if options['limit']:
+            ids = ids[:options['limit']]
+
+        rendered = failed = 0
+        for pk in list(ids):
+            certificate = Certificate.objects.select_related('item__category', 'piece').filter(pk=pk).first()
+            if certificate is None or certificate.render_status == 'ready':
+                continue
+            try:
+                render_certificate(certificate)
+                rendered += 1
+            except Exception as e:
+                failed += 1
+                record_render_failure(certificate, e, retry_later=False)
+                self.stderr.write(f'{certificate}: {type(e).__name__}: {e}')
+        self.stdout.write(self.style.SUCCESS(f'{rendered} certificate PDFs rendered, {failed} failed.'))
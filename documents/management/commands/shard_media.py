@@ -0,0 +1,135 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.utils import timezone
+
+from config.storage import ShardedUploadTo
+
+
+def sharded_fields():
+    """Every (model, FileField) that uses the sharded layout."""
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField) and isinstance(field.upload_to, ShardedUploadTo):
+                yield model, field
+
+
+class Command(BaseCommand):
+    help = (
+        'Move existing media files into the sharded <prefix>/<yyyy>/<mm>/<hash>/ layout and update their '
+        'paths. Files already in the layout are skipped, so an interrupted run can simply be started again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Files copied in parallel (default 4).')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows updated per transaction (default 500).')
+        parser.add_argument('--model', action='append', default=[], help='Only this model (app_label.Model); repeatable.')
+        parser.add_argument('--source-root', help='Read the old files from this directory instead of the '
+                                                  'configured storage, e.g. MEDIA_ROOT when moving to S3.')
+        parser.add_argument('--keep-old', action='store_true', help='Copy instead of move; leave the old files.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be moved.')
+
+    def handle(self, *args, **options):
+        fields = list(sharded_fields())
+        if options['model']:
+            wanted = {label.lower() for label in options['model']}
+            fields = [(model, field) for model, field in fields if model._meta.label_lower in wanted]
+            if not fields:
+                raise CommandError(f"No sharded file fields on {', '.join(options['model'])}.")
+        if options['source_root'] and not os.path.isdir(options['source_root']):
+            raise CommandError(f"{options['source_root']} is not a directory.")
+
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            for model, field in fields:
+                self._shard(model, field, pool, options)
+
+    def _shard(self, model, field, pool, options):
+        upload_to = field.upload_to
+        target = field.storage
+        source = FileSystemStorage(location=options['source_root']) if options['source_root'] else target
+        # Same local directory tree: a rename moves the file without copying it.
+        rename = (
+            not options['keep_old'] and isinstance(source, FileSystemStorage) and isinstance(target, FileSystemStorage)
+            and os.path.abspath(source.location) == os.path.abspath(target.location)
+        )
+        date_field = upload_to.date_field
+        touch = [f.name for f in model._meta.concrete_fields if getattr(f, 'auto_now', False)]
+
+        def move(row):
+            pk, old, when = row
+            new = upload_to.path(old, when or timezone.now(), old)
+            if target.exists(new) and (not source.exists(old) or source.size(old) == target.size(new)):
+                # Copied (or renamed) by an earlier run that stopped before
+                # the database was updated.
+                if rename and source.exists(old):
+                    source.delete(old)
+                return pk, old, new, None
+            if not source.exists(old):
+                return pk, old, None, 'missing'
+            if rename:
+                path = target.path(new)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(source.path(old), path)
+                return pk, old, new, None
+            with source.open(old, 'rb') as fh:
+                return pk, old, target.save(new, File(fh), max_length=field.max_length), None
+
+        rows = (
+            model.objects.exclude(**{field.attname: ''}).exclude(**{f'{field.attname}__isnull': True})
+            .order_by('pk').values_list('pk', field.attname, date_field or 'pk')
+        )
+        moved = skipped = missing = changed = 0
+        last_pk = None
+        while True:
+            batch = list((rows.filter(pk__gt=last_pk) if last_pk is not None else rows)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            todo = []
+            for pk, name, when in batch:
+                if upload_to.is_sharded(name):
+                    skipped += 1
+                else:
+                    todo.append((pk, name, when if date_field else None))
+            if options['dry_run']:
+                moved += len(todo)
+                continue
+
+            results = list(pool.map(move, todo))
+            missing += sum(1 for *_, error in results if error == 'missing')
+            stamp = dict.fromkeys(touch, timezone.now())
+            done, undo = [], []
+            with transaction.atomic():
+                for pk, old, new, error in results:
+                    if not new:
+                        continue
+                    # Only rows still pointing at the file that was moved; one
+                    # re-uploaded or cleared meanwhile keeps its new value.
+                    if model.objects.filter(pk=pk, **{field.attname: old}).update(**{field.attname: new}, **stamp):
+                        done.append((old, new))
+                    else:
+                        changed += 1
+                        undo.append((old, new))
+            # Put the file of a changed row back where it was found.
+            for old, new in undo:
+                if model.objects.filter(**{field.attname: new}).exists():
+                    continue
+                if rename and not source.exists(old):
+                    os.replace(target.path(new), source.path(old))
+                else:
+                    target.delete(new)
+            if not rename and not options['keep_old']:
+                for old, new in done:
+                    source.delete(old)
+            moved += len(done)
+
+        verb = 'would be moved' if options['dry_run'] else 'moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{model._meta.label}.{field.name}: {moved} {verb}, {skipped} already sharded, {missing} missing, '
+            f'{changed} changed during the run.'
+        ))
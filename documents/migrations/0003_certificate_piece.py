@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_certificate_customer'),
+        ('inventory', '0009_serializedpiece'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificate',
+            name='piece',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='certificates', to='inventory.serializedpiece'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_catalogexport'),
+        ('sales', '0004_invoice_invoice_updated_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoicePdf',
+            fields=[
+                ('invoice', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pdf', serialize=False, to='sales.invoice')),
+                ('pdf_file', models.FileField(upload_to='invoices/')),
+                ('invoice_updated_at', models.DateTimeField()),
+                ('rendered_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:21
+
+import config.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_invoicepdf'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='certificate',
+            name='pdf_file',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to=config.storage.ShardedUploadTo('certificates', date_field='issued_at')),
+        ),
+        migrations.AlterField(
+            model_name='invoicepdf',
+            name='pdf_file',
+            field=models.FileField(max_length=255, upload_to=config.storage.ShardedUploadTo('invoices', date_field='rendered_at')),
+        ),
+    ]
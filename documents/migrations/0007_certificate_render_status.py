@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:25
+
+from django.db import migrations, models
+
+
+def mark_rendered(apps, schema_editor):
+    # Certificates created before background rendering already have their PDF.
+    Certificate = apps.get_model('documents', 'Certificate')
+    Certificate.objects.exclude(pdf_file='').exclude(pdf_file__isnull=True).update(render_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_alter_certificate_pdf_file_alter_invoicepdf_pdf_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificate',
+            name='render_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='render_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='render_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='rendered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_rendered, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:10
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_updated_at(apps, schema_editor):
+    # A certificate last changed when its PDF was rendered, or else when it was created.
+    Certificate = apps.get_model('documents', 'Certificate')
+    Certificate.objects.update(updated_at=Coalesce('rendered_at', 'created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_certificate_render_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificate',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0008_certificate_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoicepdf',
+            name='customer_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,19 +1,34 @@
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
-from inventory.models import JewelryItem
+from config.storage import ShardedUploadTo
+from inventory.models import Category, JewelryItem, SerializedPiece
 from sales.models import Invoice
 from crm.models import Customer
 
 
 class Certificate(models.Model):
+    RENDER_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
     item = models.ForeignKey(JewelryItem, on_delete=models.CASCADE, related_name='certificates')
+    piece = models.ForeignKey(SerializedPiece, on_delete=models.SET_NULL, null=True, blank=True, related_name='certificates')
     invoice = models.ForeignKey(Invoice, on_delete=models.SET_NULL, null=True, blank=True, related_name='certificates')
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True, related_name='certificates')
-    pdf_file = models.FileField(upload_to='certificates/', blank=True, null=True)
+    pdf_file = models.FileField(upload_to=ShardedUploadTo('certificates', date_field='issued_at'), max_length=255, blank=True, null=True)
     certificate_number = models.CharField(max_length=50, unique=True, editable=False)
     issued_at = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # The PDF is rendered in the background by documents/certificates.py.
+    render_status = models.CharField(max_length=20, choices=RENDER_STATUS_CHOICES, default='pending', db_index=True)
+    render_attempts = models.PositiveSmallIntegerField(default=0)
+    render_error = models.TextField(blank=True)
+    rendered_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['-issued_at']
@@ -36,3 +51,60 @@ class Certificate(models.Model):
         else:
             new_num = 1
         return f"{prefix}-{new_num:04d}"
+
+
+class CatalogExport(models.Model):
+    """A catalog / price-list PDF, built in the background by documents/catalog.py."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                                 help_text='Leave blank for the whole catalog.')
+    include_prices = models.BooleanField(default=True)
+    include_inactive = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_items = models.PositiveIntegerField(default=0)
+    rendered_items = models.PositiveIntegerField(default=0)
+    pages = models.PositiveIntegerField(default=0)
+    pdf_file = models.FileField(upload_to='catalogs/', blank=True, null=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Catalog {self.created_at:%Y-%m-%d %H:%M} ({self.category or 'all items'})"
+
+    @property
+    def progress(self):
+        return int(100 * self.rendered_items / self.total_items) if self.total_items else 0
+
+
+class InvoicePdf(models.Model):
+    """
+    The last rendered PDF of an invoice; current while ``invoice_updated_at``
+    and ``customer_updated_at`` match the invoice and its customer, since the
+    PDF prints the customer's name, email and address.
+    """
+    invoice = models.OneToOneField(Invoice, on_delete=models.CASCADE, primary_key=True, related_name='pdf')
+    pdf_file = models.FileField(upload_to=ShardedUploadTo('invoices', date_field='rendered_at'), max_length=255)
+    invoice_updated_at = models.DateTimeField()
+    customer_updated_at = models.DateTimeField(null=True, blank=True)
+    rendered_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"PDF of {self.invoice_id}"
+
+    def is_current(self, invoice):
+        customer = invoice.customer
+        return (
+            bool(self.pdf_file) and self.invoice_updated_at == invoice.updated_at
+            and self.customer_updated_at == (customer.updated_at if customer else None)
+        )
@@ -0,0 +1,72 @@
+"""
+Fonts and part files shared by the label sheets and the catalog.
+
+Both are drawn on ReportLab canvases in TrueType fonts, embedded as subsets,
+so text prints in any script the font covers: ReportLab's bundled Bitstream
+Vera by default (Western and Central European), or the files named by
+PDF_FONT and PDF_FONT_BOLD (e.g. DejaVu Sans for Greek and Cyrillic).
+
+Long documents are drawn as a series of parts, each a complete PDF from its
+own canvas, so no canvas holds more than a part's pages; merge_parts() joins
+them in order with pypdf. Nothing here touches the database, and the font
+paths are passed in explicitly, so it can run in worker processes.
+"""
+import os
+from functools import lru_cache
+
+import reportlab
+from pypdf import PdfWriter
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+PRODUCER = 'Michaello Jewellery ERP'
+BUNDLED_FONTS = os.path.join(os.path.dirname(reportlab.__file__), 'fonts')
+
+
+def font_paths():
+    """``(regular, bold)`` TrueType files from the settings, defaulting to Vera."""
+    from django.conf import settings
+
+    return (
+        settings.PDF_FONT or os.path.join(BUNDLED_FONTS, 'Vera.ttf'),
+        settings.PDF_FONT_BOLD or os.path.join(BUNDLED_FONTS, 'VeraBd.ttf'),
+    )
+
+
+@lru_cache(maxsize=None)
+def register_fonts(paths):
+    """Register the ``(regular, bold)`` font files with ReportLab; returns their font names."""
+    names = []
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        pdfmetrics.registerFont(TTFont(name, path))
+        names.append(name)
+    return tuple(names)
+
+
+def fit_text(text, font, size, width):
+    """Truncate ``text`` with an ellipsis to fit ``width`` points."""
+    text = ' '.join(str(text).split())
+    if pdfmetrics.stringWidth(text, font, size) <= width:
+        return text
+    while text and pdfmetrics.stringWidth(text + '…', font, size) > width:
+        text = text[:-1]
+    return text.rstrip() + '…'
+
+
+def part_canvas(fh, pagesize):
+    """A compressed canvas writing one part to ``fh``."""
+    part = canvas.Canvas(fh, pagesize=pagesize, pageCompression=1)
+    part.setProducer(PRODUCER)
+    return part
+
+
+def merge_parts(parts, fh, title):
+    """Write the PDF ``parts`` (binary files or paths), in order, to ``fh`` as one document; returns the page count."""
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(part)
+    writer.add_metadata({'/Title': title, '/Producer': PRODUCER})
+    writer.write(fh)
+    return len(writer.pages)
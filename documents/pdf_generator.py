@@ -1,19 +1,156 @@
 import os
+from functools import lru_cache
 from io import BytesIO
 from django.conf import settings
 from django.core.files.base import ContentFile
 from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
+from reportlab.lib.pagesizes import A4, letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
+from reportlab.lib.units import inch, mm
+from reportlab.lib.utils import ImageReader
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.graphics import renderPDF
+from reportlab.graphics.barcode.qr import QrCodeWidget
+from reportlab.graphics.shapes import Drawing
+from xml.sax.saxutils import escape
 
+# Brand Colors
+BRAND_BG = colors.HexColor('#120b00')
+BRAND_TEXT = colors.HexColor('#FFE100')
+GRID_COLOR = colors.HexColor('#e0e0e0')
 
-def generate_certificate_pdf(certificate):
-    """Generate a PDF certificate for a jewelry item."""
+
+@lru_cache(maxsize=None)
+def brand_styles():
+    """Paragraph styles shared by every document, built once per process."""
+    styles = getSampleStyleSheet()
+    return {
+        'michaello': ParagraphStyle(
+            'Michaello',
+            parent=styles['Normal'],
+            fontSize=28,
+            alignment=TA_CENTER,
+            textColor=BRAND_TEXT,
+            fontName='Helvetica-Bold',
+            leading=30,
+        ),
+        'jewellery': ParagraphStyle(
+            'Jewellery',
+            parent=styles['Normal'],
+            fontSize=16,
+            alignment=TA_CENTER,
+            textColor=BRAND_TEXT,
+            fontName='Courier',
+            leading=18,
+        ),
+        'title': ParagraphStyle(
+            'CertTitle',
+            parent=styles['Normal'],
+            fontSize=12,
+            alignment=TA_CENTER,
+            textColor=colors.grey,
+            spaceAfter=5,
+        ),
+        'number': ParagraphStyle(
+            'CertNumber',
+            parent=styles['Normal'],
+            fontSize=22,
+            alignment=TA_CENTER,
+            spaceAfter=15,
+        ),
+        'heading': ParagraphStyle(
+            'Heading',
+            parent=styles['Heading2'],
+            fontSize=14,
+            spaceAfter=12,
+        ),
+        'normal': ParagraphStyle(
+            'Normal',
+            parent=styles['Normal'],
+            fontSize=11,
+            spaceAfter=6,
+        ),
+        'center': ParagraphStyle(
+            'Center',
+            parent=styles['Normal'],
+            fontSize=12,
+            alignment=TA_CENTER,
+            spaceAfter=15,
+        ),
+        'footer': ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=12,
+            alignment=TA_CENTER,
+            textColor=colors.grey,
+            leading=16,
+        ),
+        'cell': ParagraphStyle(
+            'Cell',
+            parent=styles['Normal'],
+            fontSize=9,
+            leading=11,
+        ),
+        'small': ParagraphStyle(
+            'Small',
+            parent=styles['Normal'],
+            fontSize=9,
+            leading=12,
+            textColor=colors.grey,
+        ),
+        'right': ParagraphStyle(
+            'Right',
+            parent=styles['Normal'],
+            fontSize=10,
+            leading=13,
+            alignment=TA_RIGHT,
+        ),
+    }
+
+
+@lru_cache(maxsize=None)
+def signature_image():
+    """The authorized signature as a reusable ImageReader, or None if it is missing or unreadable."""
+    sig_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'signature.png')
+    if not os.path.exists(sig_path):
+        return None
+    try:
+        return ImageReader(sig_path)
+    except Exception:
+        return None # Fallback if image is corrupted
+
+
+def brand_header(width=6.5*inch):
+    """The black Michaello / JEWELLERY band at the top of every document."""
+    styles = brand_styles()
+    logo_data = [
+        [Paragraph("Michaello", styles['michaello'])],
+        [Paragraph("JEWELLERY", styles['jewellery'])]
+    ]
+    logo_table = Table(logo_data, colWidths=[width])
+    logo_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), BRAND_BG),
+        ('TOPPADDING', (0, 0), (-1, 0), 15),
+        ('BOTTOMPADDING', (0, 1), (-1, 1), 15),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ]))
+    return logo_table
+
+
+def qr_drawing(value, size):
+    """A ``size``-point square Drawing of a QR code for ``value``."""
+    widget = QrCodeWidget(value, barBorder=0)
+    x0, y0, x1, y1 = widget.getBounds()
+    drawing = Drawing(size, size, transform=[size / (x1 - x0), 0, 0, size / (y1 - y0), 0, 0])
+    drawing.add(widget)
+    return drawing
+
+
+def generate_certificate_pdf(certificate, save=True):
+    """Generate a PDF certificate for a jewelry item; ``save=False`` stores the file without saving the row."""
     buffer = BytesIO()
-    
+
     doc = SimpleDocTemplate(
         buffer,
         pagesize=letter,
@@ -22,120 +159,41 @@ def generate_certificate_pdf(certificate):
         topMargin=72,
         bottomMargin=120 # Increased to reserve space for bottom signature
     )
-    
-    styles = getSampleStyleSheet()
-    
-    # Brand Colors
-    BRAND_BG = colors.HexColor('#120b00')
-    BRAND_TEXT = colors.HexColor('#FFE100')
-    
-    michaello_style = ParagraphStyle(
-        'Michaello',
-        parent=styles['Normal'],
-        fontSize=28,
-        alignment=TA_CENTER,
-        textColor=BRAND_TEXT,
-        fontName='Helvetica-Bold',
-        leading=30,
-    )
-    
-    jewellery_style = ParagraphStyle(
-        'Jewellery',
-        parent=styles['Normal'],
-        fontSize=16,
-        alignment=TA_CENTER,
-        textColor=BRAND_TEXT,
-        fontName='Courier',
-        leading=18,
-    )
-    
-    cert_title_style = ParagraphStyle(
-        'CertTitle',
-        parent=styles['Normal'],
-        fontSize=12,
-        alignment=TA_CENTER,
-        textColor=colors.grey,
-        spaceAfter=5,
-    )
-    
-    cert_number_style = ParagraphStyle(
-        'CertNumber',
-        parent=styles['Normal'],
-        fontSize=22,
-        alignment=TA_CENTER,
-        spaceAfter=15,
-    )
-    
-    heading_style = ParagraphStyle(
-        'Heading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=12,
-    )
-    
-    normal_style = ParagraphStyle(
-        'Normal',
-        parent=styles['Normal'],
-        fontSize=11,
-        spaceAfter=6,
-    )
-    
-    center_style = ParagraphStyle(
-        'Center',
-        parent=styles['Normal'],
-        fontSize=12,
-        alignment=TA_CENTER,
-        spaceAfter=15,
-    )
-    
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=12,
-        alignment=TA_CENTER,
-        textColor=colors.grey,
-        leading=16,
-    )
-    
+
+    styles = brand_styles()
+
     elements = []
-    
+
     # Logo Header Section
-    logo_data = [
-        [Paragraph("Michaello", michaello_style)],
-        [Paragraph("JEWELLERY", jewellery_style)]
-    ]
-    logo_table = Table(logo_data, colWidths=[6.5*inch])
-    logo_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), BRAND_BG),
-        ('TOPPADDING', (0, 0), (-1, 0), 15),
-        ('BOTTOMPADDING', (0, 1), (-1, 1), 15),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-    ]))
-    elements.append(logo_table)
+    elements.append(brand_header())
     elements.append(Spacer(1, 20))
-    
+
     # Title & Certificate Number
-    elements.append(Paragraph("CERTIFICATE OF AUTHENTICITY", cert_title_style))
-    elements.append(Paragraph(certificate.certificate_number, cert_number_style))
-    
+    elements.append(Paragraph("CERTIFICATE OF AUTHENTICITY", styles['title']))
+    elements.append(Paragraph(certificate.certificate_number, styles['number']))
+
     # Item Details
     item = certificate.item
-    
+
     data = [
         ['Item Details', ''],
         ['SKU:', item.sku],
+    ]
+    if certificate.piece_id:
+        data.append(['Serial No.:', certificate.piece.serial])
+    data += [
         ['Name:', item.name],
         ['Metal:', item.get_metal_display()],
         ['Purity:', item.purity or 'N/A'],
         ['Weight:', f'{item.weight_grams} grams' if item.weight_grams else 'N/A'],
     ]
-    
+
     if item.stone_details:
         data.append(['Stone Details:', item.stone_details])
-    
+
     if item.category:
         data.append(['Category:', item.category.name])
-    
+
     table = Table(data, colWidths=[2*inch, 4*inch])
     table.setStyle(TableStyle([
         ('BACKGROUND', (0, 0), (-1, 0), BRAND_BG),
@@ -149,65 +207,183 @@ def generate_certificate_pdf(certificate):
         ('FONTSIZE', (0, 1), (-1, -1), 10),
         ('BOTTOMPADDING', (0, 1), (-1, -1), 10),
         ('TOPPADDING', (0, 1), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e0e0e0')),
+        ('GRID', (0, 0), (-1, -1), 1, GRID_COLOR),
         ('SPAN', (0, 0), (-1, 0)),
         ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
     ]))
-    
+
     elements.append(table)
     elements.append(Spacer(1, 15))
-    
+
     # Issue Date
     elements.append(Paragraph(
         f"Issue Date: {certificate.issued_at.strftime('%B %d, %Y')}",
-        center_style
+        styles['center']
     ))
-    
+
     elements.append(Spacer(1, 20))
-    
+
     # Footer
     footer_text = """
-    Michaello Jewellery, certifies that every component of this jewel is genuine and of good quality 
+    Michaello Jewellery, certifies that every component of this jewel is genuine and of good quality
     per the details provided hereby, according to the standards of the International Gemological Institute.
     """
-    elements.append(Paragraph(footer_text, footer_style))
-    
+    elements.append(Paragraph(footer_text, styles['footer']))
+
+    # Imported here: verification needs the ORM, which the invoice render
+    # processes never load.
+    from .verification import verify_url
+    verify_link = verify_url(certificate.certificate_number)
+
     # Define a function to draw the signature at the bottom of the page
     def draw_fixed_elements(canvas, doc):
         canvas.saveState()
-        
+
         # Signature section coordinates (from bottom)
         sig_y_text = 40
         sig_y_line = 55
         sig_y_img = 60
-        
+
         # Draw Authorized Signature text
         canvas.setFont("Helvetica", 10)
         canvas.setFillColor(colors.grey)
         canvas.drawCentredString(letter[0]/2, sig_y_text, "Authorized Signature")
-        
+
         # Draw line
         canvas.setStrokeColor(colors.black)
         canvas.setLineWidth(0.5)
         canvas.line(letter[0]/2 - 100, sig_y_line, letter[0]/2 + 100, sig_y_line)
-        
+
         # Draw signature image if it exists
-        sig_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'signature.png')
-        if os.path.exists(sig_path):
-            try:
-                canvas.drawImage(sig_path, letter[0]/2 - 65, sig_y_img, width=130, height=60, mask='auto')
-            except:
-                pass # Fallback if image is corrupted
-                
+        signature = signature_image()
+        if signature is not None:
+            canvas.drawImage(signature, letter[0]/2 - 65, sig_y_img, width=130, height=60, mask='auto')
+
+        # QR code linking to the public verification page
+        if verify_link:
+            qr_size = 72
+            qr_x = letter[0] - 72 - qr_size
+            renderPDF.draw(qr_drawing(verify_link, qr_size), canvas, qr_x, sig_y_text + 8)
+            canvas.setFont("Helvetica", 7)
+            canvas.drawCentredString(qr_x + qr_size / 2, sig_y_text, "Scan to verify")
+
         canvas.restoreState()
 
     doc.build(elements, onFirstPage=draw_fixed_elements)
-    
+
     # Save to model
     pdf_content = buffer.getvalue()
     buffer.close()
-    
+
     filename = f'{certificate.certificate_number}.pdf'
-    certificate.pdf_file.save(filename, ContentFile(pdf_content), save=True)
-    
+    certificate.pdf_file.save(filename, ContentFile(pdf_content), save=save)
+
     return certificate.pdf_file
+
+
+def render_invoice_pdf(data):
+    """
+    Render an invoice to PDF bytes.
+
+    ``data`` is the plain dict built by documents.invoices.invoice_pdf_data,
+    so this runs without the ORM and can be handed to a worker process.
+    """
+    buffer = BytesIO()
+    page_width = A4[0] - 40*mm
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=20*mm,
+        leftMargin=20*mm,
+        topMargin=20*mm,
+        bottomMargin=20*mm,
+        title=f"Invoice {data['number']}",
+        author='Michaello Jewellery',
+    )
+    styles = brand_styles()
+
+    elements = [brand_header(page_width), Spacer(1, 20)]
+    elements.append(Paragraph("INVOICE", styles['title']))
+    elements.append(Paragraph(escape(data['number']), styles['number']))
+
+    customer = data['customer']
+    if customer:
+        billed = [f"<b>{escape(customer['name'])}</b>"]
+        billed += [escape(line) for line in customer['address'].splitlines() if line.strip()]
+        if customer['email']:
+            billed.append(escape(customer['email']))
+    else:
+        billed = ['<b>Walk-in Customer</b>']
+    meta = [
+        f"<b>Date:</b> {data['date']}",
+        f"<b>Invoice #:</b> {escape(data['number'])}",
+        f"<b>Status:</b> {escape(data['status'])}",
+    ]
+    header = Table(
+        [[Paragraph('<br/>'.join(billed), styles['cell']), Paragraph('<br/>'.join(meta), styles['right'])]],
+        colWidths=[page_width / 2] * 2,
+    )
+    header.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+    ]))
+    elements += [header, Spacer(1, 15)]
+
+    rows = [['Item', 'Description', 'Qty', 'Unit Price', 'Total']]
+    for line in data['lines']:
+        rows.append([
+            Paragraph(escape(line['sku'] or '-'), styles['cell']),
+            Paragraph(escape(line['description']) + (
+                f"<br/><font size=7>S/N: {escape(', '.join(line['serials']))}</font>" if line.get('serials') else ''
+            ), styles['cell']),
+            line['quantity'],
+            f"€{line['unit_price']}",
+            f"€{line['line_total']}",
+        ])
+    if not data['lines']:
+        rows.append(['', 'No items', '', '', ''])
+    body_rows = len(rows)
+    rows += [
+        ['', '', '', 'Subtotal:', f"€{data['subtotal']}"],
+        ['', '', '', 'Tax:', f"€{data['tax']}"],
+        ['', '', '', 'Discount:', f"-€{data['discount']}"],
+        ['', '', '', 'Total:', f"€{data['total']}"],
+    ]
+    table = Table(
+        rows,
+        colWidths=[28*mm, page_width - 28*mm - 14*mm - 2 * 26*mm, 14*mm, 26*mm, 26*mm],
+        repeatRows=1,
+    )
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), BRAND_BG),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('ALIGN', (2, 0), (2, -1), 'CENTER'),
+        ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
+        ('GRID', (0, 0), (-1, body_rows - 1), 1, GRID_COLOR),
+        ('LINEABOVE', (3, body_rows), (-1, body_rows), 1, GRID_COLOR),
+        ('BACKGROUND', (3, -1), (-1, -1), BRAND_BG),
+        ('TEXTCOLOR', (3, -1), (-1, -1), BRAND_TEXT),
+        ('FONTNAME', (3, -1), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (3, -1), (-1, -1), 10),
+    ]))
+    elements.append(table)
+
+    if data['notes']:
+        elements += [Spacer(1, 15), Paragraph('<b>Notes:</b>', styles['cell'])]
+        elements.append(Paragraph(escape(data['notes']).replace('\n', '<br/>'), styles['cell']))
+
+    elements += [Spacer(1, 25), Paragraph("Thank you for your business!", styles['small'])]
+
+    def draw_page_number(canvas, doc):
+        canvas.saveState()
+        canvas.setFont("Helvetica", 8)
+        canvas.setFillColor(colors.grey)
+        canvas.drawRightString(A4[0] - 20*mm, 10*mm, f"{data['number']} · page {doc.page}")
+        canvas.restoreState()
+
+    doc.build(elements, onFirstPage=draw_page_number, onLaterPages=draw_page_number)
+    return buffer.getvalue()
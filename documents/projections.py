@@ -0,0 +1,10 @@
+"""
+Column projections for the certificate list page.
+"""
+
+CERTIFICATE_LIST_FIELDS = (
+    'certificate_number', 'issued_at', 'render_status',
+    'item__sku', 'item__name',
+    'customer__name',
+    'invoice__invoice_number', 'invoice__customer__name',
+)
@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from sales.models import Invoice
+
+from .certificates import queue_certificate_pdf
+from .invoices import queue_invoice_pdf
+from .models import Certificate, InvoicePdf
+from .verification import clear_verify_cache
+
+
+@receiver(post_save, sender=Invoice)
+def render_invoice_pdf_after_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        queue_invoice_pdf(instance.pk)
+
+
+@receiver(post_save, sender=Certificate)
+def render_certificate_pdf_after_create(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        queue_certificate_pdf(instance.pk)
+
+
+@receiver(post_save, sender=Certificate)
+@receiver(post_delete, sender=Certificate)
+def certificate_changed(sender, **kwargs):
+    clear_verify_cache()
+
+
+@receiver(post_delete, sender=InvoicePdf)
+def delete_invoice_pdf_file(sender, instance, **kwargs):
+    if instance.pdf_file:
+        name, storage = instance.pdf_file.name, instance.pdf_file.storage
+        transaction.on_commit(lambda: storage.delete(name))
@@ -1,3 +1,447 @@
-from django.test import TestCase
+import os
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from pypdf import PdfReader
+
+from config.cache import MISSING
+from inventory.models import Category, JewelryItem, SerializedPiece
+from inventory.scanning import generate_serials
+from crm.models import Customer
+from inventory.tests import assert_constant_queries, make_item
+from purchasing.models import PurchaseOrder, PurchaseOrderLine
+from purchasing.receiving import receive
+from sales.models import Invoice
+
+from .catalog import run_export
+from .management.commands import shard_media
+from . import certificates
+from .certificates import ensure_certificate_pdf, render_certificate
+from .label_pdf import LAYOUTS
+from .labels import TooManyLabels, build_label_sheet, item_labels, receipt_labels
+from .models import CatalogExport, Certificate
+from .verification import _cache, verify
+
+
+@override_settings(CERTIFICATE_PDF_WORKERS=0, MEDIA_ROOT=tempfile.mkdtemp())
+class CertificateVersionTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='pw'))
+        self.certificate = Certificate.objects.create(item=make_item('RG-1'))
+
+    def get(self):
+        return self.client.get(reverse('api:resource_detail', args=['certificates', self.certificate.pk]))
+
+    def test_render_changes_etag(self):
+        before = self.get()
+        self.assertEqual(self.client.get(
+            reverse('api:resource_detail', args=['certificates', self.certificate.pk]),
+            HTTP_IF_NONE_MATCH=before['ETag'],
+        ).status_code, 304)
+
+        render_certificate(self.certificate)
+        after = self.get()
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.certificate.refresh_from_db()
+        self.assertEqual(self.certificate.render_status, 'ready')
+        self.assertEqual(self.certificate.updated_at, self.certificate.rendered_at)
+
+    def test_render_clears_verify_cache(self):
+        number = self.certificate.certificate_number
+        verify(RequestFactory().get('/'), number)
+        self.assertIsNot(_cache.get(number), MISSING)
+
+        render_certificate(self.certificate)
+        self.assertIs(_cache.get(number), MISSING)
+
+
+
+@override_settings(CERTIFICATE_PDF_WORKERS=0)
+class CertificateRenderRaceTests(TestCase):
+    def setUp(self):
+        media = self.settings(MEDIA_ROOT=tempfile.mkdtemp())
+        media.enable()
+        self.addCleanup(media.disable)
+        self.certificate = Certificate.objects.create(item=make_item('RG-1'))
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), default_storage.location)
+            for root, _, names in os.walk(default_storage.location) for name in names
+        )
+
+    def race(self, first):
+        """Run ``first`` while another render of the same certificate finishes in the middle of it."""
+        generate = certificates.generate_certificate_pdf
+        other = {}
+
+        def generate_then_lose(certificate, save=True):
+            generate(certificate, save=save)
+            if 'started' not in other:
+                other['started'] = True
+                other['name'] = render_certificate(Certificate.objects.get(pk=certificate.pk)).name
+
+        with mock.patch.object(certificates, 'generate_certificate_pdf', side_effect=generate_then_lose):
+            return first(Certificate.objects.get(pk=self.certificate.pk)).name, other['name']
+
+    def test_loser_reuses_the_stored_pdf(self):
+        returned, winner = self.race(ensure_certificate_pdf)
+        self.assertEqual(returned, winner)
+        self.certificate.refresh_from_db()
+        self.assertEqual((self.certificate.pdf_file.name, self.certificate.render_status), (winner, 'ready'))
+        self.assertEqual(self.stored_files(), [winner])
+
+    def test_rerender_replaces_the_previous_pdf(self):
+        render_certificate(self.certificate)
+        previous = self.certificate.pdf_file.name
+        default_storage.delete(previous)
+        returned, winner = self.race(ensure_certificate_pdf)
+        self.assertNotEqual(winner, previous)
+        self.assertEqual(Certificate.objects.get(pk=self.certificate.pk).pdf_file.name, returned)
+        self.assertEqual(self.stored_files(), [winner])
+
+    def test_deleted_certificate_keeps_no_file(self):
+        certificate = Certificate.objects.get(pk=self.certificate.pk)
+        generate = certificates.generate_certificate_pdf
+
+        def generate_then_delete(certificate, save=True):
+            generate(certificate, save=save)
+            Certificate.objects.filter(pk=certificate.pk).delete()
+
+        with mock.patch.object(certificates, 'generate_certificate_pdf', side_effect=generate_then_delete):
+            render_certificate(certificate)
+        self.assertEqual(self.stored_files(), [])
+
+
+def read_pdf(fh):
+    reader = PdfReader(fh)
+    return reader, [page.extract_text() for page in reader.pages]
+
+
+@override_settings(LABEL_PROCESSES=1)
+class LabelSheetTests(TestCase):
+    def labels(self, count, code='RG'):
+        return [(f'{code}-{i:03d}', f'Ring {i}', 'Gold · 18K', '€150.00') for i in range(count)]
+
+    def test_layouts(self):
+        for name, layout in LAYOUTS.items():
+            for symbology in ('code128', 'qr'):
+                with self.subTest(layout=name, symbology=symbology):
+                    fh, pages = build_label_sheet(self.labels(layout.per_page + 1), name, symbology=symbology)
+                    reader, texts = read_pdf(fh)
+                    self.assertEqual((pages, len(reader.pages)), (2, 2))
+                    box = reader.pages[0].mediabox
+                    self.assertEqual((round(box.width), round(box.height)),
+                                     (round(layout.page_width), round(layout.page_height)))
+                    self.assertIn('RG-000', texts[0])
+                    self.assertNotIn(f'RG-{layout.per_page:03d}', texts[0])
+                    self.assertIn(f'RG-{layout.per_page:03d}', texts[1])
+
+    def test_skip_leaves_first_positions_blank(self):
+        layout = LAYOUTS['l7160']
+        fh, pages = build_label_sheet(self.labels(2), 'l7160', skip=layout.per_page - 1)
+        reader, texts = read_pdf(fh)
+        self.assertEqual(pages, 2)
+        self.assertEqual(texts[0].count('Gold'), 1)
+        self.assertIn('RG-000', texts[0])
+        self.assertIn('RG-001', texts[1])
+
+    def test_prices_are_optional(self):
+        fh, pages = build_label_sheet(self.labels(1), 'l7160', include_prices=False)
+        self.assertNotIn('€', read_pdf(fh)[1][0])
+
+    def test_each_code_is_drawn_once_per_page_run(self):
+        fh, pages = build_label_sheet([('RG-1', 'Ring', 'Gold', '€1.00')] * 10 + self.labels(2), 'l7160')
+        reader, texts = read_pdf(fh)
+        self.assertEqual(len(reader.pages[0]['/Resources']['/XObject']), 3)
+
+    def test_runs_are_merged_in_order(self):
+        with mock.patch('documents.labels.CHUNK_PAGES', 1):
+            fh, pages = build_label_sheet(self.labels(50), '5160', title='Window')
+        reader, texts = read_pdf(fh)
+        self.assertEqual(pages, 2)
+        self.assertEqual(reader.metadata.title, 'Window')
+        self.assertIn('RG-029', texts[0])
+        self.assertIn('RG-030', texts[1])
+        self.assertIn('RG-049', texts[1])
+
+    def test_non_latin_text_is_kept(self):
+        fh, pages = build_label_sheet([('RG-1', 'Kółko złote, ćwierć', 'Złoto · 585', '€1.00')], 'l7160')
+        text = read_pdf(fh)[1][0]
+        self.assertIn('Kółko złote, ćwierć', text)
+        self.assertNotIn('?', text)
+
+
+class LabelCollectionTests(TestCase):
+    def test_one_label_per_item(self):
+        make_item('RG-2', quantity_on_hand=3, metal='gold', purity='18K')
+        make_item('RG-1', quantity_on_hand=0)
+        labels = item_labels(JewelryItem.objects.order_by('sku'))
+        self.assertEqual([label[0] for label in labels], ['RG-1', 'RG-2'])
+        self.assertEqual(labels[1], ('RG-2', 'Item RG-2', 'Gold · 18K', '€150.00'))
+
+    def test_per_unit_uses_serials_in_stock_first(self):
+        item = make_item('RG-1', quantity_on_hand=0)
+        pieces = generate_serials(item, 3)
+        SerializedPiece.objects.filter(pk=pieces[0].pk).update(status='sold')
+        JewelryItem.objects.filter(pk=item.pk).update(quantity_on_hand=4)
+        labels = item_labels(JewelryItem.objects.all(), per_unit=True)
+        self.assertEqual([label[0] for label in labels], ['RG-1-00002', 'RG-1-00003', 'RG-1', 'RG-1'])
+
+    def test_max_labels(self):
+        make_item('RG-1', quantity_on_hand=2)
+        make_item('RG-2', quantity_on_hand=2)
+        with mock.patch('documents.labels.MAX_LABELS', 2):
+            self.assertEqual(len(item_labels(JewelryItem.objects.all())), 2)
+            with self.assertRaises(TooManyLabels):
+                item_labels(JewelryItem.objects.all(), per_unit=True)
+        with mock.patch('documents.labels.MAX_LABELS', 1):
+            with self.assertRaises(TooManyLabels):
+                item_labels(JewelryItem.objects.all())
+
+    def test_receipt_labels(self):
+        ring, chain = make_item('RG-1', quantity_on_hand=5), make_item('CH-1')
+        order = PurchaseOrder.objects.create(status='ordered')
+        ring_line = PurchaseOrderLine.objects.create(order=order, item=ring, quantity_ordered=5, unit_cost=100)
+        chain_line = PurchaseOrderLine.objects.create(order=order, item=chain, quantity_ordered=5, unit_cost=100)
+        with self.captureOnCommitCallbacks(execute=True):
+            first = receive(order, {ring_line.pk: 2}, create_pieces=True)
+            second = receive(order, {ring_line.pk: 1, chain_line.pk: 2})
+        self.assertEqual([label[0] for label in receipt_labels(first)], ['RG-1-00001', 'RG-1-00002'])
+        self.assertEqual([label[0] for label in receipt_labels(second)], ['CH-1', 'CH-1', 'RG-1'])
+        with mock.patch('documents.labels.MAX_LABELS', 2):
+            with self.assertRaises(TooManyLabels):
+                receipt_labels(second)
+
+
+@override_settings(CATALOG_EXPORT_WORKERS=0, MEDIA_ROOT=tempfile.mkdtemp())
+class CatalogExportTests(TestCase):
+    def setUp(self):
+        rings, chains = Category.objects.create(name='Rings'), Category.objects.create(name='Chains')
+        for i in range(13):
+            make_item(f'RG-{i:02d}', category=rings, metal='gold', purity='18K')
+        make_item('CH-01', category=chains)
+        make_item('OLD-01', category=chains, is_active=False)
+        make_item('NC-01', name='Kółko bez kategorii')
+        self.export = CatalogExport.objects.create()
+
+    def build(self, export=None):
+        export = export or self.export
+        run_export(export.pk)
+        export.refresh_from_db()
+        return export
+
+    def test_catalog_is_drawn_in_parts(self):
+        photo = BytesIO()
+        Image.new('RGBA', (600, 400), (200, 160, 0, 128)).save(photo, 'PNG')
+        JewelryItem.objects.filter(sku='CH-01').update(
+            image=default_storage.save('jewelry_images/chain.png', ContentFile(photo.getvalue())),
+        )
+        with mock.patch('documents.catalog.PART_PAGES', 1), mock.patch('documents.catalog.PROGRESS_EVERY', 5):
+            export = self.build()
+        self.assertEqual(export.status, 'done', export.error)
+        self.assertEqual((export.total_items, export.rendered_items, export.pages), (15, 15, 4))
+
+        with export.pdf_file.open('rb') as fh:
+            reader, texts = read_pdf(fh)
+        self.assertEqual(len(reader.pages), 4)
+        # Categories by name, uncategorised last, twelve cards per page.
+        self.assertIn('Chains', texts[0])
+        self.assertIn('CH-01', texts[0])
+        self.assertNotIn('OLD-01', texts[0])
+        self.assertIn('Rings', texts[1])
+        self.assertIn('RG-11', texts[1])
+        self.assertIn('Rings (continued)', texts[2])
+        self.assertIn('RG-12', texts[2])
+        self.assertIn('Kółko bez kategorii', texts[3])
+        self.assertIn('Page 4', texts[3])
+        self.assertEqual(len(reader.pages[0]['/Resources']['/XObject']), 1)
+
+    def test_category_and_options(self):
+        export = self.build(CatalogExport.objects.create(
+            category=Category.objects.get(name='Chains'), include_prices=False, include_inactive=True,
+        ))
+        with export.pdf_file.open('rb') as fh:
+            reader, texts = read_pdf(fh)
+        self.assertEqual(export.pages, 1)
+        self.assertIn('OLD-01', texts[0])
+        self.assertNotIn('€', texts[0])
+
+    def test_only_one_worker_builds_an_export(self):
+        builds = []
+
+        def build(export):
+            builds.append(export.status)
+            # A second worker (or build_catalogs) reaching the same export meanwhile.
+            run_export(export.pk)
+
+        with mock.patch('documents.catalog.build_catalog', side_effect=build):
+            run_export(self.export.pk)
+            run_export(CatalogExport.objects.create(status='done').pk)
+        self.assertEqual(builds, ['running'])
+
+    def test_failure_is_recorded(self):
+        with mock.patch('documents.catalog.thumbnail', side_effect=RuntimeError('storage unavailable')), \
+                self.assertLogs('documents.catalog', 'ERROR'):
+            export = self.build()
+        self.assertEqual(export.status, 'failed')
+        self.assertEqual(export.error, 'storage unavailable')
+        self.assertIsNotNone(export.finished_at)
+        self.assertFalse(export.pdf_file)
+
+    def test_download_waits_until_done(self):
+        self.client.force_login(User.objects.create_user('clerk', password='pw'))
+        url = reverse('catalogs:catalog_download', args=[self.export.pk])
+        for status in ('pending', 'running', 'failed'):
+            CatalogExport.objects.filter(pk=self.export.pk).update(status=status)
+            self.assertEqual(self.client.get(url).status_code, 404, status)
+
+        CatalogExport.objects.filter(pk=self.export.pk).update(status='pending')
+        self.build()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+
+@override_settings(CERTIFICATE_PDF_WORKERS=0)
+class CertificateListProjectionTests(TestCase):
+    def test_rows_need_no_queries_of_their_own(self):
+        self.client.force_login(User.objects.create_user('clerk', password='pw'))
+        customer = Customer.objects.create(name='Nikos')
+
+        def add_certificates(*skus):
+            for sku in skus:
+                invoice = Invoice.objects.create(customer=customer, status='paid')
+                Certificate.objects.create(item=make_item(sku), invoice=invoice, customer=customer)
+
+        add_certificates('RG-1')
+        queries, response = assert_constant_queries(
+            self, reverse('documents:certificate_list'), lambda: add_certificates('RG-2', 'RG-3'),
+        )
+        self.assertContains(response, 'RG-3')
+
+
+class InlineExecutor:
+    """Stands in for the thread pool so the moves run on the test's database connection."""
+
+    def __init__(self, max_workers):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def map(self, fn, rows):
+        return map(fn, rows)
+
+
+@override_settings(CERTIFICATE_PDF_WORKERS=0)
+class ShardMediaTests(TestCase):
+    def setUp(self):
+        media = self.settings(MEDIA_ROOT=tempfile.mkdtemp())
+        media.enable()
+        self.addCleanup(media.disable)
+        self.upload_to = Certificate._meta.get_field('pdf_file').upload_to
+
+    def certificate(self, sku, content=b'%PDF certificate'):
+        name = f'certificates/{sku}.pdf'
+        if content is not None:
+            default_storage.save(name, ContentFile(content))
+        certificate = Certificate.objects.create(item=make_item(sku), render_status='ready')
+        Certificate.objects.filter(pk=certificate.pk).update(pdf_file=name)
+        return Certificate.objects.get(pk=certificate.pk)
+
+    def shard(self, *args):
+        out = StringIO()
+        call_command('shard_media', '--model', 'documents.Certificate', '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def sharded_name(self, certificate):
+        return self.upload_to.path(certificate.pdf_file.name, certificate.issued_at, certificate.pdf_file.name)
+
+    def test_moves_files_and_rows(self):
+        certificates = [self.certificate(f'RG-{n}', f'%PDF {n}'.encode()) for n in range(3)]
+        expected = {certificate.pk: (certificate.pdf_file.name, self.sharded_name(certificate)) for certificate in certificates}
+        self.assertIn('3 moved, 0 already sharded, 0 missing, 0 changed', self.shard())
+        for n, certificate in enumerate(certificates):
+            old, new = expected[certificate.pk]
+            certificate.refresh_from_db()
+            self.assertEqual(certificate.pdf_file.name, new)
+            self.assertFalse(default_storage.exists(old))
+            with default_storage.open(new) as fh:
+                self.assertEqual(fh.read(), f'%PDF {n}'.encode())
+        self.assertIn('0 moved, 3 already sharded', self.shard())
+
+    def test_resumes_after_interruption(self):
+        # A previous run moved the file but stopped before updating the row.
+        renamed = self.certificate('RG-1')
+        new = self.sharded_name(renamed)
+        os.makedirs(os.path.dirname(default_storage.path(new)))
+        os.replace(default_storage.path(renamed.pdf_file.name), default_storage.path(new))
+        # ... and copied this one without deleting the original.
+        copied = self.certificate('RG-2')
+        with default_storage.open(copied.pdf_file.name) as fh:
+            copied_to = default_storage.save(self.sharded_name(copied), fh)
+
+        self.assertIn('2 moved, 0 already sharded, 0 missing', self.shard())
+        renamed.refresh_from_db()
+        self.assertEqual(renamed.pdf_file.name, new)
+        self.assertTrue(default_storage.exists(new))
+        old = copied.pdf_file.name
+        copied.refresh_from_db()
+        self.assertEqual(copied.pdf_file.name, copied_to)
+        self.assertFalse(default_storage.exists(old))
+
+    def test_missing_file_is_left_alone(self):
+        missing = self.certificate('RG-1', content=None)
+        present = self.certificate('RG-2')
+        self.assertIn('1 moved, 0 already sharded, 1 missing', self.shard())
+        self.assertEqual(Certificate.objects.get(pk=missing.pk).pdf_file.name, 'certificates/RG-1.pdf')
+        self.assertTrue(self.upload_to.is_sharded(Certificate.objects.get(pk=present.pk).pdf_file.name))
+
+    def test_row_changed_during_move_keeps_its_value(self):
+        certificate = self.certificate('RG-1')
+        old = certificate.pdf_file.name
+        replace = os.replace
+
+        def reupload(src, dst):
+            # The certificate is re-rendered while its old file is being moved.
+            if not Certificate.objects.filter(pk=certificate.pk, pdf_file='certificates/RG-1-v2.pdf').exists():
+                Certificate.objects.filter(pk=certificate.pk).update(pdf_file='certificates/RG-1-v2.pdf')
+            replace(src, dst)
+
+        with mock.patch.object(shard_media, 'ThreadPoolExecutor', InlineExecutor), \
+                mock.patch.object(shard_media.os, 'replace', side_effect=reupload):
+            self.assertIn('0 moved, 0 already sharded, 0 missing, 1 changed', self.shard())
+
+        self.assertEqual(Certificate.objects.get(pk=certificate.pk).pdf_file.name, 'certificates/RG-1-v2.pdf')
+        # The moved file is put back where it was found.
+        self.assertTrue(default_storage.exists(old))
+        self.assertFalse(default_storage.exists(self.sharded_name(certificate)))
+
+    def test_row_changed_during_copy_drops_the_copy(self):
+        certificate = self.certificate('RG-1')
+        old = certificate.pdf_file.name
+        save = default_storage.save
+
+        def reupload(name, content, max_length=None):
+            Certificate.objects.filter(pk=certificate.pk).update(pdf_file='')
+            return save(name, content, max_length=max_length)
+
+        with mock.patch.object(shard_media, 'ThreadPoolExecutor', InlineExecutor), \
+                mock.patch.object(default_storage, 'save', side_effect=reupload):
+            self.assertIn('1 changed', self.shard('--keep-old'))
+
+        self.assertEqual(Certificate.objects.get(pk=certificate.pk).pdf_file.name, '')
+        self.assertTrue(default_storage.exists(old))
+        self.assertFalse(default_storage.exists(self.sharded_name(certificate)))
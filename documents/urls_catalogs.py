@@ -0,0 +1,12 @@
+from django.urls import path
+from . import views
+
+app_name = 'catalogs'
+
+urlpatterns = [
+    path('', views.catalog_list, name='catalog_list'),
+    path('add/', views.catalog_create, name='catalog_create'),
+    path('<int:pk>/status/', views.catalog_status, name='catalog_status'),
+    path('<int:pk>/download/', views.catalog_download, name='catalog_download'),
+    path('<int:pk>/delete/', views.catalog_delete, name='catalog_delete'),
+]
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = 'labels'
+
+urlpatterns = [
+    path('', views.label_sheet, name='label_sheet'),
+    path('receipt/<int:pk>/', views.receipt_label_sheet, name='receipt_label_sheet'),
+]
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+app_name = 'verify'
+
+urlpatterns = [
+    path('', views.certificate_verify, name='certificate_verify_search'),
+    path('<str:number>/', views.certificate_verify, name='certificate_verify'),
+    path('<str:number>/json/', views.certificate_verify_json, name='certificate_verify_json'),
+]
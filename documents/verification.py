@@ -0,0 +1,118 @@
+"""
+Public certificate verification.
+
+A lookup is one query on the unique ``certificate_number`` index, joined to
+the item, its category and the serialized piece by primary key, and returns
+only what the certificate itself shows (no prices, no customer). Results,
+including unknown numbers, are kept in a small in-process LRU for
+CERTIFICATE_VERIFY_CACHE_SECONDS, so repeated scans of the same certificate
+don't touch the database; entries are dropped when a certificate is saved or
+deleted in this process (documents/signals.py).
+
+Lookups that miss the cache are rate limited per client IP
+(CERTIFICATE_VERIFY_RATE_LIMIT a minute) through Django's cache, which is
+per process unless a shared cache backend is configured. Cached answers are
+not limited, so a crowd scanning the same pieces is never turned away.
+"""
+import re
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+
+from config.cache import MISSING, TTLCache
+from inventory.models import JewelryItem
+
+from .models import Certificate
+
+VERIFY_FIELDS = (
+    'certificate_number', 'issued_at', 'piece__serial',
+    'item__sku', 'item__name', 'item__metal', 'item__purity', 'item__weight_grams', 'item__stone_details',
+    'item__image', 'item__category__name',
+)
+NUMBER_RE = re.compile(r'^[A-Z0-9][A-Z0-9-]{0,49}$')
+RATE_WINDOW_SECONDS = 60
+METAL_LABELS = dict(JewelryItem.METAL_CHOICES)
+
+_cache = TTLCache('CERTIFICATE_VERIFY_CACHE_SIZE', 'CERTIFICATE_VERIFY_CACHE_SECONDS')
+
+
+def normalize_number(number):
+    """``number`` as stored (upper case, trimmed), or None if it can't be a certificate number."""
+    number = (number or '').strip().upper()
+    return number if NUMBER_RE.match(number) else None
+
+
+def verify_url(number):
+    """Public verification URL of ``number`` under CERTIFICATE_VERIFY_URL, or None if that is not set."""
+    if not settings.CERTIFICATE_VERIFY_URL:
+        return None
+    return f"{settings.CERTIFICATE_VERIFY_URL.rstrip('/')}/{quote(number)}/"
+
+
+def certificate_payload(row):
+    image = row['item__image']
+    return {
+        'valid': True,
+        'certificate_number': row['certificate_number'],
+        'issued_at': row['issued_at'].isoformat(),
+        'serial': row['piece__serial'],
+        'item': {
+            'sku': row['item__sku'],
+            'name': row['item__name'],
+            'metal': METAL_LABELS.get(row['item__metal'], row['item__metal']),
+            'purity': row['item__purity'],
+            'weight_grams': str(row['item__weight_grams']) if row['item__weight_grams'] is not None else None,
+            'stone_details': row['item__stone_details'],
+            'category': row['item__category__name'],
+            'image': f'{settings.MEDIA_URL}{image}' if image else None,
+        },
+    }
+
+
+def clear_verify_cache():
+    _cache.clear()
+
+
+def client_ip(request):
+    if settings.USE_X_FORWARDED_FOR:
+        # The right-most address is the one the trusted proxy saw.
+        forwarded = [part.strip() for part in request.headers.get('X-Forwarded-For', '').split(',') if part.strip()]
+        if forwarded:
+            return forwarded[-1]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def allow(request):
+    """Count a database lookup for the client; False once it is over CERTIFICATE_VERIFY_RATE_LIMIT this minute."""
+    limit = settings.CERTIFICATE_VERIFY_RATE_LIMIT
+    if limit <= 0:
+        return True
+    key = f'certificate-verify:{client_ip(request)}:{int(time.time() // RATE_WINDOW_SECONDS)}'
+    cache.add(key, 0, RATE_WINDOW_SECONDS)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Expired between add() and incr().
+        cache.set(key, 1, RATE_WINDOW_SECONDS)
+        count = 1
+    return count <= limit
+
+
+class RateLimited(Exception):
+    """Raised by verify() when the client has made too many uncached lookups."""
+
+
+def verify(request, number):
+    """
+    Verification payload for ``number`` (already normalized), or None if no
+    such certificate exists; raises RateLimited.
+    """
+    payload = _cache.get(number)
+    if payload is not MISSING:
+        return payload
+    if not allow(request):
+        raise RateLimited
+    row = Certificate.objects.filter(certificate_number=number).values(*VERIFY_FIELDS).first()
+    return _cache.set(number, certificate_payload(row) if row is not None else None)
@@ -1,20 +1,36 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import FileResponse, Http404
+from django.http import FileResponse, Http404, JsonResponse
 from django.core.paginator import Paginator
+from django.conf import settings
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_GET, require_POST
 
-from .models import Certificate
-from .forms import CertificateForm
-from .pdf_generator import generate_certificate_pdf
+from .models import Certificate, CatalogExport
+from .forms import CertificateForm, CatalogExportForm, LabelSheetForm
+from .catalog import request_export
+from .certificates import (
+    ensure_certificate_pdf, queue_certificate_email, render_stats, retry_certificate_pdf,
+)
+from .labels import MAX_LABELS, TooManyLabels, build_label_sheet, item_labels, receipt_labels
+from .projections import CERTIFICATE_LIST_FIELDS
+from .verification import RATE_WINDOW_SECONDS, RateLimited, normalize_number, verify
+from inventory.filters import filter_items
+from inventory.models import JewelryItem
 from notifications.email_service import send_certificate_email
+from purchasing.models import GoodsReceipt
+from config.downloads import serve_file
 
 ITEMS_PER_PAGE = 10
 
 
 @login_required
 def certificate_list(request):
-    certificates = Certificate.objects.select_related('item', 'invoice', 'customer').all()
+    certificates = Certificate.objects.select_related(
+        'item', 'invoice', 'invoice__customer', 'customer'
+    ).only(*CERTIFICATE_LIST_FIELDS)
     
     paginator = Paginator(certificates, ITEMS_PER_PAGE)
     page_number = request.GET.get('page')
@@ -35,8 +51,8 @@ def certificate_create(request):
         form = CertificateForm(request.POST)
         if form.is_valid():
             certificate = form.save()
-            generate_certificate_pdf(certificate)
-            messages.success(request, f'Certificate {certificate.certificate_number} created successfully.')
+            messages.success(request, f'Certificate {certificate.certificate_number} created successfully. '
+                                      'The PDF is being generated.')
             return redirect('documents:certificate_detail', pk=certificate.pk)
     else:
         form = CertificateForm()
@@ -55,23 +71,20 @@ def certificate_create(request):
 
 @login_required
 def certificate_download(request, pk):
-    certificate = get_object_or_404(Certificate, pk=pk)
-    if not certificate.pdf_file:
-        generate_certificate_pdf(certificate)
+    certificate = get_object_or_404(Certificate.objects.select_related('item__category', 'piece'), pk=pk)
+    ensure_certificate_pdf(certificate)
     
     if not certificate.pdf_file:
         raise Http404("Certificate PDF not found")
     
-    return FileResponse(
-        certificate.pdf_file.open('rb'),
-        as_attachment=True,
-        filename=f'{certificate.certificate_number}.pdf'
-    )
+    return serve_file(request, certificate.pdf_file, filename=f'{certificate.certificate_number}.pdf')
 
 
 @login_required
 def certificate_email(request, pk):
-    certificate = get_object_or_404(Certificate.objects.select_related('item', 'invoice', 'invoice__customer', 'customer'), pk=pk)
+    certificate = get_object_or_404(
+        Certificate.objects.select_related('item__category', 'piece', 'invoice', 'invoice__customer', 'customer'), pk=pk
+    )
     
     customer = None
     # Check for direct customer link first, then fall back to invoice customer
@@ -84,9 +97,11 @@ def certificate_email(request, pk):
         messages.error(request, 'No customer email found for this certificate.')
         return redirect('documents:certificate_detail', pk=pk)
     
-    if not certificate.pdf_file:
-        generate_certificate_pdf(certificate)
+    if queue_certificate_email(certificate, customer):
+        messages.success(request, f'Certificate is being sent to {customer.email}.')
+        return redirect('documents:certificate_detail', pk=pk)
     
+    ensure_certificate_pdf(certificate)
     if send_certificate_email(certificate, customer):
         messages.success(request, f'Certificate sent to {customer.email}.')
     else:
@@ -95,6 +110,35 @@ def certificate_email(request, pk):
     return redirect('documents:certificate_detail', pk=pk)
 
 
+@login_required
+def certificate_status(request, pk):
+    certificate = get_object_or_404(
+        Certificate.objects.only('render_status', 'render_attempts', 'render_error', 'rendered_at'), pk=pk
+    )
+    return JsonResponse({
+        'id': certificate.pk,
+        'status': certificate.render_status,
+        'attempts': certificate.render_attempts,
+        'error': certificate.render_error,
+        'rendered_at': certificate.rendered_at,
+    })
+
+
+@login_required
+@require_POST
+def certificate_retry(request, pk):
+    certificate = get_object_or_404(Certificate.objects.select_related('item__category', 'piece'), pk=pk)
+    if not retry_certificate_pdf(certificate.pk):
+        ensure_certificate_pdf(certificate)
+    messages.success(request, f'Generating the PDF of {certificate.certificate_number} again.')
+    return redirect('documents:certificate_detail', pk=pk)
+
+
+@login_required
+def certificate_render_stats(request):
+    return JsonResponse(render_stats())
+
+
 @login_required
 def certificate_delete(request, pk):
     certificate = get_object_or_404(Certificate, pk=pk)
@@ -106,3 +150,170 @@ def certificate_delete(request, pk):
         messages.success(request, f'Certificate {number} deleted successfully.')
         return redirect('documents:certificate_list')
     return render(request, 'documents/certificate_confirm_delete.html', {'certificate': certificate})
+
+
+@require_GET
+def certificate_verify(request, number=None):
+    """Public page confirming a certificate is genuine; reached from the QR code on the PDF."""
+    if number is None:
+        query = request.GET.get('number', '').strip()
+        if query and normalize_number(query):
+            return redirect('verify:certificate_verify', number=normalize_number(query))
+        return render(request, 'documents/certificate_verify.html', {
+            'number': query, 'searched': bool(query),
+        }, status=404 if query else 200)
+
+    normalized = normalize_number(number)
+    if normalized and normalized != number:
+        return redirect('verify:certificate_verify', number=normalized)
+    try:
+        certificate = verify(request, normalized) if normalized else None
+    except RateLimited:
+        response = render(request, 'documents/certificate_verify.html', {
+            'number': number, 'searched': True, 'rate_limited': True,
+        }, status=429)
+        response['Retry-After'] = RATE_WINDOW_SECONDS
+        return response
+
+    response = render(request, 'documents/certificate_verify.html', {
+        'number': number, 'searched': True, 'certificate': certificate,
+    }, status=200 if certificate else 404)
+    patch_cache_control(response, public=True, max_age=settings.CERTIFICATE_VERIFY_CACHE_SECONDS)
+    return response
+
+
+@require_GET
+def certificate_verify_json(request, number):
+    normalized = normalize_number(number)
+    try:
+        certificate = verify(request, normalized) if normalized else None
+    except RateLimited:
+        response = JsonResponse({'error': 'Too many requests'}, status=429)
+        response['Retry-After'] = RATE_WINDOW_SECONDS
+        return response
+
+    if certificate is None:
+        response = JsonResponse({'valid': False, 'certificate_number': number}, status=404)
+    else:
+        image = certificate['item']['image']
+        item = {**certificate['item'], 'image': request.build_absolute_uri(image) if image else None}
+        response = JsonResponse({**certificate, 'item': item})
+    patch_cache_control(response, public=True, max_age=settings.CERTIFICATE_VERIFY_CACHE_SECONDS)
+    return response
+
+
+@login_required
+def catalog_list(request):
+    exports = CatalogExport.objects.select_related('category', 'requested_by').order_by('-created_at', '-pk')
+    paginator = Paginator(exports, ITEMS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    return render(request, 'documents/catalog_list.html', {
+        'exports': page_obj,
+        'page_obj': page_obj,
+        'form': CatalogExportForm(),
+        'building': any(export.status in ('pending', 'running') for export in page_obj),
+    })
+
+
+@login_required
+@require_POST
+def catalog_create(request):
+    form = CatalogExportForm(request.POST)
+    if form.is_valid():
+        export = form.save(commit=False)
+        export.requested_by = request.user
+        export.save()
+        request_export(export)
+        messages.success(request, 'Catalog export started. The download link appears here when it is ready.')
+    else:
+        messages.error(request, 'Choose a valid category.')
+    return redirect('catalogs:catalog_list')
+
+
+@login_required
+def catalog_status(request, pk):
+    export = get_object_or_404(CatalogExport, pk=pk)
+    return JsonResponse({
+        'id': export.pk,
+        'status': export.status,
+        'total_items': export.total_items,
+        'rendered_items': export.rendered_items,
+        'progress': export.progress,
+        'pages': export.pages,
+        'error': export.error,
+    })
+
+
+@login_required
+def catalog_download(request, pk):
+    export = get_object_or_404(CatalogExport, pk=pk)
+    if export.status != 'done' or not export.pdf_file:
+        raise Http404("Catalog PDF not found")
+    return serve_file(request, export.pdf_file, filename=f'catalog-{export.created_at:%Y-%m-%d}.pdf')
+
+
+@login_required
+@require_POST
+def catalog_delete(request, pk):
+    export = get_object_or_404(CatalogExport, pk=pk)
+    if export.status == 'running':
+        messages.error(request, 'This catalog is still being built.')
+        return redirect('catalogs:catalog_list')
+    if export.pdf_file:
+        export.pdf_file.delete(save=False)
+    export.delete()
+    messages.success(request, 'Catalog export deleted.')
+    return redirect('catalogs:catalog_list')
+
+
+def _label_response(request, form, labels, title, filename):
+    if not labels:
+        messages.error(request, 'There is nothing to label.')
+        return None
+    data = form.cleaned_data
+    fh, pages = build_label_sheet(
+        labels, data['layout'], symbology=data['symbology'], include_prices=data['include_prices'],
+        skip=data['skip'], title=title,
+    )
+    return FileResponse(fh, as_attachment=True, filename=f'{filename}-{timezone.localdate():%Y%m%d}.pdf',
+                        content_type='application/pdf')
+
+
+@login_required
+def label_sheet(request):
+    """Label sheet for the item list's current selection (its filters arrive in the query string)."""
+    items = filter_items(JewelryItem.objects.all(), request.GET)
+    form = LabelSheetForm(request.GET if 'layout' in request.GET else None)
+    if form.is_valid():
+        try:
+            labels = item_labels(items, per_unit=form.cleaned_data['copies'] == 'stock')
+        except TooManyLabels:
+            messages.error(request, f'That is more than {MAX_LABELS} labels; narrow the selection.')
+        else:
+            response = _label_response(request, form, labels, 'Item labels', 'labels')
+            if response:
+                return response
+    return render(request, 'documents/label_form.html', {
+        'form': form,
+        'item_count': items.count(),
+        'filters': [
+            (name, value) for name, value in request.GET.items()
+            if value and name not in form.fields and name != 'page'
+        ],
+    })
+
+
+@login_required
+def receipt_label_sheet(request, pk):
+    receipt = get_object_or_404(GoodsReceipt.objects.select_related('order'), pk=pk)
+    form = LabelSheetForm(request.GET if 'layout' in request.GET else None)
+    if form.is_valid():
+        try:
+            labels = receipt_labels(receipt)
+        except TooManyLabels:
+            messages.error(request, f'That is more than {MAX_LABELS} labels.')
+        else:
+            response = _label_response(request, form, labels, f'Labels for {receipt}', f'receipt-{receipt.pk}-labels')
+            if response:
+                return response
+    return render(request, 'documents/label_form.html', {'form': form, 'receipt': receipt})
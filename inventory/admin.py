@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Category, JewelryItem
+from .models import (
+    Category, JewelryItem, MarkupRule, MetalSpotPrice, SerializedPiece, StocktakeLine, StocktakeSession,
+)
 
 
 @admin.register(Category)
@@ -8,9 +10,72 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ['name']
 
 
+class MarginBandFilter(admin.SimpleListFilter):
+    title = 'margin'
+    parameter_name = 'margin_band'
+    # value -> (label, lower bound or None, upper bound or None), bounds in %.
+    BANDS = {
+        'negative': ('Below cost', None, 0),
+        '0-20': ('0-20%', 0, 20),
+        '20-50': ('20-50%', 20, 50),
+        '50-100': ('50-100%', 50, 100),
+        '100+': ('100% and more', 100, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(value, label) for value, (label, _, _) in self.BANDS.items()]
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.BANDS:
+            return queryset
+        _, low, high = self.BANDS[self.value()]
+        if low is not None:
+            queryset = queryset.filter(margin_percent__gte=low)
+        if high is not None:
+            queryset = queryset.filter(margin_percent__lt=high)
+        return queryset
+
+
 @admin.register(JewelryItem)
 class JewelryItemAdmin(admin.ModelAdmin):
-    list_display = ['sku', 'name', 'category', 'supplier', 'metal', 'sale_price', 'quantity_on_hand', 'is_active']
-    list_filter = ['category', 'supplier', 'metal', 'is_active']
+    list_display = ['sku', 'name', 'category', 'supplier', 'metal', 'sale_price', 'margin_percent', 'markup_amount', 'quantity_on_hand', 'is_active']
+    list_filter = ['category', 'supplier', 'metal', 'is_active', MarginBandFilter]
     search_fields = ['sku', 'name', 'description']
     list_editable = ['quantity_on_hand', 'is_active']
+
+
+@admin.register(MetalSpotPrice)
+class MetalSpotPriceAdmin(admin.ModelAdmin):
+    list_display = ['metal', 'price_per_gram', 'default_fineness', 'updated_at']
+    list_editable = ['price_per_gram', 'default_fineness']
+
+
+@admin.register(MarkupRule)
+class MarkupRuleAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'category', 'metal', 'metal_multiplier', 'labour_per_gram', 'fixed_amount', 'min_cost_multiplier']
+    list_editable = ['metal_multiplier', 'labour_per_gram', 'fixed_amount', 'min_cost_multiplier']
+    list_filter = ['category', 'metal']
+
+
+@admin.register(SerializedPiece)
+class SerializedPieceAdmin(admin.ModelAdmin):
+    list_display = ['serial', 'item', 'status', 'invoice_line', 'received_at']
+    list_filter = ['status']
+    search_fields = ['serial', 'item__sku']
+    raw_id_fields = ['item', 'invoice_line']
+
+
+class StocktakeLineInline(admin.TabularInline):
+    model = StocktakeLine
+    fields = ['sku', 'expected', 'counted', 'unit_cost']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(StocktakeSession)
+class StocktakeSessionAdmin(admin.ModelAdmin):
+    list_display = ['name', 'category', 'status', 'created_at', 'applied_at']
+    list_filter = ['status']
+    readonly_fields = ['status', 'applied_at']
+    inlines = [StocktakeLineInline]
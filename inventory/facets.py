@@ -0,0 +1,79 @@
+"""
+Facet counts for item_list.
+
+One grouped query counts items per (category, supplier, metal, purity)
+combination for the search and range filters. The counts for every facet are
+then folded from those rows in Python, each facet ignoring its own selection
+so the dropdown shows what picking another value would return. The grouped
+rows are cached per filter set for FACET_CACHE_SECONDS and invalidated
+whenever the catalog changes. Invalidation bumps a version in Django's cache,
+so it reaches every web process only with a shared cache (CACHE_REDIS_URL);
+otherwise other processes catch up when their entries expire.
+"""
+import hashlib
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+FACET_FIELDS = {
+    'category': 'category_id',
+    'supplier': 'supplier_id',
+    'metal': 'metal',
+    'purity': 'purity',
+}
+VERSION_KEY = 'inventory:facets:version'
+
+
+def catalog_version():
+    return cache.get_or_set(VERSION_KEY, 1, None)
+
+
+def invalidate_facets():
+    """Call after any change to items; cached counts for older versions are ignored."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def facet_rows(queryset, cache_parts):
+    """
+    Return ``[(category_id, supplier_id, metal, purity, count), ...]`` for ``queryset``.
+
+    ``cache_parts`` must identify the filters applied to ``queryset``.
+    """
+    digest = hashlib.md5(repr(cache_parts).encode()).hexdigest()
+    key = f'inventory:facets:{catalog_version()}:{digest}'
+    rows = cache.get(key)
+    if rows is None:
+        columns = list(FACET_FIELDS.values())
+        rows = list(
+            queryset.order_by().values(*columns).annotate(n=Count('pk')).values_list(*columns, 'n')
+        )
+        cache.set(key, rows, settings.FACET_CACHE_SECONDS)
+    return rows
+
+
+def facet_counts(rows, selected):
+    """
+    Fold grouped rows into ``({facet: Counter(value -> count)}, total)``.
+
+    ``selected`` maps facet names to the chosen value as a string (or empty).
+    A row counts towards facet F when it matches every selection except F's;
+    ``total`` is the number of items matching all selections.
+    """
+    names = list(FACET_FIELDS)
+    counts = {name: Counter() for name in names}
+    total = 0
+    for *values, n in rows:
+        misses = [i for i, name in enumerate(names) if selected.get(name) and str(values[i]) != selected[name]]
+        if not misses:
+            total += n
+            for name, value in zip(names, values):
+                counts[name][value] += n
+        elif len(misses) == 1:
+            i = misses[0]
+            counts[names[i]][values[i]] += n
+    return counts, total
@@ -0,0 +1,75 @@
+"""
+The item list's filters, shared with what is built from its selection
+(label sheets): a search, price/weight/margin ranges on indexed columns,
+the facet dropdowns and the sort.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+
+from .facets import FACET_FIELDS
+
+RANGE_FILTERS = (
+    ('min_price', 'sale_price__gte'), ('max_price', 'sale_price__lte'),
+    ('min_weight', 'weight_grams__gte'), ('max_weight', 'weight_grams__lte'),
+    ('min_margin', 'margin_percent__gte'), ('max_margin', 'margin_percent__lte'),
+)
+
+# ?sort= values -> ORM ordering; '' keeps the model default.
+ITEM_SORT_OPTIONS = {
+    'margin': ('margin_percent', 'pk'),
+    '-margin': ('-margin_percent', '-pk'),
+    'price': ('sale_price', 'pk'),
+    '-price': ('-sale_price', '-pk'),
+}
+
+
+def decimal_param(params, name):
+    try:
+        value = Decimal(params.get(name, '').strip())
+    except InvalidOperation:
+        return None
+    return value if value.is_finite() else None
+
+
+def search_and_ranges(items, params):
+    """Apply the search and range filters; returns ``(items, search, ranges)``."""
+    search = params.get('search', '')
+    if search:
+        items = items.filter(Q(sku__icontains=search) | Q(name__icontains=search))
+    ranges = {}
+    for param, lookup in RANGE_FILTERS:
+        value = decimal_param(params, param)
+        if value is not None:
+            ranges[param] = value
+            items = items.filter(**{lookup: value})
+    return items, search, ranges
+
+
+def facet_selection(params):
+    """The facet dropdown values in ``params``, '' where unset or invalid."""
+    selected = {name: params.get(name, '') for name in FACET_FIELDS}
+    for name in ('category', 'supplier'):
+        if not selected[name].isdigit():
+            selected[name] = ''
+    return selected
+
+
+def select_facets(items, selected):
+    for name, column in FACET_FIELDS.items():
+        if selected[name]:
+            items = items.filter(**{column: selected[name]})
+    return items
+
+
+def sort_items(items, sort):
+    if sort in ITEM_SORT_OPTIONS:
+        items = items.order_by(*ITEM_SORT_OPTIONS[sort])
+    return items
+
+
+def filter_items(items, params):
+    """``items`` narrowed and ordered as item_list shows them for the query ``params``."""
+    items, _, _ = search_and_ranges(items, params)
+    items = select_facets(items, facet_selection(params))
+    return sort_items(items, params.get('sort', ''))
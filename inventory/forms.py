@@ -1,5 +1,5 @@
 from django import forms
-from .models import JewelryItem, Category
+from .models import JewelryItem, Category, StocktakeSession
 from crm.models import Supplier
 
 
@@ -36,3 +36,14 @@ class CategoryForm(forms.ModelForm):
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
         }
+
+
+class StocktakeSessionForm(forms.ModelForm):
+    class Meta:
+        model = StocktakeSession
+        fields = ['name', 'category', 'notes']
+        widgets = {
+            'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g., Year-end count'}),
+            'category': forms.Select(attrs={'class': 'form-select'}),
+            'notes': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
+        }
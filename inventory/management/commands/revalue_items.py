@@ -0,0 +1,59 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.models import JewelryItem, MetalSpotPrice
+from inventory.revaluation import revalue
+
+
+class Command(BaseCommand):
+    help = 'Reprice items from metal spot prices and markup rules.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report the changes without saving them.')
+        parser.add_argument('--category', help='Only reprice items in this category (by name).')
+        parser.add_argument('--metal', choices=[code for code, _ in JewelryItem.METAL_CHOICES])
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per UPDATE batch.')
+        parser.add_argument('--show', type=int, default=20, help='Largest changes to print.')
+        parser.add_argument('--report', help='Write every change to this CSV file.')
+
+    def handle(self, *args, **options):
+        if not MetalSpotPrice.objects.exists():
+            raise CommandError('No metal spot prices configured; add them in the admin first.')
+
+        queryset = JewelryItem.objects.all()
+        if options['category']:
+            queryset = queryset.filter(category__name=options['category'])
+        if options['metal']:
+            queryset = queryset.filter(metal=options['metal'])
+
+        start = time.perf_counter()
+        report = revalue(queryset, dry_run=options['dry_run'], batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - start
+        changes = report['changes']
+
+        biggest = sorted(changes, key=lambda change: abs(change[3] - change[2]), reverse=True)[:options['show']]
+        if biggest:
+            self.stdout.write(f"{'SKU':<20} {'old':>12} {'new':>12} {'change':>12}")
+            for _, sku, old, new in biggest:
+                self.stdout.write(f'{sku:<20} {old:>12} {new:>12} {new - old:>+12}')
+            self.stdout.write('')
+
+        for reason, count in report['skipped'].items():
+            if count:
+                self.stdout.write(f'Skipped {count} items: {reason}')
+
+        if options['report']:
+            with open(options['report'], 'w', newline='') as fh:
+                writer = csv.writer(fh)
+                writer.writerow(['id', 'sku', 'old_price', 'new_price', 'change'])
+                for pk, sku, old, new in changes:
+                    writer.writerow([pk, sku, old, new, new - old])
+            self.stdout.write(f"Wrote {len(changes)} changes to {options['report']}")
+
+        verb = 'Would reprice' if report['dry_run'] else 'Repriced'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(changes)} of {report['items']} items in {elapsed:.2f}s "
+            f"(total {report['old_total']} -> {report['new_total']})"
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_customer_customer_updated_at_id_idx'),
+        ('inventory', '0004_jewelryitem_supplier'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='jewelryitem',
+            index=models.Index(fields=['updated_at', 'id'], name='item_updated_at_id_idx'),
+        ),
+    ]
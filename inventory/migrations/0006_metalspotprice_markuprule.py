@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:39
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_jewelryitem_item_updated_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetalSpotPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metal', models.CharField(choices=[('gold', 'Gold'), ('silver', 'Silver'), ('platinum', 'Platinum'), ('other', 'Other')], max_length=20, unique=True)),
+                ('price_per_gram', models.DecimalField(decimal_places=4, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0'))])),
+                ('default_fineness', models.DecimalField(blank=True, decimal_places=4, help_text='Fine-metal share for items with purity N/A (e.g. 0.95 for platinum). Leave empty to skip them.', max_digits=5, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['metal'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MarkupRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metal', models.CharField(blank=True, choices=[('gold', 'Gold'), ('silver', 'Silver'), ('platinum', 'Platinum'), ('other', 'Other')], max_length=20)),
+                ('metal_multiplier', models.DecimalField(decimal_places=3, default=Decimal('1.000'), max_digits=6, validators=[django.core.validators.MinValueValidator(Decimal('0'))])),
+                ('labour_per_gram', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0'))])),
+                ('fixed_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0'))])),
+                ('min_cost_multiplier', models.DecimalField(decimal_places=3, default=Decimal('1.000'), max_digits=6, validators=[django.core.validators.MinValueValidator(Decimal('0'))])),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='markup_rules', to='inventory.category')),
+            ],
+            options={
+                'ordering': ['category__name', 'metal'],
+                'constraints': [models.UniqueConstraint(fields=('category', 'metal'), name='markup_rule_category_metal_uniq')],
+            },
+        ),
+    ]
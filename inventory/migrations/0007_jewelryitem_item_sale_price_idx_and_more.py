@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_customer_customer_updated_at_id_idx'),
+        ('inventory', '0006_metalspotprice_markuprule'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='jewelryitem',
+            index=models.Index(fields=['sale_price'], name='item_sale_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jewelryitem',
+            index=models.Index(fields=['weight_grams'], name='item_weight_grams_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jewelryitem',
+            index=models.Index(fields=['category', 'supplier', 'metal', 'purity'], name='item_facet_idx'),
+        ),
+    ]
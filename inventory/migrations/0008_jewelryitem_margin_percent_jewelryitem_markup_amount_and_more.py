@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:44
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_customer_customer_updated_at_id_idx'),
+        ('inventory', '0007_jewelryitem_item_sale_price_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jewelryitem',
+            name='margin_percent',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(cost_price__gt=0, then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(models.F('sale_price'), '-', models.F('cost_price')), models.FloatField()), '*', models.Value(100)), '/', django.db.models.functions.comparison.Cast('cost_price', models.FloatField()))), default=models.Value(Decimal('0.00')), output_field=models.DecimalField(decimal_places=2, max_digits=12)), output_field=models.DecimalField(decimal_places=2, max_digits=12), verbose_name='Margin %'),
+        ),
+        migrations.AddField(
+            model_name='jewelryitem',
+            name='markup_amount',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('sale_price'), '-', models.F('cost_price')), output_field=models.DecimalField(decimal_places=2, max_digits=12)),
+        ),
+        migrations.AddIndex(
+            model_name='jewelryitem',
+            index=models.Index(fields=['margin_percent'], name='item_margin_percent_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_jewelryitem_margin_percent_jewelryitem_markup_amount_and_more'),
+        ('sales', '0004_invoice_invoice_updated_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerializedPiece',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveIntegerField(editable=False)),
+                ('serial', models.CharField(max_length=64, unique=True)),
+                ('status', models.CharField(choices=[('in_stock', 'In Stock'), ('reserved', 'Reserved'), ('sold', 'Sold'), ('returned', 'Returned')], default='in_stock', max_length=20)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('invoice_line', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pieces', to='sales.invoiceline')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pieces', to='inventory.jewelryitem')),
+            ],
+            options={
+                'ordering': ['item', 'sequence'],
+                'indexes': [models.Index(fields=['item', 'status'], name='piece_item_status_idx')],
+                'constraints': [models.UniqueConstraint(fields=('item', 'sequence'), name='piece_item_sequence_unique')],
+            },
+        ),
+    ]
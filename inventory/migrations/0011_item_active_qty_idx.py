@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_populate_contact_lookup_keys'),
+        ('inventory', '0010_stocktake'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='jewelryitem',
+            index=models.Index(fields=['is_active', 'quantity_on_hand'], name='item_active_qty_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:21
+
+import config.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_item_active_qty_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='jewelryitem',
+            name='image',
+            field=models.ImageField(blank=True, max_length=255, null=True, upload_to=config.storage.ShardedUploadTo('jewelry_images', date_field='created_at')),
+        ),
+    ]
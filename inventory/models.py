@@ -1,6 +1,11 @@
 from django.db import models
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from decimal import Decimal
+from config.storage import ShardedUploadTo
 from crm.models import Supplier
 
 
@@ -44,13 +49,43 @@ class JewelryItem(models.Model):
     cost_price = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0'))])
     sale_price = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0'))])
     quantity_on_hand = models.PositiveIntegerField(default=0)
-    image = models.ImageField(upload_to='jewelry_images/', null=True, blank=True)
+    image = models.ImageField(upload_to=ShardedUploadTo('jewelry_images', date_field='created_at'), max_length=255, null=True, blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Stored generated columns so margins can be sorted, filtered and
+    # aggregated in SQL. Same semantics as profit_margin: 0 when cost is 0.
+    margin_percent = models.GeneratedField(
+        expression=Case(
+            # Divide as floats: SQLite stores whole-number decimals as integers
+            # and would otherwise truncate the quotient.
+            When(cost_price__gt=0, then=Cast(F('sale_price') - F('cost_price'), models.FloatField()) * 100
+                 / Cast('cost_price', models.FloatField())),
+            default=Value(Decimal('0.00')),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+        verbose_name='Margin %',
+    )
+    markup_amount = models.GeneratedField(
+        expression=F('sale_price') - F('cost_price'),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+    )
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='item_updated_at_id_idx'),
+            models.Index(fields=['sale_price'], name='item_sale_price_idx'),
+            models.Index(fields=['weight_grams'], name='item_weight_grams_idx'),
+            # Covers the grouped facet-count query in inventory/facets.py.
+            models.Index(fields=['category', 'supplier', 'metal', 'purity'], name='item_facet_idx'),
+            models.Index(fields=['margin_percent'], name='item_margin_percent_idx'),
+            # Low-stock scan (purchasing/reorder.py): active items at or below a quantity.
+            models.Index(fields=['is_active', 'quantity_on_hand'], name='item_active_qty_idx'),
+        ]
 
     def __str__(self):
         return f'{self.sku} - {self.name}'
@@ -60,3 +95,167 @@ class JewelryItem(models.Model):
         if self.cost_price and self.cost_price > 0:
             return ((self.sale_price - self.cost_price) / self.cost_price) * 100
         return Decimal('0')
+
+
+class SerializedPiece(models.Model):
+    """
+    One physical, individually labelled piece of a JewelryItem.
+
+    ``serial`` is the value printed on the piece's barcode tag. Pieces are
+    created in bulk on receipt (inventory/scanning.py) and tied to the
+    invoice line that sold them and the certificates issued for them.
+    """
+    STATUS_CHOICES = [
+        ('in_stock', 'In Stock'),
+        ('reserved', 'Reserved'),
+        ('sold', 'Sold'),
+        ('returned', 'Returned'),
+    ]
+
+    item = models.ForeignKey(JewelryItem, on_delete=models.CASCADE, related_name='pieces')
+    sequence = models.PositiveIntegerField(editable=False)
+    serial = models.CharField(max_length=64, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='in_stock')
+    invoice_line = models.ForeignKey(
+        'sales.InvoiceLine', on_delete=models.SET_NULL, null=True, blank=True, related_name='pieces'
+    )
+    received_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['item', 'sequence']
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'sequence'], name='piece_item_sequence_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['item', 'status'], name='piece_item_status_idx'),
+        ]
+
+    def __str__(self):
+        return self.serial
+
+
+class StocktakeSession(models.Model):
+    """
+    A stock count. Scans accumulate in StocktakeScan; applying the session
+    snapshots the variances into StocktakeLine and corrects quantity_on_hand
+    (see inventory/stocktake.py).
+    """
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('applied', 'Applied'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    name = models.CharField(max_length=200)
+    category = models.ForeignKey(
+        Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='stocktakes',
+        help_text='Only count this category. Leave empty to count every active item.',
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    applied_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.name
+
+
+class StocktakeScan(models.Model):
+    """Staging row: one uploaded scan (or counted batch) of a barcode. Unknown codes keep item empty."""
+    session = models.ForeignKey(StocktakeSession, on_delete=models.CASCADE, related_name='scans')
+    item = models.ForeignKey(JewelryItem, on_delete=models.CASCADE, null=True, blank=True, related_name='stocktake_scans')
+    code = models.CharField(max_length=64)
+    quantity = models.PositiveIntegerField(default=1)
+    scanned_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['session', 'item'], name='stocktake_scan_session_item'),
+        ]
+
+    def __str__(self):
+        return f'{self.code} x{self.quantity}'
+
+
+class StocktakeLine(models.Model):
+    """Variance of one item as approved when its session was applied."""
+    session = models.ForeignKey(StocktakeSession, on_delete=models.CASCADE, related_name='lines')
+    item = models.ForeignKey(JewelryItem, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    sku = models.CharField(max_length=50, verbose_name='SKU')
+    expected = models.PositiveIntegerField()
+    counted = models.PositiveIntegerField()
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        ordering = ['sku']
+
+    def __str__(self):
+        return f'{self.sku}: {self.expected} -> {self.counted}'
+
+    @property
+    def variance(self):
+        return self.counted - self.expected
+
+    @property
+    def variance_cost(self):
+        return self.variance * self.unit_cost
+
+
+class MetalSpotPrice(models.Model):
+    """Current price of one gram of the pure metal, used by the revaluation engine."""
+    metal = models.CharField(max_length=20, choices=JewelryItem.METAL_CHOICES, unique=True)
+    price_per_gram = models.DecimalField(max_digits=12, decimal_places=4, validators=[MinValueValidator(Decimal('0'))])
+    default_fineness = models.DecimalField(
+        max_digits=5, decimal_places=4, null=True, blank=True,
+        help_text='Fine-metal share for items with purity N/A (e.g. 0.95 for platinum). Leave empty to skip them.',
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['metal']
+
+    def __str__(self):
+        return f'{self.get_metal_display()} @ {self.price_per_gram}/g'
+
+
+class MarkupRule(models.Model):
+    """
+    How a sale price is built from the metal value.
+
+    sale_price = fine grams x spot x metal_multiplier
+                 + weight x labour_per_gram + fixed_amount,
+    never less than cost_price x min_cost_multiplier. The most specific rule
+    wins: category + metal, then category, then metal, then the default rule
+    (no category, no metal).
+    """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='markup_rules')
+    metal = models.CharField(max_length=20, choices=JewelryItem.METAL_CHOICES, blank=True)
+    metal_multiplier = models.DecimalField(max_digits=6, decimal_places=3, default=Decimal('1.000'),
+                                           validators=[MinValueValidator(Decimal('0'))])
+    labour_per_gram = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'),
+                                          validators=[MinValueValidator(Decimal('0'))])
+    fixed_amount = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'),
+                                       validators=[MinValueValidator(Decimal('0'))])
+    min_cost_multiplier = models.DecimalField(max_digits=6, decimal_places=3, default=Decimal('1.000'),
+                                              validators=[MinValueValidator(Decimal('0'))])
+
+    class Meta:
+        ordering = ['category__name', 'metal']
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'metal'], name='markup_rule_category_metal_uniq'),
+        ]
+
+    def __str__(self):
+        category = self.category.name if self.category else 'All categories'
+        metal = self.get_metal_display() if self.metal else 'any metal'
+        return f'{category} / {metal}'
+
+    def clean(self):
+        # NULL categories don't collide in the unique constraint, so check here.
+        clash = MarkupRule.objects.filter(category=self.category, metal=self.metal).exclude(pk=self.pk)
+        if clash.exists():
+            raise ValidationError('A markup rule for this category and metal already exists.')
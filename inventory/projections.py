@@ -0,0 +1,22 @@
+"""
+Column projections for inventory list pages and JSON endpoints.
+
+Each tuple lists exactly the columns its template or JSON payload reads, so
+the queries skip the large TextFields (description, stone_details) and the
+JSON endpoints can use .values() instead of building model instances.
+"""
+
+# item_list.html: model instances are kept for get_metal_display and the
+# related category/supplier names.
+ITEM_LIST_FIELDS = (
+    'sku', 'name', 'metal', 'purity', 'weight_grams', 'sale_price', 'margin_percent', 'is_active',
+    'category__name', 'supplier__name',
+)
+
+# Filter dropdowns on item_list.
+CATEGORY_OPTION_FIELDS = ('id', 'name')
+SUPPLIER_OPTION_FIELDS = ('id', 'name')
+
+# JSON endpoints (.values() rows).
+ITEM_JSON_FIELDS = ('id', 'sku', 'name', 'sale_price', 'quantity_on_hand')
+ITEM_SEARCH_FIELDS = ('id', 'sku', 'name', 'sale_price')
@@ -0,0 +1,133 @@
+"""
+Serialized pieces: bulk serial generation and barcode lookup.
+
+A scan resolves a barcode with one query on the unique ``serial`` index
+(joined to the item by primary key). Results are kept in a small in-process
+LRU so a scanner re-reading the same tag doesn't touch the database; entries
+are dropped when a piece or item is saved in this process (inventory/signals.py)
+and expire after SCAN_CACHE_SECONDS, which bounds how stale another worker
+process can be.
+"""
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from config.cache import MISSING, TTLCache
+
+from .facets import invalidate_facets
+from .models import JewelryItem, SerializedPiece
+
+SCAN_FIELDS = (
+    'id', 'serial', 'status', 'invoice_line_id', 'received_at',
+    'item_id', 'item__sku', 'item__name', 'item__sale_price', 'item__quantity_on_hand', 'item__is_active',
+)
+ITEM_SCAN_FIELDS = ('id', 'sku', 'name', 'sale_price', 'quantity_on_hand', 'is_active')
+
+_cache = TTLCache('SCAN_CACHE_SIZE', 'SCAN_CACHE_SECONDS')
+
+
+def generate_serials(item, count, add_stock=True, received_at=None):
+    """
+    Create ``count`` pieces for ``item`` with serials ``<SKU>-<sequence>``.
+
+    The item row is locked while the next sequence numbers are taken, so two
+    receipts of the same item can't hand out the same serial. With
+    ``add_stock`` the item's quantity_on_hand goes up by ``count``. The
+    pieces are stamped ``received_at`` (default now), which a goods receipt
+    sets to its own time so its label sheet can find them. Returns the new
+    pieces.
+    """
+    if count < 1:
+        return []
+    now = timezone.now()
+    received_at = received_at or now
+    with transaction.atomic():
+        JewelryItem.objects.select_for_update().filter(pk=item.pk).values_list('pk').get()
+        start = (SerializedPiece.objects.filter(item=item).aggregate(last=Max('sequence'))['last'] or 0) + 1
+        pieces = SerializedPiece.objects.bulk_create([
+            SerializedPiece(item=item, sequence=seq, serial=f'{item.sku}-{seq:05d}', received_at=received_at)
+            for seq in range(start, start + count)
+        ])
+        if add_stock:
+            JewelryItem.objects.filter(pk=item.pk).update(
+                quantity_on_hand=F('quantity_on_hand') + count, updated_at=now,
+            )
+            transaction.on_commit(invalidate_facets)
+    transaction.on_commit(clear_scan_cache)
+    return pieces
+
+
+def piece_payload(row):
+    return {
+        'type': 'piece',
+        'serial': row['serial'],
+        'piece_id': row['id'],
+        'status': row['status'],
+        'in_stock': row['status'] == 'in_stock' and row['item__is_active'],
+        'invoice_line_id': row['invoice_line_id'],
+        'received_at': row['received_at'].isoformat(),
+        'item': {
+            'id': row['item_id'],
+            'sku': row['item__sku'],
+            'name': row['item__name'],
+            'sale_price': str(row['item__sale_price']),
+            'quantity_on_hand': row['item__quantity_on_hand'],
+            'is_active': row['item__is_active'],
+        },
+    }
+
+
+def item_payload(row):
+    # Untracked items are labelled with their SKU.
+    return {
+        'type': 'item',
+        'serial': None,
+        'piece_id': None,
+        'status': None,
+        'in_stock': row['quantity_on_hand'] > 0 and row['is_active'],
+        'invoice_line_id': None,
+        'received_at': None,
+        'item': {
+            'id': row['id'],
+            'sku': row['sku'],
+            'name': row['name'],
+            'sale_price': str(row['sale_price']),
+            'quantity_on_hand': row['quantity_on_hand'],
+            'is_active': row['is_active'],
+        },
+    }
+
+
+def piece_queryset(code):
+    return SerializedPiece.objects.filter(serial=code).values(*SCAN_FIELDS)
+
+
+def item_queryset(code):
+    return JewelryItem.objects.filter(sku=code).values(*ITEM_SCAN_FIELDS)
+
+
+def clear_scan_cache():
+    _cache.clear()
+
+
+def resolve(code):
+    """Payload for a scanned barcode: a piece by serial, else an item by SKU, else None."""
+    payload = _cache.get(code)
+    if payload is not MISSING:
+        return payload
+    row = piece_queryset(code).first()
+    if row is not None:
+        return _cache.set(code, piece_payload(row))
+    row = item_queryset(code).first()
+    return _cache.set(code, item_payload(row) if row is not None else None)
+
+
+async def aresolve(code):
+    payload = _cache.get(code)
+    if payload is not MISSING:
+        return payload
+    row = await piece_queryset(code).afirst()
+    if row is not None:
+        return _cache.set(code, piece_payload(row))
+    row = await item_queryset(code).afirst()
+    return _cache.set(code, item_payload(row) if row is not None else None)
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from crm.models import Supplier
+
+from .facets import invalidate_facets
+from .models import Category, JewelryItem, SerializedPiece
+from .scanning import clear_scan_cache
+
+
+@receiver(post_save, sender=JewelryItem)
+@receiver(post_delete, sender=JewelryItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Supplier)  # items' supplier is set to NULL without an item signal
+def catalog_changed(sender, **kwargs):
+    invalidate_facets()
+
+
+@receiver(post_save, sender=JewelryItem)
+@receiver(post_delete, sender=JewelryItem)
+@receiver(post_save, sender=SerializedPiece)
+@receiver(post_delete, sender=SerializedPiece)
+def scan_target_changed(sender, **kwargs):
+    clear_scan_cache()
@@ -0,0 +1,214 @@
+"""
+Stocktake (cycle count) sessions.
+
+Scans arrive as lines of ``<barcode or SKU>[,<count>]`` from a file upload or
+a handheld posting its buffer. They are resolved in batches (piece serials
+first, then SKUs) and appended to the StocktakeScan staging table, so
+several devices can upload into one session without contention.
+
+variances() compares the session with quantity_on_hand in one grouped query:
+items in scope LEFT JOIN the session's scans, summed per item, keeping only
+rows where the count differs. apply() snapshots those rows as StocktakeLine
+and writes the counted quantities with bulk_update.
+"""
+import re
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, FilteredRelation, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import JewelryItem, SerializedPiece, StocktakeLine, StocktakeScan, StocktakeSession
+from .scanning import clear_scan_cache
+
+# Codes resolved per query; keeps IN lists under SQL Server's parameter limit.
+RESOLVE_CHUNK_SIZE = 500
+MAX_ERRORS_REPORTED = 20
+ZERO = Decimal('0.00')
+
+FIELD_SEPARATOR = re.compile(r'[,;\t]')
+HEADER_CODES = {'code', 'barcode', 'sku', 'serial'}
+
+
+class StocktakeClosed(Exception):
+    pass
+
+
+def parse_line(line):
+    """Return ``(code, count)`` for one input line, None for blank/header lines; raises ValueError."""
+    if isinstance(line, bytes):
+        line = line.decode('utf-8-sig', errors='replace')
+    cells = [cell.strip().strip('"') for cell in FIELD_SEPARATOR.split(line.strip())]
+    code = cells[0] if cells else ''
+    if not code or code.lower() in HEADER_CODES:
+        return None
+    count = 1
+    if len(cells) > 1 and cells[1]:
+        count = int(cells[1])
+        if count < 0:
+            raise ValueError('negative count')
+    if len(code) > StocktakeScan._meta.get_field('code').max_length:
+        raise ValueError('code too long')
+    return code, count
+
+
+def resolve_codes(codes):
+    """Map each scanned code to an item id: piece serial first, then SKU."""
+    codes = list(codes)
+    resolved = {}
+    for start in range(0, len(codes), RESOLVE_CHUNK_SIZE):
+        chunk = codes[start:start + RESOLVE_CHUNK_SIZE]
+        resolved.update(SerializedPiece.objects.filter(serial__in=chunk).values_list('serial', 'item_id'))
+        rest = [code for code in chunk if code not in resolved]
+        if rest:
+            resolved.update(JewelryItem.objects.filter(sku__in=rest).values_list('sku', 'pk'))
+    return resolved
+
+
+def record_scans(session, lines, batch_size=1000):
+    """
+    Parse ``lines`` and append them to the session's staging table.
+
+    Lines are consumed lazily, ``batch_size`` at a time, so a large upload
+    never has to be held in memory. Repeated codes within a batch become a
+    single staging row. Returns a summary dict.
+    """
+    if session.status != 'open':
+        raise StocktakeClosed(f'Stocktake "{session}" is {session.get_status_display().lower()}.')
+    summary = {'lines': 0, 'units': 0, 'unknown': Counter(), 'errors': []}
+    batch = Counter()
+
+    def flush():
+        resolved = resolve_codes(batch)
+        StocktakeScan.objects.bulk_create([
+            StocktakeScan(session=session, item_id=resolved.get(code), code=code, quantity=count)
+            for code, count in batch.items()
+        ])
+        for code, count in batch.items():
+            if code not in resolved:
+                summary['unknown'][code] += count
+        batch.clear()
+
+    for number, line in enumerate(lines, start=1):
+        summary['lines'] = number
+        try:
+            parsed = parse_line(line)
+        except ValueError as exc:
+            if len(summary['errors']) < MAX_ERRORS_REPORTED:
+                summary['errors'].append(f'Line {number}: {exc}')
+            continue
+        if parsed is None:
+            continue
+        code, count = parsed
+        batch[code] += count
+        summary['units'] += count
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return summary
+
+
+def scope(session):
+    """Items expected in the count: the session's category (or everything) that is active, plus anything scanned."""
+    expected = Q(is_active=True)
+    if session.category_id:
+        expected &= Q(category_id=session.category_id)
+    scanned = StocktakeScan.objects.filter(session=session, item__isnull=False).values('item_id')
+    return JewelryItem.objects.filter(expected | Q(pk__in=scanned))
+
+
+def variances(session):
+    """
+    ``.values()`` rows where the count differs from quantity_on_hand.
+
+    Each row has id, sku, name, quantity_on_hand, cost_price, counted,
+    variance (counted - quantity_on_hand) and variance_value (at cost).
+    """
+    return (
+        scope(session)
+        .alias(session_scans=FilteredRelation('stocktake_scans', condition=Q(stocktake_scans__session=session)))
+        .values('id', 'sku', 'name', 'quantity_on_hand', 'cost_price')
+        .annotate(counted=Coalesce(Sum('session_scans__quantity'), Value(0)))
+        .annotate(
+            variance=F('counted') - F('quantity_on_hand'),
+            variance_value=ExpressionWrapper(
+                (F('counted') - F('quantity_on_hand')) * F('cost_price'),
+                output_field=DecimalField(max_digits=16, decimal_places=2),
+            ),
+        )
+        .exclude(variance=0)
+        .order_by('sku')
+    )
+
+
+def variance_totals(session):
+    """
+    Net variance in units and at cost.
+
+    Items with no variance contribute nothing, so this is simply everything
+    counted minus everything expected, two plain aggregates instead of a
+    pass over the variance rows.
+    """
+    value = DecimalField(max_digits=16, decimal_places=2)
+    expected = scope(session).aggregate(
+        units=Coalesce(Sum('quantity_on_hand'), Value(0)),
+        value=Coalesce(Sum(F('quantity_on_hand') * F('cost_price'), output_field=value), Value(ZERO), output_field=value),
+    )
+    counted = StocktakeScan.objects.filter(session=session, item__isnull=False).aggregate(
+        units=Coalesce(Sum('quantity'), Value(0)),
+        value=Coalesce(Sum(F('quantity') * F('item__cost_price'), output_field=value), Value(ZERO), output_field=value),
+    )
+    return {
+        'variance': counted['units'] - expected['units'],
+        'variance_value': (counted['value'] - expected['value']).quantize(ZERO),
+    }
+
+
+def summarize(session):
+    """Totals for the session page: units and distinct items scanned, unknown codes."""
+    scans = StocktakeScan.objects.filter(session=session)
+    totals = scans.aggregate(units=Coalesce(Sum('quantity'), Value(0)))
+    unknown = list(
+        scans.filter(item__isnull=True).values('code').annotate(units=Sum('quantity')).order_by('-units', 'code')
+    )
+    return {
+        'units': totals['units'],
+        'items': scans.filter(item__isnull=False).values('item_id').distinct().count(),
+        'unknown': unknown,
+    }
+
+
+def apply(session, batch_size=500):
+    """
+    Set quantity_on_hand to the counted quantity for every variance.
+
+    The session is locked and re-checked inside the transaction so it can
+    only be applied once. Returns the StocktakeLines written.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        session = StocktakeSession.objects.select_for_update().get(pk=session.pk)
+        if session.status != 'open':
+            raise StocktakeClosed(f'Stocktake "{session}" is {session.get_status_display().lower()}.')
+        rows = list(variances(session))
+        lines = [
+            StocktakeLine(
+                session=session, item_id=row['id'], sku=row['sku'], expected=row['quantity_on_hand'],
+                counted=row['counted'], unit_cost=row['cost_price'],
+            )
+            for row in rows
+        ]
+        StocktakeLine.objects.bulk_create(lines, batch_size=batch_size)
+        JewelryItem.objects.bulk_update(
+            [JewelryItem(pk=row['id'], quantity_on_hand=row['counted'], updated_at=now) for row in rows],
+            ['quantity_on_hand', 'updated_at'],
+            batch_size=batch_size,
+        )
+        session.status = 'applied'
+        session.applied_at = now
+        session.save(update_fields=['status', 'applied_at'])
+        transaction.on_commit(clear_scan_cache)
+    return lines
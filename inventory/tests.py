@@ -1,3 +1,332 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.db import connection
+from django.http import Http404
+from django.test import AsyncRequestFactory, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+
+from crm.models import Supplier
+
+from . import views
+from .facets import facet_rows
+from .models import Category, JewelryItem, MarkupRule, MetalSpotPrice, StocktakeLine, StocktakeSession
+from .revaluation import revalue
+from .scanning import clear_scan_cache, generate_serials, resolve
+from .stocktake import StocktakeClosed, apply, record_scans, variances
+
+
+def make_item(sku, **fields):
+    fields.setdefault('name', f'Item {sku}')
+    fields.setdefault('cost_price', Decimal('100.00'))
+    fields.setdefault('sale_price', Decimal('150.00'))
+    return JewelryItem.objects.create(sku=sku, **fields)
+
+
+def view_request(user, path='/', method='get', asynchronous=False):
+    """A request from ``user`` with a session and messages, for calling a view directly."""
+    request = getattr(AsyncRequestFactory() if asynchronous else RequestFactory(), method)(path)
+    request.user = user
+
+    async def auser():
+        return user
+
+    request.auser = auser
+    request.session = SessionStore()
+    request._messages = FallbackStorage(request)
+    return request
+
+
+def call_views(user, sync_view, async_view, path, *args, method='get'):
+    """``(sync response, async response)`` of a view and its ASYNC_VIEWS variant for the same request."""
+    return (
+        sync_view(view_request(user, path, method), *args),
+        async_to_sync(async_view)(view_request(user, path, method, asynchronous=True), *args),
+    )
+
+
+def assert_constant_queries(test, url, add_rows):
+    """
+    Rendering ``url`` takes as many queries after ``add_rows()`` as before,
+    so no row on the page loads a deferred column or relation on its own.
+    Each count is taken on a repeat request, once caches are warm. Returns
+    the captured queries and the last response.
+    """
+    test.client.get(url)
+    with CaptureQueriesContext(connection) as before:
+        test.client.get(url)
+    # Counted now: each request clears the connection's query log.
+    expected = len(before)
+    add_rows()
+    test.client.get(url)
+    with test.assertNumQueries(expected) as after:
+        response = test.client.get(url)
+    test.assertEqual(response.status_code, 200)
+    return after.captured_queries, response
+
+
+def json_payloads(test, responses):
+    sync_response, async_response = responses
+    test.assertEqual(async_response.status_code, sync_response.status_code)
+    test.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+    return sync_response.status_code, json.loads(sync_response.content)
+
+
+class MarginColumnTests(TestCase):
+    def margin(self, item):
+        return JewelryItem.objects.values_list('margin_percent', 'markup_amount').get(pk=item.pk)
+
+    def test_margin_is_zero_when_cost_is_zero(self):
+        item = make_item('FREE-1', cost_price=Decimal('0'), sale_price=Decimal('80.00'))
+        self.assertEqual(self.margin(item), (Decimal('0.00'), Decimal('80.00')))
+        self.assertEqual(item.profit_margin, Decimal('0'))
+
+    def test_margin_matches_profit_margin(self):
+        item = make_item('R-2', cost_price=Decimal('3'), sale_price=Decimal('4'))
+        margin, markup = self.margin(item)
+        self.assertEqual(margin, Decimal('33.33'))
+        self.assertEqual(markup, Decimal('1.00'))
+        self.assertEqual(margin, round(item.profit_margin, 2))
+
+    def test_margin_follows_price_updates(self):
+        item = make_item('R-3')
+        JewelryItem.objects.filter(pk=item.pk).update(cost_price=Decimal('0'))
+        self.assertEqual(self.margin(item)[0], Decimal('0.00'))
+        JewelryItem.objects.filter(pk=item.pk).update(cost_price=Decimal('50'), sale_price=Decimal('125'))
+        self.assertEqual(self.margin(item), (Decimal('150.00'), Decimal('75.00')))
+        self.assertQuerySetEqual(JewelryItem.objects.filter(margin_percent__gte=100), [item])
+
+
+class FacetCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_deleting_supplier_invalidates_cached_rows(self):
+        supplier = Supplier.objects.create(name='Goldsmith & Co')
+        make_item('R-1', supplier=supplier)
+        self.assertEqual(facet_rows(JewelryItem.objects.all(), ()), [(None, supplier.pk, 'gold', 'N/A', 1)])
+
+        supplier.delete()
+        self.assertEqual(facet_rows(JewelryItem.objects.all(), ()), [(None, None, 'gold', 'N/A', 1)])
+
+
+class ScanCacheTests(TestCase):
+    def setUp(self):
+        clear_scan_cache()
+
+    def test_generate_serials_clears_cached_miss(self):
+        item = make_item('RG-7')
+        self.assertIsNone(resolve('RG-7-00001'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_serials(item, 2)
+        payload = resolve('RG-7-00001')
+        self.assertEqual((payload['type'], payload['status'], payload['item']['sku']), ('piece', 'in_stock', 'RG-7'))
+        self.assertEqual(resolve('RG-7-00002')['serial'], 'RG-7-00002')
+
+    def test_cached_miss_without_commit_hook(self):
+        item = make_item('RG-8')
+        self.assertIsNone(resolve('RG-8-00001'))
+        with self.captureOnCommitCallbacks(execute=False):
+            generate_serials(item, 1)
+        self.assertIsNone(resolve('RG-8-00001'))
+
+
+class StocktakeApplyTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Rings')
+        self.counted = make_item('RG-1', category=self.category, quantity_on_hand=5)
+        self.missing = make_item('RG-2', category=self.category, quantity_on_hand=2)
+        self.exact = make_item('RG-3', category=self.category, quantity_on_hand=1)
+        self.session = StocktakeSession.objects.create(name='Rings count', category=self.category)
+        record_scans(self.session, ['code,count', 'RG-1,3', 'RG-1', 'RG-3', 'NOPE-1'])
+
+    def quantities(self):
+        return dict(JewelryItem.objects.values_list('sku', 'quantity_on_hand'))
+
+    def test_apply_writes_counts_and_lines(self):
+        lines = apply(self.session)
+        self.assertEqual(self.quantities(), {'RG-1': 4, 'RG-2': 0, 'RG-3': 1})
+        self.assertEqual(
+            sorted((line.sku, line.expected, line.counted) for line in lines),
+            [('RG-1', 5, 4), ('RG-2', 2, 0)],
+        )
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, 'applied')
+        self.assertIsNotNone(self.session.applied_at)
+        self.assertFalse(variances(self.session).exists())
+
+    def test_second_apply_is_rejected_and_changes_nothing(self):
+        apply(self.session)
+        JewelryItem.objects.filter(pk=self.counted.pk).update(quantity_on_hand=9)
+
+        with self.assertRaises(StocktakeClosed):
+            apply(self.session)
+        # The stale instance passed in is re-read under the lock, so it can't bypass the check.
+        stale = StocktakeSession.objects.get(pk=self.session.pk)
+        stale.status = 'open'
+        with self.assertRaises(StocktakeClosed):
+            apply(stale)
+        self.assertEqual(self.quantities(), {'RG-1': 9, 'RG-2': 0, 'RG-3': 1})
+        self.assertEqual(StocktakeLine.objects.filter(session=self.session).count(), 2)
+
+    def test_closed_session_rejects_scans_and_apply_view(self):
+        apply(self.session)
+        self.session.refresh_from_db()
+        with self.assertRaises(StocktakeClosed):
+            record_scans(self.session, ['RG-2'])
+
+        self.client.force_login(User.objects.create_user('clerk', password='pw'))
+        response = self.client.post(reverse('inventory:stocktake_apply', args=[self.session.pk]), follow=True)
+        self.assertContains(response, 'is applied.')
+        self.assertEqual(StocktakeLine.objects.filter(session=self.session).count(), 2)
+
+
+class RevaluationTests(TestCase):
+    def setUp(self):
+        MetalSpotPrice.objects.create(metal='gold', price_per_gram=Decimal('60'))
+        MetalSpotPrice.objects.create(metal='silver', price_per_gram=Decimal('1'))
+        MetalSpotPrice.objects.create(metal='platinum', price_per_gram=Decimal('30'), default_fineness=Decimal('0.95'))
+        self.rings = Category.objects.create(name='Rings')
+        MarkupRule.objects.create()
+        MarkupRule.objects.create(metal='gold', metal_multiplier=Decimal('2'))
+        MarkupRule.objects.create(category=self.rings, metal_multiplier=Decimal('1.5'))
+        MarkupRule.objects.create(category=self.rings, metal='gold', metal_multiplier=Decimal('3'), fixed_amount=Decimal('10'))
+
+        def item(sku, metal, purity, weight, category=None, cost='10.00'):
+            return make_item(sku, metal=metal, purity=purity, category=category, cost_price=Decimal(cost),
+                             weight_grams=Decimal(weight) if weight else None)
+
+        item('RING-GOLD', 'gold', '18K', '10', self.rings)
+        item('GOLD', 'gold', '18K', '10')
+        item('RING-PLAT', 'platinum', 'N/A', '2', self.rings)
+        item('SILVER', 'silver', '925K', '100')
+        item('FLOOR', 'gold', '18K', '1', cost='1000.00')
+        item('NO-WEIGHT', 'gold', '18K', None)
+        item('NO-SPOT', 'other', 'N/A', '5')
+        item('NO-FINENESS', 'gold', 'N/A', '5')
+        self.stamp = timezone.now().replace(year=2020)
+        JewelryItem.objects.update(updated_at=self.stamp)
+
+    def prices(self):
+        return dict(JewelryItem.objects.values_list('sku', 'sale_price'))
+
+    def test_most_specific_rule_and_fineness(self):
+        report = revalue()
+        prices = self.prices()
+        self.assertEqual(prices['RING-GOLD'], Decimal('1360.00'))  # 10 x 0.75 x 60 x 3 + 10: category + metal
+        self.assertEqual(prices['GOLD'], Decimal('900.00'))        # metal rule
+        self.assertEqual(prices['RING-PLAT'], Decimal('85.50'))    # category rule, spot default fineness 0.95
+        self.assertEqual(prices['SILVER'], Decimal('92.50'))       # default rule, 925 fineness
+        self.assertEqual(prices['FLOOR'], Decimal('1000.00'))      # 90 is below cost x 1
+        self.assertEqual(report['skipped'], {'no weight': 1, 'no spot price': 1, 'unknown purity': 1, 'no markup rule': 0})
+        self.assertEqual(len(report['changes']), 5)
+
+    def test_rows_without_a_rule_are_skipped(self):
+        MarkupRule.objects.filter(category=None, metal='').delete()
+        report = revalue()
+        self.assertEqual(report['skipped']['no markup rule'], 1)
+        self.assertEqual(self.prices()['SILVER'], Decimal('150.00'))
+
+    def test_write_stamps_updated_at_and_generated_columns(self):
+        revalue()
+        rows = {
+            row['sku']: row for row in
+            JewelryItem.objects.values('sku', 'sale_price', 'margin_percent', 'markup_amount', 'updated_at')
+        }
+        self.assertEqual(
+            (rows['GOLD']['margin_percent'], rows['GOLD']['markup_amount']), (Decimal('8900.00'), Decimal('890.00')),
+        )
+        self.assertGreater(rows['GOLD']['updated_at'], self.stamp)
+        self.assertEqual(rows['NO-WEIGHT']['updated_at'], self.stamp)
+        # A second run changes nothing and stamps nothing.
+        stamps = {sku: row['updated_at'] for sku, row in rows.items()}
+        self.assertEqual(revalue()['changes'], [])
+        self.assertEqual(dict(JewelryItem.objects.values_list('sku', 'updated_at')), stamps)
+
+    def test_dry_run_writes_nothing(self):
+        before = list(JewelryItem.objects.values_list('sku', 'sale_price', 'updated_at'))
+        report = revalue(dry_run=True)
+        self.assertTrue(report['dry_run'])
+        self.assertIn((JewelryItem.objects.get(sku='GOLD').pk, 'GOLD', Decimal('150.00'), Decimal('900.00')), report['changes'])
+        self.assertEqual(list(JewelryItem.objects.values_list('sku', 'sale_price', 'updated_at')), before)
+
+
+class AsyncViewTests(TestCase):
+    """The ASYNC_VIEWS variants answer exactly as the sync views do."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('clerk', password='pw')
+        self.item = make_item('RG-1', name='Gold ring', quantity_on_hand=2)
+        make_item('RG-2', name='Old ring', is_active=False)
+        make_item('CH-1', name='Chain')
+        self.piece = generate_serials(self.item, 1)[0]
+
+    def test_item_search(self):
+        for query in ('', 'ring', 'ch-1', 'nothing'):
+            with self.subTest(query=query):
+                status, payload = json_payloads(self, call_views(
+                    self.user, views.item_search, views.item_search_async, f'/inventory/search/?q={query}',
+                ))
+                skus = {row['sku'] for row in payload['results']}
+                self.assertNotIn('RG-2', skus)
+        self.assertEqual(payload, {'results': []})
+
+    def test_item_json(self):
+        status, payload = json_payloads(self, call_views(
+            self.user, views.item_json, views.item_json_async, '/', self.item.pk,
+        ))
+        self.assertEqual((payload['sku'], payload['sale_price']), ('RG-1', '150.00'))
+        with self.assertRaises(Http404):
+            views.item_json(view_request(self.user), 0)
+        with self.assertRaises(Http404):
+            async_to_sync(views.item_json_async)(view_request(self.user, asynchronous=True), 0)
+
+    def test_scan(self):
+        for code in (self.piece.serial, 'CH-1', 'UNKNOWN'):
+            with self.subTest(code=code):
+                # Each variant resolves the code itself rather than from the other's cache entry.
+                clear_scan_cache()
+                sync_response = views.scan(view_request(self.user), code)
+                clear_scan_cache()
+                async_response = async_to_sync(views.scan_async)(view_request(self.user, asynchronous=True), code)
+                status, payload = json_payloads(self, (sync_response, async_response))
+        self.assertEqual((status, payload), (404, {'error': 'Unknown barcode', 'code': 'UNKNOWN'}))
+
+
+class ProjectionTests(TestCase):
+    """List pages and JSON endpoints read only their projected columns."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('clerk', password='pw')
+        self.client.force_login(self.user)
+        self.category = Category.objects.create(name='Rings')
+        self.supplier = Supplier.objects.create(name='Goldsmith & Co')
+
+    def add_items(self, *skus):
+        for sku in skus:
+            make_item(sku, category=self.category, supplier=self.supplier, description='Long text ' * 50)
+
+    def test_item_list(self):
+        self.add_items('RG-1')
+        queries, response = assert_constant_queries(
+            self, reverse('inventory:item_list'), lambda: self.add_items('RG-2', 'RG-3', 'RG-4'),
+        )
+        self.assertContains(response, 'RG-4')
+        self.assertContains(response, 'Goldsmith &amp; Co')
+        self.assertFalse([query for query in queries if '"description"' in query['sql']])
+
+    def test_json_endpoints_read_one_query(self):
+        self.add_items('RG-1', 'RG-2')
+        item = JewelryItem.objects.get(sku='RG-1')
+        with self.assertNumQueries(1):
+            views.item_search(view_request(self.user, '/?q=rg'))
+        with self.assertNumQueries(1):
+            views.item_json(view_request(self.user), item.pk)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -6,11 +7,21 @@ app_name = 'inventory'
 urlpatterns = [
     path('', views.item_list, name='item_list'),
     path('add/', views.item_create, name='item_create'),
-    path('search/', views.item_search, name='item_search'),
+    path('search/', views.item_search_async if settings.ASYNC_VIEWS else views.item_search, name='item_search'),
     path('<int:pk>/', views.item_detail, name='item_detail'),
     path('<int:pk>/edit/', views.item_edit, name='item_edit'),
     path('<int:pk>/delete/', views.item_delete, name='item_delete'),
-    path('<int:pk>/json/', views.item_json, name='item_json'),
+    path('<int:pk>/receive/', views.item_receive_pieces, name='item_receive_pieces'),
+    path('scan/<str:code>/', views.scan_async if settings.ASYNC_VIEWS else views.scan, name='scan'),
+    path('<int:pk>/json/', views.item_json_async if settings.ASYNC_VIEWS else views.item_json, name='item_json'),
+    path('reports/margins/', views.margin_report, name='margin_report'),
+    path('stocktakes/', views.stocktake_list, name='stocktake_list'),
+    path('stocktakes/add/', views.stocktake_create, name='stocktake_create'),
+    path('stocktakes/<int:pk>/', views.stocktake_detail, name='stocktake_detail'),
+    path('stocktakes/<int:pk>/scans/', views.stocktake_upload, name='stocktake_upload'),
+    path('stocktakes/<int:pk>/apply/', views.stocktake_apply, name='stocktake_apply'),
+    path('stocktakes/<int:pk>/cancel/', views.stocktake_cancel, name='stocktake_cancel'),
+    path('stocktakes/<int:pk>/report.csv', views.stocktake_report, name='stocktake_report'),
     path('categories/', views.category_list, name='category_list'),
     path('categories/add/', views.category_create, name='category_create'),
     path('categories/<int:pk>/edit/', views.category_edit, name='category_edit'),
@@ -1,44 +1,74 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
-from django.http import JsonResponse
+from django.db.models import Avg, Count, F, Max, Min, Q, Sum
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
 from django.core.paginator import Paginator
+from decimal import Decimal
+import csv
 
-from .models import JewelryItem, Category
-from .forms import JewelryItemForm, CategoryForm
+from .models import JewelryItem, Category, SerializedPiece, StocktakeSession
+from .scanning import aresolve, generate_serials, resolve
+from .facets import facet_counts, facet_rows
+from .filters import decimal_param, facet_selection, search_and_ranges, select_facets, sort_items
+from .forms import JewelryItemForm, CategoryForm, StocktakeSessionForm
+from .stocktake import (
+    StocktakeClosed, apply as apply_stocktake, record_scans, summarize, variance_totals, variances,
+)
+from .projections import (
+    ITEM_LIST_FIELDS, CATEGORY_OPTION_FIELDS, SUPPLIER_OPTION_FIELDS,
+    ITEM_JSON_FIELDS, ITEM_SEARCH_FIELDS,
+)
 from crm.models import Supplier
 
 ITEMS_PER_PAGE = 10
+PIECES_SHOWN = 20
+MAX_PIECES_PER_RECEIPT = 500
+MARGIN_REPORT_THRESHOLD = Decimal('20')
 
 
 @login_required
 def item_list(request):
-    items = JewelryItem.objects.select_related('category', 'supplier')
+    items = JewelryItem.objects.select_related('category', 'supplier').only(*ITEM_LIST_FIELDS)
     
-    search = request.GET.get('search', '')
-    if search:
-        items = items.filter(Q(sku__icontains=search) | Q(name__icontains=search))
+    # Search, then price, weight and margin ranges (indexed columns).
+    items, search, ranges = search_and_ranges(items, request.GET)
     
-    category_id = request.GET.get('category')
-    if category_id:
-        items = items.filter(category_id=category_id)
+    # Facet counts come from the search/range filters only; facet_counts
+    # applies the dropdown selections itself.
+    rows = facet_rows(items, (search, sorted(ranges.items())))
     
-    supplier_id = request.GET.get('supplier')
-    if supplier_id:
-        items = items.filter(supplier_id=supplier_id)
+    selected = facet_selection(request.GET)
+    items = select_facets(items, selected)
+    counts, total = facet_counts(rows, selected)
     
-    metal = request.GET.get('metal')
-    if metal:
-        items = items.filter(metal=metal)
+    def visible(facet, value):
+        return counts[facet][value] or selected[facet] == str(value)
     
-    purity = request.GET.get('purity')
-    if purity:
-        items = items.filter(purity=purity)
+    category_ids = [pk for pk in counts['category'] if pk is not None]
+    supplier_ids = [pk for pk in counts['supplier'] if pk is not None]
+    categories = [
+        cat for cat in Category.objects.filter(Q(pk__in=category_ids) | Q(pk=selected['category'] or None))
+        .only(*CATEGORY_OPTION_FIELDS) if visible('category', cat.pk)
+    ]
+    suppliers = [
+        sup for sup in Supplier.objects.filter(Q(pk__in=supplier_ids) | Q(pk=selected['supplier'] or None))
+        .only(*SUPPLIER_OPTION_FIELDS) if visible('supplier', sup.pk)
+    ]
+    for option in categories:
+        option.item_count = counts['category'][option.pk]
+    for option in suppliers:
+        option.item_count = counts['supplier'][option.pk]
+    metal_choices = [
+        (value, label, counts['metal'][value]) for value, label in JewelryItem.METAL_CHOICES if visible('metal', value)
+    ]
+    purity_choices = [
+        (value, label, counts['purity'][value]) for value, label in JewelryItem.PURITY_CHOICES if visible('purity', value)
+    ]
     
-    categories = Category.objects.all()
-    suppliers = Supplier.objects.all()
-    purity_choices = JewelryItem.PURITY_CHOICES
+    sort = request.GET.get('sort', '')
+    items = sort_items(items, sort)
     
     paginator = Paginator(items, ITEMS_PER_PAGE)
     page_number = request.GET.get('page')
@@ -49,19 +79,54 @@ def item_list(request):
         'page_obj': page_obj,
         'categories': categories,
         'suppliers': suppliers,
+        'metal_choices': metal_choices,
         'purity_choices': purity_choices,
+        'total_matches': total,
         'search': search,
-        'selected_category': category_id,
-        'selected_supplier': supplier_id,
-        'selected_metal': metal,
-        'selected_purity': purity,
+        'min_price': request.GET.get('min_price', ''),
+        'max_price': request.GET.get('max_price', ''),
+        'min_weight': request.GET.get('min_weight', ''),
+        'max_weight': request.GET.get('max_weight', ''),
+        'min_margin': request.GET.get('min_margin', ''),
+        'max_margin': request.GET.get('max_margin', ''),
+        'sort': sort,
+        'selected_category': selected['category'],
+        'selected_supplier': selected['supplier'],
+        'selected_metal': selected['metal'],
+        'selected_purity': selected['purity'],
     })
 
 
 @login_required
 def item_detail(request, pk):
     item = get_object_or_404(JewelryItem.objects.select_related('category', 'supplier'), pk=pk)
-    return render(request, 'inventory/item_detail.html', {'item': item})
+    piece_counts = dict(
+        SerializedPiece.objects.filter(item=item).order_by().values_list('status').annotate(Count('pk'))
+    )
+    pieces = SerializedPiece.objects.filter(item=item).order_by('-sequence')[:PIECES_SHOWN]
+    return render(request, 'inventory/item_detail.html', {
+        'item': item,
+        'pieces': pieces,
+        'piece_counts': [(label, piece_counts.get(value, 0)) for value, label in SerializedPiece.STATUS_CHOICES],
+        'piece_total': sum(piece_counts.values()),
+    })
+
+
+@login_required
+@require_POST
+def item_receive_pieces(request, pk):
+    """Create serialized pieces for newly received stock of an item."""
+    item = get_object_or_404(JewelryItem, pk=pk)
+    try:
+        count = int(request.POST.get('count', ''))
+    except ValueError:
+        count = 0
+    if not 1 <= count <= MAX_PIECES_PER_RECEIPT:
+        messages.error(request, f'Enter a number of pieces between 1 and {MAX_PIECES_PER_RECEIPT}.')
+        return redirect('inventory:item_detail', pk=pk)
+    pieces = generate_serials(item, count, add_stock=request.POST.get('add_stock') == 'on')
+    messages.success(request, f'Received {len(pieces)} pieces ({pieces[0].serial} to {pieces[-1].serial}).')
+    return redirect('inventory:item_detail', pk=pk)
 
 
 @login_required
@@ -152,42 +217,252 @@ def category_delete(request, pk):
 
 
 @login_required
-def item_json(request, pk):
-    """Return item details as JSON for invoice form auto-population."""
-    item = get_object_or_404(JewelryItem, pk=pk)
-    return JsonResponse({
-        'id': item.pk,
-        'sku': item.sku,
-        'name': item.name,
-        'description': f"{item.name} - {item.sku}",
-        'sale_price': str(item.sale_price),
-        'quantity_on_hand': item.quantity_on_hand,
+def margin_report(request):
+    """Margin statistics per category, aggregated in SQL from the stored margin columns."""
+    threshold = decimal_param(request.GET, 'threshold')
+    if threshold is None:
+        threshold = MARGIN_REPORT_THRESHOLD
+    items = JewelryItem.objects.all()
+    if request.GET.get('active') != 'all':
+        items = items.filter(is_active=True)
+    
+    aggregates = {
+        'item_count': Count('pk'),
+        'avg_margin': Avg('margin_percent'),
+        'min_margin': Min('margin_percent'),
+        'max_margin': Max('margin_percent'),
+        'total_cost': Sum(F('cost_price') * F('quantity_on_hand')),
+        'total_markup': Sum(F('markup_amount') * F('quantity_on_hand')),
+        'below_threshold': Count('pk', filter=Q(margin_percent__lt=threshold)),
+    }
+    rows = items.values('category__name').annotate(**aggregates).order_by('category__name')
+    totals = items.aggregate(**aggregates)
+    
+    return render(request, 'inventory/margin_report.html', {
+        'rows': rows,
+        'totals': totals,
+        'threshold': threshold,
+        'show_all': request.GET.get('active') == 'all',
     })
 
 
 @login_required
-def item_search(request):
-    """Search items for autocomplete in invoice form."""
-    query = request.GET.get('q', '').strip()
-    items = JewelryItem.objects.filter(is_active=True)
+def stocktake_list(request):
+    sessions = StocktakeSession.objects.select_related('category')
+    paginator = Paginator(sessions, ITEMS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    return render(request, 'inventory/stocktake_list.html', {'sessions': page_obj, 'page_obj': page_obj})
+
+
+@login_required
+def stocktake_create(request):
+    if request.method == 'POST':
+        form = StocktakeSessionForm(request.POST)
+        if form.is_valid():
+            session = form.save()
+            messages.success(request, f'Stocktake "{session.name}" started.')
+            return redirect('inventory:stocktake_detail', pk=session.pk)
+    else:
+        form = StocktakeSessionForm()
+    return render(request, 'inventory/stocktake_form.html', {'form': form, 'title': 'Start Stocktake'})
+
+
+@login_required
+def stocktake_detail(request, pk):
+    session = get_object_or_404(StocktakeSession.objects.select_related('category'), pk=pk)
+    if session.status == 'applied':
+        rows = list(session.lines.all())
+        totals = {
+            'variance': sum(line.variance for line in rows),
+            'variance_value': sum((line.variance_cost for line in rows), Decimal('0.00')),
+        }
+    else:
+        rows = variances(session)
+        totals = variance_totals(session)
+    paginator = Paginator(rows, ITEMS_PER_PAGE * 5)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    return render(request, 'inventory/stocktake_detail.html', {
+        'session': session,
+        'summary': summarize(session),
+        'rows': page_obj,
+        'page_obj': page_obj,
+        'totals': totals,
+    })
+
+
+@login_required
+@require_POST
+def stocktake_upload(request, pk):
+    """
+    Add scans to a session.
+
+    Accepts a file upload or pasted codes from the session page, or a raw
+    text/csv body (one ``code[,count]`` per line) from a handheld, which is
+    read line by line as it streams in and answered with JSON.
+    """
+    session = get_object_or_404(StocktakeSession, pk=pk)
+    from_form = request.content_type in ('multipart/form-data', 'application/x-www-form-urlencoded')
+    if not from_form:
+        lines = request
+    elif request.FILES.get('file'):
+        lines = request.FILES['file']
+    else:
+        lines = request.POST.get('codes', '').splitlines()
+    
+    try:
+        summary = record_scans(session, lines)
+    except StocktakeClosed as exc:
+        if not from_form:
+            return JsonResponse({'error': str(exc)}, status=409)
+        messages.error(request, str(exc))
+        return redirect('inventory:stocktake_detail', pk=pk)
+    
+    if not from_form:
+        return JsonResponse({
+            'lines': summary['lines'],
+            'units': summary['units'],
+            'unknown': dict(summary['unknown']),
+            'errors': summary['errors'],
+        })
+    messages.success(request, f"Recorded {summary['units']} units from {summary['lines']} lines.")
+    if summary['unknown']:
+        messages.warning(request, f"{len(summary['unknown'])} codes did not match any piece or SKU.")
+    for error in summary['errors']:
+        messages.error(request, error)
+    return redirect('inventory:stocktake_detail', pk=pk)
+
+
+@login_required
+@require_POST
+def stocktake_apply(request, pk):
+    session = get_object_or_404(StocktakeSession, pk=pk)
+    try:
+        lines = apply_stocktake(session)
+    except StocktakeClosed as exc:
+        messages.error(request, str(exc))
+    else:
+        messages.success(request, f'Stocktake applied: {len(lines)} items corrected.')
+    return redirect('inventory:stocktake_detail', pk=pk)
+
+
+@login_required
+@require_POST
+def stocktake_cancel(request, pk):
+    session = get_object_or_404(StocktakeSession, pk=pk)
+    if StocktakeSession.objects.filter(pk=pk, status='open').update(status='cancelled'):
+        messages.success(request, f'Stocktake "{session.name}" cancelled.')
+    else:
+        messages.error(request, f'Stocktake "{session.name}" is not open.')
+    return redirect('inventory:stocktake_detail', pk=pk)
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output."""
+    def write(self, value):
+        return value
+
+
+@login_required
+def stocktake_report(request, pk):
+    """Variance report as CSV: the applied lines, or the live variances of an open session."""
+    session = get_object_or_404(StocktakeSession, pk=pk)
+    if session.status == 'applied':
+        rows = (
+            (line.sku, line.expected, line.counted, line.variance, line.unit_cost, line.variance_cost)
+            for line in session.lines.iterator()
+        )
+    else:
+        rows = (
+            (row['sku'], row['quantity_on_hand'], row['counted'], row['variance'], row['cost_price'],
+             row['variance_value'].quantize(Decimal('0.01')))
+            for row in variances(session).iterator()
+        )
+    writer = csv.writer(_Echo())
     
+    def stream():
+        yield writer.writerow(['sku', 'expected', 'counted', 'variance', 'unit_cost', 'variance_cost'])
+        for row in rows:
+            yield writer.writerow(row)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="stocktake-{session.pk}.csv"'
+    return response
+
+
+def _item_json_payload(row):
+    return {
+        'id': row['id'],
+        'sku': row['sku'],
+        'name': row['name'],
+        'description': f"{row['name']} - {row['sku']}",
+        'sale_price': str(row['sale_price']),
+        'quantity_on_hand': row['quantity_on_hand'],
+    }
+
+
+def _item_search_queryset(query):
+    items = JewelryItem.objects.filter(is_active=True)
     if query:
         items = items.filter(
             Q(sku__icontains=query) | Q(name__icontains=query)
         )
-    
     # Limit results for performance
-    items = items[:20]
-    
-    results = [
-        {
-            'id': item.pk,
-            'sku': item.sku,
-            'name': item.name,
-            'text': f"{item.sku} - {item.name}",
-            'sale_price': str(item.sale_price),
-        }
-        for item in items
-    ]
-    
+    return items.values(*ITEM_SEARCH_FIELDS)[:20]
+
+
+def _item_search_result(row):
+    return {
+        'id': row['id'],
+        'sku': row['sku'],
+        'name': row['name'],
+        'text': f"{row['sku']} - {row['name']}",
+        'sale_price': str(row['sale_price']),
+    }
+
+
+@login_required
+def item_json(request, pk):
+    """Return item details as JSON for invoice form auto-population."""
+    row = get_object_or_404(JewelryItem.objects.values(*ITEM_JSON_FIELDS), pk=pk)
+    return JsonResponse(_item_json_payload(row))
+
+
+@login_required
+def item_search(request):
+    """Search items for autocomplete in invoice form."""
+    query = request.GET.get('q', '').strip()
+    results = [_item_search_result(row) for row in _item_search_queryset(query)]
+    return JsonResponse({'results': results})
+
+
+@login_required
+def scan(request, code):
+    """Resolve a scanned barcode (piece serial or SKU) to the piece, item and stock status."""
+    payload = resolve(code)
+    if payload is None:
+        return JsonResponse({'error': 'Unknown barcode', 'code': code}, status=404)
+    return JsonResponse(payload)
+
+
+@login_required
+async def scan_async(request, code):
+    """Async variant of scan for the ASGI deployment mode."""
+    payload = await aresolve(code)
+    if payload is None:
+        return JsonResponse({'error': 'Unknown barcode', 'code': code}, status=404)
+    return JsonResponse(payload)
+
+
+@login_required
+async def item_json_async(request, pk):
+    """Async variant of item_json for the ASGI deployment mode."""
+    row = await aget_object_or_404(JewelryItem.objects.values(*ITEM_JSON_FIELDS), pk=pk)
+    return JsonResponse(_item_json_payload(row))
+
+
+@login_required
+async def item_search_async(request):
+    """Async variant of item_search for the ASGI deployment mode."""
+    query = request.GET.get('q', '').strip()
+    results = [_item_search_result(row) async for row in _item_search_queryset(query)]
     return JsonResponse({'results': results})
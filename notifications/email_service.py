@@ -1,4 +1,7 @@
-from django.core.mail import send_mail, EmailMessage
+import csv
+import io
+
+from django.core.mail import send_mail, EmailMessage, EmailMultiAlternatives
 from django.conf import settings
 from django.template.loader import render_to_string
 
@@ -14,8 +17,8 @@ def get_from_email():
     return settings.EMAIL_HOST_USER
 
 
-def send_invoice_email(invoice, checkout_url):
-    """Send invoice email with Stripe payment link."""
+def send_invoice_email(invoice, checkout_url, pdf=None):
+    """Send invoice email with Stripe payment link and, if given, the invoice PDF attached."""
     if not invoice.customer or not invoice.customer.email:
         return False
     
@@ -30,7 +33,7 @@ def send_invoice_email(invoice, checkout_url):
     plain_message = f"""
 Dear {invoice.customer.name},
 
-Please find your invoice {invoice.invoice_number} for €{invoice.total}.
+Please find {'attached ' if pdf else ''}your invoice {invoice.invoice_number} for €{invoice.total}.
 
 Pay online: {checkout_url}
 
@@ -40,14 +43,16 @@ Michaello Jewelry
 """
     
     try:
-        send_mail(
+        email = EmailMultiAlternatives(
             subject=subject,
-            message=plain_message,
+            body=plain_message,
             from_email=get_from_email(),
-            recipient_list=[invoice.customer.email],
-            html_message=html_message,
-            fail_silently=False,
+            to=[invoice.customer.email],
         )
+        email.attach_alternative(html_message, 'text/html')
+        if pdf:
+            email.attach(f'{invoice.invoice_number}.pdf', pdf, 'application/pdf')
+        email.send(fail_silently=False)
         return True
     except Exception as e:
         print(f"Email error: {e}")
@@ -127,10 +132,64 @@ Michaello Jewelry
         email.body = html_message
         
         if certificate.pdf_file:
-            email.attach_file(certificate.pdf_file.path)
+            with certificate.pdf_file.open('rb') as pdf:
+                email.attach(f'{certificate.certificate_number}.pdf', pdf.read(), 'application/pdf')
         
         email.send(fail_silently=False)
         return True
     except Exception as e:
         print(f"Email error: {e}")
         return False
+
+
+# Suppliers (largest reorders first) and suggestions per supplier listed in the
+# digest body; the attached CSV has all of them.
+DIGEST_SUPPLIERS = 25
+DIGEST_LINES_PER_SUPPLIER = 10
+
+
+def send_low_stock_digest(report, groups, recipients):
+    """Send one low-stock digest for a scan run, with every suggestion attached as CSV."""
+    if not recipients:
+        return False
+    
+    suggestions = report['suggestions']
+    subject = f"Low stock: {report['low_items']} items, {len(suggestions)} to reorder"
+    
+    largest = sorted(groups, key=lambda group: group['units'], reverse=True)[:DIGEST_SUPPLIERS]
+    context = {
+        'report': report,
+        'groups': [
+            dict(group, shown=group['lines'][:DIGEST_LINES_PER_SUPPLIER],
+                 more=len(group['lines']) - DIGEST_LINES_PER_SUPPLIER)
+            for group in largest
+        ],
+        'more_suppliers': len(groups) - len(largest),
+    }
+    
+    html_message = render_to_string('notifications/email/low_stock_digest.html', context)
+    
+    csv_file = io.StringIO()
+    writer = csv.writer(csv_file)
+    writer.writerow(['supplier', 'sku', 'name', 'on_hand', 'on_order', 'sold', 'per_day', 'days_of_cover', 'reorder_qty', 'unit_cost', 'value'])
+    for group in groups:
+        for row in group['lines']:
+            writer.writerow([
+                group['supplier'], row['sku'], row['name'], row['on_hand'], row['on_order'], row['sold'],
+                row['per_day'], row['days_of_cover'], row['quantity'], row['unit_cost'], row['value'],
+            ])
+    
+    try:
+        email = EmailMessage(
+            subject=subject,
+            body=html_message,
+            from_email=get_from_email(),
+            to=recipients,
+        )
+        email.content_subtype = 'html'
+        email.attach('reorder_suggestions.csv', csv_file.getvalue(), 'text/csv')
+        email.send(fail_silently=False)
+        return True
+    except Exception as e:
+        print(f"Email error: {e}")
+        return False
@@ -0,0 +1,42 @@
+from django.contrib import admin
+from .models import PurchaseOrder, PurchaseOrderLine, GoodsReceipt, GoodsReceiptLine
+
+
+class PurchaseOrderLineInline(admin.TabularInline):
+    model = PurchaseOrderLine
+    fields = ['item', 'quantity_ordered', 'quantity_received', 'unit_cost']
+    readonly_fields = ['quantity_received']
+    raw_id_fields = ['item']
+    extra = 0
+
+
+@admin.register(PurchaseOrder)
+class PurchaseOrderAdmin(admin.ModelAdmin):
+    list_display = ['po_number', 'supplier', 'status', 'expected_date', 'ordered_at', 'created_at']
+    list_filter = ['status']
+    search_fields = ['po_number', 'supplier__name']
+    list_select_related = ['supplier']
+    readonly_fields = ['po_number', 'ordered_at']
+    inlines = [PurchaseOrderLineInline]
+
+
+class GoodsReceiptLineInline(admin.TabularInline):
+    model = GoodsReceiptLine
+    fields = ['item', 'quantity', 'unit_cost']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(GoodsReceipt)
+class GoodsReceiptAdmin(admin.ModelAdmin):
+    # Receipts are written by purchasing/receiving.py together with the
+    # stock they added, so they are read-only here.
+    list_display = ['order', 'reference', 'cost_method', 'received_at']
+    list_filter = ['cost_method']
+    search_fields = ['order__po_number', 'reference']
+    readonly_fields = ['order', 'reference', 'cost_method', 'received_at']
+    inlines = [GoodsReceiptLineInline]
+
+    def has_add_permission(self, request):
+        return False
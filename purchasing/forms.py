@@ -0,0 +1,70 @@
+from django import forms
+from .models import PurchaseOrder, PurchaseOrderLine, GoodsReceipt
+from crm.models import Supplier
+from inventory.models import JewelryItem
+
+
+class PurchaseOrderForm(forms.ModelForm):
+    class Meta:
+        model = PurchaseOrder
+        fields = ['supplier', 'expected_date', 'notes']
+        widgets = {
+            'supplier': forms.Select(attrs={'class': 'form-select'}),
+            'expected_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+            'notes': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['supplier'].queryset = Supplier.objects.only('pk', 'name')
+        self.fields['supplier'].required = True
+
+
+class PurchaseOrderLineForm(forms.ModelForm):
+    class Meta:
+        model = PurchaseOrderLine
+        fields = ['item', 'quantity_ordered', 'unit_cost']
+        widgets = {
+            'item': forms.Select(attrs={'class': 'form-select item-select'}),
+            'quantity_ordered': forms.NumberInput(attrs={'class': 'form-control', 'min': '1'}),
+            'unit_cost': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['item'].queryset = JewelryItem.objects.all()
+        self.fields['item'].required = True
+        # Items are picked through the search endpoint; only the current
+        # choice is rendered rather than the whole catalogue.
+        selected = self['item'].value()
+        options = JewelryItem.objects.filter(pk=selected).values_list('pk', 'sku', 'name') if selected else []
+        self.fields['item'].widget.choices = [('', '---------')] + [
+            (pk, f'{sku} - {name}') for pk, sku, name in options
+        ]
+
+
+PurchaseOrderLineFormSet = forms.inlineformset_factory(
+    PurchaseOrder,
+    PurchaseOrderLine,
+    form=PurchaseOrderLineForm,
+    extra=0,
+    can_delete=True,
+    min_num=1,
+    validate_min=True,
+)
+
+
+class PackingListForm(forms.Form):
+    file = forms.FileField(
+        label='Packing list (CSV)',
+        help_text='One row per SKU: sku,quantity[,unit_cost]. A header row is optional.',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'}),
+    )
+    reference = forms.CharField(
+        max_length=100, required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Delivery note number'}),
+    )
+    cost_method = forms.ChoiceField(
+        choices=GoodsReceipt.COST_METHOD_CHOICES, initial='average',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from purchasing.models import GoodsReceipt, PurchaseOrder
+from purchasing.receiving import ReceivingError, parse_packing_list, receive
+
+
+class Command(BaseCommand):
+    help = 'Receive a delivery against a purchase order from a packing list CSV (sku,quantity[,unit_cost]).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('po_number')
+        parser.add_argument('path', help='Packing list CSV file.')
+        parser.add_argument('--cost-method', choices=[value for value, _ in GoodsReceipt.COST_METHOD_CHOICES], default='average')
+        parser.add_argument('--reference', default='', help='Delivery note number (defaults to the file name).')
+        parser.add_argument('--create-pieces', action='store_true', help='Create a serialized piece per unit received.')
+        parser.add_argument('--dry-run', action='store_true', help='Check the packing list without receiving anything.')
+
+    def handle(self, *args, **options):
+        try:
+            order = PurchaseOrder.objects.get(po_number=options['po_number'])
+        except PurchaseOrder.DoesNotExist:
+            raise CommandError(f"Purchase order {options['po_number']} not found.")
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as fh:
+                quantities, unit_costs = parse_packing_list(order, fh)
+            units = sum(quantities.values())
+            if options['dry_run']:
+                self.stdout.write(f'{units} units on {len(quantities)} lines would be received.')
+                return
+            receive(
+                order, quantities, unit_costs=unit_costs, cost_method=options['cost_method'],
+                reference=(options['reference'] or options['path'].rsplit('/', 1)[-1])[:100],
+                create_pieces=options['create_pieces'],
+            )
+        except OSError as exc:
+            raise CommandError(str(exc))
+        except ReceivingError as exc:
+            raise CommandError('\n'.join(exc.errors))
+        order.refresh_from_db(fields=['status'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Received {units} units on {len(quantities)} lines; {order} is now {order.get_status_display().lower()}.'
+        ))
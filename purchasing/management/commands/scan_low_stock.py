@@ -0,0 +1,71 @@
+import csv
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from notifications.email_service import send_low_stock_digest
+from purchasing.reorder import by_supplier, create_draft_orders, scan
+
+
+class Command(BaseCommand):
+    help = 'Find low-stock items, suggest reorders per supplier from sales velocity and email one digest.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=int, help='Units at or below which an item is low (LOW_STOCK_THRESHOLD).')
+        parser.add_argument('--lookback-days', type=int, help='Days of paid sales used for velocity (REORDER_LOOKBACK_DAYS).')
+        parser.add_argument('--lead-time-days', type=int, help='Days from ordering to delivery (REORDER_LEAD_TIME_DAYS).')
+        parser.add_argument('--cover-days', type=int, help='Days of sales to cover after delivery (REORDER_COVER_DAYS).')
+        parser.add_argument('--email', action='append', default=[], help='Digest recipient (repeatable; defaults to LOW_STOCK_ALERT_EMAILS).')
+        parser.add_argument('--no-email', action='store_true', help="Don't send the digest.")
+        parser.add_argument('--create-orders', action='store_true', help='Create a draft purchase order per supplier.')
+        parser.add_argument('--report', help='Write every suggestion to this CSV file.')
+        parser.add_argument('--show', type=int, default=20, help='Most urgent suggestions to print.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        report = scan(
+            threshold=options['threshold'], lookback_days=options['lookback_days'],
+            lead_time_days=options['lead_time_days'], cover_days=options['cover_days'],
+        )
+        elapsed = time.perf_counter() - start
+        suggestions = report['suggestions']
+        groups = by_supplier(suggestions)
+
+        if suggestions[:options['show']]:
+            self.stdout.write(f"{'SKU':<20} {'on hand':>8} {'on order':>9} {'per day':>8} {'cover':>7} {'reorder':>8}")
+            for row in suggestions[:options['show']]:
+                self.stdout.write(
+                    f"{row['sku']:<20} {row['on_hand']:>8} {row['on_order']:>9} {row['per_day']:>8} "
+                    f"{row['days_of_cover']:>7} {row['quantity']:>8}"
+                )
+            self.stdout.write('')
+
+        if options['report']:
+            with open(options['report'], 'w', newline='') as fh:
+                writer = csv.writer(fh)
+                writer.writerow(['supplier', 'sku', 'on_hand', 'on_order', 'sold', 'per_day', 'days_of_cover', 'reorder_qty', 'value'])
+                for group in groups:
+                    for row in group['lines']:
+                        writer.writerow([
+                            group['supplier'], row['sku'], row['on_hand'], row['on_order'], row['sold'],
+                            row['per_day'], row['days_of_cover'], row['quantity'], row['value'],
+                        ])
+            self.stdout.write(f"Wrote {len(suggestions)} suggestions to {options['report']}")
+
+        if options['create_orders'] and groups:
+            orders = create_draft_orders(groups)
+            self.stdout.write(f'Created {len(orders)} draft purchase orders.')
+
+        recipients = options['email'] or settings.LOW_STOCK_ALERT_EMAILS
+        if options['no_email']:
+            pass
+        elif not recipients:
+            self.stdout.write('No digest recipients; set LOW_STOCK_ALERT_EMAILS or pass --email.')
+        elif report['low_items'] and send_low_stock_digest(report, groups, recipients):
+            self.stdout.write(f"Sent the digest to {', '.join(recipients)}.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['low_items']} low items, {len(suggestions)} to reorder from {len(groups)} suppliers "
+            f"({report['low_without_sales']} low without recent sales) in {elapsed:.2f}s"
+        ))
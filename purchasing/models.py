@@ -0,0 +1,106 @@
+from django.db import models
+from django.core.validators import MinValueValidator
+from decimal import Decimal
+from django.utils import timezone
+
+from crm.models import Supplier
+from inventory.models import JewelryItem
+
+
+class PurchaseOrder(models.Model):
+    STATUS_CHOICES = [
+        ('draft', 'Draft'),
+        ('ordered', 'Ordered'),
+        ('partial', 'Partially Received'),
+        ('received', 'Received'),
+        ('cancelled', 'Cancelled'),
+    ]
+    # Statuses in which deliveries can be booked in.
+    RECEIVABLE = ('ordered', 'partial')
+
+    po_number = models.CharField(max_length=50, unique=True, editable=False, verbose_name='PO Number')
+    supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, related_name='purchase_orders')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
+    expected_date = models.DateField(null=True, blank=True)
+    notes = models.TextField(blank=True)
+    ordered_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['supplier', 'status'], name='po_supplier_status_idx'),
+        ]
+
+    def __str__(self):
+        return self.po_number
+
+    def save(self, *args, **kwargs):
+        if not self.po_number:
+            self.po_number = self.generate_po_number()
+        super().save(*args, **kwargs)
+
+    def generate_po_number(self):
+        today = timezone.now()
+        prefix = f"PO-{today.strftime('%Y%m%d')}"
+        last_order = PurchaseOrder.objects.filter(po_number__startswith=prefix).order_by('-po_number').first()
+        if last_order:
+            new_num = int(last_order.po_number.split('-')[-1]) + 1
+        else:
+            new_num = 1
+        return f"{prefix}-{new_num:04d}"
+
+    @property
+    def is_receivable(self):
+        return self.status in self.RECEIVABLE
+
+
+class PurchaseOrderLine(models.Model):
+    order = models.ForeignKey(PurchaseOrder, on_delete=models.CASCADE, related_name='lines')
+    item = models.ForeignKey(JewelryItem, on_delete=models.SET_NULL, null=True, related_name='purchase_order_lines')
+    quantity_ordered = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
+    quantity_received = models.PositiveIntegerField(default=0, editable=False)
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0'))])
+
+    def __str__(self):
+        return f"{self.item} x{self.quantity_ordered}"
+
+    @property
+    def outstanding(self):
+        return max(0, self.quantity_ordered - self.quantity_received)
+
+    @property
+    def line_total(self):
+        return self.quantity_ordered * self.unit_cost
+
+
+class GoodsReceipt(models.Model):
+    """One delivery booked in against a purchase order (see purchasing/receiving.py)."""
+    COST_METHOD_CHOICES = [
+        ('average', 'Weighted average'),
+        ('last', 'Last purchase cost'),
+        ('keep', 'Keep current cost'),
+    ]
+
+    order = models.ForeignKey(PurchaseOrder, on_delete=models.CASCADE, related_name='receipts')
+    reference = models.CharField(max_length=100, blank=True, help_text='Supplier delivery note or packing list number.')
+    cost_method = models.CharField(max_length=20, choices=COST_METHOD_CHOICES, default='average')
+    received_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-received_at']
+
+    def __str__(self):
+        return f"{self.order} @ {self.received_at:%Y-%m-%d %H:%M}"
+
+
+class GoodsReceiptLine(models.Model):
+    receipt = models.ForeignKey(GoodsReceipt, on_delete=models.CASCADE, related_name='lines')
+    order_line = models.ForeignKey(PurchaseOrderLine, on_delete=models.CASCADE, related_name='receipt_lines')
+    item = models.ForeignKey(JewelryItem, on_delete=models.SET_NULL, null=True, related_name='+')
+    quantity = models.PositiveIntegerField()
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.item} x{self.quantity}"
@@ -0,0 +1,244 @@
+"""
+Goods receiving.
+
+receive() books a delivery against a purchase order in one transaction: the
+receipt lines are bulk-inserted, and order lines and items are updated with
+one CASE/WHEN UPDATE per chunk of rows. Stock is incremented with F() so concurrent
+sales are never overwritten. The new cost price is computed in the same
+UPDATE from the item's pre-delivery stock and cost when the weighted-average
+method is used.
+"""
+import csv
+import io
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Func, IntegerField, Value, When
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from inventory.facets import invalidate_facets
+from inventory.models import JewelryItem
+from inventory.scanning import clear_scan_cache, generate_serials
+
+from .models import GoodsReceipt, GoodsReceiptLine, PurchaseOrder, PurchaseOrderLine
+
+# Rows per UPDATE; keeps the IN lists under SQL Server's 2100 parameter limit.
+UPDATE_CHUNK_SIZE = 500
+MAX_ERRORS_REPORTED = 20
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+CENT = Decimal('0.01')
+
+
+class ReceivingError(Exception):
+    """Raised with a list of problems when a delivery can't be booked in as given."""
+
+    def __init__(self, errors):
+        errors = list(errors)
+        self.errors = errors[:MAX_ERRORS_REPORTED]
+        if len(errors) > MAX_ERRORS_REPORTED:
+            self.errors.append(f'...and {len(errors) - MAX_ERRORS_REPORTED} more.')
+        super().__init__('; '.join(self.errors))
+
+
+def _chunks(pks):
+    pks = list(pks)
+    for start in range(0, len(pks), UPDATE_CHUNK_SIZE):
+        yield pks[start:start + UPDATE_CHUNK_SIZE]
+
+
+class _Divisor(Func):
+    """
+    An integer count to divide money by. SQLite stores whole-euro prices as
+    integers and would truncate the quotient, so there it is cast to REAL.
+    """
+    template = '%(expressions)s'
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='CAST(%(expressions)s AS REAL)', **extra_context)
+
+
+def _per_row(pks, values, output_field):
+    """
+    ``CASE`` giving each row in ``pks`` its value from ``values``.
+
+    Rows sharing a value share one ``WHEN pk IN (...)`` branch, so a delivery
+    of the same quantity or cost across many lines stays a short CASE.
+    """
+    groups = defaultdict(list)
+    for pk in pks:
+        groups[values[pk]].append(pk)
+    return Case(
+        *[When(pk__in=group, then=Value(value, output_field=output_field)) for value, group in groups.items()],
+        output_field=output_field,
+    )
+
+
+def _increment_received(quantities):
+    for pks in _chunks(quantities):
+        PurchaseOrderLine.objects.filter(pk__in=pks).update(
+            quantity_received=F('quantity_received') + _per_row(pks, quantities, IntegerField()),
+        )
+
+
+def _add_stock(quantities, values, cost_method, now):
+    """
+    Add ``{item_id: qty}`` to quantity_on_hand and, unless ``cost_method`` is
+    'keep', set cost_price from the delivery worth ``{item_id: value}``.
+    """
+    unit_costs = {pk: (values[pk] / qty).quantize(CENT) for pk, qty in quantities.items()}
+    for pks in _chunks(quantities):
+        received = _per_row(pks, quantities, IntegerField())
+        changes = {'quantity_on_hand': F('quantity_on_hand') + received, 'updated_at': now}
+        if cost_method == 'last':
+            changes['cost_price'] = _per_row(pks, unit_costs, MONEY)
+        elif cost_method == 'average':
+            # Weighted over stock on hand and the delivery. F() reads the
+            # pre-UPDATE row, as SQL evaluates every SET against the old values;
+            # oversold (negative) stock counts as none.
+            on_hand = Case(When(quantity_on_hand__gt=0, then=F('quantity_on_hand')), default=Value(0))
+            changes['cost_price'] = Round(
+                ExpressionWrapper(
+                    (on_hand * F('cost_price') + _per_row(pks, values, MONEY)) / _Divisor(on_hand + received),
+                    output_field=MONEY,
+                ),
+                2, output_field=MONEY,
+            )
+        JewelryItem.objects.filter(pk__in=pks).update(**changes)
+
+
+def receive(order, quantities, cost_method='average', unit_costs=None, reference='', create_pieces=False):
+    """
+    Book in a delivery and return the GoodsReceipt.
+
+    ``quantities`` maps PurchaseOrderLine ids to units received; ``unit_costs``
+    optionally overrides the ordered unit cost per line (e.g. from the
+    packing list). Every line is checked before anything is written, and
+    ReceivingError lists all problems. With ``create_pieces`` each received
+    unit also gets a serialized piece.
+    """
+    unit_costs = unit_costs or {}
+    quantities = {pk: qty for pk, qty in quantities.items() if qty}
+    if not quantities:
+        raise ReceivingError(['Nothing to receive.'])
+    now = timezone.now()
+
+    with transaction.atomic():
+        order = PurchaseOrder.objects.select_for_update().get(pk=order.pk)
+        if not order.is_receivable:
+            raise ReceivingError([f'{order} is {order.get_status_display().lower()} and cannot be received.'])
+        lines = {
+            line.pk: line
+            for line in order.lines.select_for_update().filter(pk__in=list(quantities)).select_related('item')
+        }
+        errors = []
+        for pk, qty in quantities.items():
+            line = lines.get(pk)
+            if line is None:
+                errors.append(f'Line {pk} is not on {order}.')
+            elif line.item_id is None:
+                errors.append(f'Line {pk} no longer has an item.')
+            elif qty < 0:
+                errors.append(f'{line.item.sku}: quantity cannot be negative.')
+            elif qty > line.outstanding:
+                errors.append(f'{line.item.sku}: receiving {qty} but only {line.outstanding} outstanding.')
+            elif unit_costs.get(pk, 0) < 0:
+                errors.append(f'{line.item.sku}: unit cost cannot be negative.')
+        if errors:
+            raise ReceivingError(errors)
+
+        receipt = GoodsReceipt.objects.create(order=order, reference=reference, cost_method=cost_method, received_at=now)
+        receipt_lines = []
+        item_quantities = defaultdict(int)
+        item_values = defaultdict(Decimal)
+        for pk, qty in quantities.items():
+            line = lines[pk]
+            cost = unit_costs.get(pk, line.unit_cost)
+            receipt_lines.append(GoodsReceiptLine(
+                receipt=receipt, order_line=line, item_id=line.item_id, quantity=qty, unit_cost=cost,
+            ))
+            item_quantities[line.item_id] += qty
+            item_values[line.item_id] += qty * cost
+        GoodsReceiptLine.objects.bulk_create(receipt_lines)
+        _increment_received(quantities)
+        _add_stock(item_quantities, item_values, cost_method, now)
+
+        order.status = 'partial' if order.lines.filter(quantity_received__lt=F('quantity_ordered')).exists() else 'received'
+        order.save(update_fields=['status', 'updated_at'])
+
+        if create_pieces:
+            items = JewelryItem.objects.in_bulk(list(item_quantities))
+            for item_id, qty in item_quantities.items():
+                generate_serials(items[item_id], qty, add_stock=False, received_at=now)
+
+        transaction.on_commit(clear_scan_cache)
+        if cost_method != 'keep':
+            # Margins feed the cached facet counts.
+            transaction.on_commit(invalidate_facets)
+    return receipt
+
+
+def receive_all(order, **kwargs):
+    """Receive every outstanding unit of ``order``."""
+    quantities = {
+        pk: ordered - received
+        for pk, ordered, received in order.lines.values_list('pk', 'quantity_ordered', 'quantity_received')
+        if ordered > received
+    }
+    return receive(order, quantities, **kwargs)
+
+
+def parse_packing_list(order, fh):
+    """
+    Read a packing list CSV (``sku,quantity[,unit_cost]``, header optional)
+    into ``(quantities, unit_costs)`` for receive().
+
+    Rows are matched to the order's outstanding lines by SKU; a SKU ordered
+    on several lines fills them in order. Raises ReceivingError listing every
+    bad row.
+    """
+    if isinstance(fh, (bytes, str)):
+        fh = io.BytesIO(fh.encode() if isinstance(fh, str) else fh)
+    text = io.TextIOWrapper(fh, encoding='utf-8-sig', newline='') if not isinstance(fh, io.TextIOBase) else fh
+
+    open_lines = defaultdict(list)
+    for line in order.lines.select_related('item').filter(item__isnull=False).order_by('pk'):
+        if line.outstanding:
+            open_lines[line.item.sku].append([line.pk, line.outstanding])
+
+    quantities = defaultdict(int)
+    unit_costs = {}
+    errors = []
+    for number, row in enumerate(csv.reader(text), start=1):
+        row = [cell.strip() for cell in row]
+        if not row or not row[0] or (number == 1 and row[0].lower() == 'sku'):
+            continue
+        sku = row[0]
+        try:
+            qty = int(row[1]) if len(row) > 1 and row[1] else 1
+            cost = Decimal(row[2]).quantize(CENT) if len(row) > 2 and row[2] else None
+            if qty < 1 or (cost is not None and cost < 0):
+                raise ValueError
+        except (ValueError, ArithmeticError):
+            errors.append(f'Row {number}: invalid quantity or cost.')
+            continue
+        if sku not in open_lines:
+            errors.append(f'Row {number}: {sku} is not outstanding on {order}.')
+            continue
+        remaining = qty
+        for slot in open_lines[sku]:
+            take = min(slot[1], remaining)
+            if take:
+                slot[1] -= take
+                remaining -= take
+                quantities[slot[0]] += take
+                if cost is not None:
+                    unit_costs[slot[0]] = cost
+        if remaining:
+            errors.append(f'Row {number}: {sku} exceeds the outstanding quantity by {remaining}.')
+    if errors:
+        raise ReceivingError(errors)
+    return dict(quantities), unit_costs
@@ -0,0 +1,211 @@
+"""
+Low-stock monitoring and reorder suggestions.
+
+Sales velocity is units sold on paid invoices per day over the last
+REORDER_LOOKBACK_DAYS (or since the item went on sale, if later). Invoice
+lines are read in keyset batches of ``(item_id, quantity, date)`` and reduced
+per item with NumPy, so a year of sales never has to be held in memory as model
+instances.
+
+An active item is low when it is at or below LOW_STOCK_THRESHOLD (the red
+badge on the item page) or its days of cover, stock on hand divided by
+velocity, don't last REORDER_LEAD_TIME_DAYS. For low items that sell, the
+suggestion tops stock up to lead time plus REORDER_COVER_DAYS of sales, less
+anything already on an open purchase order. Low items without recent sales
+are only counted; reordering them is a buying decision, not arithmetic.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from inventory.models import JewelryItem
+from sales.models import InvoiceLine
+
+from .models import PurchaseOrder, PurchaseOrderLine
+
+LINE_BATCH_SIZE = 20000
+ITEM_CHUNK_SIZE = 500
+# Shortest history a velocity is computed over, so one sale of a new item
+# doesn't read as a sale a day.
+MIN_HISTORY_DAYS = 7
+CENT = Decimal('0.01')
+# Open orders whose outstanding quantities count as already on order. Drafts
+# are included so a suggestion turned into a draft isn't suggested again.
+ON_ORDER_STATUSES = ('draft',) + PurchaseOrder.RECEIVABLE
+
+ITEM_FIELDS = ('pk', 'sku', 'name', 'supplier_id', 'supplier__name', 'quantity_on_hand', 'cost_price', 'created_at')
+
+
+def units_sold(since, batch_size=LINE_BATCH_SIZE):
+    """
+    Sum paid sales per item since ``since``.
+
+    Returns ``(item_ids, units, first_sold)`` arrays sorted by item id;
+    ``first_sold`` is the POSIX time of each item's earliest sale in the window.
+    """
+    lines = (
+        InvoiceLine.objects.filter(invoice__status='paid', invoice__created_at__gte=since, item__isnull=False)
+        .order_by('pk').values_list('pk', 'item_id', 'quantity', 'invoice__created_at')
+    )
+    ids = np.empty(0, dtype=np.int64)
+    units = np.empty(0, dtype=np.int64)
+    first = np.empty(0, dtype=np.float64)
+    last_pk = 0
+    while True:
+        batch = list(lines.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return ids, units, first
+        last_pk = batch[-1][0]
+        _, item_ids, quantities, sold_at = zip(*batch)
+        # Fold the batch into the running totals with one unique pass over
+        # the previous totals plus the new lines.
+        ids, inverse = np.unique(np.concatenate([ids, np.array(item_ids, dtype=np.int64)]), return_inverse=True)
+        units = np.bincount(
+            inverse, weights=np.concatenate([units, np.array(quantities, dtype=np.int64)]), minlength=len(ids),
+        ).astype(np.int64)
+        times = np.concatenate([first, np.fromiter((value.timestamp() for value in sold_at), dtype=np.float64)])
+        first = np.full(len(ids), np.inf)
+        np.minimum.at(first, inverse, times)
+
+
+def _on_order(item_ids):
+    """Outstanding units per item on open purchase orders."""
+    on_order = {}
+    for start in range(0, len(item_ids), ITEM_CHUNK_SIZE):
+        on_order.update(
+            PurchaseOrderLine.objects.filter(
+                item_id__in=item_ids[start:start + ITEM_CHUNK_SIZE], order__status__in=ON_ORDER_STATUSES,
+            )
+            .values_list('item_id')
+            .annotate(units=Sum(F('quantity_ordered') - F('quantity_received')))
+            .order_by()
+        )
+    return on_order
+
+
+def _sold_items(item_ids):
+    """Active items among ``item_ids``, fetched by primary key in chunks."""
+    rows = []
+    for start in range(0, len(item_ids), ITEM_CHUNK_SIZE):
+        rows.extend(
+            JewelryItem.objects.filter(pk__in=item_ids[start:start + ITEM_CHUNK_SIZE], is_active=True)
+            .values_list(*ITEM_FIELDS)
+        )
+    return rows
+
+
+def scan(threshold=None, lookback_days=None, lead_time_days=None, cover_days=None, now=None):
+    """
+    Find low-stock items and compute reorder suggestions.
+
+    Returns a dict with the parameters used, ``suggestions`` (one dict per
+    item to reorder, most urgent first), ``low_without_sales`` (how many
+    low items had no sales in the window) and ``low_items``.
+    """
+    threshold = settings.LOW_STOCK_THRESHOLD if threshold is None else threshold
+    lookback_days = settings.REORDER_LOOKBACK_DAYS if lookback_days is None else lookback_days
+    lead_time_days = settings.REORDER_LEAD_TIME_DAYS if lead_time_days is None else lead_time_days
+    cover_days = settings.REORDER_COVER_DAYS if cover_days is None else cover_days
+    now = now or timezone.now()
+    since = now - timedelta(days=lookback_days)
+
+    sold_ids, sold_units, first_sold = units_sold(since)
+
+    # Items that sold are checked against their cover; the rest can only be
+    # low by the threshold, which the (is_active, quantity_on_hand) index
+    # answers without touching the table.
+    active = JewelryItem.objects.filter(is_active=True)
+    rows = _sold_items(sold_ids.tolist())
+    low_count = active.filter(quantity_on_hand__lte=threshold).count()
+    if not rows:
+        return {
+            'threshold': threshold, 'lookback_days': lookback_days, 'lead_time_days': lead_time_days,
+            'cover_days': cover_days, 'suggestions': [], 'low_items': low_count, 'low_without_sales': low_count,
+        }
+
+    pk, sku, name, supplier_id, supplier_name, qoh, cost, created = zip(*rows)
+    pk = np.array(pk, dtype=np.int64)
+    qoh = np.array(qoh, dtype=np.int64)
+    position = np.searchsorted(sold_ids, pk)
+    units = sold_units[position]
+    # An item has been on sale since it was created or first sold, whichever
+    # is earlier (imports can postdate the sales history).
+    on_sale_since = np.minimum(np.fromiter((value.timestamp() for value in created), dtype=np.float64), first_sold[position])
+    days = np.clip((now.timestamp() - on_sale_since) / 86400, MIN_HISTORY_DAYS, lookback_days)
+    velocity = units / days
+    with np.errstate(divide='ignore'):
+        cover = np.where(velocity > 0, qoh / velocity, np.inf)
+
+    low = (qoh <= threshold) | (cover <= lead_time_days)
+    on_order = _on_order(pk[low].tolist())
+    target = np.ceil(velocity * (lead_time_days + cover_days)).astype(np.int64)
+    pending = np.array([on_order.get(item_id, 0) for item_id in pk.tolist()], dtype=np.int64)
+    suggested = np.where(low, np.maximum(target - qoh - pending, 0), 0)
+
+    suggestions = []
+    for i in np.flatnonzero(suggested).tolist():
+        suggestions.append({
+            'item_id': int(pk[i]),
+            'sku': sku[i],
+            'name': name[i],
+            'supplier_id': supplier_id[i],
+            'supplier': supplier_name[i] or '',
+            'on_hand': int(qoh[i]),
+            'on_order': int(pending[i]),
+            'sold': int(units[i]),
+            'per_day': round(float(velocity[i]), 2),
+            'days_of_cover': round(float(cover[i]), 1),
+            'quantity': int(suggested[i]),
+            'unit_cost': cost[i],
+            'value': (cost[i] * int(suggested[i])).quantize(CENT),
+        })
+    suggestions.sort(key=lambda row: (row['days_of_cover'], row['sku']))
+    low_with_sales = int((low & (qoh <= threshold)).sum())
+    return {
+        'threshold': threshold, 'lookback_days': lookback_days, 'lead_time_days': lead_time_days,
+        'cover_days': cover_days, 'suggestions': suggestions,
+        'low_items': low_count + int((low & (qoh > threshold)).sum()),
+        'low_without_sales': low_count - low_with_sales,
+    }
+
+
+def by_supplier(suggestions):
+    """Group suggestions per supplier: ``[{'supplier_id', 'supplier', 'lines', 'units', 'value'}]``."""
+    groups = defaultdict(list)
+    for row in suggestions:
+        groups[(row['supplier'], row['supplier_id'])].append(row)
+    return [
+        {
+            'supplier_id': supplier_id,
+            'supplier': supplier or 'No supplier',
+            'lines': lines,
+            'units': sum(row['quantity'] for row in lines),
+            'value': sum((row['value'] for row in lines), Decimal('0.00')),
+        }
+        for (supplier, supplier_id), lines in sorted(groups.items(), key=lambda group: (group[0][1] is None, group[0][0]))
+    ]
+
+
+def create_draft_orders(groups):
+    """Create one draft purchase order per supplier group; returns the orders."""
+    orders = []
+    with transaction.atomic():
+        for group in groups:
+            if group['supplier_id'] is None:
+                continue
+            order = PurchaseOrder.objects.create(
+                supplier_id=group['supplier_id'],
+                notes=f'Reorder suggestion of {timezone.localdate():%Y-%m-%d}.',
+            )
+            PurchaseOrderLine.objects.bulk_create([
+                PurchaseOrderLine(order=order, item_id=row['item_id'], quantity_ordered=row['quantity'], unit_cost=row['unit_cost'])
+                for row in group['lines']
+            ])
+            orders.append(order)
+    return orders
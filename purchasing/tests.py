@@ -0,0 +1,153 @@
+import csv
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from crm.models import Supplier
+from inventory.models import JewelryItem
+from inventory.tests import make_item
+from sales.models import Invoice, InvoiceLine
+
+from .models import PurchaseOrder, PurchaseOrderLine
+from .receiving import ReceivingError, receive
+from .reorder import scan
+
+
+class WeightedAverageCostTests(TestCase):
+    def setUp(self):
+        self.item = make_item('RG-1', cost_price=Decimal('100.00'), quantity_on_hand=10)
+        self.order = PurchaseOrder.objects.create(status='ordered')
+        self.line = PurchaseOrderLine.objects.create(
+            order=self.order, item=self.item, quantity_ordered=10, unit_cost=Decimal('130.00'),
+        )
+
+    def stock(self, item=None):
+        return JewelryItem.objects.values_list('quantity_on_hand', 'cost_price').get(pk=(item or self.item).pk)
+
+    def test_partial_receipts_average_over_stock_on_hand(self):
+        receive(self.order, {self.line.pk: 4})
+        # (10 x 100 + 4 x 130) / 14
+        self.assertEqual(self.stock(), (14, Decimal('108.57')))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'partial')
+
+        receive(self.order, {self.line.pk: 6}, unit_costs={self.line.pk: Decimal('120.00')})
+        # (14 x 108.57 + 6 x 120) / 20
+        self.assertEqual(self.stock(), (20, Decimal('112.00')))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'received')
+        self.line.refresh_from_db()
+        self.assertEqual(self.line.quantity_received, 10)
+
+    def test_lines_for_one_item_are_averaged_together(self):
+        second = PurchaseOrderLine.objects.create(
+            order=self.order, item=self.item, quantity_ordered=5, unit_cost=Decimal('160.00'),
+        )
+        receive(self.order, {self.line.pk: 5, second.pk: 5})
+        # (10 x 100 + 5 x 130 + 5 x 160) / 20
+        self.assertEqual(self.stock(), (20, Decimal('122.50')))
+
+    def test_no_stock_on_hand_takes_delivery_cost(self):
+        empty = make_item('RG-2', cost_price=Decimal('50.00'))
+        line = PurchaseOrderLine.objects.create(order=self.order, item=empty, quantity_ordered=3, unit_cost=Decimal('130.00'))
+        receive(self.order, {line.pk: 2})
+        self.assertEqual(self.stock(empty), (2, Decimal('130.00')))
+
+    def test_keep_and_last_cost_methods(self):
+        receive(self.order, {self.line.pk: 2}, cost_method='keep')
+        self.assertEqual(self.stock(), (12, Decimal('100.00')))
+        receive(self.order, {self.line.pk: 2}, cost_method='last', unit_costs={self.line.pk: Decimal('125.00')})
+        self.assertEqual(self.stock(), (14, Decimal('125.00')))
+
+    def test_over_receipt_is_rejected_without_changes(self):
+        receive(self.order, {self.line.pk: 8})
+        with self.assertRaisesMessage(ReceivingError, 'RG-1: receiving 3 but only 2 outstanding.'):
+            receive(self.order, {self.line.pk: 3})
+        self.assertEqual(self.stock(), (18, Decimal('113.33')))
+        self.assertEqual(self.order.receipts.count(), 1)
+
+
+@override_settings(
+    LOW_STOCK_THRESHOLD=5, REORDER_LOOKBACK_DAYS=90, REORDER_LEAD_TIME_DAYS=14, REORDER_COVER_DAYS=30,
+    LOW_STOCK_ALERT_EMAILS=[],
+)
+class ReorderTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.supplier = Supplier.objects.create(name='Goldsmith & Co')
+        # 18 sold over 30 days: 0.6 a day, 5 days of cover.
+        self.ring = self.stocked('RG-1', 3, (18, 30))
+        # 30 sold over 30 days: 20 days of cover, not low.
+        self.stocked('RG-2', 20, (30, 30))
+        # 30 sold over 10 days: 3 a day, low by cover though above the threshold.
+        self.chain = self.stocked('CH-1', 10, (20, 10), (10, 2))
+        # A single sale yesterday is spread over the 7-day minimum history.
+        self.stocked('PD-1', 0, (1, 1))
+        # Low but unsold, sold only outside the window or on drafts, or inactive.
+        self.stocked('ER-1', 2, (50, 120))
+        self.stocked('ER-2', 1, (5, 3), status='draft')
+        self.stocked('BR-1', 0, (10, 5), is_active=False)
+        order = PurchaseOrder.objects.create(supplier=self.supplier, status='partial')
+        PurchaseOrderLine.objects.create(
+            order=order, item=self.ring, quantity_ordered=8, quantity_received=3, unit_cost=Decimal('100.00'),
+        )
+
+    def stocked(self, sku, on_hand, *sales, status='paid', is_active=True):
+        """An item with ``on_hand`` units that sold ``(units, days ago)`` for each of ``sales``."""
+        item = make_item(sku, supplier=self.supplier, is_active=is_active)
+        for units, days_ago in sales:
+            invoice = Invoice.objects.create(status=status)
+            InvoiceLine.objects.create(invoice=invoice, item=item, description=sku, quantity=units, unit_price=Decimal('150.00'))
+            Invoice.objects.filter(pk=invoice.pk).update(created_at=self.now - timedelta(days=days_ago))
+        JewelryItem.objects.filter(pk=item.pk).update(quantity_on_hand=on_hand)
+        return item
+
+    def test_quantities_follow_velocity(self):
+        report = scan(now=self.now)
+        rows = {row['sku']: row for row in report['suggestions']}
+        self.assertEqual(list(rows), ['PD-1', 'CH-1', 'RG-1'])
+        # Lead time plus cover is 44 days of sales, less stock and open orders.
+        self.assertEqual(
+            {sku: (row['per_day'], row['days_of_cover'], row['on_order'], row['quantity']) for sku, row in rows.items()},
+            {
+                'PD-1': (0.14, 0.0, 0, 7),
+                'CH-1': (3.0, 3.3, 0, 132 - 10),
+                'RG-1': (0.6, 5.0, 5, 27 - 3 - 5),
+            },
+        )
+        self.assertEqual(rows['RG-1']['value'], Decimal('1900.00'))
+        # PD-1, CH-1, RG-1, plus ER-1 and ER-2 without paid sales in the window.
+        self.assertEqual((report['low_items'], report['low_without_sales']), (5, 2))
+
+    def test_draft_orders_are_not_suggested_again(self):
+        out = StringIO()
+        call_command('scan_low_stock', '--create-orders', '--no-email', stdout=out)
+        self.assertIn('Created 1 draft purchase orders.', out.getvalue())
+        draft = PurchaseOrder.objects.get(status='draft')
+        self.assertEqual(
+            dict(draft.lines.values_list('item__sku', 'quantity_ordered')), {'PD-1': 7, 'CH-1': 122, 'RG-1': 19},
+        )
+        self.assertEqual(scan()['suggestions'], [])
+
+    def test_one_digest_per_run(self):
+        call_command('scan_low_stock', '--email', 'buyer@example.com', '--email', 'owner@example.com', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ['buyer@example.com', 'owner@example.com'])
+        self.assertEqual(message.subject, 'Low stock: 5 items, 3 to reorder')
+        name, content, _ = message.attachments[0]
+        self.assertEqual(name, 'reorder_suggestions.csv')
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual([(row['sku'], row['reorder_qty']) for row in rows], [('PD-1', '7'), ('CH-1', '122'), ('RG-1', '19')])
+
+    def test_no_digest_without_recipients(self):
+        out = StringIO()
+        call_command('scan_low_stock', stdout=out)
+        call_command('scan_low_stock', '--no-email', '--email', 'buyer@example.com', stdout=StringIO())
+        self.assertEqual(mail.outbox, [])
+        self.assertIn('No digest recipients', out.getvalue())
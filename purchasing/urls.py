@@ -0,0 +1,15 @@
+from django.urls import path
+from . import views
+
+app_name = 'purchasing'
+
+urlpatterns = [
+    path('', views.po_list, name='po_list'),
+    path('add/', views.po_create, name='po_create'),
+    path('<int:pk>/', views.po_detail, name='po_detail'),
+    path('<int:pk>/edit/', views.po_edit, name='po_edit'),
+    path('<int:pk>/order/', views.po_mark_ordered, name='po_mark_ordered'),
+    path('<int:pk>/cancel/', views.po_cancel, name='po_cancel'),
+    path('<int:pk>/receive/', views.po_receive, name='po_receive'),
+    path('<int:pk>/receive/csv/', views.po_receive_csv, name='po_receive_csv'),
+]
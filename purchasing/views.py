@@ -0,0 +1,200 @@
+from django.shortcuts import render, get_object_or_404, redirect
+from django.contrib.auth.decorators import login_required
+from django.contrib import messages
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.views.decorators.http import require_POST
+from django.core.paginator import Paginator
+from django.utils import timezone
+from decimal import Decimal, InvalidOperation
+
+from .models import PurchaseOrder, GoodsReceipt
+from .forms import PurchaseOrderForm, PurchaseOrderLineFormSet, PackingListForm
+from .receiving import ReceivingError, parse_packing_list, receive, receive_all
+from crm.models import Supplier
+
+ITEMS_PER_PAGE = 10
+RECEIPTS_SHOWN = 10
+
+
+def _cost_method(request):
+    method = request.POST.get('cost_method', 'average')
+    return method if method in dict(GoodsReceipt.COST_METHOD_CHOICES) else 'average'
+
+
+def _report_receipt(request, receipt):
+    units = sum(line.quantity for line in receipt.lines.all())
+    messages.success(request, f'Received {units} units on {receipt.order}; stock updated.')
+
+
+@login_required
+def po_list(request):
+    orders = PurchaseOrder.objects.select_related('supplier').annotate(
+        total=Sum(ExpressionWrapper(
+            F('lines__quantity_ordered') * F('lines__unit_cost'),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        )),
+    ).order_by('-created_at', '-pk')
+    status_filter = request.GET.get('status', '')
+    if status_filter:
+        orders = orders.filter(status=status_filter)
+    supplier_filter = request.GET.get('supplier', '')
+    if supplier_filter.isdigit():
+        orders = orders.filter(supplier_id=supplier_filter)
+    else:
+        supplier_filter = ''
+
+    paginator = Paginator(orders, ITEMS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    return render(request, 'purchasing/po_list.html', {
+        'orders': page_obj,
+        'page_obj': page_obj,
+        'status_filter': status_filter,
+        'supplier_filter': supplier_filter,
+        'status_choices': PurchaseOrder.STATUS_CHOICES,
+        'suppliers': Supplier.objects.filter(purchase_orders__isnull=False).distinct().only('pk', 'name'),
+    })
+
+
+@login_required
+def po_create(request):
+    initial = {}
+    if request.GET.get('supplier', '').isdigit():
+        initial['supplier'] = request.GET['supplier']
+    if request.method == 'POST':
+        form = PurchaseOrderForm(request.POST)
+        formset = PurchaseOrderLineFormSet(request.POST)
+        if form.is_valid() and formset.is_valid():
+            order = form.save()
+            formset.instance = order
+            formset.save()
+            messages.success(request, f'Purchase order {order.po_number} created successfully.')
+            return redirect('purchasing:po_detail', pk=order.pk)
+    else:
+        form = PurchaseOrderForm(initial=initial)
+        formset = PurchaseOrderLineFormSet()
+    return render(request, 'purchasing/po_form.html', {
+        'form': form,
+        'formset': formset,
+        'title': 'New Purchase Order',
+    })
+
+
+@login_required
+def po_edit(request, pk):
+    order = get_object_or_404(PurchaseOrder, pk=pk)
+    if order.status != 'draft':
+        messages.error(request, 'Only draft purchase orders can be edited.')
+        return redirect('purchasing:po_detail', pk=pk)
+
+    if request.method == 'POST':
+        form = PurchaseOrderForm(request.POST, instance=order)
+        formset = PurchaseOrderLineFormSet(request.POST, instance=order)
+        if form.is_valid() and formset.is_valid():
+            form.save()
+            formset.save()
+            messages.success(request, f'Purchase order {order.po_number} updated successfully.')
+            return redirect('purchasing:po_detail', pk=order.pk)
+    else:
+        form = PurchaseOrderForm(instance=order)
+        formset = PurchaseOrderLineFormSet(instance=order)
+    return render(request, 'purchasing/po_form.html', {
+        'form': form,
+        'formset': formset,
+        'title': f'Edit {order.po_number}',
+        'order': order,
+    })
+
+
+@login_required
+def po_detail(request, pk):
+    order = get_object_or_404(PurchaseOrder.objects.select_related('supplier'), pk=pk)
+    lines = list(order.lines.select_related('item').order_by('pk'))
+    receipts = order.receipts.annotate(units=Sum('lines__quantity'))[:RECEIPTS_SHOWN]
+    return render(request, 'purchasing/po_detail.html', {
+        'order': order,
+        'lines': lines,
+        'total': sum((line.line_total for line in lines), Decimal('0.00')),
+        'outstanding': sum(line.outstanding for line in lines),
+        'receipts': receipts,
+        'cost_methods': GoodsReceipt.COST_METHOD_CHOICES,
+        'packing_form': PackingListForm(),
+    })
+
+
+@login_required
+@require_POST
+def po_mark_ordered(request, pk):
+    if PurchaseOrder.objects.filter(pk=pk, status='draft', lines__isnull=False).exists():
+        PurchaseOrder.objects.filter(pk=pk).update(status='ordered', ordered_at=timezone.now(), updated_at=timezone.now())
+        messages.success(request, 'Purchase order marked as ordered.')
+    else:
+        messages.error(request, 'Only a draft purchase order with lines can be placed.')
+    return redirect('purchasing:po_detail', pk=pk)
+
+
+@login_required
+@require_POST
+def po_cancel(request, pk):
+    order = get_object_or_404(PurchaseOrder, pk=pk)
+    if PurchaseOrder.objects.filter(pk=pk, status__in=('draft', 'ordered')).update(status='cancelled', updated_at=timezone.now()):
+        messages.success(request, f'Purchase order {order.po_number} cancelled.')
+    else:
+        messages.error(request, 'Only draft or ordered purchase orders with nothing received can be cancelled.')
+    return redirect('purchasing:po_detail', pk=pk)
+
+
+@login_required
+@require_POST
+def po_receive(request, pk):
+    """Book in the quantities entered on the order page (``receive-<line id>``, ``cost-<line id>``)."""
+    order = get_object_or_404(PurchaseOrder, pk=pk)
+    options = {
+        'cost_method': _cost_method(request),
+        'reference': request.POST.get('reference', '').strip()[:100],
+        'create_pieces': request.POST.get('create_pieces') == 'on',
+    }
+    try:
+        if request.POST.get('receive_all'):
+            receipt = receive_all(order, **options)
+        else:
+            quantities, unit_costs = {}, {}
+            for line_id in order.lines.values_list('pk', flat=True):
+                qty = request.POST.get(f'receive-{line_id}', '').strip()
+                cost = request.POST.get(f'cost-{line_id}', '').strip()
+                if qty:
+                    quantities[line_id] = int(qty)
+                if qty and cost:
+                    unit_costs[line_id] = Decimal(cost).quantize(Decimal('0.01'))
+            receipt = receive(order, quantities, unit_costs=unit_costs, **options)
+    except (ValueError, InvalidOperation):
+        messages.error(request, 'Enter whole quantities and valid unit costs.')
+    except ReceivingError as exc:
+        for error in exc.errors:
+            messages.error(request, error)
+    else:
+        _report_receipt(request, receipt)
+    return redirect('purchasing:po_detail', pk=pk)
+
+
+@login_required
+@require_POST
+def po_receive_csv(request, pk):
+    """Book in a delivery from an uploaded packing list."""
+    order = get_object_or_404(PurchaseOrder, pk=pk)
+    form = PackingListForm(request.POST, request.FILES)
+    if not form.is_valid():
+        messages.error(request, 'Choose a packing list CSV to upload.')
+        return redirect('purchasing:po_detail', pk=pk)
+    try:
+        quantities, unit_costs = parse_packing_list(order, form.cleaned_data['file'])
+        receipt = receive(
+            order, quantities, unit_costs=unit_costs,
+            cost_method=form.cleaned_data['cost_method'],
+            reference=form.cleaned_data['reference'] or form.cleaned_data['file'].name[:100],
+        )
+    except ReceivingError as exc:
+        for error in exc.errors:
+            messages.error(request, error)
+    else:
+        _report_receipt(request, receipt)
+    return redirect('purchasing:po_detail', pk=pk)
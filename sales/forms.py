@@ -1,7 +1,16 @@
+import re
+
 from django import forms
+from django.db import transaction
+from django.utils import timezone
+
 from .models import Invoice, InvoiceLine
 from crm.models import Customer
-from inventory.models import JewelryItem
+from inventory.models import JewelryItem, SerializedPiece
+from inventory.scanning import clear_scan_cache
+
+# Scanned serials arrive one per line; typed ones may be comma or space separated.
+SERIAL_SEPARATORS = re.compile(r'[\s,;]+')
 
 
 class InvoiceForm(forms.ModelForm):
@@ -22,6 +31,14 @@ class InvoiceForm(forms.ModelForm):
 
 
 class InvoiceLineForm(forms.ModelForm):
+    serials = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={
+            'class': 'form-control form-control-sm mt-1 serials-input', 'rows': 1,
+            'placeholder': 'Serial numbers (scan or type)',
+        }),
+    )
+
     class Meta:
         model = InvoiceLine
         fields = ['item', 'description', 'quantity', 'unit_price']
@@ -36,12 +53,73 @@ class InvoiceLineForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.fields['item'].queryset = JewelryItem.objects.filter(is_active=True)
         self.fields['item'].required = False
+        self.pieces = []
+        if self.instance.pk:
+            self.fields['serials'].initial = '\n'.join(self.instance.pieces.values_list('serial', flat=True))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        serials = list(dict.fromkeys(code for code in SERIAL_SEPARATORS.split(cleaned_data.get('serials') or '') if code))
+        if not serials:
+            return cleaned_data
+        item = cleaned_data.get('item')
+        quantity = cleaned_data.get('quantity') or 0
+        pieces = {piece.serial: piece for piece in SerializedPiece.objects.filter(serial__in=serials)}
+        errors = []
+        for serial in serials:
+            piece = pieces.get(serial)
+            if piece is None:
+                errors.append(f'Unknown serial {serial}.')
+            elif item is None or piece.item_id != item.pk:
+                errors.append(f'{serial} is not a piece of the selected item.')
+            elif piece.status != 'in_stock' and not (self.instance.pk and piece.invoice_line_id == self.instance.pk):
+                errors.append(f'{serial} is {piece.get_status_display().lower()}.')
+        if len(serials) > quantity:
+            errors.append(f'{len(serials)} serials entered for a quantity of {quantity}.')
+        if errors:
+            raise forms.ValidationError(errors)
+        self.pieces = [pieces[serial] for serial in serials]
+        return cleaned_data
+
+    def save(self, commit=True):
+        line = super().save(commit)
+        if commit:
+            self.save_pieces(line)
+        return line
+
+    def save_pieces(self, line):
+        """Reserve the line's pieces for it and release the ones taken off it."""
+        now = timezone.now()
+        keep = [piece.pk for piece in self.pieces]
+        SerializedPiece.objects.filter(invoice_line=line, status='reserved').exclude(pk__in=keep).update(
+            invoice_line=None, status='in_stock', updated_at=now,
+        )
+        if keep:
+            # Pieces already on this line keep their status; only free ones are taken.
+            SerializedPiece.objects.filter(pk__in=keep, status='in_stock').update(
+                invoice_line=line, status='reserved', updated_at=now,
+            )
+        transaction.on_commit(clear_scan_cache)
+
+
+class BaseInvoiceLineFormSet(forms.BaseInlineFormSet):
+    def clean(self):
+        super().clean()
+        seen = set()
+        for form in self.forms:
+            if not form.is_valid() or self._should_delete_form(form):
+                continue
+            for piece in form.pieces:
+                if piece.serial in seen:
+                    raise forms.ValidationError(f'Serial {piece.serial} is on more than one line.')
+                seen.add(piece.serial)
 
 
 InvoiceLineFormSet = forms.inlineformset_factory(
     Invoice,
     InvoiceLine,
     form=InvoiceLineForm,
+    formset=BaseInvoiceLineFormSet,
     extra=0,
     can_delete=True,
     min_num=1,
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from sales.models import Invoice, InvoiceLine, InvoiceSnapshot
+from sales.snapshots import build_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Backfill immutable snapshots for paid invoices that do not have one yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        pending = (
+            Invoice.objects.filter(status='paid', snapshot__isnull=True)
+            .select_related('customer')
+            .prefetch_related(Prefetch('lines', queryset=InvoiceLine.objects.select_related('item')))
+            .order_by('pk')
+        )
+        last_pk = 0
+        total = 0
+        while True:
+            # Keyset pagination so each chunk is an indexed range scan.
+            chunk = list(pending.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            snapshots = [build_snapshot(invoice, invoice.lines.all()) for invoice in chunk]
+            InvoiceSnapshot.objects.bulk_create(snapshots, ignore_conflicts=True)
+            last_pk = chunk[-1].pk
+            total += len(chunk)
+            self.stdout.write(f'Snapshotted {total} invoices (last id {last_pk})')
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {total} paid invoices snapshotted.'))
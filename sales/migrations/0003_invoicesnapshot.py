@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:34
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_change_currency_to_eur'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSnapshot',
+            fields=[
+                ('invoice', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='sales.invoice')),
+                ('html', models.TextField()),
+                ('lines', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
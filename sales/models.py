@@ -1,10 +1,12 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from django.utils import timezone
 
 from crm.models import Customer
-from inventory.models import JewelryItem
+from inventory.models import JewelryItem, SerializedPiece
+from inventory.scanning import clear_scan_cache
 
 
 class Invoice(models.Model):
@@ -31,6 +33,9 @@ class Invoice(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='invoice_updated_at_id_idx'),
+        ]
 
     def __str__(self):
         return self.invoice_number
@@ -62,6 +67,10 @@ class Invoice(models.Model):
             if line.item and line.quantity > 0:
                 line.item.quantity_on_hand = max(0, line.item.quantity_on_hand - line.quantity)
                 line.item.save()
+        SerializedPiece.objects.filter(invoice_line__invoice=self).exclude(status='sold').update(
+            status='sold', updated_at=timezone.now(),
+        )
+        clear_scan_cache()
 
 
 class InvoiceLine(models.Model):
@@ -78,3 +87,14 @@ class InvoiceLine(models.Model):
 
     def __str__(self):
         return f"{self.description} x{self.quantity}"
+
+
+class InvoiceSnapshot(models.Model):
+    """Frozen rendering of a paid invoice, served instead of re-querying its lines."""
+    invoice = models.OneToOneField(Invoice, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    html = models.TextField()
+    lines = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Snapshot of {self.invoice_id}"
@@ -0,0 +1,14 @@
+"""
+Column projections for invoice list pages and JSON endpoints.
+
+invoice_list skips notes and the Stripe ids; invoice_search reads plain
+.values() rows instead of model instances.
+"""
+
+INVOICE_LIST_FIELDS = (
+    'invoice_number', 'status', 'subtotal', 'tax', 'discount', 'total', 'created_at',
+    'customer__name',
+)
+
+# invoice_search JSON (.values() rows).
+INVOICE_SEARCH_FIELDS = ('id', 'invoice_number', 'customer__name', 'total', 'status')
@@ -0,0 +1,64 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from crm.stats import add_purchase, remove_purchase
+from inventory.models import SerializedPiece
+from inventory.scanning import clear_scan_cache
+
+from .models import Invoice, InvoiceLine
+
+
+def _purchase(status, customer_id, total):
+    """What an invoice contributes to its customer's stats: (customer_id, total) or None."""
+    if status == 'paid' and customer_id:
+        return customer_id, total
+    return None
+
+
+@receiver(pre_save, sender=Invoice)
+def remember_purchase(sender, instance, raw=False, **kwargs):
+    instance._previous_purchase = None
+    if instance.pk and not raw:
+        row = Invoice.objects.filter(pk=instance.pk).values_list('status', 'customer_id', 'total').first()
+        if row:
+            instance._previous_purchase = _purchase(*row)
+
+
+@receiver(post_save, sender=Invoice)
+def update_customer_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_purchase', None)
+    current = _purchase(instance.status, instance.customer_id, instance.total)
+    if previous == current:
+        return
+    if previous:
+        remove_purchase(*previous)
+    if current:
+        add_purchase(*current, instance.created_at)
+
+
+@receiver(post_delete, sender=Invoice)
+def remove_deleted_purchase(sender, instance, **kwargs):
+    purchase = _purchase(instance.status, instance.customer_id, instance.total)
+    if purchase:
+        remove_purchase(*purchase)
+
+
+def _release_pieces(pieces):
+    if pieces.filter(status='reserved').update(invoice_line=None, status='in_stock', updated_at=timezone.now()):
+        transaction.on_commit(clear_scan_cache)
+
+
+@receiver(post_save, sender=Invoice)
+def release_voided_pieces(sender, instance, raw=False, **kwargs):
+    # Pieces reserved on invoice lines go back to stock when the invoice is voided.
+    if instance.status == 'void' and not raw:
+        _release_pieces(SerializedPiece.objects.filter(invoice_line__invoice=instance))
+
+
+@receiver(pre_delete, sender=InvoiceLine)
+def release_deleted_line_pieces(sender, instance, **kwargs):
+    _release_pieces(SerializedPiece.objects.filter(invoice_line=instance))
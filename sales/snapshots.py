@@ -0,0 +1,53 @@
+"""
+Immutable snapshots of paid invoices.
+
+A paid invoice can no longer be edited or deleted, so its detail body is
+rendered once at payment time and stored in InvoiceSnapshot together with a
+compact copy of its lines. invoice_detail then serves the stored HTML without
+touching InvoiceLine or JewelryItem.
+"""
+from collections import defaultdict
+
+from django.template.loader import render_to_string
+
+from inventory.models import SerializedPiece
+
+from .models import InvoiceSnapshot
+
+
+def serialize_lines(lines):
+    """Compact, template-ready copy of invoice lines (item SKU and piece serials included)."""
+    lines = list(lines)
+    serials = defaultdict(list)
+    if lines:
+        pieces = SerializedPiece.objects.filter(invoice_line__in=[line.pk for line in lines]).order_by('serial')
+        for line_id, serial in pieces.values_list('invoice_line_id', 'serial'):
+            serials[line_id].append(serial)
+    return [
+        {
+            'sku': line.item.sku if line.item else '',
+            'description': line.description,
+            'serials': serials[line.pk],
+            'quantity': line.quantity,
+            'unit_price': str(line.unit_price),
+            'line_total': str(line.line_total),
+        }
+        for line in lines
+    ]
+
+
+def build_snapshot(invoice, lines):
+    """Render an unsaved snapshot; ``lines`` should have ``item`` preloaded."""
+    serialized = serialize_lines(lines)
+    html = render_to_string('includes/invoice_body.html', {'invoice': invoice, 'lines': serialized})
+    return InvoiceSnapshot(invoice=invoice, html=html, lines=serialized)
+
+
+def snapshot_invoice(invoice):
+    """Freeze a paid invoice. Existing snapshots are left untouched."""
+    if invoice.status != 'paid':
+        return None
+    lines = invoice.lines.select_related('item')
+    snapshot = build_snapshot(invoice, lines)
+    InvoiceSnapshot.objects.bulk_create([snapshot], ignore_conflicts=True)
+    return snapshot
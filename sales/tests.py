@@ -1,3 +1,406 @@
-from django.test import TestCase
+import csv
+import io
+import zipfile
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import tempfile
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core import mail
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from pypdf import PdfReader
+
+from documents.invoices import current_invoice_pdf
+from documents.models import InvoicePdf
+from inventory.models import JewelryItem, SerializedPiece
+from inventory.scanning import generate_serials
+from crm.models import Customer
+from inventory.tests import assert_constant_queries, call_views, json_payloads, make_item, view_request
+
+from . import views
+from .models import Invoice, InvoiceLine, InvoiceSnapshot
+
+
+@override_settings(DB_REPLICA_ALIAS='replica', INVOICE_PDF_WORKERS=0)
+class PrimaryPinningTests(TransactionTestCase):
+    """Reads go to the replica, except right after a write (config/db_router.py)."""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.user = User.objects.create_user('clerk', password='pw')
+        self.client.force_login(self.user)
+
+    def post_invoice(self):
+        return self.client.post(reverse('sales:invoice_create'), {
+            'tax': '0', 'discount': '0', 'notes': '',
+            'lines-TOTAL_FORMS': '1', 'lines-INITIAL_FORMS': '0',
+            'lines-MIN_NUM_FORMS': '1', 'lines-MAX_NUM_FORMS': '1000',
+            'lines-0-description': 'Ring resizing', 'lines-0-quantity': '2', 'lines-0-unit_price': '25.00',
+        })
+
+    def test_redirect_after_invoice_create_reads_primary(self):
+        response = self.post_invoice()
+        invoice = Invoice.objects.get()
+        self.assertRedirects(response, reverse('sales:invoice_detail', args=[invoice.pk]), fetch_redirect_response=False)
+        self.assertEqual(invoice.total, Decimal('50.00'))
+        cookie = response.cookies[settings.DB_PRIMARY_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.DB_REPLICA_PIN_SECONDS)
+
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            detail = self.client.get(response.url)
+        self.assertContains(detail, invoice.invoice_number)
+        self.assertTrue(any('sales_invoice' in query['sql'] for query in primary.captured_queries))
+        self.assertEqual(replica.captured_queries, [])
+
+    def test_reads_without_pin_cookie_use_replica(self):
+        invoice = Invoice.objects.create()
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(reverse('sales:invoice_detail', args=[invoice.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(settings.DB_PRIMARY_PIN_COOKIE, response.cookies)
+        self.assertTrue(any('sales_invoice' in query['sql'] for query in replica.captured_queries))
+        self.assertFalse(any('sales_invoice' in query['sql'] for query in primary.captured_queries))
+
+
+@override_settings(INVOICE_PDF_WORKERS=0)
+class SerialAssignmentTests(TestCase):
+    """Serials entered on an invoice line reserve those pieces for it."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='pw'))
+        self.item = make_item('RG-1')
+        self.pieces = generate_serials(self.item, 3)
+
+    def line_data(self, serials, quantity=2, item=None, **extra):
+        data = {
+            'tax': '0', 'discount': '0', 'notes': '',
+            'lines-TOTAL_FORMS': '1', 'lines-INITIAL_FORMS': '0',
+            'lines-MIN_NUM_FORMS': '1', 'lines-MAX_NUM_FORMS': '1000',
+            'lines-0-item': (item or self.item).pk, 'lines-0-description': 'Ring',
+            'lines-0-quantity': str(quantity), 'lines-0-unit_price': '150.00', 'lines-0-serials': serials,
+        }
+        data.update(extra)
+        return data
+
+    def statuses(self):
+        return dict(SerializedPiece.objects.values_list('serial', 'status'))
+
+    def create(self, serials, **kwargs):
+        return self.client.post(reverse('sales:invoice_create'), self.line_data(serials, **kwargs))
+
+    def test_create_reserves_pieces(self):
+        response = self.create('RG-1-00001\nRG-1-00002')
+        invoice = Invoice.objects.get()
+        self.assertRedirects(response, reverse('sales:invoice_detail', args=[invoice.pk]), fetch_redirect_response=False)
+        line = invoice.lines.get()
+        self.assertQuerySetEqual(line.pieces.order_by('serial').values_list('serial', flat=True), ['RG-1-00001', 'RG-1-00002'])
+        self.assertEqual(self.statuses(), {'RG-1-00001': 'reserved', 'RG-1-00002': 'reserved', 'RG-1-00003': 'in_stock'})
+        self.assertContains(self.client.get(response.url), 'S/N: RG-1-00001, RG-1-00002')
+
+    def test_rejects_unavailable_foreign_and_excess_serials(self):
+        SerializedPiece.objects.filter(serial='RG-1-00003').update(status='sold')
+        generate_serials(make_item('NK-1'), 1)
+        for serials, error in [
+            ('RG-1-00003', 'RG-1-00003 is sold.'),
+            ('NK-1-00001', 'NK-1-00001 is not a piece of the selected item.'),
+            ('XX-9', 'Unknown serial XX-9.'),
+            ('RG-1-00001 RG-1-00002 RG-1-00003', '3 serials entered for a quantity of 2.'),
+        ]:
+            response = self.create(serials)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(error, response.context['formset'].forms[0].non_field_errors())
+        self.assertFalse(Invoice.objects.exists())
+        self.assertEqual(SerializedPiece.objects.filter(status='reserved').count(), 0)
+
+    def test_rejects_serial_on_two_lines(self):
+        data = self.line_data('RG-1-00001', **{
+            'lines-TOTAL_FORMS': '2', 'lines-1-item': self.item.pk, 'lines-1-description': 'Ring',
+            'lines-1-quantity': '1', 'lines-1-unit_price': '150.00', 'lines-1-serials': 'RG-1-00001',
+        })
+        response = self.client.post(reverse('sales:invoice_create'), data)
+        self.assertEqual(response.context['formset'].non_form_errors(), ['Serial RG-1-00001 is on more than one line.'])
+
+    def test_edit_swaps_and_delete_releases(self):
+        self.create('RG-1-00001')
+        invoice = Invoice.objects.get()
+        line = invoice.lines.get()
+        edit = self.line_data('RG-1-00002', **{'lines-INITIAL_FORMS': '1', 'lines-0-id': line.pk})
+        self.client.post(reverse('sales:invoice_edit', args=[invoice.pk]), edit)
+        self.assertEqual(self.statuses(), {'RG-1-00001': 'in_stock', 'RG-1-00002': 'reserved', 'RG-1-00003': 'in_stock'})
+
+        line.delete()
+        self.assertEqual(set(self.statuses().values()), {'in_stock'})
+        self.assertFalse(SerializedPiece.objects.exclude(invoice_line=None).exists())
+
+    def test_void_releases_and_paid_sells(self):
+        self.create('RG-1-00001')
+        voided = Invoice.objects.get()
+        self.create('RG-1-00002')
+        paid = Invoice.objects.exclude(pk=voided.pk).get()
+
+        self.client.post(reverse('sales:invoice_void', args=[voided.pk]))
+        paid.status = 'paid'
+        paid.save()
+        paid.update_inventory_on_paid()
+        self.assertEqual(self.statuses(), {'RG-1-00001': 'in_stock', 'RG-1-00002': 'sold', 'RG-1-00003': 'in_stock'})
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity_on_hand, 1)
+
+
+@override_settings(INVOICE_PDF_WORKERS=0, INVOICE_PDF_PROCESSES=1)
+class InvoiceMonthZipTests(TestCase):
+    def setUp(self):
+        media = self.settings(MEDIA_ROOT=tempfile.mkdtemp())
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client.force_login(User.objects.create_user('clerk', password='pw'))
+        self.customer = Customer.objects.create(name='Eleni Papadopoulou', address='Ermou 12, Athens')
+
+    def invoice(self, created_at, status='sent', customer=None):
+        invoice = Invoice.objects.create(status=status, customer=customer, total=Decimal('150.00'))
+        Invoice.objects.filter(pk=invoice.pk).update(created_at=created_at)
+        return Invoice.objects.select_related('customer', 'pdf').get(pk=invoice.pk)
+
+    def month_zip(self, month):
+        response = self.client.get(reverse('sales:invoice_month_zip'), {'month': month})
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def pdf_text(self, pdf):
+        return ''.join(page.extract_text() for page in PdfReader(io.BytesIO(pdf)).pages)
+
+    def test_month_holds_issued_invoices_up_to_the_new_year(self):
+        self.invoice(datetime(2025, 11, 30, 23, 59, tzinfo=dt_timezone.utc))
+        first = self.invoice(datetime(2025, 12, 1, tzinfo=dt_timezone.utc), customer=self.customer)
+        self.invoice(datetime(2025, 12, 15, tzinfo=dt_timezone.utc), status='draft')
+        void = self.invoice(datetime(2025, 12, 20, tzinfo=dt_timezone.utc), status='void')
+        last = self.invoice(datetime(2025, 12, 31, 23, 59, 59, tzinfo=dt_timezone.utc), status='paid')
+        january = self.invoice(datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+
+        archive = self.month_zip('2025-12')
+        self.assertEqual(
+            archive.namelist(),
+            [f'{invoice.invoice_number}.pdf' for invoice in (first, void, last)] + ['invoices-2025-12.csv'],
+        )
+        self.assertIn('Eleni Papadopoulou', self.pdf_text(archive.read(f'{first.invoice_number}.pdf')))
+        self.assertEqual(archive.getinfo(f'{last.invoice_number}.pdf').date_time, (2025, 12, 31, 23, 59, 58))
+        rows = list(csv.reader(io.StringIO(archive.read('invoices-2025-12.csv').decode())))
+        self.assertEqual(rows, [
+            ['invoice_number', 'date', 'status', 'customer', 'subtotal', 'tax', 'discount', 'total'],
+            [first.invoice_number, '2025-12-01', 'sent', 'Eleni Papadopoulou', '0.00', '0.00', '0.00', '150.00'],
+            [void.invoice_number, '2025-12-20', 'void', '', '0.00', '0.00', '0.00', '150.00'],
+            [last.invoice_number, '2025-12-31', 'paid', '', '0.00', '0.00', '0.00', '150.00'],
+        ])
+        self.assertEqual(self.month_zip('2026-01').namelist(), [f'{january.invoice_number}.pdf', 'invoices-2026-01.csv'])
+
+    def test_current_pdf_missing_from_storage_is_rendered_again(self):
+        invoice = self.invoice(datetime(2025, 12, 1, tzinfo=dt_timezone.utc), customer=self.customer)
+        lost = current_invoice_pdf(invoice).pdf_file.name
+        default_storage.delete(lost)
+
+        archive = self.month_zip('2025-12')
+        self.assertIn(invoice.invoice_number, self.pdf_text(archive.read(f'{invoice.invoice_number}.pdf')))
+        record = InvoicePdf.objects.get(pk=invoice.pk)
+        self.assertNotEqual(record.pdf_file.name, lost)
+        self.assertTrue(default_storage.exists(record.pdf_file.name))
+
+    def test_customer_changes_make_the_pdf_stale(self):
+        invoice = self.invoice(datetime(2025, 12, 1, tzinfo=dt_timezone.utc), customer=self.customer)
+        before = current_invoice_pdf(invoice).pdf_file.name
+        reloaded = Invoice.objects.select_related('customer', 'pdf').get(pk=invoice.pk)
+        self.assertEqual(current_invoice_pdf(reloaded).pdf_file.name, before)
+
+        self.customer.address = 'Tsimiski 40, Thessaloniki'
+        self.customer.save()
+        invoice = Invoice.objects.select_related('customer', 'pdf').get(pk=invoice.pk)
+        with current_invoice_pdf(invoice).pdf_file.open('rb') as fh:
+            self.assertIn('Tsimiski 40, Thessaloniki', self.pdf_text(fh.read()))
+        self.assertFalse(default_storage.exists(before))
+
+    def test_out_of_range_months_redirect_before_streaming(self):
+        for month in ['9999-12', '2026-13', '0-1', '2026', 'June']:
+            response = self.client.get(reverse('sales:invoice_month_zip'), {'month': month})
+            self.assertRedirects(response, reverse('sales:invoice_list'), fetch_redirect_response=False, msg_prefix=month)
+
+    def test_last_supported_month_streams(self):
+        response = self.client.get(reverse('sales:invoice_month_zip'), {'month': '9999-11'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="invoices-9999-11.zip"')
+        self.assertEqual(b''.join(response.streaming_content)[:2], b'PK')
+
+
+def checkout_session(**params):
+    return SimpleNamespace(id=f"cs_{params['metadata']['invoice_id']}", url=f"https://pay.example/{params['metadata']['invoice_id']}")
+
+
+@override_settings(INVOICE_PDF_WORKERS=0, MEDIA_ROOT=tempfile.mkdtemp())
+@mock.patch('stripe.checkout.Session.create', side_effect=checkout_session)
+class AsyncInvoiceViewTests(TestCase):
+    """The ASYNC_VIEWS variants answer exactly as the sync views do."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('clerk', password='pw')
+        self.customer = Customer.objects.create(name='Nikos', email='nikos@example.com')
+
+    def invoice(self, **fields):
+        return Invoice.objects.create(customer=self.customer, total=Decimal('120.00'), **fields)
+
+    def send(self, view, invoice, asynchronous=False):
+        request = view_request(self.user, asynchronous=asynchronous)
+        response = (async_to_sync(view) if asynchronous else view)(request, invoice.pk)
+        invoice.refresh_from_db()
+        return response, [str(message) for message in get_messages(request)]
+
+    def test_invoice_search(self, create):
+        paid = self.invoice(status='paid')
+        self.invoice()
+        for query in ('', 'nik', paid.invoice_number, 'nobody'):
+            with self.subTest(query=query):
+                status, payload = json_payloads(self, call_views(
+                    self.user, views.invoice_search, views.invoice_search_async, f'/sales/search/?q={query}',
+                ))
+                self.assertEqual(status, 200)
+                if query != 'nobody':
+                    self.assertEqual([row['id'] for row in payload['results']], [paid.pk])
+
+    def test_generate_payment_link(self, create):
+        invoice = self.invoice()
+        status, payload = json_payloads(self, call_views(
+            self.user, views.generate_payment_link, views.generate_payment_link_async, '/', invoice.pk,
+        ))
+        self.assertEqual((status, payload), (200, {'url': f'https://pay.example/{invoice.pk}'}))
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.status, invoice.stripe_checkout_session_id), ('sent', f'cs_{invoice.pk}'))
+
+        Invoice.objects.filter(pk=invoice.pk).update(status='paid')
+        sync_response, async_response = call_views(
+            self.user, views.generate_payment_link, views.generate_payment_link_async, '/', invoice.pk,
+        )
+        self.assertEqual((sync_response.status_code, async_response.status_code), (302, 302))
+        self.assertEqual(async_response.url, sync_response.url)
+
+    def test_invoice_send(self, create):
+        results = []
+        for asynchronous, view in ((False, views.invoice_send), (True, views.invoice_send_async)):
+            invoice = self.invoice()
+            response, messages = self.send(view, invoice, asynchronous)
+            self.assertEqual(response.url, reverse('sales:invoice_detail', args=[invoice.pk]))
+            results.append((invoice.status, invoice.stripe_checkout_session_id == f'cs_{invoice.pk}',
+                            [message.replace(invoice.invoice_number, 'N') for message in messages]))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], ('sent', True, ['Invoice N sent to nikos@example.com.']))
+        self.assertEqual(len(mail.outbox), 2)
+        for email in mail.outbox:
+            self.assertEqual(email.to, ['nikos@example.com'])
+            self.assertEqual([attachment[2] for attachment in email.attachments], ['application/pdf'])
+
+    def test_invoice_send_refusals(self, create):
+        sent = self.invoice(status='sent')
+        anonymous = Invoice.objects.create()
+        for invoice, message in ((sent, 'Invoice has already been sent or processed.'),
+                                 (anonymous, 'Cannot send invoice: customer has no email address.')):
+            for asynchronous, view in ((False, views.invoice_send), (True, views.invoice_send_async)):
+                with self.subTest(invoice=invoice.pk, asynchronous=asynchronous):
+                    response, messages = self.send(view, invoice, asynchronous)
+                    self.assertEqual(messages, [message])
+        self.assertFalse(create.called)
+        self.assertEqual(mail.outbox, [])
+
+
+class ProjectionTests(TestCase):
+    """List pages and JSON endpoints read only their projected columns."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('clerk', password='pw')
+        self.client.force_login(self.user)
+        self.customer = Customer.objects.create(name='Nikos')
+
+    def add_invoices(self, count):
+        for i in range(count):
+            Invoice.objects.create(customer=self.customer, status='paid', total=Decimal('10.00'), notes='Notes ' * 50)
+
+    def test_invoice_list(self):
+        self.add_invoices(1)
+        queries, response = assert_constant_queries(self, reverse('sales:invoice_list'), lambda: self.add_invoices(3))
+        self.assertContains(response, 'Nikos', count=4)
+        self.assertFalse([query for query in queries if '"notes"' in query['sql']])
+
+    def test_invoice_search_reads_one_query(self):
+        self.add_invoices(2)
+        with self.assertNumQueries(1):
+            views.invoice_search(view_request(self.user, '/?q=nik'))
+
+
+@override_settings(INVOICE_PDF_WORKERS=0)
+class InvoiceSnapshotTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk', password='pw'))
+        self.item = make_item('RG-1', quantity_on_hand=3)
+        self.invoice = Invoice.objects.create(customer=Customer.objects.create(name='Nikos', email='nikos@example.com'))
+        self.line = InvoiceLine.objects.create(
+            invoice=self.invoice, item=self.item, description='Gold ring', quantity=2, unit_price=Decimal('75.00'),
+        )
+        Invoice.objects.filter(pk=self.invoice.pk).update(subtotal=Decimal('150.00'), total=Decimal('150.00'))
+
+    def pay(self):
+        event = {'type': 'checkout.session.completed', 'data': {'object': {
+            'metadata': {'invoice_id': str(self.invoice.pk)}, 'payment_intent': 'pi_1',
+        }}}
+        with mock.patch('stripe.Webhook.construct_event', return_value=event), mock.patch('sales.views.print', create=True):
+            response = self.client.post(reverse('sales:stripe_webhook'), b'{}', content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def detail(self):
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get(reverse('sales:invoice_detail', args=[self.invoice.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries.captured_queries]
+
+    def test_paid_invoice_is_served_from_snapshot(self):
+        self.pay()
+        snapshot = InvoiceSnapshot.objects.get(invoice=self.invoice)
+        self.assertEqual(snapshot.lines[0]['description'], 'Gold ring')
+        response, queries = self.detail()
+        self.assertContains(response, 'Gold ring')
+        self.assertContains(response, '€150.00')
+        self.assertFalse([sql for sql in queries if 'sales_invoiceline' in sql or 'inventory_jewelryitem' in sql])
+
+    def test_source_edits_do_not_change_snapshot(self):
+        self.pay()
+        html = InvoiceSnapshot.objects.get(invoice=self.invoice).html
+        InvoiceLine.objects.filter(pk=self.line.pk).update(description='Silver ring', unit_price=Decimal('1.00'))
+        JewelryItem.objects.filter(pk=self.item.pk).update(sku='RG-9')
+        self.pay()  # a repeated webhook
+
+        self.assertEqual(InvoiceSnapshot.objects.get(invoice=self.invoice).html, html)
+        response, queries = self.detail()
+        self.assertContains(response, 'Gold ring')
+        self.assertContains(response, 'RG-1')
+        self.assertNotContains(response, 'Silver ring')
+
+    def test_invoice_paid_elsewhere_is_snapshotted_on_first_view(self):
+        Invoice.objects.filter(pk=self.invoice.pk).update(status='paid')
+        response, queries = self.detail()
+        self.assertContains(response, 'Gold ring')
+        self.assertTrue(InvoiceSnapshot.objects.filter(invoice=self.invoice).exists())
+
+        InvoiceLine.objects.filter(pk=self.line.pk).update(description='Silver ring')
+        response, queries = self.detail()
+        self.assertContains(response, 'Gold ring')
+        self.assertFalse([sql for sql in queries if 'sales_invoiceline' in sql])
+
+    def test_unpaid_invoice_shows_current_lines(self):
+        InvoiceLine.objects.filter(pk=self.line.pk).update(description='Silver ring')
+        response, queries = self.detail()
+        self.assertContains(response, 'Silver ring')
+        self.assertFalse(InvoiceSnapshot.objects.exists())
@@ -1,15 +1,21 @@
 import stripe
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.shortcuts import render, get_object_or_404, redirect
+from django.db.models import Q
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.core.paginator import Paginator
 
 from .models import Invoice, InvoiceLine
+from .snapshots import serialize_lines, snapshot_invoice
 from .forms import InvoiceForm, InvoiceLineFormSet
+from .projections import INVOICE_LIST_FIELDS, INVOICE_SEARCH_FIELDS
+from config.downloads import serve_file
+from documents.invoices import current_invoice_pdf, get_invoice_pdf, iter_month_zip, month_invoices
 from notifications.email_service import send_invoice_email, send_payment_confirmation_email
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -17,9 +23,37 @@ stripe.api_key = settings.STRIPE_SECRET_KEY
 ITEMS_PER_PAGE = 10
 
 
+def create_checkout_session(invoice):
+    """Create a Stripe Checkout Session paying the invoice total."""
+    return stripe.checkout.Session.create(
+        payment_method_types=['card'],
+        line_items=[{
+            'price_data': {
+                'currency': invoice.currency,
+                'unit_amount': int(invoice.total * 100),
+                'product_data': {
+                    'name': f'Invoice {invoice.invoice_number}',
+                },
+            },
+            'quantity': 1,
+        }],
+        mode='payment',
+        success_url=settings.STRIPE_SUCCESS_URL + f'?invoice_id={invoice.pk}',
+        cancel_url=settings.STRIPE_CANCEL_URL + f'?invoice_id={invoice.pk}',
+        metadata={'invoice_id': str(invoice.pk)},
+    )
+
+
+# Stripe and SMTP are blocking network calls; in async views they run in a
+# worker thread so the event loop keeps serving other requests meanwhile.
+acreate_checkout_session = sync_to_async(create_checkout_session, thread_sensitive=False)
+asend_invoice_email = sync_to_async(send_invoice_email, thread_sensitive=False)
+aget_invoice_pdf = sync_to_async(get_invoice_pdf)
+
+
 @login_required
 def invoice_list(request):
-    invoices = Invoice.objects.select_related('customer').all()
+    invoices = Invoice.objects.select_related('customer').only(*INVOICE_LIST_FIELDS)
     status_filter = request.GET.get('status')
     if status_filter:
         invoices = invoices.filter(status=status_filter)
@@ -33,8 +67,39 @@ def invoice_list(request):
 
 @login_required
 def invoice_detail(request, pk):
-    invoice = get_object_or_404(Invoice.objects.prefetch_related('lines', 'lines__item'), pk=pk)
-    return render(request, 'sales/invoice_detail.html', {'invoice': invoice})
+    invoice = get_object_or_404(Invoice.objects.select_related('customer', 'snapshot'), pk=pk)
+    snapshot = getattr(invoice, 'snapshot', None)
+    if snapshot is not None:
+        return render(request, 'sales/invoice_detail.html', {'invoice': invoice, 'snapshot_html': snapshot.html})
+    
+    if invoice.status == 'paid':
+        # Paid before snapshots existed (or marked paid outside the webhook).
+        snapshot = snapshot_invoice(invoice)
+        return render(request, 'sales/invoice_detail.html', {'invoice': invoice, 'snapshot_html': snapshot.html})
+    
+    lines = serialize_lines(invoice.lines.select_related('item'))
+    return render(request, 'sales/invoice_detail.html', {'invoice': invoice, 'lines': lines})
+
+
+@login_required
+def invoice_pdf(request, pk):
+    invoice = get_object_or_404(Invoice.objects.select_related('customer'), pk=pk)
+    return serve_file(request, current_invoice_pdf(invoice).pdf_file, filename=f'{invoice.invoice_number}.pdf')
+
+
+@login_required
+def invoice_month_zip(request):
+    """Every issued invoice of ``?month=YYYY-MM`` as PDFs in a streamed ZIP."""
+    try:
+        year, month = (int(part) for part in request.GET.get('month', '').split('-'))
+        # Builds both bounds of the month, so e.g. 9999-12 fails here rather than mid-stream.
+        month_invoices(year, month)
+    except ValueError:
+        messages.error(request, 'Choose a month to download.')
+        return redirect('sales:invoice_list')
+    response = StreamingHttpResponse(iter_month_zip(year, month), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="invoices-{year}-{month:02d}.zip"'
+    return response
 
 
 @login_required
@@ -116,29 +181,13 @@ def invoice_send(request, pk):
     
     # Generate Stripe checkout session
     try:
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[{
-                'price_data': {
-                    'currency': invoice.currency,
-                    'unit_amount': int(invoice.total * 100),
-                    'product_data': {
-                        'name': f'Invoice {invoice.invoice_number}',
-                    },
-                },
-                'quantity': 1,
-            }],
-            mode='payment',
-            success_url=settings.STRIPE_SUCCESS_URL + f'?invoice_id={invoice.pk}',
-            cancel_url=settings.STRIPE_CANCEL_URL + f'?invoice_id={invoice.pk}',
-            metadata={'invoice_id': str(invoice.pk)},
-        )
+        checkout_session = create_checkout_session(invoice)
         invoice.stripe_checkout_session_id = checkout_session.id
         invoice.status = 'sent'
         invoice.save()
         
-        # Send email with payment link
-        email_sent = send_invoice_email(invoice, checkout_session.url)
+        # Send email with payment link and the invoice PDF
+        email_sent = send_invoice_email(invoice, checkout_session.url, get_invoice_pdf(invoice))
         
         if email_sent:
             messages.success(request, f'Invoice {invoice.invoice_number} sent to {invoice.customer.email}.')
@@ -171,23 +220,7 @@ def generate_payment_link(request, pk):
         return redirect('sales:invoice_detail', pk=pk)
     
     try:
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[{
-                'price_data': {
-                    'currency': invoice.currency,
-                    'unit_amount': int(invoice.total * 100),
-                    'product_data': {
-                        'name': f'Invoice {invoice.invoice_number}',
-                    },
-                },
-                'quantity': 1,
-            }],
-            mode='payment',
-            success_url=settings.STRIPE_SUCCESS_URL + f'?invoice_id={invoice.pk}',
-            cancel_url=settings.STRIPE_CANCEL_URL + f'?invoice_id={invoice.pk}',
-            metadata={'invoice_id': str(invoice.pk)},
-        )
+        checkout_session = create_checkout_session(invoice)
         invoice.stripe_checkout_session_id = checkout_session.id
         if invoice.status == 'draft':
             invoice.status = 'sent'
@@ -198,6 +231,56 @@ def generate_payment_link(request, pk):
         return JsonResponse({'error': str(e)}, status=400)
 
 
+@login_required
+async def invoice_send_async(request, pk):
+    """Async variant of invoice_send for the ASGI deployment mode."""
+    invoice = await aget_object_or_404(Invoice.objects.select_related('customer'), pk=pk)
+    if invoice.status != 'draft':
+        messages.warning(request, 'Invoice has already been sent or processed.')
+        return redirect('sales:invoice_detail', pk=pk)
+    
+    if not invoice.customer or not invoice.customer.email:
+        messages.error(request, 'Cannot send invoice: customer has no email address.')
+        return redirect('sales:invoice_detail', pk=pk)
+    
+    try:
+        checkout_session = await acreate_checkout_session(invoice)
+        invoice.stripe_checkout_session_id = checkout_session.id
+        invoice.status = 'sent'
+        await invoice.asave()
+        
+        email_sent = await asend_invoice_email(invoice, checkout_session.url, await aget_invoice_pdf(invoice))
+        
+        if email_sent:
+            messages.success(request, f'Invoice {invoice.invoice_number} sent to {invoice.customer.email}.')
+        else:
+            messages.warning(request, f'Invoice {invoice.invoice_number} created but email failed to send. Payment link: {checkout_session.url}')
+    except stripe.error.StripeError as e:
+        messages.error(request, f'Stripe error: {str(e)}')
+    
+    return redirect('sales:invoice_detail', pk=pk)
+
+
+@login_required
+async def generate_payment_link_async(request, pk):
+    """Async variant of generate_payment_link for the ASGI deployment mode."""
+    invoice = await aget_object_or_404(Invoice, pk=pk)
+    if invoice.status == 'paid':
+        messages.error(request, 'Invoice has already been paid.')
+        return redirect('sales:invoice_detail', pk=pk)
+    
+    try:
+        checkout_session = await acreate_checkout_session(invoice)
+        invoice.stripe_checkout_session_id = checkout_session.id
+        if invoice.status == 'draft':
+            invoice.status = 'sent'
+        await invoice.asave()
+        
+        return JsonResponse({'url': checkout_session.url})
+    except stripe.error.StripeError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
 @csrf_exempt
 @require_POST
 def stripe_webhook(request):
@@ -236,6 +319,7 @@ def stripe_webhook(request):
                     invoice.save()
                     print(f"[WEBHOOK] Invoice marked as paid")
                     invoice.update_inventory_on_paid()
+                    snapshot_invoice(invoice)
                     send_payment_confirmation_email(invoice)
                     print(f"[WEBHOOK] Inventory updated and email sent")
                 else:
@@ -262,31 +346,42 @@ def payment_cancel(request):
     return render(request, 'sales/payment_cancel.html', {'invoice': invoice})
 
 
-@login_required
-def invoice_search(request):
-    """Search invoices for autocomplete in certificate form."""
-    from django.db.models import Q
-    query = request.GET.get('q', '').strip()
-    invoices = Invoice.objects.select_related('customer').filter(status='paid')
-    
+STATUS_LABELS = dict(Invoice.STATUS_CHOICES)
+
+
+def _invoice_search_queryset(query):
+    invoices = Invoice.objects.filter(status='paid')
     if query:
         invoices = invoices.filter(
             Q(invoice_number__icontains=query) | Q(customer__name__icontains=query)
         )
-    
     # Limit results for performance
-    invoices = invoices[:20]
-    
-    results = [
-        {
-            'id': inv.pk,
-            'invoice_number': inv.invoice_number,
-            'customer': inv.customer.name if inv.customer else 'Walk-in',
-            'total': str(inv.total),
-            'status': inv.get_status_display(),
-            'text': f"{inv.invoice_number} - {inv.customer.name if inv.customer else 'Walk-in'} (€{inv.total})",
-        }
-        for inv in invoices
-    ]
-    
+    return invoices.values(*INVOICE_SEARCH_FIELDS)[:20]
+
+
+def _invoice_search_result(row):
+    customer = row['customer__name'] or 'Walk-in'
+    return {
+        'id': row['id'],
+        'invoice_number': row['invoice_number'],
+        'customer': customer,
+        'total': str(row['total']),
+        'status': STATUS_LABELS.get(row['status'], row['status']),
+        'text': f"{row['invoice_number']} - {customer} (€{row['total']})",
+    }
+
+
+@login_required
+def invoice_search(request):
+    """Search invoices for autocomplete in certificate form."""
+    query = request.GET.get('q', '').strip()
+    results = [_invoice_search_result(row) for row in _invoice_search_queryset(query)]
+    return JsonResponse({'results': results})
+
+
+@login_required
+async def invoice_search_async(request):
+    """Async variant of invoice_search for the ASGI deployment mode."""
+    query = request.GET.get('q', '').strip()
+    results = [_invoice_search_result(row) async for row in _invoice_search_queryset(query)]
     return JsonResponse({'results': results})
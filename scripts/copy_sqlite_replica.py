@@ -0,0 +1,39 @@
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def _get_env(name: str, default: str | None = None) -> str:
+    value = os.getenv(name, default)
+    if value is None or value == "":
+        raise RuntimeError(f"Missing required environment variable: {name}")
+    return value
+
+
+def main() -> int:
+    """Refresh the local SQLite read replica from the primary database file."""
+    primary_path = BASE_DIR / _get_env("SQLITE_NAME", "db.sqlite3")
+    replica_path = BASE_DIR / _get_env("SQLITE_REPLICA_NAME")
+
+    if not primary_path.exists():
+        raise RuntimeError(f"Primary database not found: {primary_path}")
+    if primary_path.resolve() == replica_path.resolve():
+        raise RuntimeError("SQLITE_REPLICA_NAME must differ from SQLITE_NAME")
+
+    # The backup API gives a consistent snapshot even while the dev server writes.
+    with sqlite3.connect(primary_path) as source, sqlite3.connect(replica_path) as target:
+        source.backup(target)
+
+    print(f"[copy_sqlite_replica] {primary_path} -> {replica_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except Exception as e:
+        print(f"[copy_sqlite_replica] ERROR: {e}", file=sys.stderr)
+        raise
@@ -0,0 +1,14 @@
+# Gunicorn launch profile for the ASGI deployment mode.
+#
+#   gunicorn config.asgi:application -c scripts/gunicorn_asgi.conf.py
+#
+# Each uvicorn worker runs an event loop, so the async autocomplete and
+# Stripe/SMTP views no longer hold a whole worker while waiting on I/O.
+import os
+
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '3'))
+worker_class = 'uvicorn_worker.UvicornWorker'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))